@@ -1,6 +1,11 @@
 """
 YouTube 財經報告生成器 v3.0
 主程式入口點
+
+    streamlit run main.py                      啟動網頁介面
+    python main.py batch urls.txt [選項]       以命令列批次處理 (python main.py batch -h 查看選項)
+    python main.py serve [選項]                啟動本機工作 API (python main.py serve -h 查看選項)
+    python main.py worker run|submit|status    多節點共用工作佇列 (python main.py worker -h 查看選項)
 """
 import sys
 import os
@@ -8,7 +13,16 @@ import os
 # 添加 src 目錄到 Python 路徑
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.ui.app_streamlit import main
-
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from src.core.batch_cli import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from src.core.job_api import main as serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        from src.core.worker_node import main as worker_main
+        sys.exit(worker_main(sys.argv[2:]))
+    
+    from src.ui.app_streamlit import main
     main()
@@ -0,0 +1,167 @@
+"""
+命令列批次處理模組
+不需開啟瀏覽器即可批次處理影片，適合排程工作與沒有桌面環境的伺服器：
+
+    python main.py batch urls.txt --workers 4 --model small --expert 財經專家
+
+進度以每行一筆 JSON 輸出到標準輸出，逐字稿、報告與摘要寫入輸出資料夾，
+結束時在標準錯誤輸出各階段用時；全部成功時結束代碼為 0，有影片失敗時為 1，參數錯誤為 2
+"""
+import os
+import sys
+import json
+import argparse
+from src.core.config import COMPACTION_STEPS, AI_PROVIDERS
+from src.core.batch_pipeline import BatchPipeline, STAGE_LABELS
+from src.core.progress import JsonLinesReporter
+from src.utils.prompt_manager import PromptManager
+
+TRANSCRIPTS_SUBFOLDER = "transcripts"
+SUMMARY_FILENAME = "summary.json"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python main.py batch",
+        description="批次處理影片、播放清單或頻道，輸出逐字稿與分析報告"
+    )
+    parser.add_argument("urls_file", help="網址清單檔 (每行一個影片、播放清單或頻道網址，# 開頭為註解)；- 代表標準輸入")
+    parser.add_argument("--output", "-o", default="batch_output", help="輸出資料夾 (逐字稿、報告與摘要)")
+    parser.add_argument("--workers", type=int, help="影片資訊、字幕與音訊下載階段的平行數")
+    parser.add_argument("--transcribe-workers", type=int, help="語音轉文字的平行數 (預設 1)")
+    parser.add_argument("--analyze-workers", type=int, help="AI 分析的平行數")
+    parser.add_argument("--model", default="base", help="faster-whisper 模型 (base / small / medium ...)")
+    parser.add_argument("--language", choices=["zh", "en"], help="語音語言 (預設自動檢測)")
+    parser.add_argument("--expert", help="分析使用的專家名稱 (prompts 資料夾中的檔名)；未指定時只保存逐字稿")
+    parser.add_argument("--ai-model", default="gemini-2.5-flash", choices=list(AI_PROVIDERS.values()), help="Gemini 模型")
+    parser.add_argument("--api-key", help="Gemini API Key (預設讀取 GOOGLE_API_KEY 環境變數)")
+    parser.add_argument("--cookies", help="yt-dlp 使用的 Cookie 檔案")
+    parser.add_argument("--force", action="store_true", help="略過報告快取，重新生成報告")
+    parser.add_argument("--no-compact", action="store_true", help="分析前不精簡逐字稿")
+    return parser
+
+
+def stage_workers(args):
+    """將命令列的平行數參數轉為各階段的執行緒數"""
+    workers = {}
+    if args.workers:
+        workers.update(metadata=args.workers, captions=args.workers, audio=args.workers)
+    if args.transcribe_workers:
+        workers["transcribe"] = args.transcribe_workers
+    if args.analyze_workers:
+        workers["analyze"] = args.analyze_workers
+    return workers
+
+
+def run_batch(urls, backend, output_dir, workers=None, stream=None):
+    """
+    以指定的執行方式處理影片並將結果寫入輸出資料夾，回傳 (各影片狀態, 各階段摘要, 總秒數)
+
+    報告由 backend 直接寫入輸出資料夾；逐字稿完成後另存一份到 transcripts 子資料夾，
+    最後寫入 summary.json (內容同最後一行 JSON 進度，另含各影片的結果)。
+    按下 Ctrl+C 時取消其餘處理 (終止下載與轉錄的子程序)，已完成的影片照常匯出。
+    """
+    reporter = JsonLinesReporter(stream)
+    pipeline = BatchPipeline(backend, workers=workers, reporter=reporter)
+    pipeline.start(urls)
+    try:
+        pipeline.wait()
+    except KeyboardInterrupt:
+        pipeline.cancel("使用者中斷")
+        pipeline.wait()
+    items = pipeline.snapshot()
+
+    transcripts_dir = os.path.join(output_dir, TRANSCRIPTS_SUBFOLDER)
+    for item in items:
+        if not item["record"]:
+            continue
+        try:
+            os.makedirs(transcripts_dir, exist_ok=True)
+            transcript_path = os.path.join(transcripts_dir, item["record"]["filename"])
+            with open(transcript_path, "w", encoding="utf-8") as f:
+                f.write(backend.read_transcript(item))
+        except (OSError, ValueError) as e:
+            reporter.emit("export_failed", index=item["index"], error=str(e))
+
+    stage_summary = pipeline.stage_summary()
+    wall_seconds = round(pipeline.finished_at - pipeline.started_at, 3)
+    with open(os.path.join(output_dir, SUMMARY_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "items": [reporter.describe(item) for item in items],
+                "stages": stage_summary,
+                "wall_seconds": wall_seconds
+            },
+            f, ensure_ascii=False, indent=2
+        )
+    return items, stage_summary, wall_seconds
+
+
+def format_summary(items, stage_summary, wall_seconds):
+    """各階段用時摘要 (供人閱讀)"""
+    failed = sum(item["status"] == "failed" for item in items)
+    cancelled = sum(item["status"] == "cancelled" for item in items)
+    lines = [
+        f"批次處理完成：{len(items)} 部影片，成功 {len(items) - failed - cancelled}、失敗 {failed}"
+        + (f"、取消 {cancelled}" if cancelled else "") + f"，總用時 {wall_seconds:.1f} 秒"
+    ]
+    for stage, stats in stage_summary.items():
+        if stats["items"]:
+            lines.append(
+                f"  {STAGE_LABELS[stage]}: {stats['items']} 部，累計 {stats['total_seconds']:.1f} 秒，"
+                f"最長 {stats['max_seconds']:.1f} 秒"
+            )
+    for item in items:
+        if item["status"] == "failed":
+            lines.append(f"  ❌ {item['title']} ({STAGE_LABELS[item['stage']]}): {item['error']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    try:
+        if args.urls_file == "-":
+            source_text = sys.stdin.read()
+        else:
+            with open(args.urls_file, "r", encoding="utf-8") as f:
+                source_text = f.read()
+    except OSError as e:
+        print(f"❌ 無法讀取網址清單: {e}", file=sys.stderr)
+        return 2
+
+    prompt_template = None
+    if args.expert:
+        prompt_manager = PromptManager()
+        if args.expert not in prompt_manager.get_available_prompts():
+            print(f"❌ 找不到專家: {args.expert}（可用: {', '.join(prompt_manager.get_available_prompts())}）", file=sys.stderr)
+            return 2
+        prompt_template = prompt_manager.get_prompt_content(args.expert)
+
+    # 下載與轉錄相關模組較大，確認參數無誤後才載入
+    from src.services.video_processor import VideoProcessor
+    from src.services.batch_backend import VideoBatchBackend
+
+    urls = VideoProcessor.expand_urls(source_text, args.cookies)
+    if not urls:
+        print("❌ 沒有可處理的影片網址", file=sys.stderr)
+        return 2
+
+    os.makedirs(args.output, exist_ok=True)
+    backend = VideoBatchBackend(
+        args.output, args.cookies, args.model, args.language, args.api_key or os.getenv("GOOGLE_API_KEY"),
+        prompt_template, args.expert, args.ai_model, force_regenerate=args.force,
+        compaction_steps=None if args.no_compact else COMPACTION_STEPS
+    )
+    if args.expert and not backend.can_analyze:
+        print("⚠️ 未提供 API Key，只下載並保存逐字稿", file=sys.stderr)
+
+    items, stage_summary, wall_seconds = run_batch(urls, backend, args.output, stage_workers(args))
+    print(format_summary(items, stage_summary, wall_seconds), file=sys.stderr)
+    return 1 if any(item["status"] in ("failed", "cancelled") for item in items) else 0
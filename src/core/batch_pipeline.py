@@ -0,0 +1,373 @@
+"""
+影片批次處理管線模組
+將多部影片拆成「影片資訊 → 字幕 / 音訊下載 → 語音轉文字 → AI 分析」等階段，
+每個階段有各自的工作執行緒數，階段之間以有界佇列銜接；單一影片較慢或失敗只影響自己，不會卡住其他影片。
+其他工作 (同一程序中的其他批次或工作階段) 正在轉錄同一部影片時附加到該處理，只重新執行 AI 分析。
+取得影片資訊後各階段依預估用時由短到長處理，語音轉文字另需向共用的排程器 (LaneScheduler) 取得資源。
+取消時進行中的下載與轉錄在下一次檢查取消權杖時中止，尚未開始的影片直接標記為已取消
+"""
+import os
+import time
+import queue
+import shutil
+import tempfile
+import itertools
+import threading
+from src.core.config import BATCH_STAGE_WORKERS, BATCH_QUEUE_SIZE, BATCH_WORK_FOLDER
+from src.core.progress import ProgressReporter
+from src.utils.cancellation import CancelToken, OperationCancelled
+from src.utils.lane_scheduler import LaneScheduler, BATCH, get_transcribe_scheduler
+from src.utils.metrics import MetricsRecorder
+from src.utils.single_flight import get_transcript_flights
+
+# 階段依處理順序排列；有字幕的影片走 captions，其餘走 audio → transcribe
+STAGES = ("metadata", "captions", "audio", "transcribe", "analyze")
+STAGE_LABELS = {
+    "metadata": "影片資訊",
+    "captions": "字幕下載",
+    "audio": "音訊下載",
+    "transcribe": "語音轉文字",
+    "analyze": "AI 分析"
+}
+STATUS_LABELS = {
+    "queued": "⏳ 等待中",
+    "running": "🔄 處理中",
+    "done": "✅ 完成",
+    "failed": "❌ 失敗",
+    "cancelled": "⏹️ 已取消"
+}
+
+_STOP = object()
+# 影片已附加到其他工作的處理，完成時由 _on_shared 接續
+_DETACHED = object()
+
+
+class BatchPipeline:
+    """
+    多階段影片批次處理
+
+    實際的下載、轉錄與分析由 backend 執行 (見 VideoBatchBackend)，進度透過 reporter (ProgressReporter) 回報，
+    本類別只負責排程：各階段的執行緒從自己的佇列取出影片，完成後交給下一個階段的佇列；
+    下游佇列已滿時上游暫停，下載好的音訊不會無限堆積。每部影片使用各自的暫存資料夾，完成後即刪除。
+    """
+
+    def __init__(self, backend, workers=None, queue_size=BATCH_QUEUE_SIZE, work_root=BATCH_WORK_FOLDER, reporter=None,
+                 flights=None, lane=BATCH, scheduler=None, cancel_token=None):
+        self.backend = backend
+        self.workers = dict(BATCH_STAGE_WORKERS)
+        self.workers.update(workers or {})
+        self.queue_size = queue_size
+        self.work_root = work_root
+        self.reporter = reporter or ProgressReporter()
+        self.flights = flights or get_transcript_flights()
+        self.lane = lane
+        self.scheduler = scheduler or get_transcribe_scheduler()
+        self.cancel_token = cancel_token or CancelToken()
+        self.items = []
+        self.job_dir = None
+        self.started_at = None
+        self.finished_at = None
+        self._queues = {}
+        # 附加的處理的進度通知 (無上限，其他工作的執行緒放入後立即返回)，由本工作的 batch-shared 執行緒處理
+        self._shared_updates = queue.SimpleQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._completed = set()
+        self._done = threading.Event()
+
+    def start(self, urls):
+        """開始處理影片網址列表 (立即返回)，以 wait() 等待完成"""
+        if self.started_at is not None:
+            raise RuntimeError("批次處理已經開始")
+        self.started_at = time.time()
+        os.makedirs(self.work_root, exist_ok=True)
+        self.job_dir = tempfile.mkdtemp(prefix="job_", dir=self.work_root)
+        self.items = [
+            {
+                "index": index, "url": url, "title": url, "video_id": None, "duration": None, "chapters": [],
+                "has_captions": False, "stage": "metadata", "status": "queued", "source": None, "error": None,
+                "timings": {}, "record": None, "report": None, "work_dir": None, "audio_path": None, "flight": None
+            }
+            for index, url in enumerate(urls)
+        ]
+        self._remaining = len(self.items)
+        self.reporter.job_started(self.snapshot())
+        if not self.items:
+            self._finish_job()
+            return
+
+        self._queues = {stage: queue.PriorityQueue(maxsize=self.queue_size) for stage in STAGES}
+        for stage in STAGES:
+            for number in range(max(1, self.workers.get(stage, 1))):
+                thread = threading.Thread(target=self._worker, args=(stage,), name=f"batch-{stage}-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        # 由獨立執行緒送入第一個階段，佇列已滿時只有它會等待
+        threading.Thread(target=self._feed, name="batch-feed", daemon=True).start()
+        threading.Thread(target=self._drain_shared, name="batch-shared", daemon=True).start()
+
+    def wait(self, timeout=None):
+        """等待全部影片處理完畢，回傳是否已完成"""
+        return self._done.wait(timeout)
+
+    def run(self, urls):
+        """處理影片網址列表並等待完成，回傳各影片的狀態"""
+        self.start(urls)
+        self.wait()
+        return self.snapshot()
+
+    def cancel(self, reason="已取消"):
+        """取消處理 (立即返回)：進行中的階段中止並終止子程序、釋放轉錄資源，其餘影片不再處理"""
+        self.cancel_token.cancel(reason)
+        # 附加在其他工作的影片沒有佔用執行緒，直接結束
+        with self._lock:
+            detached = [
+                item for item in self.items
+                if item["source"] == "shared" and item["record"] is None and item["index"] not in self._completed
+            ]
+        for item in detached:
+            self._complete(item, "cancelled", reason)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def snapshot(self):
+        """目前各影片的狀態 (複本，可在其他執行緒中讀取)"""
+        with self._lock:
+            return [self._copy(item) for item in self.items]
+
+    def stage_summary(self):
+        """各階段的處理數量與用時 {階段: {"items", "total_seconds", "max_seconds"}}"""
+        summary = {stage: {"items": 0, "total_seconds": 0.0, "max_seconds": 0.0} for stage in STAGES}
+        with self._lock:
+            for item in self.items:
+                for stage, seconds in item["timings"].items():
+                    summary[stage]["items"] += 1
+                    summary[stage]["total_seconds"] += seconds
+                    summary[stage]["max_seconds"] = max(summary[stage]["max_seconds"], seconds)
+        for stats in summary.values():
+            stats["total_seconds"] = round(stats["total_seconds"], 3)
+            stats["max_seconds"] = round(stats["max_seconds"], 3)
+        return summary
+
+    def queue_depths(self):
+        """各階段佇列中等待處理的影片數"""
+        return {stage: work_queue.qsize() for stage, work_queue in self._queues.items()} if not self.done else {}
+
+    @staticmethod
+    def _copy(item):
+        copied = dict(item)
+        copied["timings"] = dict(item["timings"])
+        return copied
+
+    def _update(self, item, **fields):
+        with self._lock:
+            item.update(fields)
+            copied = self._copy(item)
+        try:
+            self.reporter.item_updated(copied)
+        except Exception:
+            pass  # 回報進度失敗不影響處理
+
+    def _feed(self):
+        for item in self.items:
+            self._enqueue("metadata", item)
+
+    @staticmethod
+    def _priority(stage, item):
+        """佇列中的處理順序：影片資訊與 AI 分析依原順序，下載與轉錄依預估用時由短到長"""
+        if stage in ("captions", "audio", "transcribe"):
+            return LaneScheduler.estimate_cost(item["duration"], stage == "captions")
+        return item["index"]
+
+    def _enqueue(self, stage, item):
+        self._queues[stage].put((self._priority(stage, item), next(self._sequence), item))
+
+    def _worker(self, stage):
+        handler = getattr(self, f"_run_{stage}")
+        work_queue = self._queues[stage]
+        while True:
+            _, _, item = work_queue.get()
+            if item is _STOP:
+                return
+            if self.cancel_token.cancelled:
+                self._complete(item, "cancelled", self.cancel_token.reason)
+                continue
+            self._update(item, stage=stage, status="running")
+            if item["flight"] is not None:
+                self.flights.publish(item["flight"], stage)
+            start_time = time.perf_counter()
+            status = "failed"
+            try:
+                with self.cancel_token.bind():
+                    next_stage = handler(item)
+                error = None
+            except OperationCancelled as e:
+                next_stage, error, status = None, str(e) or "已取消", "cancelled"
+            except Exception as e:
+                next_stage, error = None, str(e) or type(e).__name__
+            with self._lock:
+                item["timings"][stage] = round(time.perf_counter() - start_time, 3)
+
+            if error is None and next_stage is not None and self.cancel_token.cancelled:
+                next_stage, error, status = None, self.cancel_token.reason, "cancelled"
+            if next_stage is _DETACHED:
+                continue
+            if error is not None:
+                self._complete(item, status, error)
+            elif next_stage is None:
+                self._complete(item, "done")
+            else:
+                self._update(item, stage=next_stage, status="queued")
+                self._enqueue(next_stage, item)
+
+    def _work_dir(self, item):
+        if item["work_dir"] is None:
+            item["work_dir"] = os.path.join(self.job_dir, f"item_{item['index']:04d}")
+            os.makedirs(item["work_dir"], exist_ok=True)
+        return item["work_dir"]
+
+    def _after_transcript(self):
+        return "analyze" if getattr(self.backend, "can_analyze", False) else None
+
+    def _run_metadata(self, item):
+        info = self.backend.probe(item["url"])
+        self._update(
+            item, title=info.get("title") or item["url"], video_id=info.get("id"), duration=info.get("duration"),
+            chapters=info.get("chapters") or [],
+            has_captions=bool(info.get("has_subtitles") or info.get("has_automatic_captions"))
+        )
+        # 已轉錄過的影片直接沿用目錄中的逐字稿
+        existing = self.backend.find_existing(item)
+        if existing:
+            self._update(item, record=existing, source="existing")
+            return self._after_transcript()
+
+        # 同一部影片 (相同轉錄參數) 正在其他工作中處理時共用其逐字稿，否則由本工作處理並讓之後的工作附加
+        transcript_key = getattr(self.backend, "transcript_key", None)
+        key = transcript_key(item) if transcript_key else None
+        if key is not None:
+            flight, leader = self.flights.join(key, on_update=lambda flight: self._on_shared(item, flight))
+            if not leader:
+                return _DETACHED
+            with self._lock:
+                item["flight"] = key
+        return "captions" if item["has_captions"] else "audio"
+
+    def _release_flight(self, item, record=None, error=None):
+        """逐字稿已完成 (或處理失敗)，通知附加在此處理的其他工作"""
+        with self._lock:
+            key, item["flight"] = item["flight"], None
+        if key is not None:
+            self.flights.finish(key, result=record, error=error)
+
+    def _on_shared(self, item, flight):
+        """
+        附加的處理有進度或已完成 (附加時及之後在處理該影片的工作執行緒中呼叫)
+
+        只放入本工作的通知佇列後立即返回：本工作的佇列已滿時，不會讓處理該影片的其他工作停下來等待。
+        """
+        with self._lock:
+            if item["index"] in self._completed:
+                return
+        self._shared_updates.put((item, flight))
+
+    def _drain_shared(self):
+        while True:
+            item, flight = self._shared_updates.get()
+            if item is _STOP:
+                return
+            self._apply_shared(item, flight)
+
+    def _apply_shared(self, item, flight):
+        """依附加的處理的進度更新影片，完成時送入下一個階段 (佇列已滿時只有 batch-shared 執行緒等待)"""
+        with self._lock:
+            # 通知在佇列中等待時處理可能已完成，較早的進度通知也會看到完成狀態，只接續一次
+            if item["index"] in self._completed or item["record"] is not None:
+                return
+        if not flight.done:
+            self._update(item, source="shared", stage=flight.stage or item["stage"])
+        elif flight.error is not None or not flight.result:
+            self._complete(item, "failed", f"共用的處理失敗: {flight.error or '沒有產生逐字稿'}")
+        else:
+            self._update(item, record=flight.result)
+            next_stage = self._after_transcript()
+            if next_stage is None:
+                self._complete(item, "done")
+            else:
+                self._update(item, stage=next_stage, status="queued")
+                self._enqueue(next_stage, item)
+
+    def _run_captions(self, item):
+        result = self.backend.fetch_captions(item, self._work_dir(item))
+        if not result:
+            return "audio"  # 字幕下載失敗時改用語音轉文字
+        transcript_text, segments = result
+        record = self.backend.save(item, transcript_text, segments, "captions", self._work_dir(item))
+        self._update(item, record=record, source="captions")
+        self._release_flight(item, record)
+        return self._after_transcript()
+
+    def _run_audio(self, item):
+        audio_path = self.backend.fetch_audio(item, self._work_dir(item))
+        self._update(item, audio_path=audio_path)
+        return "transcribe"
+
+    def _run_transcribe(self, item):
+        with self.scheduler.slot(self.lane, LaneScheduler.estimate_cost(item["duration"])):
+            transcript_text, segments, language = self.backend.transcribe(item, item["audio_path"])
+        record = self.backend.save(item, transcript_text, segments, "asr", self._work_dir(item), language=language)
+        self._update(item, record=record, source="asr")
+        self._release_flight(item, record)
+        # 音訊檔較大，轉錄後立即刪除
+        if item["audio_path"] and os.path.exists(item["audio_path"]):
+            os.remove(item["audio_path"])
+        return self._after_transcript()
+
+    def _run_analyze(self, item):
+        report = self.backend.analyze(item)
+        self._update(item, report=report)
+        return None
+
+    def _complete(self, item, status, error=None):
+        with self._lock:
+            if item["index"] in self._completed:
+                return  # 取消與共用處理的完成通知可能同時發生
+            self._completed.add(item["index"])
+        self._release_flight(item, error=error or "處理中止")
+        if item["work_dir"]:
+            shutil.rmtree(item["work_dir"], ignore_errors=True)
+        self._update(item, status=status, error=error, work_dir=None, audio_path=None)
+        with self._lock:
+            self._remaining -= 1
+            finished = self._remaining == 0
+        if finished:
+            self._finish_job()
+
+    def _finish_job(self):
+        """全部影片完成：通知各階段執行緒結束並清除工作資料夾"""
+        for stage, work_queue in self._queues.items():
+            for _ in range(max(1, self.workers.get(stage, 1))):
+                work_queue.put((float("inf"), next(self._sequence), _STOP))
+        self._shared_updates.put((_STOP, None))
+        if self.job_dir:
+            shutil.rmtree(self.job_dir, ignore_errors=True)
+        self.finished_at = time.time()
+
+        stage_summary = self.stage_summary()
+        statuses = [item["status"] for item in self.items]
+        MetricsRecorder.record(
+            "batch_job", lane=self.lane, items=len(self.items), done=statuses.count("done"), failed=statuses.count("failed"),
+            cancelled=statuses.count("cancelled"),
+            shared=sum(item["source"] == "shared" for item in self.items),
+            wall_seconds=round(self.finished_at - self.started_at, 3),
+            stages={stage: stats["total_seconds"] for stage, stats in stage_summary.items()}
+        )
+        try:
+            self.reporter.job_finished(self.snapshot(), stage_summary)
+        except Exception:
+            pass
+        self._done.set()
@@ -4,21 +4,35 @@
 """
 import os
 import time
+import uuid
+from contextlib import contextmanager
 import streamlit as st
-from src.core.config import DEFAULT_REPORT_NAME, TRANSCRIPT_FILENAME
+from src.core.config import (
+    DEFAULT_REPORT_NAME, TRANSCRIPT_FILENAME, SEGMENTS_FILENAME,
+    NEAR_DUPLICATE_THRESHOLD, NEAR_DUPLICATE_DURATION_TOLERANCE, FINGERPRINT_MIN_COVERAGE
+)
+from src.core.batch_pipeline import BatchPipeline, STAGE_LABELS, STATUS_LABELS
 from src.services.video_processor import VideoProcessor
+from src.services.batch_backend import VideoBatchBackend
 from src.services.ai_service import AIService
 from src.utils.file_manager import FileManager
+from src.utils.chapter_splitter import ChapterSplitter
+from src.utils.metrics import MetricsRecorder
+from src.utils.transcript_store import TranscriptStore
+from src.utils.compressed_storage import CompressedStorage
+from src.utils.single_flight import get_transcript_flights, transcript_key
+from src.utils.lane_scheduler import LaneScheduler, INTERACTIVE, get_transcribe_scheduler
+from src.utils.cancellation import CancelToken
 
 
 class BusinessLogic:
     """業務邏輯處理器"""
     
     @staticmethod
-    def process_video(youtube_url, api_key, save_path, cookie_file=None, whisper_model="base", custom_prompt=None, language="zh", ai_model="gemini-2.0-flash-exp"):
+    def process_video(youtube_url, api_key, save_path, cookie_file=None, whisper_model="base", custom_prompt=None, language="zh", ai_model="gemini-2.0-flash-exp", stream_output=False, force_regenerate=False, expert_prompts=None, latency_target=None, compaction_steps=None, chapter_mode=False):
         """處理影片的主要邏輯 (自動保存逐字稿模式)"""
         
-        with st.container():
+        with st.container(), BusinessLogic._interruptible("cancel_video"):
             st.subheader("📈 處理進度 (自動保存逐字稿)")
             
             # 確保 save_path 不為 None
@@ -26,55 +40,141 @@ class BusinessLogic:
                 save_path = os.getcwd()  # 使用當前工作目錄作為默認值
                 st.warning(f"⚠️ 使用默認儲存路徑: {save_path}")
             
-            # 首先獲取影片標題
+            # 首先獲取影片資訊（標題、長度、章節）
             st.write("🎯 步驟 1/7: 獲取影片資訊...")
-            video_title = VideoProcessor.get_video_title(youtube_url, cookie_file)
+            video_info = VideoProcessor.probe_video(youtube_url, cookie_file)
+            if video_info:
+                video_title = video_info["title"]
+                chapters = video_info["chapters"]
+            else:
+                video_title = VideoProcessor.get_video_title(youtube_url, cookie_file)
+                chapters = []
+            video_id = video_info["id"] if video_info else None
+            duration = video_info["duration"] if video_info else None
             st.success(f"✅ 影片標題: {video_title}")
+            if chapters:
+                st.info(f"📑 影片包含 {len(chapters)} 個章節")
             
-            # 建立報告檔案路徑
-            final_report_path = os.path.join(save_path, f"{DEFAULT_REPORT_NAME}.txt")
+            # 建立報告檔案路徑（每次處理各自一個檔案，避免同時處理時互相覆寫）
+            final_report_path = FileManager.report_path(save_path, video_title)
+            
+            # 其他工作階段正在處理同一部影片時共用其逐字稿，只重新執行 AI 分析
+            flights = get_transcript_flights()
+            flight_key = transcript_key(video_id, whisper_model, language)
+            flight, leader = flights.join(flight_key) if flight_key else (None, True)
             
             success = False
+            expert_reports = None
+            saved_record = None
             start_time = time.time()
             
             try:
                 # 顯示性能資訊
                 st.info("🚀 啟動高速模式：多執行緒下載 + GPU 加速轉錄 + 自動保存逐字稿")
                 
+                if leader:
+                    flights.publish(flight_key, "captions")
+                
+                if not leader:
+                    saved_record = BusinessLogic._follow_transcript(flight)
+                    if saved_record:
+                        # 直接讀取已保存的逐字稿，不使用主導工作仍在讀寫的臨時檔案
+                        store = TranscriptStore()
+                        st.write("🤖 步驟 5/7: AI 修飾報告...")
+                        success, expert_reports = BusinessLogic._run_ai_analysis(
+                            final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+                            expert_prompts, latency_target, compaction_steps, chapter_mode, chapters, saved_record,
+                            transcript_text=store.read_text(saved_record["filename"]),
+                            segments=store.read_segments(saved_record["filename"])
+                        )
                 # 優先嘗試使用 CC 字幕
-                if VideoProcessor.check_and_download_subtitles(youtube_url, cookie_file):
+                elif VideoProcessor.check_and_download_subtitles(youtube_url, cookie_file):
                     if FileManager.convert_vtt_to_text():
                         processing_time = time.time() - start_time
                         st.success(f"⚡ 字幕處理完成！用時: {processing_time:.1f} 秒")
                         
+                        # 內容與既有逐字稿重複時直接沿用，報告也可由快取取得
+                        with open(TRANSCRIPT_FILENAME, 'r', encoding='utf-8') as f:
+                            reused_record = BusinessLogic._reuse_near_duplicate(f.read(), duration)
+                        
                         # 保存逐字稿到資料夾
                         st.write("💾 步驟 4/7: 保存逐字稿...")
-                        FileManager.save_transcript(video_title)
+                        if reused_record:
+                            st.info("♻️ 已有相同內容的逐字稿，略過保存")
+                            saved_record = reused_record
+                        else:
+                            saved_record = FileManager.save_transcript(video_title, video_id=video_id, duration=duration, source="captions")
+                        flights.finish(flight_key, result=saved_record)
                         
                         # 進行AI修飾
                         st.write("🤖 步驟 5/7: AI 修飾報告...")
-                        if AIService.refine_with_ai(final_report_path, api_key, custom_prompt, ai_model):
-                            success = True
+                        success, expert_reports = BusinessLogic._run_ai_analysis(
+                            final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+                            expert_prompts, latency_target, compaction_steps, chapter_mode, chapters, saved_record
+                        )
                 else:
                     # 如果沒有字幕，則使用語音轉文字
+                    flights.publish(flight_key, "audio")
                     download_start = time.time()
                     if VideoProcessor.download_audio(youtube_url, cookie_file):
                         download_time = time.time() - download_start
                         st.success(f"⚡ 音訊下載完成！用時: {download_time:.1f} 秒")
                         
+                        # 先以音訊指紋比對已轉錄過的音訊，符合時直接沿用時間軸
+                        audio_hashes, audio_seconds = VideoProcessor.compute_audio_fingerprint()
+                        fingerprint_record = BusinessLogic._reuse_fingerprint_match(audio_hashes, audio_seconds)
+                        
+                        # 轉錄開頭幾分鐘後先比對既有逐字稿，整份重複時停止轉錄
+                        reused = {}
+                        def head_check(head_text):
+                            reused["record"] = BusinessLogic._reuse_near_duplicate(head_text, duration, partial=True)
+                            return reused["record"] is not None
+                        
                         transcribe_start = time.time()
-                        if VideoProcessor.transcribe_audio(whisper_model, language):
+                        flights.publish(flight_key, "transcribe")
+                        transcribed = bool(fingerprint_record)
+                        if not fingerprint_record:
+                            # 與批次工作共用轉錄資源，單部影片走互動佇列優先處理
+                            with get_transcribe_scheduler().slot(
+                                INTERACTIVE, LaneScheduler.estimate_cost(duration or audio_seconds),
+                                on_wait=lambda: st.info("⏳ 其他工作正在轉錄，已排入互動佇列優先處理...")
+                            ):
+                                transcribed = VideoProcessor.transcribe_audio(
+                                    whisper_model, language, head_check=head_check, audio_seconds=duration or audio_seconds
+                                )
+                        if transcribed:
                             transcribe_time = time.time() - transcribe_start
-                            st.success(f"🔥 語音轉文字完成！用時: {transcribe_time:.1f} 秒")
+                            if fingerprint_record:
+                                st.success("⚡ 已依音訊指紋沿用既有逐字稿，略過語音轉文字")
+                            else:
+                                st.success(f"🔥 語音轉文字完成！用時: {transcribe_time:.1f} 秒")
                             
                             # 保存逐字稿到資料夾
                             st.write("💾 步驟 4/7: 保存逐字稿...")
-                            FileManager.save_transcript(video_title)
+                            if reused.get("record"):
+                                st.info("♻️ 已有相同內容的逐字稿，略過保存")
+                                saved_record = reused["record"]
+                            else:
+                                saved_record = FileManager.save_transcript(
+                                    video_title, video_id=video_id, duration=duration or audio_seconds,
+                                    # 記憶體不足時可能改用較小的模型，記錄實際使用的模型
+                                    language=language, model=transcribed if isinstance(transcribed, str) else whisper_model,
+                                    source="fingerprint" if fingerprint_record else "asr"
+                                )
+                            flights.finish(flight_key, result=saved_record)
+                            
+                            # 記錄音訊指紋，之後相同音訊可略過轉錄
+                            if audio_hashes and saved_record:
+                                store = TranscriptStore()
+                                if not store.has_fingerprint(saved_record["id"]):
+                                    store.add_fingerprint(saved_record["id"], audio_hashes)
                             
                             # 進行AI修飾
                             st.write("🤖 步驟 5/7: AI 修飾報告...")
-                            if AIService.refine_with_ai(final_report_path, api_key, custom_prompt, ai_model):
-                                success = True
+                            success, expert_reports = BusinessLogic._run_ai_analysis(
+                                final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+                                expert_prompts, latency_target, compaction_steps, chapter_mode, chapters, saved_record
+                            )
             
             except Exception as e:
                 st.error(f"❌ 發生嚴重錯誤：{e}")
@@ -83,16 +183,22 @@ class BusinessLogic:
                 success = False
             
             finally:
-                st.write("🧹 步驟 6/7: 清理暫存檔案...")
-                FileManager.cleanup_files(cookie_file)
-                
-                # 清理臨時逐字稿
-                try:
-                    if os.path.exists(TRANSCRIPT_FILENAME):
-                        os.remove(TRANSCRIPT_FILENAME)
-                        st.write(f"🗑️ 已移除臨時逐字稿: {TRANSCRIPT_FILENAME}")
-                except OSError as e:
-                    st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
+                if leader:
+                    flights.finish(flight_key, error="處理失敗")  # 已完成時不會覆寫結果
+                    st.write("🧹 步驟 6/7: 清理暫存檔案...")
+                    FileManager.cleanup_files(cookie_file)
+                    
+                    # 清理臨時逐字稿與時間軸
+                    for temp_filename in (TRANSCRIPT_FILENAME, SEGMENTS_FILENAME):
+                        try:
+                            if os.path.exists(temp_filename):
+                                os.remove(temp_filename)
+                                st.write(f"🗑️ 已移除臨時逐字稿: {temp_filename}")
+                        except OSError as e:
+                            st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
+                elif cookie_file and os.path.exists(cookie_file):
+                    # 共用逐字稿時沒有產生臨時檔，只刪除自己的 Cookie 檔案，避免刪除主導工作仍在使用的檔案
+                    os.remove(cookie_file)
                 
                 # 顯示總處理時間
                 total_time = time.time() - start_time
@@ -104,10 +210,128 @@ class BusinessLogic:
                 else:
                     st.error(f"❌ 處理失敗，用時: {total_time:.1f} 秒")
             
-            return BusinessLogic._display_results(success, final_report_path)
+            return BusinessLogic._display_results(
+                success, final_report_path, show_preview=not stream_output, expert_reports=expert_reports,
+                transcript_record=saved_record
+            )
     
     @staticmethod
-    def process_transcript_file(transcript_file, api_key, save_path, custom_prompt=None, ai_model="gemini-2.0-flash-exp"):
+    def process_video_batch(source_text, api_key, save_path, cookie_file=None, whisper_model="base", custom_prompt=None, language="zh", ai_model="gemini-2.0-flash-exp", force_regenerate=False, latency_target=None, compaction_steps=None, expert_name=None):
+        """批次處理多部影片（可貼上多個網址、播放清單或頻道），各階段平行處理並即時顯示每部影片的狀態"""
+        
+        with st.container(), BusinessLogic._interruptible("cancel_batch"):
+            st.subheader("📈 批次處理進度")
+            
+            if save_path is None or (isinstance(save_path, str) and save_path.strip() == ""):
+                save_path = os.getcwd()
+                st.warning(f"⚠️ 使用默認儲存路徑: {save_path}")
+            
+            pipeline = None
+            try:
+                with st.spinner("🔍 展開播放清單 / 頻道..."):
+                    urls = VideoProcessor.expand_urls(source_text, cookie_file)
+                if not urls:
+                    st.error("❌ 沒有可處理的影片網址")
+                    return False
+                st.info(f"📋 共 {len(urls)} 部影片")
+                if not (api_key and custom_prompt):
+                    st.info("ℹ️ 未提供 API Key，只下載並保存逐字稿")
+                
+                backend = VideoBatchBackend(
+                    save_path, cookie_file, whisper_model, language, api_key, custom_prompt, expert_name, ai_model,
+                    force_regenerate, latency_target, compaction_steps
+                )
+                pipeline = BatchPipeline(backend)
+                pipeline.start(urls)
+                
+                # 背景執行緒只更新狀態，介面由主執行緒定期重繪
+                progress_bar = st.progress(0)
+                status_table = st.empty()
+                while True:
+                    finished = pipeline.wait(timeout=0.5)
+                    items = pipeline.snapshot()
+                    completed = sum(item["status"] in ("done", "failed", "cancelled") for item in items)
+                    progress_bar.progress(completed / len(items))
+                    status_table.dataframe(
+                        [BusinessLogic.format_batch_row(item) for item in items],
+                        use_container_width=True, hide_index=True
+                    )
+                    if finished:
+                        break
+            except Exception as e:
+                st.error(f"❌ 發生嚴重錯誤：{e}")
+                import traceback
+                st.error(f"詳細錯誤資訊：{traceback.format_exc()}")
+                return False
+            finally:
+                # 介面被取消或重新執行時停止背景的處理，釋放轉錄資源
+                if pipeline is not None and not pipeline.done:
+                    pipeline.cancel("介面已停止處理")
+                if cookie_file and os.path.exists(cookie_file):
+                    os.remove(cookie_file)
+            
+            failed = [item for item in items if item["status"] == "failed"]
+            total_time = pipeline.finished_at - pipeline.started_at
+            if failed:
+                st.warning(f"⚠️ 批次處理完成：{len(items) - len(failed)} 部成功、{len(failed)} 部失敗，總用時 {total_time:.1f} 秒")
+            else:
+                st.success(f"🎉 批次處理完成！共 {len(items)} 部影片，總用時 {total_time:.1f} 秒")
+            
+            for item in items:
+                if not item["report"]:
+                    continue
+                with st.expander(f"📄 {item['title']}"):
+                    st.caption(f"📁 {item['report']['path']}")
+                    try:
+                        with open(item["report"]["path"], "r", encoding="utf-8") as f:
+                            st.markdown(f.read())
+                    except OSError as e:
+                        st.warning(f"⚠️ 無法讀取報告檔案: {e}")
+            return not failed
+    
+    @staticmethod
+    @contextmanager
+    def _interruptible(key):
+        """
+        可取消的處理區塊：顯示取消按鈕與已用時間，並綁定取消權杖
+        
+        按下取消 (或關閉分頁) 時 Streamlit 要求重新執行，進行中的執行在下一次呼叫介面元件時中止；按鈕的 on_click
+        要到新的執行開始時才會呼叫，只記錄取消狀態供新的執行顯示。因此下載、轉錄與各種等待期間由權杖的 on_check
+        定期更新已用時間，讓執行能在這些更新時中止，沿途的 finally 終止子程序並釋放轉錄資源。
+        """
+        st.button("⏹️ 取消處理", key=key, on_click=lambda: st.session_state.update(processing_cancelled=True))
+        elapsed = st.empty()
+        start_time = time.time()
+        token = CancelToken(on_check=lambda: elapsed.caption(f"⏱️ 處理中… 已用時 {time.time() - start_time:.0f} 秒"))
+        with token.bind():
+            yield token
+        elapsed.empty()
+    
+    @staticmethod
+    def format_batch_row(item):
+        """批次處理狀態表的一列"""
+        if item["status"] in ("failed", "cancelled"):
+            note = item["error"]
+        elif item["source"] == "existing":
+            note = "沿用既有逐字稿"
+        elif item["source"] == "shared":
+            note = "共用其他工作的逐字稿"
+        elif item["report"] and item["report"].get("compaction_error"):
+            note = f"逐字稿精簡設定錯誤，使用原始逐字稿: {item['report']['compaction_error']}"
+        elif item["report"] and item["report"]["cache_hit"]:
+            note = "報告命中快取"
+        else:
+            note = ""
+        return {
+            "影片": item["title"],
+            "階段": STAGE_LABELS[item["stage"]],
+            "狀態": STATUS_LABELS[item["status"]],
+            "用時 (秒)": round(sum(item["timings"].values()), 1),
+            "說明": note
+        }
+    
+    @staticmethod
+    def process_transcript_file(transcript_file, api_key, save_path, custom_prompt=None, ai_model="gemini-2.0-flash-exp", stream_output=False, force_regenerate=False, expert_prompts=None, latency_target=None, compaction_steps=None, chapter_mode=False):
         """處理上傳的逐字稿檔案（自動保存逐字稿）"""
         
         with st.container():
@@ -123,9 +347,11 @@ class BusinessLogic:
             st.success(f"✅ 檔案名稱: {file_title}")
             
             # 建立報告檔案路徑
-            final_report_path = os.path.join(save_path, f"{DEFAULT_REPORT_NAME}.txt")
+            final_report_path = FileManager.report_path(save_path, file_title)
             
             success = False
+            expert_reports = None
+            saved_record = None
             
             try:
                 st.write("📝 步驟 1/5: 讀取逐字稿檔案...")
@@ -141,12 +367,14 @@ class BusinessLogic:
                 
                 # 保存逐字稿到資料夾
                 st.write("💾 步驟 2/5: 保存逐字稿...")
-                FileManager.save_transcript(file_title)
+                saved_record = FileManager.save_transcript(file_title, source="upload")
                 
                 # 進行AI修飾
                 st.write("🤖 步驟 3/5: AI 修飾報告...")
-                if AIService.refine_with_ai(final_report_path, api_key, custom_prompt, ai_model):
-                    success = True
+                success, expert_reports = BusinessLogic._run_ai_analysis(
+                    final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+                    expert_prompts, latency_target, compaction_steps, chapter_mode, transcript_record=saved_record
+                )
             
             except Exception as e:
                 st.error(f"❌ 發生嚴重錯誤：{e}")
@@ -158,25 +386,104 @@ class BusinessLogic:
                 st.write("🧹 步驟 4/5: 清理臨時檔案...")
                 FileManager.cleanup_files()
                 
-                # 清理臨時逐字稿
+                # 清理臨時逐字稿與時間軸
+                for temp_filename in (TRANSCRIPT_FILENAME, SEGMENTS_FILENAME):
+                    try:
+                        if os.path.exists(temp_filename):
+                            os.remove(temp_filename)
+                            st.write(f"🗑️ 已移除臨時逐字稿: {temp_filename}")
+                    except OSError as e:
+                        st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
+                
+                st.write("✅ 步驟 5/5: 處理完成")
+                if success:
+                    st.success("🎉 處理完成！")
+                    st.info("💾 逐字稿已自動保存到 saved_transcripts 資料夾")
+                else:
+                    st.error("❌ 處理失敗")
+            
+            return BusinessLogic._display_results(
+                success, final_report_path, show_preview=not stream_output, expert_reports=expert_reports,
+                transcript_record=saved_record
+            )
+    
+    @staticmethod
+    def process_transcript_batch(transcript_files, api_key, save_path, custom_prompt, ai_model="gemini-2.0-flash-exp", force_regenerate=False, latency_target=None, compaction_steps=None, expert_name=None):
+        """批次處理多份上傳的逐字稿：短逐字稿打包為少量請求，各自產生報告（自動保存逐字稿）"""
+        
+        with st.container():
+            st.subheader(f"📈 處理進度 (批次分析 {len(transcript_files)} 份逐字稿)")
+            
+            # 確保 save_path 不為 None
+            if save_path is None or (isinstance(save_path, str) and save_path.strip() == ""):
+                save_path = os.getcwd()  # 使用當前工作目錄作為默認值
+                st.warning(f"⚠️ 使用默認儲存路徑: {save_path}")
+            
+            report_paths = {}
+            success = False
+            
+            try:
+                st.write("📝 步驟 1/4: 讀取並保存逐字稿檔案...")
+                transcripts = {}
+                saved_records = {}
+                for transcript_file in transcript_files:
+                    # 使用檔案名稱作為標題，同名檔案加上編號區分
+                    file_title = base_title = transcript_file.name.rsplit('.', 1)[0]
+                    counter = 1
+                    while file_title in transcripts:
+                        file_title = f"{base_title}_{counter}"
+                        counter += 1
+                    
+                    transcript_content = transcript_file.read().decode('utf-8')
+                    if not transcript_content.strip():
+                        st.warning(f"⚠️ {file_title} 內容為空，已略過")
+                        continue
+                    transcripts[file_title] = transcript_content
+                    
+                    with open(TRANSCRIPT_FILENAME, 'w', encoding='utf-8') as f:
+                        f.write(transcript_content)
+                    saved_records[file_title] = FileManager.save_transcript(file_title, source="upload")
+                
+                if transcripts:
+                    st.write("🤖 步驟 2/4: AI 批次分析...")
+                    output_paths = {name: FileManager.report_path(save_path, name) for name in transcripts}
+                    results = AIService.refine_batch(
+                        transcripts, output_paths, api_key, custom_prompt, ai_model,
+                        force_regenerate=force_regenerate, latency_target=latency_target, compaction_steps=compaction_steps
+                    )
+                    report_paths = {name: output_paths[name] for name, ok in results.items() if ok}
+                    success = bool(report_paths)
+                    for name, report_path in report_paths.items():
+                        BusinessLogic._archive_reports(saved_records.get(name), {expert_name: report_path}, results[name])
+                else:
+                    st.error("❌ 沒有可分析的逐字稿")
+            
+            except Exception as e:
+                st.error(f"❌ 發生嚴重錯誤：{e}")
+                import traceback
+                st.error(f"詳細錯誤資訊：{traceback.format_exc()}")
+                success = False
+            
+            finally:
+                st.write("🧹 步驟 3/4: 清理臨時檔案...")
                 try:
                     if os.path.exists(TRANSCRIPT_FILENAME):
                         os.remove(TRANSCRIPT_FILENAME)
-                        st.write(f"🗑️ 已移除臨時逐字稿: {TRANSCRIPT_FILENAME}")
                 except OSError as e:
                     st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
                 
-                st.write("✅ 步驟 5/5: 處理完成")
+                st.write("✅ 步驟 4/4: 處理完成")
                 if success:
-                    st.success("🎉 處理完成！")
-                    st.info("💾 逐字稿已自動保存到 saved_transcripts 資料夾")
+                    st.success(f"🎉 批次分析完成！{len(report_paths)}/{len(transcript_files)} 份報告已生成")
                 else:
                     st.error("❌ 處理失敗")
             
-            return BusinessLogic._display_results(success, final_report_path)
+            if not success:
+                return BusinessLogic._display_results(False, None)
+            return BusinessLogic._display_expert_results(report_paths)
     
     @staticmethod
-    def process_saved_transcript(transcript_filename, api_key, save_path, custom_prompt=None, ai_model="gemini-2.0-flash-exp"):
+    def process_saved_transcript(transcript_filename, api_key, save_path, custom_prompt=None, ai_model="gemini-2.0-flash-exp", stream_output=False, force_regenerate=False, expert_prompts=None, latency_target=None, compaction_steps=None, chapter_mode=False):
         """處理已保存的逐字稿檔案"""
         
         with st.container():
@@ -196,32 +503,39 @@ class BusinessLogic:
             st.success(f"✅ 選擇的逐字稿: {file_title}")
             
             # 建立報告檔案路徑
-            final_report_path = os.path.join(save_path, f"{DEFAULT_REPORT_NAME}.txt")
+            final_report_path = FileManager.report_path(save_path, file_title)
             
             success = False
+            expert_reports = None
+            saved_record = None
             
             try:
                 st.write("📝 步驟 1/4: 讀取已保存的逐字稿...")
                 
-                # 檢查檔案是否存在
-                if not os.path.exists(transcript_path):
+                # 檢查檔案是否存在（逐字稿可能以壓縮檔保存）
+                if not CompressedStorage.exists(transcript_path):
                     st.error(f"❌ 找不到逐字稿檔案: {transcript_path}")
                     return False
                 
-                # 讀取已保存的逐字稿檔案
-                with open(transcript_path, 'r', encoding='utf-8') as f:
-                    transcript_content = f.read()
+                # 讀取已保存的逐字稿檔案（自動解壓縮）
+                transcript_content = CompressedStorage.read_text(transcript_path)
                 
                 # 將內容寫入臨時逐字稿檔案以供AI處理
                 with open(TRANSCRIPT_FILENAME, 'w', encoding='utf-8') as f:
                     f.write(transcript_content)
                 
+                # 一併載入時間軸（供章節分析使用）
+                CompressedStorage.extract(FileManager.segments_path_for(transcript_path), SEGMENTS_FILENAME)
+                
+                saved_record = TranscriptStore().get(transcript_filename)
                 st.success(f"✅ 逐字稿已載入，內容長度: {len(transcript_content)} 字元")
                 
                 # 進行AI修飾
                 st.write("🤖 步驟 2/4: AI 重新分析報告...")
-                if AIService.refine_with_ai(final_report_path, api_key, custom_prompt, ai_model):
-                    success = True
+                success, expert_reports = BusinessLogic._run_ai_analysis(
+                    final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+                    expert_prompts, latency_target, compaction_steps, chapter_mode, transcript_record=saved_record
+                )
             
             except Exception as e:
                 st.error(f"❌ 發生嚴重錯誤：{e}")
@@ -232,13 +546,14 @@ class BusinessLogic:
             finally:
                 st.write("🧹 步驟 3/4: 清理臨時檔案...")
                 
-                # 清理臨時逐字稿
-                try:
-                    if os.path.exists(TRANSCRIPT_FILENAME):
-                        os.remove(TRANSCRIPT_FILENAME)
-                        st.write(f"🗑️ 已移除臨時逐字稿: {TRANSCRIPT_FILENAME}")
-                except OSError as e:
-                    st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
+                # 清理臨時逐字稿與時間軸
+                for temp_filename in (TRANSCRIPT_FILENAME, SEGMENTS_FILENAME):
+                    try:
+                        if os.path.exists(temp_filename):
+                            os.remove(temp_filename)
+                            st.write(f"🗑️ 已移除臨時逐字稿: {temp_filename}")
+                    except OSError as e:
+                        st.warning(f"⚠️ 無法移除臨時逐字稿: {e}")
                 
                 st.write("✅ 步驟 4/4: 處理完成")
                 if success:
@@ -247,11 +562,192 @@ class BusinessLogic:
                 else:
                     st.error("❌ 處理失敗")
             
-            return BusinessLogic._display_results(success, final_report_path)
+            return BusinessLogic._display_results(
+                success, final_report_path, show_preview=not stream_output, expert_reports=expert_reports,
+                transcript_record=saved_record
+            )
+    
+    @staticmethod
+    def _reuse_near_duplicate(transcript_text, duration=None, partial=False):
+        """
+        比對已保存的逐字稿，整份重複時改用既有逐字稿與時間軸，回傳符合的目錄記錄
+        
+        partial 代表只有影片開頭的文字，此時需以影片長度確認不是剪輯片段。
+        """
+        try:
+            store = TranscriptStore()
+            matches = store.find_near_duplicates(transcript_text)
+        except Exception as e:
+            st.warning(f"⚠️ 比對既有逐字稿時發生錯誤: {e}")
+            return None
+        
+        for match in matches:
+            record = match["record"]
+            if partial:
+                known_duration = record.get("duration")
+                if not duration or not known_duration or abs(known_duration - duration) > duration * NEAR_DUPLICATE_DURATION_TOLERANCE:
+                    continue
+            elif match["coverage"] < NEAR_DUPLICATE_THRESHOLD:
+                st.info(f"🔗 內容出現在已保存的逐字稿「{record['title']}」中（可能為剪輯片段），仍完整處理")
+                continue
+            
+            CompressedStorage.extract(store.path_for(record["filename"]), TRANSCRIPT_FILENAME)
+            if not CompressedStorage.extract(store.segments_path_for(record["filename"]), SEGMENTS_FILENAME) \
+                    and os.path.exists(SEGMENTS_FILENAME):
+                os.remove(SEGMENTS_FILENAME)
+            
+            st.info(f"♻️ 內容與已保存的逐字稿「{record['title']}」重複（相似度 {match['containment']:.0%}），改用既有逐字稿")
+            MetricsRecorder.record(
+                "near_duplicate", matched=record["filename"], partial=partial,
+                containment=round(match["containment"], 3), coverage=round(match["coverage"], 3)
+            )
+            return record
+        return None
+    
+    @staticmethod
+    def _reuse_fingerprint_match(audio_hashes, audio_seconds):
+        """
+        以音訊指紋查詢已轉錄過的音訊，符合時依時間差校正既有時間軸並寫入臨時逐字稿，回傳符合的目錄記錄
+        
+        新音訊片頭較短或較長都能對齊；既有逐字稿需涵蓋新音訊的大部分內容才會沿用。
+        """
+        if not audio_hashes:
+            return None
+        try:
+            store = TranscriptStore()
+            match = store.match_fingerprint(audio_hashes)
+            if match is None:
+                return None
+            record, match_count, offset_seconds = match
+            segments = store.read_segments(record["filename"])
+        except Exception as e:
+            st.warning(f"⚠️ 比對音訊指紋時發生錯誤: {e}")
+            return None
+        
+        if not segments:
+            st.info(f"🔗 音訊與「{record['title']}」相同，但該逐字稿沒有時間軸，無法校正時間差，仍進行轉錄")
+            return None
+        
+        # 既有時間 = 新時間 + 時間差，換算回新音訊的時間並去除超出範圍的片段
+        known_seconds = record.get("duration") or segments[-1]["end"]
+        overlap = min(audio_seconds, known_seconds - offset_seconds) - max(0.0, -offset_seconds)
+        if overlap / audio_seconds < FINGERPRINT_MIN_COVERAGE:
+            st.info(f"🔗 音訊部分與「{record['title']}」相同（涵蓋 {max(overlap, 0) / audio_seconds:.0%}），仍進行完整轉錄")
+            return None
+        
+        shifted_segments = []
+        for segment in segments:
+            start = segment["start"] - offset_seconds
+            end = segment["end"] - offset_seconds
+            if end <= 0 or start >= audio_seconds:
+                continue
+            shifted_segments.append({
+                "start": round(max(0.0, start), 2), "end": round(min(end, audio_seconds), 2), "text": segment["text"]
+            })
+        if not shifted_segments:
+            return None
+        
+        with open(TRANSCRIPT_FILENAME, 'w', encoding='utf-8') as f:
+            f.write(" ".join(segment["text"] for segment in shifted_segments).strip())
+        FileManager.write_segments(shifted_segments)
+        
+        st.info(f"🎧 音訊與已保存的「{record['title']}」相同（時間差 {offset_seconds:+.1f} 秒），沿用既有逐字稿")
+        MetricsRecorder.record(
+            "audio_fingerprint", matched=record["filename"], matches=match_count,
+            offset_seconds=round(offset_seconds, 2), segments=len(shifted_segments)
+        )
+        return record
+    
+    @staticmethod
+    def _follow_transcript(flight):
+        """等待其他工作階段完成同一部影片的逐字稿，回傳其記錄 (不寫入臨時逐字稿，主導工作仍在使用)"""
+        st.info("🔗 另一個工作正在處理同一部影片，等待共用其逐字稿（只重新執行 AI 分析）")
+        status_text = st.empty()
+        while not flight.wait(1.0):
+            status_text.text(f"共用處理進度: {STAGE_LABELS.get(flight.stage, '準備中')}")
+        status_text.empty()
+        if flight.error is not None or not flight.result:
+            st.error(f"❌ 共用的處理失敗: {flight.error or '沒有產生逐字稿'}")
+            return None
+        st.success(f"✅ 已取得共用的逐字稿: {flight.result['filename']}")
+        return flight.result
+    
+    @staticmethod
+    def _run_ai_analysis(final_report_path, api_key, custom_prompt, ai_model, stream_output=False, force_regenerate=False, expert_prompts=None, latency_target=None, compaction_steps=None, chapter_mode=False, chapters=None, transcript_record=None, transcript_text=None, segments=None):
+        """執行 AI 分析並將報告存入逐字稿的報告歷史，回傳 (是否成功, {專家: 報告路徑})"""
+        used_model, expert_reports = BusinessLogic._generate_reports(
+            final_report_path, api_key, custom_prompt, ai_model, stream_output, force_regenerate,
+            expert_prompts, latency_target, compaction_steps, chapter_mode, chapters, transcript_text, segments
+        )
+        if used_model:
+            expert_name = next(iter(expert_prompts)) if expert_prompts and len(expert_prompts) == 1 else None
+            BusinessLogic._archive_reports(transcript_record, expert_reports or {expert_name: final_report_path}, used_model)
+        return bool(used_model), expert_reports
     
     @staticmethod
-    def _display_results(success, final_report_path):
-        """顯示處理結果"""
+    def _archive_reports(transcript_record, report_paths, model):
+        """將產生的報告存為逐字稿的新版本，之後可直接開啟而不需再次呼叫 API"""
+        if not transcript_record:
+            return
+        try:
+            store = TranscriptStore()
+            for expert, report_path in report_paths.items():
+                with open(report_path, 'r', encoding='utf-8') as f:
+                    report = store.add_report(transcript_record["id"], f.read(), expert=expert, model=model)
+                st.caption(f"🗂️ 報告已存入歷史紀錄：{BusinessLogic.format_report_label(report)}")
+        except Exception as e:
+            st.warning(f"⚠️ 無法保存報告歷史: {e}")
+    
+    @staticmethod
+    def _generate_reports(final_report_path, api_key, custom_prompt, ai_model, stream_output=False, force_regenerate=False, expert_prompts=None, latency_target=None, compaction_steps=None, chapter_mode=False, chapters=None, transcript_text=None, segments=None):
+        """
+        執行 AI 分析，選擇多位專家時平行產生各自的報告，回傳 (實際使用的模型或 False, {專家: 報告路徑})
+        
+        未提供 transcript_text / segments 時讀取臨時逐字稿與時間軸。
+        """
+        if expert_prompts and len(expert_prompts) > 1:
+            if chapter_mode:
+                st.info("ℹ️ 已選擇多位專家，章節分析模式僅適用於單一專家，改為多專家平行分析")
+            base_path, ext = os.path.splitext(final_report_path)
+            output_paths = {name: f"{base_path}_{name}{ext}" for name in expert_prompts}
+            results = AIService.refine_with_experts(
+                expert_prompts, output_paths, api_key, ai_model, force_regenerate, latency_target, compaction_steps,
+                transcript_text=transcript_text
+            )
+            expert_reports = {name: output_paths[name] for name, ok in results.items() if ok}
+            return next((model for model in results.values() if model), False), expert_reports
+        
+        if expert_prompts:
+            custom_prompt = next(iter(expert_prompts.values()))
+        
+        if chapter_mode and custom_prompt:
+            sections, split_method = ChapterSplitter.build_sections(
+                segments if segments is not None else FileManager.load_segments(), chapters
+            )
+            if len(sections) > 1:
+                used_model = AIService.refine_by_sections(
+                    sections, final_report_path, api_key, custom_prompt, ai_model,
+                    stream=stream_output, force_regenerate=force_regenerate,
+                    latency_target=latency_target, compaction_steps=compaction_steps, split_method=split_method
+                )
+                return used_model, None
+            st.info("ℹ️ 逐字稿缺少時間軸或內容過短，改為整份逐字稿分析")
+        
+        used_model = AIService.refine_with_ai(
+            final_report_path, api_key, custom_prompt, ai_model,
+            stream=stream_output, force_regenerate=force_regenerate,
+            latency_target=latency_target, compaction_steps=compaction_steps, transcript_text=transcript_text
+        )
+        return used_model, None
+    
+    @staticmethod
+    def _display_results(success, final_report_path, show_preview=True, expert_reports=None, transcript_record=None):
+        """顯示處理結果（串流模式已即時顯示報告，僅提供下載），並於報告下方列出相關影片"""
+        if success and expert_reports:
+            BusinessLogic._display_expert_results(expert_reports)
+            BusinessLogic.display_related_transcripts(transcript_record)
+            return True
+        
         if success:
             st.success(f"🎉 報告生成完成！")
             st.info(f"📁 檔案路徑: {final_report_path}")
@@ -261,8 +757,9 @@ class BusinessLogic:
                 with open(final_report_path, 'r', encoding='utf-8') as f:
                     report_content = f.read()
                 
-                st.subheader("📄 生成的報告")
-                st.markdown(report_content)
+                if show_preview:
+                    st.subheader("📄 生成的報告")
+                    st.markdown(report_content)
                 
                 # 提供下載按鈕
                 st.download_button(
@@ -272,20 +769,132 @@ class BusinessLogic:
                     mime="text/markdown"
                 )
                 
-                return True
-                
             except Exception as e:
                 st.warning(f"⚠️ 無法讀取報告檔案進行預覽: {e}")
-                return True
+            
+            BusinessLogic.display_related_transcripts(transcript_record)
+            return True
         else:
             st.error("❌ 報告生成失敗，請檢查上方錯誤訊息")
             return False
     
+    @staticmethod
+    def _display_expert_results(expert_reports):
+        """顯示多專家報告：綜合檢視與各專家分頁"""
+        st.success(f"🎉 {len(expert_reports)} 份專家報告生成完成！")
+        
+        report_contents = {}
+        for name, report_path in expert_reports.items():
+            try:
+                with open(report_path, 'r', encoding='utf-8') as f:
+                    report_contents[name] = f.read()
+            except Exception as e:
+                st.warning(f"⚠️ 無法讀取 {name} 報告檔案進行預覽: {e}")
+        
+        if not report_contents:
+            return True
+        
+        combined_report = "\n\n---\n\n".join(
+            f"# {name}\n\n{content}" for name, content in report_contents.items()
+        )
+        
+        tabs = st.tabs(["🧩 綜合檢視"] + [f"👤 {name}" for name in report_contents])
+        with tabs[0]:
+            st.download_button(
+                label="📥 下載綜合報告",
+                data=combined_report,
+                file_name=f"{DEFAULT_REPORT_NAME}_combined.md",
+                mime="text/markdown",
+                key="download_combined_report"
+            )
+            st.markdown(combined_report)
+        
+        for tab, (name, content) in zip(tabs[1:], report_contents.items()):
+            with tab:
+                st.info(f"📁 檔案路徑: {expert_reports[name]}")
+                st.download_button(
+                    label=f"📥 下載 {name} 報告",
+                    data=content,
+                    file_name=f"{DEFAULT_REPORT_NAME}_{name}.md",
+                    mime="text/markdown",
+                    key=f"download_report_{name}"
+                )
+                st.markdown(content)
+        
+        return True
+    
+    @staticmethod
+    def format_transcript_label(record):
+        """組合已保存逐字稿的顯示名稱：標題、保存日期、長度與來源"""
+        details = [time.strftime("%Y-%m-%d %H:%M", time.localtime(record["created_at"]))]
+        if record.get("duration"):
+            minutes, seconds = divmod(int(record["duration"]), 60)
+            details.append(f"{minutes}:{seconds:02d}")
+        if record.get("source"):
+            details.append({"captions": "字幕", "asr": "語音辨識", "upload": "上傳"}.get(record["source"], record["source"]))
+        return f"{record['title']}（{'，'.join(details)}）"
+    
+    @staticmethod
+    def format_report_label(report):
+        """組合報告版本的顯示名稱：專家、模型、版本與建立時間"""
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(report["created_at"]))
+        return f"{report['expert'] or '自訂 Prompt'} · {report['model'] or '未知模型'} · v{report['version']}（{created}）"
+    
+    @staticmethod
+    def display_related_transcripts(transcript_record):
+        """於報告下方列出主題相近的其他已保存逐字稿"""
+        if not transcript_record:
+            return
+        try:
+            related = TranscriptStore().related(transcript_record["id"])
+        except Exception as e:
+            st.warning(f"⚠️ 無法查詢相關影片: {e}")
+            return
+        if not related:
+            return
+        
+        st.subheader("🔗 相關影片")
+        for match in related:
+            st.markdown(
+                f"- {BusinessLogic.format_transcript_label(match['record'])} · 相似度 {match['score']:.0%}"
+            )
+    
+    @staticmethod
+    def display_report_history(transcript_record):
+        """顯示已保存逐字稿的歷史報告，選擇後直接由目錄讀取，不需再次呼叫 API"""
+        store = TranscriptStore()
+        reports = store.list_reports(transcript_record["id"])
+        if not reports:
+            return
+        
+        with st.expander(f"📚 歷史報告（{len(reports)} 個版本）", expanded=False):
+            report_labels = {report["id"]: report for report in reports}
+            report_id = st.selectbox(
+                "選擇報告版本",
+                list(report_labels),
+                format_func=lambda value: BusinessLogic.format_report_label(report_labels[value]),
+                key=f"report_history_{transcript_record['id']}"
+            )
+            content = store.read_report(report_id)
+            if content is None:
+                st.warning("⚠️ 找不到此報告版本")
+                return
+            report = report_labels[report_id]
+            st.download_button(
+                label="📥 下載此版本",
+                data=content,
+                file_name=f"{DEFAULT_REPORT_NAME}_{transcript_record['title']}_v{report['version']}.md",
+                mime="text/markdown",
+                key=f"download_report_history_{report_id}"
+            )
+            st.markdown(content)
+    
     @staticmethod
     def prepare_cookie_file(cookie_file):
         """準備 Cookie 檔案"""
         if cookie_file:
-            cookie_path = f"temp_cookie_{int(time.time())}.txt"
+            # 網頁介面與批次處理可能同時進行，檔名需各自獨立
+            cookie_path = f"temp_cookie_{int(time.time())}_{uuid.uuid4().hex[:8]}.txt"
             with open(cookie_path, "wb") as f:
                 f.write(cookie_file.getbuffer())
             return cookie_path
@@ -8,17 +8,213 @@ import os
 AUDIO_FILENAME = "_temp_audio.mp3"
 TRANSCRIPT_FILENAME = "_temp_transcript.txt"
 SUBTITLE_FILENAME = "_temp_subtitle.vtt"
+SEGMENTS_FILENAME = "_temp_segments.jsonl"
 DEFAULT_REPORT_NAME = "youtube_report"
 
 # 逐字稿儲存配置
 TRANSCRIPTS_FOLDER = "saved_transcripts"
+SEGMENTS_SUFFIX = ".segments.jsonl"  # 與逐字稿同名的時間軸檔案
+TRANSCRIPT_CATALOG_DB = os.path.join(TRANSCRIPTS_FOLDER, "catalog.sqlite3")
+TRANSCRIPT_PAGE_SIZE = 50
+TRANSCRIPT_SEARCH_CHUNK_CHARS = 300   # 全文檢索的索引單位長度 (依時間軸片段組合)
+TRANSCRIPT_SEARCH_LIMIT = 20          # 搜尋結果最多顯示的影片數
+TRANSCRIPT_SNIPPET_CHARS = 40         # 搜尋摘要在命中詞前後保留的字數
+TRANSCRIPT_SORT_OPTIONS = {
+    "最新優先": ("created_at", True),
+    "最舊優先": ("created_at", False),
+    "標題": ("title", False),
+    "影片長度": ("duration", True)
+}
+
+# 壓縮儲存配置：逐字稿、時間軸與報告快取以 zstd 壓縮 (未安裝 zstandard 時改用 gzip，設為 None 則不壓縮)
+STORAGE_COMPRESSION = "zstd"
+STORAGE_ZSTD_LEVEL = 10   # 逐字稿寫入一次、讀取多次，取較高壓縮等級
+STORAGE_GZIP_LEVEL = 6
+
+# 近似重複偵測配置 (MinHash + LSH)：64 組排列分成 16 帶，視窗相似度約 0.5 以上即成為候選
+NEAR_DUPLICATE_NUM_PERM = 64
+NEAR_DUPLICATE_BANDS = 16
+NEAR_DUPLICATE_SHINGLE_TOKENS = 3
+NEAR_DUPLICATE_WINDOW_TOKENS = 400
+NEAR_DUPLICATE_THRESHOLD = 0.8               # 新內容有多少比例出現在既有逐字稿中才視為重複
+NEAR_DUPLICATE_HEAD_SECONDS = 180            # 語音轉錄時先以開頭幾秒比對
+NEAR_DUPLICATE_DURATION_TOLERANCE = 0.05     # 僅比對開頭時，影片長度差距需在此比例內
+
+# 相關影片推薦配置 (bigram TF-IDF 餘弦相似度)
+RELATED_TERMS_PER_DOC = 128     # 每份逐字稿只保留權重最高的詞，控制索引大小
+RELATED_VIDEO_LIMIT = 5
+RELATED_MIN_SCORE = 0.05
+
+# 音訊指紋配置：以 8kHz 單聲道計算頻譜峰值配對，每幀 32 毫秒
+FINGERPRINT_SAMPLE_RATE = 8000
+FINGERPRINT_FFT_SIZE = 512
+FINGERPRINT_HOP_SIZE = 256
+FINGERPRINT_PEAK_BLOCK_FRAMES = 8      # 每個頻帶每 8 幀 (約 0.25 秒) 最多取一個峰值
+FINGERPRINT_FAN_OUT = 5                # 每個錨點配對的峰值數
+FINGERPRINT_MAX_DELTA_FRAMES = 64      # 配對峰值的最大時間差 (約 2 秒)
+FINGERPRINT_MIN_MATCHES = 20
+FINGERPRINT_MIN_MATCH_RATIO = 0.05
+FINGERPRINT_MIN_COVERAGE = 0.9         # 既有逐字稿需涵蓋新音訊的比例
+
+# 效能指標記錄配置
+METRICS_FOLDER = "logs"
+METRICS_FILENAME = os.path.join(METRICS_FOLDER, "metrics.jsonl")
+TOKEN_USAGE_LOG = os.path.join(METRICS_FOLDER, "token_usage.jsonl")
+
+# 報告快取配置
+CACHE_FOLDER = "cache"
+REPORT_CACHE_DB = os.path.join(CACHE_FOLDER, "report_cache.sqlite3")
+REPORT_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60  # 快取保留 30 天
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024    # 快取總容量上限 200MB
+TOKEN_CALIBRATION_FILE = os.path.join(CACHE_FOLDER, "token_calibration.json")
 
 # AI 模型選項
 AI_PROVIDERS = {
     "Gemini 2.5 Pro (最強性能)": "gemini-2.5-pro",
     "Gemini 2.5 Flash (快速)": "gemini-2.5-flash", 
-    "Gemini 2.5 Flash Lite (輕量)": "gemini-2.5-flash-lite"
+    "Gemini 2.5 Flash Lite (輕量)": "gemini-2.5-flash-lite",
+    "自動選擇 (依長度與延遲目標)": "auto"
+}
+
+# 自動選擇模型配置：依偏好順序排列 (品質由高到低)，預估延遲 = 固定開銷 + 輸入處理 + 輸出生成
+AUTO_MODEL = "auto"
+AUTO_ROUTE_LATENCY_TARGET_SECONDS = 60
+AUTO_ROUTE_EXPECTED_OUTPUT_TOKENS = 3000
+GEMINI_MODEL_PROFILES = {
+    "gemini-2.5-pro": {
+        "context_tokens": 1048576, "overhead_seconds": 20.0,
+        "input_tokens_per_second": 10000, "output_tokens_per_second": 80
+    },
+    "gemini-2.5-flash": {
+        "context_tokens": 1048576, "overhead_seconds": 5.0,
+        "input_tokens_per_second": 30000, "output_tokens_per_second": 200
+    },
+    "gemini-2.5-flash-lite": {
+        "context_tokens": 1048576, "overhead_seconds": 1.0,
+        "input_tokens_per_second": 60000, "output_tokens_per_second": 400
+    }
+}
+
+# Gemini 呼叫排程配置 (每個 API Key 的每分鐘請求數與 Token 數上限)
+GEMINI_RATE_LIMITS = {
+    "gemini-2.5-pro": {"rpm": 5, "tpm": 250000},
+    "gemini-2.5-flash": {"rpm": 10, "tpm": 250000},
+    "gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250000}
+}
+GEMINI_DEFAULT_RATE_LIMIT = {"rpm": 10, "tpm": 250000}
+GEMINI_MAX_RETRIES = 5
+GEMINI_BACKOFF_BASE_SECONDS = 2.0
+GEMINI_BACKOFF_MAX_SECONDS = 60.0
+GEMINI_CIRCUIT_FAILURE_THRESHOLD = 5
+GEMINI_CIRCUIT_RESET_SECONDS = 60.0
+GEMINI_API_KEYS_ENV = "GOOGLE_API_KEYS"  # 以逗號分隔多組 API Key，輪流使用
+
+# 逐字稿精簡步驟 (依序執行，簡繁轉換 "traditional" 需另外勾選並安裝 opencc)
+COMPACTION_STEPS = ["whitespace", "fillers", "repetitions", "punctuation"]
+
+# 章節分析配置：無章節資訊時依語音停頓切分段落
+CHAPTER_ANALYSIS_MAX_WORKERS = 6
+CHAPTER_RETRY_ROUNDS = 1
+SILENCE_GAP_SECONDS = 2.0
+MIN_SECTION_SECONDS = 180
+MAX_SECTION_SECONDS = 900
+
+# 多專家平行分析的最大同時呼叫數
+EXPERT_FANOUT_MAX_WORKERS = 8
+
+# 批次打包配置：多份短逐字稿合併為單一請求，以 JSON 結構化輸出後拆回各自的報告
+BATCH_PACK_TOKEN_BUDGET = 60000          # 每個批次請求的輸入 Token 上限
+BATCH_PACK_MAX_ITEMS = 10                # 每個批次最多包含的逐字稿數
+BATCH_PACK_MAX_WORKERS = 4
+
+# 影片批次處理配置 (多個網址 / 播放清單 / 頻道)：各階段有各自的平行數，階段之間以有界佇列銜接
+BATCH_WORK_FOLDER = "batch_work"     # 每部影片的暫存檔放在此資料夾下各自的子資料夾
+BATCH_MAX_ITEMS = 200                # 展開播放清單或頻道時最多處理的影片數
+BATCH_QUEUE_SIZE = 4                 # 階段間佇列上限，下游較慢時上游暫停，避免音訊檔大量堆積
+BATCH_STAGE_WORKERS = {
+    "metadata": 4,      # 影片資訊 (yt-dlp 探查)
+    "captions": 4,      # 字幕下載
+    "audio": 3,         # 音訊下載
+    "transcribe": 1,    # 語音轉文字 (佔用 GPU，預設一次一部)
+    "analyze": 2        # AI 分析 (另受 Gemini 排程的速率限制)
+}
+
+# 音訊下載自動調校：依各網站最近的實測速度在下列設定中選擇，同時進行的下載共用連線數與頻寬上限
+DOWNLOAD_PROFILES = [
+    {"fragments": 4, "chunk_size": "5M"},
+    {"fragments": 8, "chunk_size": "10M"},
+    {"fragments": 16, "chunk_size": "10M"},
+    {"fragments": 32, "chunk_size": "20M"}
+]
+DOWNLOAD_DEFAULT_PROFILE = 2            # 沒有實測資料時使用的設定 (索引)
+DOWNLOAD_MAX_CONNECTIONS = 48           # 同時進行的下載合計的分段連線數上限
+DOWNLOAD_MAX_BANDWIDTH_MBPS = None      # 合計下載頻寬上限 (MB/s)，None 為不限制
+DOWNLOAD_HISTORY = 20                   # 每個網站保留的最近實測數 (啟動時從效能指標記錄載入)
+DOWNLOAD_EXPLORE_EVERY = 10             # 每隔幾次下載改試相鄰的設定，跟上網路狀況的變化
+
+# 轉錄資源排程：互動佇列 (單部影片、指定 interactive 的工作) 與批次佇列依權重分享，
+# 佇列內依預估用時由短到長 (shortest-job-first)，等待越久預估用時視為越短，長影片不會一直被插隊
+SCHEDULER_TRANSCRIBE_SLOTS = 2                      # 同時進行的轉錄數 (同一模型由多個執行緒共用)
+SCHEDULER_LANE_WEIGHTS = {"interactive": 3, "batch": 1}
+SCHEDULER_LANE_LIMITS = {"batch": 1}                # 各佇列最多同時佔用的轉錄數 (保留給互動工作)
+SCHEDULER_AGING_RATE = 1.0                          # 每等待 1 秒，預估用時視為減少的秒數
+SCHEDULER_ASR_SECONDS_PER_AUDIO_SECOND = 0.15       # 語音轉文字的預估用時 (相對音訊長度)
+SCHEDULER_CAPTION_COST_SECONDS = 5                  # 有字幕的影片只需下載字幕
+SCHEDULER_UNKNOWN_DURATION_SECONDS = 1800           # 無法取得長度時的假設
+SCHEDULER_WAIT_HISTORY = 500                        # 各佇列保留最近的等待時間筆數 (計算 p95)
+
+# 本機工作 API 配置 (python main.py serve)：多個介面或工具可將批次工作送到同一台主機處理
+JOB_API_HOST = "127.0.0.1"           # 預設只接受本機連線，開放給其他主機時請設定 JOB_API_TOKEN_ENV
+JOB_API_PORT = 8765
+JOB_API_TOKEN_ENV = "VIDSCRIPT_API_TOKEN"   # 設定後每個請求需帶 Authorization: Bearer <token>
+JOB_API_OUTPUT_FOLDER = "api_reports"
+JOB_API_MAX_RUNNING_JOBS = 2         # 同時執行的工作數 (轉錄資源另由 SCHEDULER_* 依優先順序分配)
+JOB_API_HISTORY = 100                # 保留最近完成的工作數
+JOB_API_SSE_KEEPALIVE_SECONDS = 15
+
+# 多節點工作佇列配置 (python main.py worker)：佇列資料庫需放在各節點都能存取的共用儲存空間
+WORK_QUEUE_DB = os.path.join(CACHE_FOLDER, "work_queue.sqlite3")
+WORK_QUEUE_LEASE_SECONDS = 120          # 租約長度，節點需在到期前送出心跳
+WORK_QUEUE_HEARTBEAT_SECONDS = 30
+WORK_QUEUE_WORKER_TIMEOUT_SECONDS = 90  # 超過此時間沒有心跳的節點視為離線
+WORK_QUEUE_MAX_ATTEMPTS = 3             # 節點當機或處理失敗時的最多嘗試次數
+WORK_QUEUE_AFFINITY_WAIT_SECONDS = 60   # 需要特定模型的工作優先留給已載入該模型的節點的時間
+WORK_QUEUE_POLL_SECONDS = 2.0
+WORK_QUEUE_OUTPUT_FOLDER = "worker_reports"
+
+# 外部程式 (yt-dlp / FFmpeg) 的看門狗：超過總時間 (timeout) 或持續沒有輸出 (idle) 時終止整個程序樹
+PROCESS_WATCHDOG = {
+    "probe": {"timeout": 300, "idle": 180},       # 影片資訊 / 清單探查 / 字幕列表 (完成時才輸出 JSON)
+    "captions": {"timeout": 180, "idle": 90},     # 字幕下載
+    "audio": {"timeout": 3600, "idle": 300},      # 音訊下載 (轉為 mp3 時數分鐘沒有輸出)
+    "ffmpeg": {"timeout": 3600, "idle": 120}      # 靜音偵測與切段
+}
+PROCESS_POLL_SECONDS = 0.5
+
+# 長音訊分段轉錄：超過指定長度的音訊在靜音處切段，分派給多個工作節點轉錄後依時間合併
+SHARD_MIN_AUDIO_SECONDS = 3600          # 短於此長度的音訊直接在本機轉錄
+SHARD_TARGET_SECONDS = 1200             # 每段的目標長度
+SHARD_SEARCH_SECONDS = 90               # 在目標切點前後此範圍內尋找靜音
+SHARD_OVERLAP_SECONDS = 2.0             # 相鄰分段重疊的秒數 (找不到靜音時避免切斷句子)
+SHARD_SILENCE_DB = -35                  # 低於此音量 (dBFS) 視為靜音
+SHARD_MIN_SILENCE_SECONDS = 0.4
+SHARD_FOLDER_NAME = "shards"            # 分段音訊放在佇列資料庫旁的資料夾 (各節點都能讀取)
+
+# 轉錄記憶體控管：依模型大小、運算精度與音訊長度估計每次轉錄的峰值記憶體 (RSS)，合計超過預算時延後執行，
+# 等待過久或無論如何都放不下時改用較小的模型；實測的峰值記錄為效能指標 (memory_stage) 並用來修正估計
+MEMORY_BUDGET_MB = None                 # 程序的記憶體預算，None 為啟動時的用量 + 可用記憶體 × MEMORY_BUDGET_FRACTION
+MEMORY_BUDGET_FRACTION = 0.8
+MEMORY_FALLBACK_BUDGET_MB = 8192        # 無法偵測記憶體 (未安裝 psutil 且非 Linux) 時使用
+MEMORY_MODEL_MB = {                     # 模型以 int8 載入時的常駐記憶體
+    "tiny": 150, "base": 250, "small": 650, "medium": 1600, "large-v2": 3200, "large-v3": 3200
 }
+MEMORY_COMPUTE_TYPE_FACTORS = {"int8": 1.0, "int8_float16": 1.0, "float16": 0.4, "float32": 2.5}  # float16 只用於 GPU，權重在 VRAM
+MEMORY_TRANSCRIBE_OVERHEAD_MB = 300     # 特徵計算與 beam search 的工作記憶體
+MEMORY_AUDIO_MB_PER_SECOND = 0.13       # 整段音訊解碼為 16 kHz float32 (含重取樣暫存)；分段轉錄時只計單段長度
+MEMORY_DOWNGRADE = {"large-v3": "medium", "large-v2": "medium", "medium": "small", "small": "base", "base": "tiny"}
+MEMORY_DEFER_SECONDS = 300              # 延後超過此秒數仍放不下時改用較小的模型
+MEMORY_SAMPLE_SECONDS = 0.5             # 取樣程序 RSS 的間隔
+MEMORY_ESTIMATE_HISTORY = 20            # 每個模型保留的最近「實測 / 估計」比例
 
 # Faster-Whisper 模型選項（針對 VRAM 優化）
 WHISPER_MODELS = {
@@ -0,0 +1,273 @@
+"""
+本機工作 API 模組
+以標準函式庫的 HTTP 伺服器提供批次處理工作的送出、查詢、進度串流 (Server-Sent Events) 與結果下載，
+多個介面或內部工具可共用同一台 GPU / CPU 主機：
+
+    python main.py serve [--host 127.0.0.1] [--port 8765]
+
+端點：
+    POST /jobs                                 送出工作 {"urls": [...] 或多行文字, "options": {...}}
+    GET  /jobs                                 工作列表
+    GET  /jobs/<id>                            工作狀態與各影片進度
+    GET  /jobs/<id>/events                     以 SSE 串流進度 (支援 Last-Event-ID 續傳)
+    POST /jobs/<id>/cancel                     取消等待中或執行中的工作
+    GET  /jobs/<id>/items/<n>/transcript       第 n 部影片的逐字稿
+    GET  /jobs/<id>/items/<n>/report           第 n 部影片的報告
+    GET  /queue                                佇列深度
+    GET  /health                               服務狀態
+"""
+import os
+import re
+import sys
+import json
+import hmac
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from src.core.config import (
+    JOB_API_HOST, JOB_API_PORT, JOB_API_TOKEN_ENV, JOB_API_OUTPUT_FOLDER, JOB_API_SSE_KEEPALIVE_SECONDS,
+    COMPACTION_STEPS
+)
+from src.core.job_manager import JobManager
+
+_MAX_BODY_BYTES = 1024 * 1024
+
+_ROUTES = [
+    ("GET", re.compile(r"^/health$"), "health"),
+    ("GET", re.compile(r"^/queue$"), "queue"),
+    ("GET", re.compile(r"^/jobs$"), "list_jobs"),
+    ("POST", re.compile(r"^/jobs$"), "submit"),
+    ("GET", re.compile(r"^/jobs/(?P<job_id>\w+)$"), "job_status"),
+    ("GET", re.compile(r"^/jobs/(?P<job_id>\w+)/events$"), "job_events"),
+    ("POST", re.compile(r"^/jobs/(?P<job_id>\w+)/cancel$"), "cancel_job"),
+    ("GET", re.compile(r"^/jobs/(?P<job_id>\w+)/items/(?P<index>\d+)/(?P<kind>transcript|report)$"), "item_output")
+]
+
+
+class ApiError(Exception):
+    """回傳給用戶端的錯誤 (附 HTTP 狀態碼)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JobApiHandler(BaseHTTPRequestHandler):
+    """工作 API 的請求處理 (manager、token 由 JobApiServer 設定)"""
+
+    server_version = "VidScriptJobAPI/1.0"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass  # 不輸出每個請求的存取紀錄
+
+    def _dispatch(self, method):
+        try:
+            self._check_token()
+            parts = urlsplit(self.path)
+            for route_method, pattern, name in _ROUTES:
+                match = pattern.match(parts.path)
+                if match and route_method == method:
+                    return getattr(self, f"_handle_{name}")(query=parse_qs(parts.query), **match.groupdict())
+            if any(pattern.match(parts.path) for _, pattern, _ in _ROUTES):
+                raise ApiError(405, "不支援此方法")
+            raise ApiError(404, "找不到此端點")
+        except ApiError as e:
+            self._send_json({"error": str(e)}, e.status)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 用戶端已中斷連線
+
+    def _check_token(self):
+        token = self.server.token
+        if not token:
+            return
+        provided = self.headers.get("Authorization", "")
+        if not hmac.compare_digest(provided.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+            raise ApiError(401, "缺少或錯誤的存取權杖")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, text, content_type="text/plain"):
+        body = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > _MAX_BODY_BYTES:
+            raise ApiError(413, "請求內容過大")
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except (UnicodeDecodeError, ValueError):
+            raise ApiError(400, "請求內容不是合法的 JSON")
+
+    def _job(self, job_id):
+        job = self.server.manager.get(job_id)
+        if job is None:
+            raise ApiError(404, f"找不到工作: {job_id}")
+        return job
+
+    def _handle_health(self, query):
+        self._send_json({"status": "ok"})
+
+    def _handle_queue(self, query):
+        self._send_json(self.server.manager.queue_depth())
+
+    def _handle_list_jobs(self, query):
+        self._send_json({"jobs": [job.to_dict(include_items=False) for job in self.server.manager.list_jobs()]})
+
+    def _handle_submit(self, query):
+        payload = self._read_json()
+        if not isinstance(payload, dict):
+            raise ApiError(400, "請求內容必須是 JSON 物件")
+        try:
+            job = self.server.manager.submit(payload.get("urls"), payload.get("options"))
+        except ValueError as e:
+            raise ApiError(400, str(e))
+        except RuntimeError as e:
+            raise ApiError(503, str(e))
+        self._send_json(job.to_dict(include_items=False), 202)
+
+    def _handle_job_status(self, query, job_id):
+        self._send_json(self._job(job_id).to_dict())
+
+    def _handle_cancel_job(self, query, job_id):
+        job = self._job(job_id)
+        if job.finished:
+            raise ApiError(409, "工作已結束")
+        self.server.manager.cancel(job_id)
+        self._send_json(job.to_dict(include_items=False), 202)
+
+    def _handle_job_events(self, query, job_id):
+        """以 Server-Sent Events 串流進度，工作結束且事件送完後關閉連線"""
+        job = self._job(job_id)
+        cursor = self.headers.get("Last-Event-ID") or (query.get("since") or ["-1"])[0]
+        try:
+            cursor = int(cursor) + 1
+        except ValueError:
+            raise ApiError(400, "Last-Event-ID 必須是整數")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        while True:
+            events = job.wait_events(cursor, self.server.keepalive_seconds)
+            if events:
+                for event in events:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n".encode("utf-8"))
+                cursor = events[-1]["id"] + 1
+            elif not job.finished:
+                self.wfile.write(b": keepalive\n\n")
+            self.wfile.flush()
+            if job.finished and cursor >= len(job.events):
+                return
+
+    def _handle_item_output(self, query, job_id, index, kind):
+        job = self._job(job_id)
+        items = job.items()
+        index = int(index)
+        if index >= len(items):
+            raise ApiError(404, f"工作中沒有第 {index} 部影片")
+        item = items[index]
+        if kind == "transcript":
+            if not item["record"]:
+                raise ApiError(409, "逐字稿尚未完成")
+            try:
+                text = job.backend.read_transcript(item)
+            except (OSError, ValueError) as e:
+                raise ApiError(500, f"無法讀取逐字稿: {e}")
+            return self._send_text(text)
+
+        if not item["report"]:
+            raise ApiError(409, "報告尚未完成" if item["status"] != "done" else "此工作未產生報告")
+        try:
+            with open(item["report"]["path"], "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError as e:
+            raise ApiError(500, f"無法讀取報告: {e}")
+        self._send_text(text, "text/markdown")
+
+
+class JobApiServer(ThreadingHTTPServer):
+    """工作 API 伺服器 (每個請求一個執行緒)"""
+
+    daemon_threads = True
+
+    def __init__(self, manager, host=JOB_API_HOST, port=JOB_API_PORT, token=None,
+                 keepalive_seconds=JOB_API_SSE_KEEPALIVE_SECONDS):
+        super().__init__((host, port), JobApiHandler)
+        self.manager = manager
+        self.token = token
+        self.keepalive_seconds = keepalive_seconds
+
+
+def default_backend_factory(output_folder=JOB_API_OUTPUT_FOLDER, api_key=None, transcriber=None):
+    """依工作選項建立實際下載、轉錄與分析的執行方式 (transcriber 見 VideoBatchBackend)"""
+    from src.services.batch_backend import VideoBatchBackend
+    from src.utils.prompt_manager import PromptManager
+
+    def create(options):
+        expert = options.get("expert")
+        prompt_template = None
+        if expert:
+            prompt_manager = PromptManager()
+            if expert not in prompt_manager.get_available_prompts():
+                raise ValueError(f"找不到專家: {expert}")
+            prompt_template = prompt_manager.get_prompt_content(expert)
+        os.makedirs(output_folder, exist_ok=True)
+        return VideoBatchBackend(
+            output_folder, whisper_model=options.get("whisper_model", "base"), language=options.get("language"),
+            api_key=api_key, prompt_template=prompt_template, expert_name=expert,
+            ai_model=options.get("ai_model", "gemini-2.5-flash"),
+            force_regenerate=options.get("force_regenerate", False),
+            compaction_steps=COMPACTION_STEPS if options.get("compact", True) else None, transcriber=transcriber
+        )
+
+    return create
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python main.py serve", description="啟動本機批次處理工作 API")
+    parser.add_argument("--host", default=JOB_API_HOST, help="監聽位址 (預設只接受本機連線)")
+    parser.add_argument("--port", type=int, default=JOB_API_PORT)
+    parser.add_argument("--output", default=JOB_API_OUTPUT_FOLDER, help="報告輸出資料夾")
+    args = parser.parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    token = os.getenv(JOB_API_TOKEN_ENV)
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not token:
+        print(f"⚠️ 監聽 {args.host} 且未設定 {JOB_API_TOKEN_ENV}，任何能連線的主機都可送出工作", file=sys.stderr)
+
+    manager = JobManager(default_backend_factory(args.output, os.getenv("GOOGLE_API_KEY")))
+    server = JobApiServer(manager, args.host, args.port, token)
+    print(f"🚀 工作 API 已啟動: http://{args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.shutdown()
+        server.server_close()
+    return 0
@@ -0,0 +1,249 @@
+"""
+工作管理模組
+接收批次處理工作並交給 BatchPipeline 執行，保存每個工作的狀態與進度事件，
+供 HTTP 工作 API 查詢狀態、串流進度與取得逐字稿 / 報告。
+工作分為互動 (interactive) 與批次 (batch) 兩種優先順序，依 LaneScheduler 的規則取得執行名額；
+等待中或執行中的工作都可以取消
+"""
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from src.core.config import JOB_API_MAX_RUNNING_JOBS, JOB_API_HISTORY, SCHEDULER_LANE_WEIGHTS
+from src.core.batch_pipeline import BatchPipeline
+from src.core.progress import ProgressReporter, JsonLinesReporter
+from src.utils.cancellation import CancelToken, OperationCancelled
+from src.utils.lane_scheduler import LaneScheduler, BATCH, get_transcribe_scheduler
+from src.utils.download_tuner import get_download_tuner
+from src.utils.memory_admission import get_memory_admission
+
+# 工作可指定的選項與型別 (其餘設定沿用伺服器預設)
+JOB_OPTIONS = {
+    "expert": str,
+    "whisper_model": str,
+    "language": str,
+    "ai_model": str,
+    "force_regenerate": bool,
+    "compact": bool,
+    "priority": str     # interactive 或 batch (預設)
+}
+
+
+class Job(ProgressReporter):
+    """
+    一個批次處理工作
+
+    同時作為管線的進度回報對象：每次影片狀態改變都記錄為一筆事件 (依序編號)，
+    串流進度時從指定編號之後讀取即可，斷線重連也不會漏掉事件。
+    """
+
+    def __init__(self, source_text, options):
+        self.id = uuid.uuid4().hex[:12]
+        self.source_text = source_text
+        self.options = options
+        self.lane = options.get("priority", BATCH)
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.backend = None
+        self.pipeline = None
+        self.cancel_token = CancelToken()
+        self.events = []
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def _append(self, event, **fields):
+        with self._condition:
+            entry = {"id": len(self.events), "event": event, "timestamp": round(time.time(), 3)}
+            entry.update(fields)
+            self.events.append(entry)
+            self._condition.notify_all()
+
+    def set_status(self, status, error=None):
+        with self._condition:
+            self.status = status
+            self.error = error
+            if status == "running":
+                self.started_at = time.time()
+            elif self.finished:
+                self.finished_at = time.time()
+        self._append("job_status", status=status, error=error)
+
+    def wait_events(self, cursor, timeout):
+        """回傳編號 cursor 之後的事件；沒有新事件時最多等待 timeout 秒 (工作已結束則立即返回)"""
+        with self._condition:
+            if cursor >= len(self.events) and not self.finished:
+                self._condition.wait(timeout)
+            return self.events[cursor:]
+
+    def job_started(self, items):
+        self._append("job_started", items=len(items))
+
+    def item_updated(self, item):
+        self._append("item", **JsonLinesReporter.describe(item))
+
+    def job_finished(self, items, stage_summary):
+        statuses = [item["status"] for item in items]
+        self._append(
+            "job_finished", items=len(items), done=statuses.count("done"), failed=statuses.count("failed"),
+            cancelled=statuses.count("cancelled"), stages=stage_summary
+        )
+
+    def items(self):
+        return self.pipeline.snapshot() if self.pipeline else []
+
+    def to_dict(self, include_items=True):
+        items = self.items()
+        result = {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "options": self.options,
+            "priority": self.lane,
+            "created_at": round(self.created_at, 3),
+            "started_at": round(self.started_at, 3) if self.started_at else None,
+            "finished_at": round(self.finished_at, 3) if self.finished_at else None,
+            "counts": {
+                status: sum(item["status"] == status for item in items)
+                for status in ("queued", "running", "done", "failed", "cancelled")
+            }
+        }
+        if include_items:
+            result["items"] = [JsonLinesReporter.describe(item) for item in items]
+            if self.pipeline and self.pipeline.done:
+                result["stages"] = self.pipeline.stage_summary()
+        return result
+
+
+class JobManager:
+    """
+    批次處理工作佇列
+
+    backend_factory(options) 依工作選項建立執行方式 (需提供 expand_urls 與 BatchPipeline 所需的方法)；
+    同時最多執行 max_running 個工作，批次工作另受 SCHEDULER_LANE_LIMITS 限制，保留名額給互動工作；
+    等待中的工作依優先順序與送出時間取得名額。
+    """
+
+    def __init__(self, backend_factory, max_running=JOB_API_MAX_RUNNING_JOBS, history=JOB_API_HISTORY, workers=None):
+        self.backend_factory = backend_factory
+        self.history = history
+        self.workers = workers
+        self._jobs = OrderedDict()
+        self._slots = LaneScheduler(slots=max_running)
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    @staticmethod
+    def validate_options(options):
+        """檢查工作選項，不合法時拋出 ValueError"""
+        options = options or {}
+        if not isinstance(options, dict):
+            raise ValueError("options 必須是物件")
+        for key, value in options.items():
+            if key not in JOB_OPTIONS:
+                raise ValueError(f"不支援的選項: {key}")
+            if value is not None and not isinstance(value, JOB_OPTIONS[key]):
+                raise ValueError(f"選項 {key} 的型別錯誤")
+        if options.get("priority") not in (None, *SCHEDULER_LANE_WEIGHTS):
+            raise ValueError(f"priority 必須是 {' 或 '.join(SCHEDULER_LANE_WEIGHTS)}")
+        return {key: value for key, value in options.items() if value is not None}
+
+    def submit(self, urls, options=None):
+        """送出工作 (urls 為網址列表或多行文字)，回傳 Job"""
+        if isinstance(urls, (list, tuple)):
+            if not all(isinstance(url, str) for url in urls):
+                raise ValueError("urls 必須是字串列表")
+            urls = "\n".join(urls)
+        if not isinstance(urls, str) or not urls.strip():
+            raise ValueError("請提供至少一個影片、播放清單或頻道網址")
+
+        job = Job(urls, self.validate_options(options))
+        job.set_status("queued")
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("工作佇列已關閉")
+            self._jobs[job.id] = job
+            self._trim_history()
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id, reason="已取消"):
+        """取消工作 (立即返回)，回傳 Job；找不到時回傳 None，已結束的工作不受影響"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_token.cancel(reason)
+        if job.pipeline is not None:
+            job.pipeline.cancel(reason)
+        return job
+
+    def list_jobs(self):
+        with self._condition:
+            return list(self._jobs.values())
+
+    def queue_depth(self):
+        """等待中的工作數、執行中的工作數、各階段等待的影片數、工作與轉錄在各優先佇列的等待時間，下載的連線數與實測速度，以及轉錄的記憶體用量"""
+        with self._condition:
+            queued_jobs = sum(job.status == "queued" for job in self._jobs.values())
+            running = [job for job in self._jobs.values() if job.status == "running"]
+        stages = {}
+        pending_items = 0
+        for job in running:
+            if job.pipeline is None:
+                continue
+            for stage, depth in job.pipeline.queue_depths().items():
+                stages[stage] = stages.get(stage, 0) + depth
+            pending_items += sum(item["status"] in ("queued", "running") for item in job.pipeline.snapshot())
+        return {
+            "queued_jobs": queued_jobs, "running_jobs": len(running), "pending_items": pending_items, "stages": stages,
+            "job_lanes": self._slots.stats(), "transcribe_lanes": get_transcribe_scheduler().stats(),
+            "downloads": get_download_tuner().stats(), "memory": get_memory_admission().stats()
+        }
+
+    def shutdown(self):
+        """停止接收新工作；已送出的工作會繼續完成"""
+        with self._condition:
+            self._stopped = True
+
+    def _trim_history(self):
+        """只保留最近 history 個已結束的工作"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self, job):
+        # 工作層級無法預估用時 (尚未展開網址)，同一佇列內依送出順序；等待名額時也可取消
+        try:
+            with job.cancel_token.bind(), self._slots.slot(job.lane, 0):
+                self._execute(job)
+        except OperationCancelled as e:
+            job.set_status("cancelled", str(e))
+
+    def _execute(self, job):
+        job.set_status("running")
+        try:
+            job.backend = self.backend_factory(job.options)
+            urls = job.backend.expand_urls(job.source_text)
+            if not urls:
+                raise ValueError("沒有可處理的影片網址")
+            job.pipeline = BatchPipeline(
+                job.backend, workers=self.workers, reporter=job, lane=job.lane, cancel_token=job.cancel_token
+            )
+            job.pipeline.run(urls)
+            if job.cancel_token.cancelled:
+                job.set_status("cancelled", job.cancel_token.reason)
+            else:
+                job.set_status("done")
+        except OperationCancelled as e:
+            job.set_status("cancelled", str(e))
+        except Exception as e:
+            job.set_status("failed", str(e) or type(e).__name__)
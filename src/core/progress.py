@@ -0,0 +1,71 @@
+"""
+進度回報模組
+批次處理管線透過 ProgressReporter 介面回報進度，不直接依賴 Streamlit，
+同一條管線可用於網頁介面、命令列與其他前端
+"""
+import sys
+import json
+import time
+import threading
+
+
+class ProgressReporter:
+    """
+    批次處理進度回報介面 (預設不做任何事)
+
+    管線會在背景執行緒中呼叫這些方法，實作需自行確保執行緒安全；
+    Streamlit 等只能在主執行緒更新畫面的前端，應改為由主執行緒定期讀取 BatchPipeline.snapshot()。
+    """
+
+    def job_started(self, items):
+        """開始處理，items 為各影片的初始狀態"""
+
+    def item_updated(self, item):
+        """單部影片的階段或狀態改變"""
+
+    def job_finished(self, items, stage_summary):
+        """全部影片處理完畢，stage_summary 為各階段的處理數量與用時"""
+
+
+class JsonLinesReporter(ProgressReporter):
+    """以每行一筆 JSON 的格式輸出進度，供命令列、排程工作與其他程式解析"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        entry = {"event": event, "timestamp": round(time.time(), 3)}
+        entry.update(fields)
+        with self._lock:
+            self.stream.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.stream.flush()
+
+    @staticmethod
+    def describe(item):
+        """影片狀態中可公開輸出的欄位"""
+        return {
+            "index": item["index"],
+            "url": item["url"],
+            "title": item["title"],
+            "stage": item["stage"],
+            "status": item["status"],
+            "source": item["source"],
+            "error": item["error"],
+            "timings": item["timings"],
+            "transcript": item["record"]["filename"] if item["record"] else None,
+            "report": item["report"]["path"] if item["report"] else None
+        }
+
+    def job_started(self, items):
+        self.emit("job_started", items=len(items))
+
+    def item_updated(self, item):
+        self.emit("item", **self.describe(item))
+
+    def job_finished(self, items, stage_summary):
+        statuses = [item["status"] for item in items]
+        self.emit(
+            "job_finished", items=len(items), done=statuses.count("done"), failed=statuses.count("failed"),
+            cancelled=statuses.count("cancelled"), stages=stage_summary
+        )
@@ -0,0 +1,353 @@
+"""
+工作節點模組
+多台主機以共用工作佇列 (SharedWorkQueue) 分攤影片處理：
+
+    python main.py worker submit urls.txt --queue Z:\\vidscript\\queue.sqlite3 --model small --expert 財經專家
+    python main.py worker run --queue Z:\\vidscript\\queue.sqlite3 [--id gpu-1] [--models small]
+    python main.py worker status --queue Z:\\vidscript\\queue.sqlite3
+
+送出時將播放清單 / 頻道展開為各別影片，每部影片一份工作；節點依自身能力 (GPU、已載入的模型) 領取工作，
+處理期間定期送出心跳，當機的節點租約到期後工作會交由其他節點重試。
+超過 SHARD_MIN_AUDIO_SECONDS 的長音訊由領到影片的節點在靜音處切段，各段再以工作分派給所有節點轉錄；
+也可直接分段轉錄本機的音訊檔：
+
+    python main.py worker transcribe live.m4a --queue Z:\\vidscript\\queue.sqlite3 --model small
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import argparse
+import threading
+from collections import Counter
+from src.core.config import (
+    WORK_QUEUE_DB, WORK_QUEUE_HEARTBEAT_SECONDS, WORK_QUEUE_POLL_SECONDS, WORK_QUEUE_OUTPUT_FOLDER,
+    WORK_QUEUE_MAX_ATTEMPTS, AI_PROVIDERS, SHARD_MIN_AUDIO_SECONDS, SHARD_FOLDER_NAME
+)
+from src.core.progress import JsonLinesReporter
+from src.utils.audio_sharding import AudioSharder
+from src.utils.cancellation import current_token
+from src.utils.metrics import MetricsRecorder
+from src.utils.work_queue import SharedWorkQueue, DONE, FAILED
+
+VIDEO_TASK = "video"
+SHARD_TASK = "transcribe_shard"
+
+
+def detect_gpu():
+    """是否有可用的 CUDA GPU"""
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+class WorkerNode:
+    """
+    從共用佇列領取並執行工作的節點
+
+    handlers 為 {工作種類: handler(payload, node) -> 結果}；結果需可轉為 JSON。
+    處理工作時由背景執行緒定期送出心跳延長租約，租約被收回 (例如網路中斷過久) 時結果不會寫回。
+    """
+
+    def __init__(self, work_queue, handlers, worker_id=None, gpu=None, warm_models=None,
+                 poll_seconds=WORK_QUEUE_POLL_SECONDS, heartbeat_seconds=WORK_QUEUE_HEARTBEAT_SECONDS, reporter=None):
+        self.work_queue = work_queue
+        self.handlers = handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+        self.gpu = detect_gpu() if gpu is None else gpu
+        self.warm_models = set(warm_models or [])
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.reporter = reporter or JsonLinesReporter(sys.stderr)
+        self.processed = 0
+
+    def capabilities(self):
+        return {"gpu": self.gpu, "models": sorted(self.warm_models), "kinds": sorted(self.handlers)}
+
+    def run_once(self, kinds=None):
+        """領取並處理一份工作 (可限定工作種類)，沒有工作時回傳 False"""
+        self.work_queue.heartbeat(self.worker_id, self.capabilities())
+        kinds = set(self.handlers) if kinds is None else set(kinds) & set(self.handlers)
+        task = self.work_queue.claim(self.worker_id, self.capabilities(), kinds=kinds)
+        if task is None:
+            return False
+
+        self.reporter.emit("task_started", worker=self.worker_id, task=task["id"], kind=task["kind"], attempt=task["attempts"])
+        stop_heartbeat = threading.Event()
+        lease = {"lost": False}
+
+        def keep_alive():
+            while not stop_heartbeat.wait(self.heartbeat_seconds):
+                if not self.work_queue.heartbeat(self.worker_id, self.capabilities(), task["id"]):
+                    lease["lost"] = True
+                    return
+
+        heartbeat_thread = threading.Thread(target=keep_alive, name=f"heartbeat-{task['id']}", daemon=True)
+        heartbeat_thread.start()
+        start_time = time.perf_counter()
+        try:
+            result = self.handlers[task["kind"]](task["payload"], self)
+            error = None
+        except Exception as e:
+            result, error = None, str(e) or type(e).__name__
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join()
+        seconds = round(time.perf_counter() - start_time, 3)
+
+        if error is None:
+            accepted = self.work_queue.complete(task["id"], self.worker_id, result)
+        else:
+            accepted = self.work_queue.fail(task["id"], self.worker_id, error)
+        self.processed += 1
+        self.reporter.emit(
+            "task_finished", worker=self.worker_id, task=task["id"], status="done" if error is None else "failed",
+            error=error, seconds=seconds, lease_lost=lease["lost"] or not accepted
+        )
+        return True
+
+    def run(self, stop_event=None, max_tasks=None):
+        """持續領取工作，直到 stop_event 被設定或處理完 max_tasks 份"""
+        stop_event = stop_event or threading.Event()
+        try:
+            while not stop_event.is_set() and (max_tasks is None or self.processed < max_tasks):
+                if not self.run_once():
+                    stop_event.wait(self.poll_seconds)
+        finally:
+            self.work_queue.unregister(self.worker_id)
+
+
+def shard_task_handler(payload, node):
+    """轉錄一段音訊 (payload 為 transcribe_sharded 送出的分段)，時間軸換算為整段音訊的時間"""
+    from src.services.video_processor import VideoProcessor
+
+    start_time = time.perf_counter()
+    # 各段需使用相同的模型，記憶體不足時只延後、不改用較小的模型
+    result = VideoProcessor.run_transcription(
+        payload["path"], payload["model"], payload.get("language"), audio_seconds=payload["end"] - payload["start"],
+        allow_downgrade=False
+    )
+    node.warm_models.add(payload["model"])
+    offset = payload["start"]
+    return {
+        "index": payload["index"],
+        "worker": node.worker_id,
+        "language": result["language"],
+        "seconds": round(time.perf_counter() - start_time, 3),
+        "segments": [
+            {"start": round(segment["start"] + offset, 2), "end": round(segment["end"] + offset, 2), "text": segment["text"]}
+            for segment in result["segments"]
+        ]
+    }
+
+
+def transcribe_sharded(node, audio_path, model_name="base", language="zh", shard_root=None,
+                       min_seconds=SHARD_MIN_AUDIO_SECONDS):
+    """
+    將長音訊在靜音處切段，分派到共用佇列由各節點轉錄後合併，回傳 {"text", "segments", "language", "model", "shards"}
+
+    分段音訊寫入佇列資料庫旁的 shards 資料夾，各節點只讀取自己那一段；等待期間本節點也一起處理分段，
+    所有節點都在等待分段時仍能完成。短於 min_seconds 的音訊直接在本機轉錄 (shards 為空列表)。
+    等待期間檢查目前的取消權杖，被取消時撤回尚未完成的分段。
+    """
+    start_time = time.perf_counter()
+    duration, silences = AudioSharder.detect_silences(audio_path)
+    plan = AudioSharder.plan_shards(duration, silences)
+    if duration < min_seconds or len(plan) < 2:
+        from src.services.video_processor import VideoProcessor
+        result = VideoProcessor.run_transcription(audio_path, model_name, language, audio_seconds=duration)
+        return {
+            "text": result["text"], "segments": result["segments"], "language": result["language"],
+            "model": result["model"], "shards": []
+        }
+
+    shard_root = shard_root or os.path.join(os.path.dirname(os.path.abspath(node.work_queue.db_path)), SHARD_FOLDER_NAME)
+    shard_dir = os.path.join(shard_root, uuid.uuid4().hex[:12])
+    os.makedirs(shard_dir, exist_ok=True)
+    task_ids = []
+    try:
+        for shard in plan:
+            path = AudioSharder.extract_shard(
+                audio_path, shard["start"], shard["end"], os.path.join(shard_dir, f"shard_{shard['index']:03d}.wav")
+            )
+            payload = dict(shard, path=path, model=model_name, language=language)
+            task_ids.append(node.work_queue.enqueue(SHARD_TASK, payload, requires={"model": model_name}))
+        split_seconds = round(time.perf_counter() - start_time, 3)
+
+        token = current_token()
+        while True:
+            token.check()  # 取消時由 finally 撤回尚未完成的分段
+            tasks = [node.work_queue.get(task_id) for task_id in task_ids]
+            failed = next((task for task in tasks if task["status"] == FAILED), None)
+            if failed is not None:
+                raise RuntimeError(f"第 {failed['payload']['index'] + 1} 段轉錄失敗: {failed['error']}")
+            if all(task["status"] == DONE for task in tasks):
+                break
+            if not node.run_once(kinds={SHARD_TASK}):
+                time.sleep(node.poll_seconds)
+    finally:
+        node.work_queue.cancel(task_ids)
+        shutil.rmtree(shard_dir, ignore_errors=True)
+
+    results = [dict(task["result"], **{key: task["payload"][key] for key in ("start", "end", "cut_start", "cut_end")},
+                    attempts=task["attempts"]) for task in tasks]
+    segments = AudioSharder.merge_segments(results)
+    shard_timings = [
+        {
+            "index": result["index"], "worker": result["worker"], "attempts": result["attempts"],
+            "audio_seconds": round(result["end"] - result["start"], 3), "seconds": result["seconds"],
+            "segments": len(result["segments"])
+        }
+        for result in results
+    ]
+    wall_seconds = round(time.perf_counter() - start_time, 3)
+    MetricsRecorder.record(
+        "sharded_transcription", audio_seconds=round(duration, 3), model=model_name, split_seconds=split_seconds,
+        wall_seconds=wall_seconds, shards=shard_timings
+    )
+    node.reporter.emit("shards_merged", worker=node.worker_id, wall_seconds=wall_seconds, shards=shard_timings)
+    return {
+        "text": " ".join(segment["text"] for segment in segments).strip(),
+        "segments": segments,
+        "language": Counter(result["language"] for result in results).most_common(1)[0][0],
+        "model": model_name,
+        "shards": shard_timings
+    }
+
+
+def video_task_handler(output_folder=WORK_QUEUE_OUTPUT_FOLDER, api_key=None):
+    """處理單部影片的工作 (payload 為 {"url", "options"})，回傳影片的處理結果；長音訊改為分段轉錄"""
+    from src.core.batch_pipeline import BatchPipeline
+    from src.core.job_api import default_backend_factory
+
+    def handle(payload, node):
+        def transcriber(audio_path, model_name, language):
+            return transcribe_sharded(node, audio_path, model_name, language)
+
+        backend = default_backend_factory(output_folder, api_key, transcriber)(payload.get("options") or {})
+        pipeline = BatchPipeline(backend)
+        item = pipeline.run([payload["url"]])[0]
+        if "transcribe" in item["timings"]:
+            node.warm_models.add(backend.whisper_model)
+        if item["status"] == "failed":
+            raise RuntimeError(f"{item['stage']}: {item['error']}")
+        return {"item": JsonLinesReporter.describe(item), "worker": node.worker_id}
+
+    return handle
+
+
+def submit_videos(work_queue, urls, options, gpu=False, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+    """每部影片加入一份工作，回傳工作 ID 列表"""
+    requires = {"model": options.get("whisper_model", "base")}
+    if gpu:
+        requires["gpu"] = True
+    return [
+        work_queue.enqueue(VIDEO_TASK, {"url": url, "options": options}, requires=requires, max_attempts=max_attempts)
+        for url in urls
+    ]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python main.py worker", description="多節點共用工作佇列")
+    parser.add_argument("--queue", default=WORK_QUEUE_DB, help="共用佇列資料庫路徑 (需放在各節點都能存取的位置)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="送出影片、播放清單或頻道")
+    submit.add_argument("urls_file", help="網址清單檔 (每行一個網址)；- 代表標準輸入")
+    submit.add_argument("--model", default="base", help="faster-whisper 模型")
+    submit.add_argument("--language", choices=["zh", "en"])
+    submit.add_argument("--expert", help="分析使用的專家名稱；未指定時只保存逐字稿")
+    submit.add_argument("--ai-model", default="gemini-2.5-flash", choices=list(AI_PROVIDERS.values()))
+    submit.add_argument("--gpu", action="store_true", help="只分派給有 GPU 的節點")
+
+    run = commands.add_parser("run", help="以本機作為工作節點")
+    run.add_argument("--id", help="節點名稱 (預設為主機名稱加隨機後綴)")
+    run.add_argument("--models", nargs="*", default=[], help="預先載入的 Whisper 模型")
+    run.add_argument("--cpu", action="store_true", help="即使有 GPU 也以 CPU 節點登錄")
+    run.add_argument("--output", default=WORK_QUEUE_OUTPUT_FOLDER, help="報告輸出資料夾")
+    run.add_argument("--max-tasks", type=int, help="處理指定份數後結束")
+
+    transcribe = commands.add_parser("transcribe", help="分段轉錄本機的長音訊 (由所有節點一起處理)")
+    transcribe.add_argument("audio_file")
+    transcribe.add_argument("--model", default="base", help="faster-whisper 模型")
+    transcribe.add_argument("--language", choices=["zh", "en"])
+    transcribe.add_argument("--output", default="transcript_sharded.txt", help="逐字稿輸出路徑 (時間軸另存為同名 .json)")
+
+    commands.add_parser("status", help="顯示佇列與節點狀態")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    work_queue = SharedWorkQueue(args.queue)
+
+    if args.command == "status":
+        print(json.dumps(work_queue.stats(), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == "transcribe":
+        if not os.path.exists(args.audio_file):
+            print(f"❌ 找不到音訊檔案 {args.audio_file}", file=sys.stderr)
+            return 2
+        node = WorkerNode(work_queue, {SHARD_TASK: shard_task_handler}, gpu=None)
+        try:
+            result = transcribe_sharded(node, args.audio_file, args.model, args.language, min_seconds=0)
+        finally:
+            work_queue.unregister(node.worker_id)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(result["text"])
+        from src.utils.file_manager import FileManager
+        FileManager.write_segments(result["segments"], os.path.splitext(args.output)[0] + ".json")
+        print(json.dumps({"output": args.output, "shards": result["shards"]}, ensure_ascii=False, indent=2))
+        return 0
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    if args.command == "submit":
+        try:
+            if args.urls_file == "-":
+                source_text = sys.stdin.read()
+            else:
+                with open(args.urls_file, "r", encoding="utf-8") as f:
+                    source_text = f.read()
+        except OSError as e:
+            print(f"❌ 無法讀取網址清單: {e}", file=sys.stderr)
+            return 2
+        from src.services.video_processor import VideoProcessor
+        urls = VideoProcessor.expand_urls(source_text)
+        if not urls:
+            print("❌ 沒有可處理的影片網址", file=sys.stderr)
+            return 2
+        options = {"whisper_model": args.model, "ai_model": args.ai_model}
+        if args.language:
+            options["language"] = args.language
+        if args.expert:
+            options["expert"] = args.expert
+        task_ids = submit_videos(work_queue, urls, options, gpu=args.gpu)
+        print(json.dumps({"submitted": len(task_ids), "tasks": task_ids}))
+        return 0
+
+    if args.models:
+        # 預先載入模型，節點登錄時即可承接需要這些模型的工作
+        from src.services.video_processor import VideoProcessor
+        for model_name in args.models:
+            VideoProcessor.load_whisper_model(model_name)
+    node = WorkerNode(
+        work_queue, {VIDEO_TASK: video_task_handler(args.output, os.getenv("GOOGLE_API_KEY")), SHARD_TASK: shard_task_handler},
+        worker_id=args.id, gpu=False if args.cpu else None, warm_models=args.models
+    )
+    print(f"🚀 工作節點 {node.worker_id} 已啟動: {json.dumps(node.capabilities(), ensure_ascii=False)}", file=sys.stderr)
+    try:
+        node.run(max_tasks=args.max_tasks)
+    except KeyboardInterrupt:
+        pass
+    return 0
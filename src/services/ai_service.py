@@ -3,39 +3,273 @@ AI 服務模組
 處理所有 AI 相關功能，包括 Gemini API 調用等
 """
 import os
+import json
+import time
+import sqlite3
+import threading
+from typing import TypedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import google.generativeai as genai
-from src.core.config import TRANSCRIPT_FILENAME
+import google.ai.generativelanguage as glm
+from google.generativeai.types import content_types, generation_types
+from src.core.config import (
+    TRANSCRIPT_FILENAME, EXPERT_FANOUT_MAX_WORKERS, AUTO_MODEL, AUTO_ROUTE_LATENCY_TARGET_SECONDS,
+    AUTO_ROUTE_EXPECTED_OUTPUT_TOKENS, GEMINI_MODEL_PROFILES, CHAPTER_ANALYSIS_MAX_WORKERS, CHAPTER_RETRY_ROUNDS,
+    BATCH_PACK_TOKEN_BUDGET, BATCH_PACK_MAX_ITEMS, BATCH_PACK_MAX_WORKERS
+)
 from src.utils.file_manager import FileManager
+from src.utils.metrics import MetricsRecorder
+from src.utils.report_cache import ReportCache
+from src.utils.token_estimator import TokenEstimator
+from src.utils.transcript_compactor import TranscriptCompactor
+from src.utils.chapter_splitter import ChapterSplitter
+from src.services.gemini_scheduler import get_scheduler, CircuitOpenError
+
+
+class BatchReport(TypedDict):
+    """批次請求的結構化輸出：每份逐字稿一筆"""
+    id: str
+    report: str
 
 
 class AIService:
     """AI 服務管理器"""
     
+    _clients = {}
+    _clients_lock = threading.Lock()
+    
+    @staticmethod
+    def _client_for(api_key):
+        """取得綁定指定 API Key 的用戶端 (每組 Key 一個，不使用 genai.configure 的全域設定)"""
+        with AIService._clients_lock:
+            client = AIService._clients.get(api_key)
+            if client is None:
+                client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+                AIService._clients[api_key] = client
+            return client
+    
+    @staticmethod
+    def _generate_content(model_name, api_key, prompt, stream=False, generation_config=None):
+        """以指定 API Key 呼叫模型，回傳與 GenerativeModel.generate_content 相同的回應物件"""
+        request = {
+            "model": model_name if model_name.startswith("models/") else f"models/{model_name}",
+            "contents": [content_types.to_content(prompt)]
+        }
+        if generation_config:
+            request["generation_config"] = generation_types.to_generation_config_dict(generation_config)
+        request = glm.GenerateContentRequest(**request)
+        client = AIService._client_for(api_key)
+        if stream:
+            return genai.types.GenerateContentResponse.from_iterator(client.stream_generate_content(request))
+        return genai.types.GenerateContentResponse.from_response(client.generate_content(request))
+    
     @staticmethod
-    def call_gemini_api(prompt, api_key, output_filename, model_name="gemini-2.5-flash"):
-        """調用 Google Gemini API"""
+    def call_gemini_api(prompt, api_key, output_filename, model_name="gemini-2.5-flash", stream=False, placeholder=None, estimated_tokens=None):
+        """調用 Google Gemini API，串流模式下會邊接收邊寫入報告並更新畫面"""
+        start_time = time.time()
+        if estimated_tokens is None:
+            estimated_tokens = TokenEstimator.estimate(prompt)
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(model_name)
+            if stream:
+                if placeholder is None:
+                    st.subheader("📄 生成的報告")
+                    placeholder = st.empty()
+                return get_scheduler().submit(
+                    model_name,
+                    lambda key: AIService._stream_gemini_response(
+                        key, prompt, output_filename, model_name, start_time, placeholder, estimated_tokens
+                    ),
+                    api_key=api_key,
+                    estimated_tokens=estimated_tokens
+                )
             
-            response = model.generate_content(prompt)
-            if not response.parts:
-                block_reason = response.prompt_feedback.block_reason if response.prompt_feedback else "未知"
-                st.error(f"❌ Gemini 模型 ({model_name}) 因故未生成任何內容。原因: {block_reason}")
-                return False
-
+            report_text = AIService.generate_report_text(prompt, api_key, model_name, estimated_tokens)
             with open(output_filename, "w", encoding="utf-8") as f:
-                f.write(response.text)
+                f.write(report_text)
+            MetricsRecorder.record(
+                "gemini_call", model=model_name, stream=False,
+                total_seconds=round(time.time() - start_time, 3), output_chars=len(report_text)
+            )
             st.success(f"✅ 報告已成功由 Gemini ({model_name}) 生成並儲存為 {output_filename}")
             return True
+        except CircuitOpenError as e:
+            st.error(f"❌ {e}")
+            return False
         except Exception as e:
             st.error(f"❌ Gemini API ({model_name}) 呼叫失敗: {e}")
             return False
     
     @staticmethod
-    def refine_with_ai(report_output_filename, api_key, custom_prompt=None, model_name="gemini-2.5-flash"):
-        """使用 AI 生成報告"""
+    def _stream_gemini_response(api_key, prompt, output_filename, model_name, start_time, placeholder, estimated_tokens=None):
+        """以串流方式接收 Gemini 回應，逐段附加到報告檔案與即時預覽區"""
+        response = AIService._generate_content(model_name, api_key, prompt, stream=True)
+        
+        first_token_time = None
+        received_parts = []
+        with open(output_filename, "w", encoding="utf-8") as f:
+            for chunk in response:
+                # 被封鎖或空白的片段沒有 parts，存取 text 會拋出例外
+                if not chunk.parts:
+                    continue
+                text = chunk.text
+                if not text:
+                    continue
+                
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                    st.caption(f"⏱️ 首個回應片段用時: {first_token_time:.1f} 秒")
+                
+                f.write(text)
+                f.flush()
+                received_parts.append(text)
+                placeholder.markdown("".join(received_parts))
+        
+        if not received_parts:
+            feedback = getattr(response, "prompt_feedback", None)
+            block_reason = feedback.block_reason if feedback else "未知"
+            st.error(f"❌ Gemini 模型 ({model_name}) 因故未生成任何內容。原因: {block_reason}")
+            return False
+        
+        AIService._record_token_usage(response, prompt, model_name, estimated_tokens)
+        total_time = time.time() - start_time
+        MetricsRecorder.record(
+            "gemini_call", model=model_name, stream=True,
+            time_to_first_token=round(first_token_time, 3), total_seconds=round(total_time, 3),
+            output_chars=sum(len(part) for part in received_parts)
+        )
+        st.success(f"✅ 報告已由 Gemini ({model_name}) 串流生成並儲存為 {output_filename}（總用時 {total_time:.1f} 秒）")
+        return True
+    
+    @staticmethod
+    def generate_report_text(prompt, api_key, model_name="gemini-2.5-flash", estimated_tokens=None):
+        """產生報告文字（不輸出介面訊息，可在背景執行緒中呼叫）"""
+        if estimated_tokens is None:
+            estimated_tokens = TokenEstimator.estimate(prompt)
+        response = get_scheduler().submit(
+            model_name,
+            lambda key: AIService._generate_content(model_name, key, prompt),
+            api_key=api_key,
+            estimated_tokens=estimated_tokens
+        )
+        if not response.parts:
+            block_reason = response.prompt_feedback.block_reason if response.prompt_feedback else "未知"
+            raise ValueError(f"Gemini 模型 ({model_name}) 未生成任何內容。原因: {block_reason}")
+        AIService._record_token_usage(response, prompt, model_name, estimated_tokens)
+        return response.text
+    
+    @staticmethod
+    def _record_token_usage(response, prompt, model_name, estimated_tokens=None):
+        """將 Gemini 回傳的實際用量與本地估算值一併記錄"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        TokenEstimator.record_usage(
+            prompt, model_name,
+            getattr(usage, "prompt_token_count", 0),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            estimated_tokens=estimated_tokens
+        )
+    
+    @staticmethod
+    def select_model(estimated_tokens, latency_target=None):
+        """依 Prompt 長度與延遲目標自動選擇模型：選出預估延遲在目標內、品質最高的模型"""
+        latency_target = latency_target or AUTO_ROUTE_LATENCY_TARGET_SECONDS
+        fitting_models = []
+        for model_name, profile in GEMINI_MODEL_PROFILES.items():
+            if estimated_tokens + AUTO_ROUTE_EXPECTED_OUTPUT_TOKENS > profile["context_tokens"]:
+                continue
+            predicted_seconds = (
+                profile["overhead_seconds"]
+                + estimated_tokens / profile["input_tokens_per_second"]
+                + AUTO_ROUTE_EXPECTED_OUTPUT_TOKENS / profile["output_tokens_per_second"]
+            )
+            if predicted_seconds <= latency_target:
+                return model_name, predicted_seconds
+            fitting_models.append((predicted_seconds, model_name))
+        
+        # 沒有模型能達成延遲目標時，改用預估最快的模型
+        if fitting_models:
+            predicted_seconds, model_name = min(fitting_models)
+            return model_name, predicted_seconds
+        return list(GEMINI_MODEL_PROFILES)[-1], None
+    
+    @staticmethod
+    def _resolve_model(model_name, estimated_tokens, latency_target=None):
+        """處理「自動選擇」模型選項並顯示選擇結果"""
+        if model_name != AUTO_MODEL:
+            return model_name
+        selected_model, predicted_seconds = AIService.select_model(estimated_tokens, latency_target)
+        predicted_text = f"，預估用時 {predicted_seconds:.0f} 秒" if predicted_seconds else ""
+        st.info(f"🧭 自動選擇模型: {selected_model}（Prompt 約 {estimated_tokens:,} tokens{predicted_text}）")
+        MetricsRecorder.record("model_route", model=selected_model, estimated_tokens=estimated_tokens, predicted_seconds=predicted_seconds)
+        return selected_model
+    
+    @staticmethod
+    def compact_transcript(transcript_text, compaction_steps):
+        """精簡逐字稿並顯示前後 Token 數（原始逐字稿檔案保持不變）"""
+        try:
+            compacted_text, stats = TranscriptCompactor(compaction_steps).compact(transcript_text)
+        except ValueError as e:
+            st.warning(f"⚠️ 逐字稿精簡設定錯誤，改用原始逐字稿: {e}")
+            return transcript_text
+        
+        if "traditional" in compaction_steps and not TranscriptCompactor.is_traditional_available():
+            st.warning("⚠️ 未安裝 opencc，略過簡繁轉換")
+        
+        st.info(
+            f"🧹 逐字稿精簡: {stats['tokens_before']:,} → {stats['tokens_after']:,} tokens "
+            f"(減少 {stats['token_reduction']:.1%})"
+        )
+        MetricsRecorder.record("transcript_compaction", **stats)
+        return compacted_text
+    
+    @staticmethod
+    def build_final_prompt(prompt_template, transcript_text):
+        """將逐字稿套入 Prompt 範本"""
+        if "{transcript_text}" in prompt_template:
+            return prompt_template.format(transcript_text=transcript_text)
+        return prompt_template + "\n\n影片內容逐字稿：\n" + transcript_text
+    
+    @staticmethod
+    def generate_report(transcript_text, prompt_template, api_key, model_name="gemini-2.5-flash", force_regenerate=False, latency_target=None, compaction_steps=None):
+        """
+        由逐字稿產生報告（不輸出介面訊息，可在背景執行緒中呼叫），流程同 refine_with_ai：精簡、選擇模型、查詢快取、呼叫 API
+        
+        回傳 (報告文字, 實際使用的模型, 是否命中快取, 精簡設定錯誤)；精簡設定錯誤時改用原始逐字稿，錯誤訊息記錄為效能指標。
+        """
+        compaction_error = None
+        if compaction_steps:
+            try:
+                transcript_text, stats = TranscriptCompactor(compaction_steps).compact(transcript_text)
+                MetricsRecorder.record("transcript_compaction", **stats)
+            except ValueError as e:
+                compaction_error = str(e)
+                MetricsRecorder.record("transcript_compaction", error=compaction_error)
+        
+        final_prompt = AIService.build_final_prompt(prompt_template, transcript_text)
+        estimated_tokens = TokenEstimator.estimate(final_prompt)
+        if model_name == AUTO_MODEL:
+            model_name, predicted_seconds = AIService.select_model(estimated_tokens, latency_target)
+            MetricsRecorder.record("model_route", model=model_name, estimated_tokens=estimated_tokens, predicted_seconds=predicted_seconds)
+        
+        report_cache = ReportCache()
+        if not force_regenerate:
+            cached_report = report_cache.get(transcript_text, prompt_template, model_name)
+            MetricsRecorder.record("report_cache", model=model_name, hit=cached_report is not None)
+            if cached_report is not None:
+                return cached_report, model_name, True, compaction_error
+        
+        report_text = AIService.generate_report_text(final_prompt, api_key, model_name, estimated_tokens)
+        try:
+            report_cache.put(transcript_text, prompt_template, model_name, report_text)
+        except sqlite3.Error:
+            pass  # 快取寫入失敗不影響報告
+        return report_text, model_name, False, compaction_error
+    
+    @staticmethod
+    def refine_with_ai(report_output_filename, api_key, custom_prompt=None, model_name="gemini-2.5-flash", stream=False, force_regenerate=False, latency_target=None, compaction_steps=None, transcript_text=None):
+        """使用 AI 生成報告 (未提供 transcript_text 時讀取臨時逐字稿)，成功時回傳實際使用的模型 (自動選擇時為選出的模型)，失敗時回傳 False"""
         st.write("🤖 步驟 4/6: 開始使用 AI 潤飾報告...")
         
         if not api_key:
@@ -62,21 +296,448 @@ class AIService:
                     st.error("❌ prompt.txt 檔案為空。")
                     return False
             
-            with open(TRANSCRIPT_FILENAME, "r", encoding="utf-8") as f:
-                transcript_text = f.read()
+            if transcript_text is None:
+                with open(TRANSCRIPT_FILENAME, "r", encoding="utf-8") as f:
+                    transcript_text = f.read()
 
             if not transcript_text.strip():
                 st.error("❌ 逐字稿為空，無法產生報告。")
                 return False
+            
+            if compaction_steps:
+                transcript_text = AIService.compact_transcript(transcript_text, compaction_steps)
 
             # 組合最終的 prompt
-            if "{transcript_text}" in prompt_template:
-                final_prompt = prompt_template.format(transcript_text=transcript_text)
+            final_prompt = AIService.build_final_prompt(prompt_template, transcript_text)
+            estimated_tokens = TokenEstimator.estimate(final_prompt)
+            st.info(f"📏 預估 Prompt 長度: {estimated_tokens:,} tokens")
+            model_name = AIService._resolve_model(model_name, estimated_tokens, latency_target)
+            
+            # 檢查報告快取
+            report_cache = ReportCache()
+            if force_regenerate:
+                st.info("🔄 已選擇強制重新生成，略過報告快取")
             else:
-                final_prompt = prompt_template + "\n\n影片內容逐字稿：\n" + transcript_text
+                cached_report = report_cache.get(transcript_text, prompt_template, model_name)
+                if cached_report is not None:
+                    MetricsRecorder.record("report_cache", model=model_name, hit=True)
+                    with open(report_output_filename, "w", encoding="utf-8") as f:
+                        f.write(cached_report)
+                    st.success(f"⚡ 命中報告快取 ({model_name})，已直接載入先前生成的報告")
+                    if stream:
+                        # 串流模式下結果頁不再預覽，需在此顯示快取內容
+                        st.subheader("📄 生成的報告")
+                        st.markdown(cached_report)
+                    return model_name
+                MetricsRecorder.record("report_cache", model=model_name, hit=False)
+            
+            if not AIService.call_gemini_api(final_prompt, api_key, report_output_filename, model_name, stream=stream, estimated_tokens=estimated_tokens):
+                return False
             
-            return AIService.call_gemini_api(final_prompt, api_key, report_output_filename, model_name)
+            try:
+                with open(report_output_filename, "r", encoding="utf-8") as f:
+                    report_cache.put(transcript_text, prompt_template, model_name, f.read())
+            except (OSError, sqlite3.Error) as e:
+                st.warning(f"⚠️ 無法寫入報告快取: {e}")
+            return model_name
                 
         except Exception as e:
             st.error(f"❌ AI API 呼叫失敗: {e}")
             return False
+    
+    @staticmethod
+    def refine_with_experts(expert_prompts, output_paths, api_key, model_name="gemini-2.5-flash", force_regenerate=False, latency_target=None, compaction_steps=None, transcript_text=None):
+        """將同一份逐字稿平行交由多位專家分析，回傳 {專家名稱: 實際使用的模型，失敗時為 False}"""
+        st.write(f"🤖 開始多專家平行分析（共 {len(expert_prompts)} 位專家）...")
+        results = {name: False for name in expert_prompts}
+        
+        if not api_key:
+            st.error("❌ 請提供 API Key。")
+            return results
+        
+        # 逐字稿只讀取一次，由所有專家共用 (未提供時讀取臨時逐字稿)
+        if transcript_text is None:
+            try:
+                with open(TRANSCRIPT_FILENAME, "r", encoding="utf-8") as f:
+                    transcript_text = f.read()
+            except OSError as e:
+                st.error(f"❌ 無法讀取逐字稿: {e}")
+                return results
+        
+        if not transcript_text.strip():
+            st.error("❌ 逐字稿為空，無法產生報告。")
+            return results
+        
+        if compaction_steps:
+            transcript_text = AIService.compact_transcript(transcript_text, compaction_steps)
+        
+        final_prompts = {
+            name: AIService.build_final_prompt(prompt_template, transcript_text)
+            for name, prompt_template in expert_prompts.items()
+        }
+        estimated_tokens = {name: TokenEstimator.estimate(prompt) for name, prompt in final_prompts.items()}
+        st.info(f"📏 預估 Prompt 長度: 最多 {max(estimated_tokens.values()):,} tokens")
+        # 自動選擇時依最長的 Prompt 決定模型，確保所有專家都在延遲目標內
+        model_name = AIService._resolve_model(model_name, max(estimated_tokens.values()), latency_target)
+        
+        report_cache = ReportCache()
+        pending_prompts = {}
+        for name, prompt_template in expert_prompts.items():
+            cached_report = None if force_regenerate else report_cache.get(transcript_text, prompt_template, model_name)
+            if cached_report is not None:
+                with open(output_paths[name], "w", encoding="utf-8") as f:
+                    f.write(cached_report)
+                results[name] = model_name
+                st.success(f"⚡ {name}: 命中報告快取")
+            else:
+                pending_prompts[name] = final_prompts[name]
+        
+        start_time = time.time()
+        call_seconds = {}
+        
+        def timed_generate(name):
+            call_start = time.time()
+            report_text = AIService.generate_report_text(pending_prompts[name], api_key, model_name, estimated_tokens[name])
+            return report_text, time.time() - call_start
+        
+        if pending_prompts:
+            progress_bar = st.progress(0)
+            max_workers = min(EXPERT_FANOUT_MAX_WORKERS, len(pending_prompts))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(timed_generate, name): name
+                    for name in pending_prompts
+                }
+                # 背景執行緒只負責 API 呼叫，介面更新統一在主執行緒進行
+                for done_count, future in enumerate(as_completed(futures), 1):
+                    name = futures[future]
+                    try:
+                        report_text, seconds = future.result()
+                        with open(output_paths[name], "w", encoding="utf-8") as f:
+                            f.write(report_text)
+                        report_cache.put(transcript_text, expert_prompts[name], model_name, report_text)
+                        call_seconds[name] = seconds
+                        results[name] = model_name
+                        st.success(f"✅ {name} 報告完成（用時 {seconds:.1f} 秒）")
+                    except Exception as e:
+                        st.error(f"❌ {name} 報告生成失敗: {e}")
+                    progress_bar.progress(done_count / len(pending_prompts))
+        
+        wall_time = time.time() - start_time
+        MetricsRecorder.record(
+            "expert_fanout", model=model_name, experts=len(expert_prompts),
+            cache_hits=len(expert_prompts) - len(pending_prompts),
+            wall_seconds=round(wall_time, 3),
+            slowest_call_seconds=round(max(call_seconds.values()), 3) if call_seconds else 0.0
+        )
+        if pending_prompts:
+            st.info(f"⏱️ 多專家分析總用時: {wall_time:.1f} 秒")
+        return results
+    
+    @staticmethod
+    def refine_by_sections(sections, report_output_filename, api_key, prompt_template, model_name="gemini-2.5-flash",
+                           stream=False, force_regenerate=False, latency_target=None, compaction_steps=None, split_method="chapters"):
+        """將各章節平行交給 AI 分析，組合為附時間軸的分章節報告；各章節獨立重試，成功時回傳實際使用的模型"""
+        split_label = "影片章節" if split_method == "chapters" else "語音停頓"
+        st.write(f"📑 開始章節平行分析（依{split_label}切分為 {len(sections)} 段）...")
+        
+        if not api_key:
+            st.error("❌ 請提供 API Key。")
+            return False
+        
+        compactor = None
+        if compaction_steps:
+            try:
+                compactor = TranscriptCompactor(compaction_steps)
+            except ValueError as e:
+                st.warning(f"⚠️ 逐字稿精簡設定錯誤，改用原始逐字稿: {e}")
+        
+        section_prompts = []
+        for section in sections:
+            section_text = section["text"]
+            if compactor:
+                section_text, _ = compactor.compact(section_text)
+            time_range = f"{ChapterSplitter.format_timestamp(section['start'])}–{ChapterSplitter.format_timestamp(section['end'])}"
+            section_context = f"以下為影片章節「{section['title']}」（{time_range}）的逐字稿，請只針對本章節內容進行分析：\n{section_text}"
+            section_prompts.append((section_context, AIService.build_final_prompt(prompt_template, section_context)))
+        
+        estimated_tokens = [TokenEstimator.estimate(prompt) for _, prompt in section_prompts]
+        st.info(f"📏 預估 Prompt 長度: 每段最多 {max(estimated_tokens):,} tokens，合計 {sum(estimated_tokens):,} tokens")
+        model_name = AIService._resolve_model(model_name, max(estimated_tokens), latency_target)
+        
+        report_cache = ReportCache()
+        section_reports = {}
+        section_errors = {}
+        pending = []
+        for index, (section_context, _) in enumerate(section_prompts):
+            cached_report = None if force_regenerate else report_cache.get(section_context, prompt_template, model_name)
+            if cached_report is not None:
+                section_reports[index] = cached_report
+            else:
+                pending.append(index)
+        if section_reports:
+            st.success(f"⚡ {len(section_reports)} 個章節命中報告快取")
+        
+        start_time = time.time()
+        progress_bar = st.progress(0)
+        for retry_round in range(CHAPTER_RETRY_ROUNDS + 1):
+            if not pending:
+                break
+            if retry_round:
+                st.write(f"🔁 重試 {len(pending)} 個失敗的章節...")
+            
+            max_workers = min(CHAPTER_ANALYSIS_MAX_WORKERS, len(pending))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(
+                        AIService.generate_report_text, section_prompts[index][1], api_key, model_name, estimated_tokens[index]
+                    ): index
+                    for index in pending
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    section = sections[index]
+                    try:
+                        section_reports[index] = future.result()
+                        section_errors.pop(index, None)
+                        report_cache.put(section_prompts[index][0], prompt_template, model_name, section_reports[index])
+                        st.write(f"✅ [{ChapterSplitter.format_timestamp(section['start'])}] {section['title']} 分析完成")
+                    except Exception as e:
+                        section_errors[index] = str(e)
+                    progress_bar.progress(len(section_reports) / len(sections))
+            pending = sorted(section_errors)
+        
+        if not section_reports:
+            st.error("❌ 所有章節分析皆失敗")
+            return False
+        
+        # 組合分章節報告
+        report_lines = ["# 📑 分章節分析報告", "", "## 目錄", ""]
+        for section in sections:
+            report_lines.append(f"- [{ChapterSplitter.format_timestamp(section['start'])}] {section['title']}")
+        for index, section in enumerate(sections):
+            time_range = f"{ChapterSplitter.format_timestamp(section['start'])} - {ChapterSplitter.format_timestamp(section['end'])}"
+            report_lines.extend(["", "---", "", f"## ⏱️ [{time_range}] {section['title']}", ""])
+            if index in section_reports:
+                report_lines.append(section_reports[index].strip())
+            else:
+                report_lines.append(f"> ⚠️ 本章節分析失敗: {section_errors.get(index, '未知錯誤')}")
+        report_content = "\n".join(report_lines) + "\n"
+        
+        with open(report_output_filename, "w", encoding="utf-8") as f:
+            f.write(report_content)
+        
+        wall_time = time.time() - start_time
+        MetricsRecorder.record(
+            "chapter_analysis", model=model_name, sections=len(sections), split_method=split_method,
+            failed_sections=len(section_errors), wall_seconds=round(wall_time, 3)
+        )
+        if section_errors:
+            st.warning(f"⚠️ {len(section_errors)} 個章節分析失敗，其餘章節已完成")
+        st.success(f"✅ 分章節報告已生成並儲存為 {report_output_filename}（用時 {wall_time:.1f} 秒）")
+        
+        if stream:
+            # 串流模式下結果頁不再預覽，需在此顯示組合後的報告
+            st.subheader("📄 生成的報告")
+            st.markdown(report_content)
+        return model_name
+    
+    @staticmethod
+    def pack_batches(item_tokens, token_budget=BATCH_PACK_TOKEN_BUDGET, max_items=BATCH_PACK_MAX_ITEMS):
+        """
+        依 Token 預算將逐字稿分組 (First-Fit Decreasing)，回傳 (批次列表, 單獨處理列表)
+        
+        item_tokens 為 {名稱: Token 數}；超過預算或無法與其他逐字稿合併者單獨處理。
+        """
+        batches = []  # [已用 Token 數, [名稱]]
+        singles = []
+        for name, tokens in sorted(item_tokens.items(), key=lambda item: item[1], reverse=True):
+            if tokens > token_budget:
+                singles.append(name)
+                continue
+            for batch in batches:
+                if batch[0] + tokens <= token_budget and len(batch[1]) < max_items:
+                    batch[0] += tokens
+                    batch[1].append(name)
+                    break
+            else:
+                batches.append([tokens, [name]])
+        
+        packed = []
+        for _, names in batches:
+            if len(names) > 1:
+                packed.append(names)
+            else:
+                singles.extend(names)
+        return packed, singles
+    
+    @staticmethod
+    def build_batch_prompt(prompt_template, transcripts):
+        """將多份逐字稿以分隔標記組成單一 Prompt，transcripts 為 [(編號, 逐字稿)]"""
+        sections = "\n\n".join(
+            f"<<<VIDEO {item_id}>>>\n{text}\n<<<END VIDEO {item_id}>>>" for item_id, text in transcripts
+        )
+        instructions = (
+            f"以下共有 {len(transcripts)} 份彼此獨立的影片逐字稿，各以 <<<VIDEO 編號>>> 與 <<<END VIDEO 編號>>> 標記。"
+            "請依照分析指示分別為每一份逐字稿撰寫完整報告，報告之間不可互相引用內容；"
+            "以 JSON 陣列回傳，每份逐字稿一個元素，id 為逐字稿編號，report 為 Markdown 格式的報告。"
+        )
+        return instructions + "\n\n" + AIService.build_final_prompt(prompt_template, sections)
+    
+    @staticmethod
+    def parse_batch_response(response_text, item_ids):
+        """解析批次回應，回傳 {編號: 報告}；缺漏或空白的報告不列入，JSON 格式錯誤時拋出 ValueError"""
+        try:
+            entries = json.loads(response_text)
+        except ValueError as e:
+            raise ValueError(f"批次回應不是有效的 JSON: {e}")
+        if not isinstance(entries, list):
+            raise ValueError("批次回應格式錯誤，應為 JSON 陣列")
+        
+        reports = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            item_id = str(entry.get("id", "")).strip()
+            report = entry.get("report")
+            if item_id in item_ids and isinstance(report, str) and report.strip():
+                reports[item_id] = report
+        return reports
+    
+    @staticmethod
+    def generate_batch_reports(prompt, item_ids, api_key, model_name="gemini-2.5-flash", estimated_tokens=None):
+        """以結構化 JSON 輸出產生批次報告（不輸出介面訊息，可在背景執行緒中呼叫）"""
+        if estimated_tokens is None:
+            estimated_tokens = TokenEstimator.estimate(prompt)
+        generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=list[BatchReport]
+        )
+        response = get_scheduler().submit(
+            model_name,
+            lambda key: AIService._generate_content(model_name, key, prompt, generation_config=generation_config),
+            api_key=api_key,
+            estimated_tokens=estimated_tokens
+        )
+        if not response.parts:
+            block_reason = response.prompt_feedback.block_reason if response.prompt_feedback else "未知"
+            raise ValueError(f"Gemini 模型 ({model_name}) 未生成任何內容。原因: {block_reason}")
+        AIService._record_token_usage(response, prompt, model_name, estimated_tokens)
+        return AIService.parse_batch_response(response.text, item_ids)
+    
+    @staticmethod
+    def refine_batch(transcripts, output_paths, api_key, prompt_template, model_name="gemini-2.5-flash",
+                     force_regenerate=False, latency_target=None, compaction_steps=None):
+        """
+        將多份短逐字稿打包為少量批次請求，再拆回各自的報告，回傳 {名稱: 實際使用的模型，失敗時為 False}
+        
+        批次回應無法解析或缺少部分報告時，缺漏的逐字稿會改為逐份呼叫。
+        """
+        st.write(f"📦 開始批次分析（共 {len(transcripts)} 份逐字稿）...")
+        results = {name: False for name in transcripts}
+        
+        if not api_key:
+            st.error("❌ 請提供 API Key。")
+            return results
+        
+        if compaction_steps:
+            try:
+                compactor = TranscriptCompactor(compaction_steps)
+                transcripts = {name: compactor.compact(text)[0] for name, text in transcripts.items()}
+            except ValueError as e:
+                st.warning(f"⚠️ 逐字稿精簡設定錯誤，改用原始逐字稿: {e}")
+        
+        item_tokens = {name: TokenEstimator.estimate(text) for name, text in transcripts.items()}
+        template_tokens = TokenEstimator.estimate(AIService.build_batch_prompt(prompt_template, []))
+        token_budget = BATCH_PACK_TOKEN_BUDGET - template_tokens
+        st.info(f"📏 預估逐字稿長度: 合計 {sum(item_tokens.values()):,} tokens，每批上限 {token_budget:,} tokens")
+        model_name = AIService._resolve_model(
+            model_name, min(sum(item_tokens.values()), token_budget) + template_tokens, latency_target
+        )
+        
+        report_cache = ReportCache()
+        pending = {}
+        for name, text in transcripts.items():
+            cached_report = None if force_regenerate else report_cache.get(text, prompt_template, model_name)
+            if cached_report is not None:
+                with open(output_paths[name], "w", encoding="utf-8") as f:
+                    f.write(cached_report)
+                results[name] = model_name
+            else:
+                pending[name] = item_tokens[name]
+        cache_hits = len(transcripts) - len(pending)
+        if cache_hits:
+            st.success(f"⚡ {cache_hits} 份逐字稿命中報告快取")
+        
+        batches, singles = AIService.pack_batches(pending, token_budget)
+        if batches:
+            st.info(f"📦 {sum(len(names) for names in batches)} 份逐字稿打包為 {len(batches)} 個批次請求，{len(singles)} 份單獨處理")
+        
+        def run_batch(names):
+            ids = {str(index): name for index, name in enumerate(names, 1)}
+            prompt = AIService.build_batch_prompt(prompt_template, [(item_id, transcripts[name]) for item_id, name in ids.items()])
+            reports = AIService.generate_batch_reports(prompt, list(ids), api_key, model_name)
+            return {ids[item_id]: report for item_id, report in reports.items()}
+        
+        def run_single(name):
+            prompt = AIService.build_final_prompt(prompt_template, transcripts[name])
+            return {name: AIService.generate_report_text(prompt, api_key, model_name)}
+        
+        def save_report(name, report_text):
+            with open(output_paths[name], "w", encoding="utf-8") as f:
+                f.write(report_text)
+            report_cache.put(transcripts[name], prompt_template, model_name, report_text)
+            results[name] = model_name
+        
+        start_time = time.time()
+        fallbacks = []
+        requests = 0
+        finished = 0
+        if pending:
+            progress_bar = st.progress(0)
+            with ThreadPoolExecutor(max_workers=BATCH_PACK_MAX_WORKERS) as executor:
+                # 第一輪：批次請求與單獨處理的逐字稿同時送出
+                futures = {executor.submit(run_batch, names): names for names in batches}
+                futures.update({executor.submit(run_single, name): [name] for name in singles})
+                requests += len(futures)
+                for future in as_completed(futures):
+                    names = futures[future]
+                    try:
+                        reports = future.result()
+                    except Exception as e:
+                        reports = {}
+                        if len(names) > 1:
+                            st.warning(f"⚠️ 批次請求失敗，{len(names)} 份逐字稿改為逐份呼叫: {e}")
+                        else:
+                            st.error(f"❌ {names[0]} 報告生成失敗: {e}")
+                    for name in names:
+                        if name in reports:
+                            save_report(name, reports[name])
+                        elif len(names) > 1:
+                            fallbacks.append(name)
+                    finished += sum(1 for name in names if name not in fallbacks)
+                    progress_bar.progress(finished / len(pending))
+                
+                if fallbacks:
+                    # 第二輪：批次回應缺漏的逐字稿改為逐份呼叫
+                    st.write(f"🔁 {len(fallbacks)} 份逐字稿改為逐份呼叫...")
+                    futures = {executor.submit(run_single, name): name for name in fallbacks}
+                    requests += len(futures)
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        try:
+                            save_report(name, future.result()[name])
+                        except Exception as e:
+                            st.error(f"❌ {name} 報告生成失敗: {e}")
+                        finished += 1
+                        progress_bar.progress(finished / len(pending))
+        
+        wall_time = time.time() - start_time
+        MetricsRecorder.record(
+            "batch_pack", model=model_name, items=len(transcripts), cache_hits=cache_hits,
+            batches=len(batches), singles=len(singles), fallbacks=len(fallbacks),
+            requests=requests, wall_seconds=round(wall_time, 3)
+        )
+        if pending:
+            st.info(f"⏱️ 批次分析完成：{len(pending)} 份逐字稿共 {requests} 次請求，用時 {wall_time:.1f} 秒")
+        return results
@@ -0,0 +1,113 @@
+"""
+影片批次處理的執行模組
+提供 BatchPipeline 各階段實際的工作：yt-dlp 取得資訊與下載、faster-whisper 轉錄、Gemini 分析與保存結果
+所有方法都不輸出介面訊息，可在背景執行緒中呼叫
+"""
+import os
+from src.core.config import AUDIO_FILENAME, SUBTITLE_FILENAME, SEGMENTS_FILENAME
+from src.services.video_processor import VideoProcessor
+from src.services.ai_service import AIService
+from src.services.gemini_scheduler import get_scheduler
+from src.utils.file_manager import FileManager
+from src.utils.transcript_store import TranscriptStore
+from src.utils.single_flight import transcript_key
+
+
+class VideoBatchBackend:
+    """批次處理各階段的實際執行方式"""
+
+    def __init__(self, save_path, cookie_file=None, whisper_model="base", language="zh", api_key=None,
+                 prompt_template=None, expert_name=None, ai_model="gemini-2.5-flash", force_regenerate=False,
+                 latency_target=None, compaction_steps=None, transcriber=None):
+        self.save_path = save_path
+        self.cookie_file = cookie_file
+        self.whisper_model = whisper_model
+        self.language = language
+        self.api_key = api_key
+        self.prompt_template = prompt_template
+        self.expert_name = expert_name
+        self.ai_model = ai_model
+        self.force_regenerate = force_regenerate
+        self.latency_target = latency_target
+        self.compaction_steps = compaction_steps
+        # 轉錄方式 (音訊路徑, 模型, 語言) -> {"text", "segments", "language"[, "model"]}，預設在本機轉錄
+        self.transcriber = transcriber or VideoProcessor.run_transcription
+        # 記憶體不足時可能改用較小的模型，保存時記錄各影片實際使用的模型
+        self._transcribed_models = {}
+        # 未提供 API Key (介面輸入或環境變數 Key 池) 或 Prompt 時只下載並保存逐字稿
+        self.can_analyze = bool(prompt_template and get_scheduler().resolve_api_keys(api_key))
+
+    def expand_urls(self, source_text):
+        """將多行網址 (影片、播放清單或頻道) 展開為影片網址列表"""
+        return VideoProcessor.expand_urls(source_text, self.cookie_file)
+
+    def probe(self, url):
+        info = VideoProcessor.probe_video(url, self.cookie_file)
+        if info is None:
+            raise RuntimeError("無法取得影片資訊（網址錯誤、私人影片或需要 Cookie）")
+        return info
+
+    def find_existing(self, item):
+        """同一部影片已有逐字稿時回傳目錄記錄"""
+        if not item["video_id"]:
+            return None
+        return TranscriptStore().find_by_video_id(item["video_id"])
+
+    def transcript_key(self, item):
+        """同時處理同一部影片時用來合併的 key (影片 ID 與轉錄參數)"""
+        return transcript_key(item["video_id"], self.whisper_model, self.language)
+
+    def fetch_captions(self, item, work_dir):
+        """下載字幕並轉為 (文字, 時間軸)，沒有字幕時回傳 None"""
+        subtitle_path = os.path.join(work_dir, SUBTITLE_FILENAME)
+        if not VideoProcessor.fetch_subtitles(item["url"], self.cookie_file, subtitle_path):
+            return None
+        transcript_text, segments = FileManager.parse_vtt(subtitle_path)
+        return (transcript_text, segments) if transcript_text.strip() else None
+
+    def fetch_audio(self, item, work_dir):
+        audio_path = os.path.join(work_dir, AUDIO_FILENAME)
+        error = VideoProcessor.fetch_audio(item["url"], self.cookie_file, audio_path)
+        if error:
+            # yt-dlp 的錯誤訊息可能很長，只保留最後一行
+            raise RuntimeError(f"音訊下載失敗: {error.strip().splitlines()[-1][:300]}")
+        return audio_path
+
+    def transcribe(self, item, audio_path):
+        result = self.transcriber(audio_path, self.whisper_model, self.language)
+        if not result["text"]:
+            raise RuntimeError("語音轉文字沒有產生任何內容")
+        self._transcribed_models[item["index"]] = result.get("model") or self.whisper_model
+        return result["text"], result["segments"], result["language"]
+
+    def save(self, item, transcript_text, segments, source, work_dir, language=None):
+        segments_path = os.path.join(work_dir, SEGMENTS_FILENAME)
+        FileManager.write_segments(segments, segments_path)
+        return TranscriptStore().save(
+            transcript_text, item["title"], video_id=item["video_id"], duration=item["duration"],
+            language=language, model=self._transcribed_models.pop(item["index"], self.whisper_model) if source == "asr" else None,
+            source=source,
+            segments_path=segments_path
+        )
+
+    def read_transcript(self, item):
+        return TranscriptStore().read_text(item["record"]["filename"])
+
+    def analyze(self, item):
+        """產生報告、寫入報告檔並存入報告歷史，回傳 {"path", "model", "cache_hit", "compaction_error"}"""
+        store = TranscriptStore()
+        record = item["record"]
+        transcript_text = store.read_text(record["filename"])
+        if not transcript_text.strip():
+            raise ValueError("逐字稿為空，無法產生報告")
+
+        report_text, model_name, cache_hit, compaction_error = AIService.generate_report(
+            transcript_text, self.prompt_template, self.api_key, self.ai_model,
+            force_regenerate=self.force_regenerate, latency_target=self.latency_target,
+            compaction_steps=self.compaction_steps
+        )
+        report_path = FileManager.report_path(self.save_path, item["title"])
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(report_text)
+        store.add_report(record["id"], report_text, expert=self.expert_name, model=model_name)
+        return {"path": report_path, "model": model_name, "cache_hit": cache_hit, "compaction_error": compaction_error}
@@ -0,0 +1,344 @@
+"""
+Gemini 呼叫排程模組
+依模型的每分鐘請求數 / Token 數配額排程 API 呼叫，
+並提供指數退避重試、斷路器與多組 API Key 輪替
+"""
+import os
+import time
+import random
+import threading
+from collections import deque
+from src.core.config import (
+    GEMINI_RATE_LIMITS, GEMINI_DEFAULT_RATE_LIMIT, GEMINI_MAX_RETRIES,
+    GEMINI_BACKOFF_BASE_SECONDS, GEMINI_BACKOFF_MAX_SECONDS,
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD, GEMINI_CIRCUIT_RESET_SECONDS, GEMINI_API_KEYS_ENV
+)
+from src.utils.metrics import MetricsRecorder
+
+# 可重試的 HTTP 狀態碼與例外類型 (google.api_core 例外以類別名稱判斷，避免硬性依賴)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTION_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "BadGateway", "GatewayTimeout"
+}
+THROTTLED_EXCEPTION_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，暫停呼叫指定模型"""
+
+
+class RateLimitWindow:
+    """單一模型與 API Key 的一分鐘滑動視窗配額"""
+
+    def __init__(self, rpm, tpm, window_seconds=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_seconds = window_seconds
+        self.events = deque()  # (時間, token 數)
+        self.cooldown_until = 0.0
+
+    def _prune(self, now):
+        while self.events and now - self.events[0][0] >= self.window_seconds:
+            self.events.popleft()
+
+    def wait_time(self, tokens, now):
+        """計算至少需等待多久才能送出本次請求"""
+        self._prune(now)
+        wait = max(0.0, self.cooldown_until - now)
+
+        if self.rpm and len(self.events) >= self.rpm:
+            wait = max(wait, self.events[0][0] + self.window_seconds - now)
+
+        if self.tpm and self.events:
+            used = sum(count for _, count in self.events)
+            excess = used + tokens - self.tpm
+            # 單次請求超過整體配額時只能等視窗清空後送出
+            for timestamp, count in self.events:
+                if excess <= 0:
+                    break
+                excess -= count
+                wait = max(wait, timestamp + self.window_seconds - now)
+
+        return wait
+
+    def consume(self, tokens, now):
+        self.events.append((now, tokens))
+
+
+class CircuitBreaker:
+    """連續失敗達門檻時開啟，冷卻後以半開狀態放行單一呼叫試探"""
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.open_count = 0
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                if now - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = "half_open"
+            elif self.state == "half_open" and now - self.probe_started_at < self.reset_seconds:
+                # 試探中的呼叫尚未回報結果 (逾時未回報時再放行下一個)
+                return False
+            if self.state == "half_open":
+                self.probe_started_at = now
+            return True
+
+    def release_probe(self):
+        """試探呼叫無法判斷服務狀態 (節流或請求本身錯誤) 時讓出試探資格"""
+        with self._lock:
+            self.probe_started_at = 0.0
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.open_count += 1
+
+
+class GeminiScheduler:
+    """Gemini API 呼叫排程器"""
+
+    def __init__(self, rate_limits=None, max_retries=GEMINI_MAX_RETRIES,
+                 backoff_base=GEMINI_BACKOFF_BASE_SECONDS, backoff_max=GEMINI_BACKOFF_MAX_SECONDS,
+                 failure_threshold=GEMINI_CIRCUIT_FAILURE_THRESHOLD, reset_seconds=GEMINI_CIRCUIT_RESET_SECONDS,
+                 window_seconds=60.0):
+        self.rate_limits = rate_limits if rate_limits is not None else GEMINI_RATE_LIMITS
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.window_seconds = window_seconds
+
+        self._condition = threading.Condition()
+        self._windows = {}
+        self._breakers = {}
+        self._cursors = {}
+        self._metrics = {
+            "requests": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "throttled": 0,
+            "circuit_rejections": 0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    @staticmethod
+    def resolve_api_keys(api_key=None):
+        """合併介面輸入的 API Key 與環境變數中的 Key 池"""
+        keys = []
+        if api_key:
+            keys.append(api_key)
+        for key in os.getenv(GEMINI_API_KEYS_ENV, "").split(","):
+            key = key.strip()
+            if key and key not in keys:
+                keys.append(key)
+        return keys
+
+    @staticmethod
+    def status_code_of(error):
+        """從各種 HTTP / SDK 例外取出狀態碼"""
+        for source in (error, getattr(error, "response", None)):
+            if source is None:
+                continue
+            for attr in ("code", "status_code", "status"):
+                value = getattr(source, attr, None)
+                if isinstance(value, int):
+                    return value
+        return None
+
+    @staticmethod
+    def is_retryable(error):
+        """判斷錯誤是否屬於暫時性（節流或伺服器端）錯誤"""
+        if GeminiScheduler.status_code_of(error) in RETRYABLE_STATUS_CODES:
+            return True
+        if type(error).__name__ in RETRYABLE_EXCEPTION_NAMES:
+            return True
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    @staticmethod
+    def is_throttled(error):
+        """判斷錯誤是否為單一 API Key 被節流 (由 Key 冷卻處理，不計入斷路器)"""
+        return GeminiScheduler.status_code_of(error) == 429 or type(error).__name__ in THROTTLED_EXCEPTION_NAMES
+
+    @staticmethod
+    def _retry_after(error):
+        """讀取伺服器回傳的 Retry-After 秒數"""
+        headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+        if not headers:
+            return None
+        try:
+            value = headers.get("Retry-After")
+            return float(value) if value is not None else None
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """指數退避加上完整抖動 (full jitter)"""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _window(self, model_name, api_key):
+        key = (model_name, api_key)
+        if key not in self._windows:
+            limits = self.rate_limits.get(model_name, GEMINI_DEFAULT_RATE_LIMIT)
+            self._windows[key] = RateLimitWindow(limits.get("rpm"), limits.get("tpm"), self.window_seconds)
+        return self._windows[key]
+
+    def _breaker(self, model_name):
+        with self._condition:
+            if model_name not in self._breakers:
+                self._breakers[model_name] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            return self._breakers[model_name]
+
+    def _acquire(self, model_name, api_keys, tokens):
+        """排隊等待配額，回傳選用的 API Key 與等待秒數"""
+        enqueued_at = time.monotonic()
+        with self._condition:
+            self._metrics["queue_depth"] += 1
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._metrics["queue_depth"])
+            try:
+                while True:
+                    now = time.monotonic()
+                    start = self._cursors.get(model_name, 0)
+                    best_index, best_wait = None, None
+                    # 從游標位置開始輪詢，選出最快可用的 API Key
+                    for offset in range(len(api_keys)):
+                        index = (start + offset) % len(api_keys)
+                        wait = self._window(model_name, api_keys[index]).wait_time(tokens, now)
+                        if best_wait is None or wait < best_wait:
+                            best_index, best_wait = index, wait
+                        if wait <= 0:
+                            break
+
+                    if best_wait <= 0:
+                        self._window(model_name, api_keys[best_index]).consume(tokens, now)
+                        self._cursors[model_name] = (best_index + 1) % len(api_keys)
+                        waited = now - enqueued_at
+                        self._metrics["total_wait_seconds"] += waited
+                        self._metrics["max_wait_seconds"] = max(self._metrics["max_wait_seconds"], waited)
+                        return api_keys[best_index], waited
+
+                    self._condition.wait(timeout=best_wait)
+            finally:
+                self._metrics["queue_depth"] -= 1
+                self._condition.notify_all()
+
+    def submit(self, model_name, request_fn, api_key=None, estimated_tokens=0):
+        """
+        在配額內執行 request_fn(api_key)，遇到暫時性錯誤時自動重試
+
+        request_fn 需接受 API Key 參數並回傳呼叫結果；非暫時性錯誤會直接拋出。
+        """
+        api_keys = self.resolve_api_keys(api_key)
+        if not api_keys:
+            raise ValueError("未提供任何 Gemini API Key")
+
+        breaker = self._breaker(model_name)
+        with self._condition:
+            self._metrics["requests"] += 1
+
+        total_wait = 0.0
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                with self._condition:
+                    self._metrics["circuit_rejections"] += 1
+                raise CircuitOpenError(f"Gemini 模型 {model_name} 連續呼叫失敗，暫停呼叫 {self.reset_seconds:.0f} 秒")
+
+            selected_key, waited = self._acquire(model_name, api_keys, estimated_tokens)
+            total_wait += waited
+            try:
+                result = request_fn(selected_key)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    breaker.release_probe()
+                    with self._condition:
+                        self._metrics["failures"] += 1
+                    raise
+
+                last_error = e
+                throttled = self.is_throttled(e)
+                # 節流只影響單一 Key，斷路器只計入伺服器錯誤與逾時
+                if throttled:
+                    breaker.release_probe()
+                else:
+                    breaker.record_failure()
+                delay = self._backoff_delay(attempt, self._retry_after(e))
+                with self._condition:
+                    self._metrics["retries"] += 1
+                    if throttled:
+                        self._metrics["throttled"] += 1
+                        # 被節流的 Key 暫停使用，若有其他 Key 可立即改用
+                        self._window(model_name, selected_key).cooldown_until = time.monotonic() + delay
+                        delay = 0.0 if len(api_keys) > 1 else delay
+                    self._condition.notify_all()
+
+                if attempt < self.max_retries and delay > 0:
+                    time.sleep(delay)
+                continue
+
+            breaker.record_success()
+            with self._condition:
+                self._metrics["successes"] += 1
+            MetricsRecorder.record(
+                "gemini_schedule", model=model_name, attempts=attempt + 1,
+                queue_wait_seconds=round(total_wait, 3), estimated_tokens=estimated_tokens
+            )
+            return result
+
+        with self._condition:
+            self._metrics["failures"] += 1
+        MetricsRecorder.record(
+            "gemini_schedule", model=model_name, attempts=self.max_retries + 1,
+            queue_wait_seconds=round(total_wait, 3), estimated_tokens=estimated_tokens,
+            error=str(last_error)
+        )
+        raise last_error
+
+    def snapshot(self):
+        """取得排程佇列與重試統計"""
+        with self._condition:
+            metrics = dict(self._metrics)
+            breakers = {name: breaker.state for name, breaker in self._breakers.items()}
+        granted = metrics["successes"] + metrics["failures"]
+        metrics["avg_wait_seconds"] = metrics["total_wait_seconds"] / granted if granted else 0.0
+        metrics["circuit_states"] = breakers
+        return metrics
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """取得共用的 Gemini 排程器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GeminiScheduler()
+        return _scheduler
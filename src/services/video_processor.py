@@ -3,20 +3,35 @@
 處理 YouTube 影片下載、字幕處理、音訊轉錄等功能
 使用 faster-whisper 進行 VRAM 優化
 """
+import gc
 import os
-import subprocess
+import re
+import json
+import time
 import tempfile
+import threading
 import streamlit as st
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
 from src.core.config import (
     YT_DLP_PATH, FFMPEG_PATH, AUDIO_FILENAME, SUBTITLE_FILENAME, 
-    TRANSCRIPT_FILENAME, SUBTITLE_LANGUAGES, SUPPORTED_LANGUAGES, LANGUAGE_OPTIONS
+    TRANSCRIPT_FILENAME, SUBTITLE_LANGUAGES, SUPPORTED_LANGUAGES, LANGUAGE_OPTIONS, NEAR_DUPLICATE_HEAD_SECONDS,
+    FINGERPRINT_SAMPLE_RATE, BATCH_MAX_ITEMS
 )
+from src.utils.file_manager import FileManager
+from src.utils.audio_fingerprint import AudioFingerprinter
+from src.utils.cancellation import current_token
+from src.utils.download_tuner import get_download_tuner
+from src.utils.memory_admission import get_memory_admission, audio_seconds_of, track_peak
+from src.utils.process_runner import run_process, ProcessWatchdogError
 
 
 class VideoProcessor:
     """影片處理器"""
     
+    # 已載入的 faster-whisper 模型 (依模型名稱)，批次處理時重複使用
+    _whisper_models = {}
+    _model_lock = threading.Lock()
+    
     @staticmethod
     def check_device_availability():
         """檢查系統可用的運算設備"""
@@ -42,18 +57,11 @@ class VideoProcessor:
             env['PYTHONIOENCODING'] = 'utf-8'
             env['PYTHONUTF8'] = '1'
             
-            process = subprocess.Popen(
-                command, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                env=env
-            )
-            stdout, stderr = process.communicate()
+            process = run_process(command, "probe", env=env)
             
             title = None
             if process.returncode == 0:
-                title = VideoProcessor._decode_title(stdout)
+                title = VideoProcessor._decode_title(process.stdout)
             
             # 如果第一種方法失敗，嘗試第二種方法：--print
             if not title or title == "unknown_video":
@@ -61,17 +69,10 @@ class VideoProcessor:
                 if cookie_file:
                     command_alt.extend(["--cookies", cookie_file])
                 
-                process_alt = subprocess.Popen(
-                    command_alt, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.PIPE, 
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                    env=env
-                )
-                stdout_alt, stderr_alt = process_alt.communicate()
+                process_alt = run_process(command_alt, "probe", env=env)
                 
                 if process_alt.returncode == 0:
-                    title = VideoProcessor._decode_title(stdout_alt)
+                    title = VideoProcessor._decode_title(process_alt.stdout)
             
             return title if title else "unknown_video"
             
@@ -99,8 +100,15 @@ class VideoProcessor:
                 # 如果所有編碼都失敗，使用 errors='replace'
                 title = stdout_bytes.decode('utf-8', errors='replace').strip()
             
-            # 清理標題中不適合檔案名稱的字元
-            import re
+            return VideoProcessor._clean_title(title)
+            
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _clean_title(title):
+        """清理標題中不適合檔案名稱的字元"""
+        try:
             # 先移除不可見字元和控制字元
             title = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', title)
             # 替換檔案系統不允許的字元
@@ -119,6 +127,113 @@ class VideoProcessor:
         except Exception:
             return None
     
+    @staticmethod
+    def probe_video(youtube_url, cookie_file=None):
+        """以單次 yt-dlp 呼叫取得影片中繼資料（標題、長度、章節與字幕資訊），失敗時回傳 None"""
+        command = [YT_DLP_PATH, "--dump-single-json", "--skip-download", "--no-warnings", youtube_url]
+        if cookie_file:
+            command.extend(["--cookies", cookie_file])
+        
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+        env['PYTHONUTF8'] = '1'
+        
+        try:
+            result = run_process(command, "probe", env=env)
+            if result.returncode != 0:
+                return None
+            info = json.loads(result.stdout.decode('utf-8', errors='replace'))
+        except (OSError, ValueError, ProcessWatchdogError) as e:
+            st.warning(f"⚠️ 獲取影片資訊時發生錯誤: {e}")
+            return None
+        
+        chapters = []
+        for index, chapter in enumerate(info.get("chapters") or [], 1):
+            chapters.append({
+                "title": chapter.get("title") or f"章節 {index}",
+                "start": float(chapter.get("start_time") or 0),
+                "end": float(chapter.get("end_time") or 0)
+            })
+        
+        return {
+            "id": info.get("id"),
+            "title": VideoProcessor._clean_title(info.get("title") or "") or "unknown_video",
+            "duration": info.get("duration"),
+            "chapters": chapters,
+            "has_subtitles": bool(info.get("subtitles")),
+            "has_automatic_captions": bool(info.get("automatic_captions")),
+            "webpage_url": info.get("webpage_url") or youtube_url
+        }
+    
+    @staticmethod
+    def expand_urls(source_text, cookie_file=None, max_items=BATCH_MAX_ITEMS):
+        """
+        將多行網址 (可混合影片、播放清單與頻道) 展開為影片網址列表，依出現順序去除重複
+        
+        每個網址以 yt-dlp --flat-playlist 探查一次，只讀取清單而不解析各影片，數百部影片的清單也只需數秒；
+        頻道會先列出分頁 (影片、Shorts 等) 再逐一展開。無法探查的網址原樣保留，由後續階段回報錯誤。
+        """
+        video_urls = []
+        seen = set()
+        
+        def add(url, video_id=None):
+            key = video_id or url
+            if key not in seen and len(video_urls) < max_items:
+                seen.add(key)
+                video_urls.append(url)
+        
+        def expand(url, depth):
+            info = VideoProcessor._probe_flat(url, cookie_file, max_items)
+            if info is None:
+                add(url)
+                return
+            if info.get("_type") not in ("playlist", "multi_video"):
+                add(info.get("webpage_url") or url, info.get("id"))
+                return
+            for entry in info.get("entries") or []:
+                if len(video_urls) >= max_items:
+                    return
+                if not entry:
+                    continue
+                entry_url = entry.get("url") or entry.get("webpage_url")
+                # 頻道的分頁或清單中的子清單需再展開一層
+                if entry.get("_type") == "playlist" or entry.get("ie_key") == "YoutubeTab":
+                    if depth < 2 and entry_url:
+                        expand(entry_url, depth + 1)
+                    continue
+                if entry.get("id") and (not entry_url or not entry_url.startswith("http")):
+                    entry_url = f"https://www.youtube.com/watch?v={entry['id']}"
+                if entry_url:
+                    add(entry_url, entry.get("id"))
+        
+        for line in source_text.splitlines():
+            url = line.strip()
+            if url and not url.startswith("#"):
+                expand(url, 0)
+        return video_urls
+    
+    @staticmethod
+    def _probe_flat(url, cookie_file=None, max_items=BATCH_MAX_ITEMS):
+        """以 --flat-playlist 取得網址的清單資訊 (不解析各影片)，失敗時回傳 None"""
+        command = [
+            YT_DLP_PATH, "--flat-playlist", "--dump-single-json", "--no-warnings",
+            "--playlist-end", str(max_items), url
+        ]
+        if cookie_file:
+            command.extend(["--cookies", cookie_file])
+        
+        env = os.environ.copy()
+        env['PYTHONIOENCODING'] = 'utf-8'
+        env['PYTHONUTF8'] = '1'
+        
+        try:
+            result = run_process(command, "probe", env=env)
+            if result.returncode != 0:
+                return None
+            return json.loads(result.stdout.decode('utf-8', errors='replace'))
+        except (OSError, ValueError, ProcessWatchdogError):
+            return None
+    
     @staticmethod
     def check_and_download_subtitles(youtube_url, cookie_file=None):
         """檢查並下載 CC 字幕"""
@@ -129,14 +244,13 @@ class VideoProcessor:
             check_command.extend(["--cookies", cookie_file])
         
         try:
-            process = subprocess.Popen(check_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
-            stdout, stderr = process.communicate()
+            process = run_process(check_command, "probe")
             
             if process.returncode != 0:
                 st.write("⚠️ 無法獲取字幕，使用語音轉文字")
                 return False
             
-            subtitle_info = stdout.decode('utf-8', errors='ignore')
+            subtitle_info = process.stdout.decode('utf-8', errors='ignore')
             
             # 簡化檢查邏輯：只需要確認有字幕存在
             if not any(marker in subtitle_info for marker in ["Available subtitles", "Available automatic captions"]):
@@ -153,127 +267,165 @@ class VideoProcessor:
     @staticmethod
     def _download_subtitles(youtube_url, cookie_file):
         """下載字幕的內部方法 (多執行緒最佳化)"""
+        source = VideoProcessor.fetch_subtitles(youtube_url, cookie_file)
+        if source:
+            st.write(f"✅ 成功下載 {source}")
+            return True
+        st.write("ℹ️ 無可用字幕，將使用語音轉文字")
+        return False
+    
+    @staticmethod
+    def fetch_subtitles(youtube_url, cookie_file=None, subtitle_path=SUBTITLE_FILENAME):
+        """
+        下載字幕並存為 subtitle_path (不輸出介面訊息，可在背景執行緒中呼叫)
+        
+        依 SUBTITLE_LANGUAGES 順序嘗試人工字幕，再嘗試自動字幕；回傳字幕來源說明，沒有字幕時回傳 None。
+        暫存檔放在 subtitle_path 所在的資料夾，各工作使用不同資料夾時不會互相覆寫。
+        """
+        work_dir = os.path.dirname(subtitle_path) or "."
+        output_template = os.path.join(work_dir, "_temp_subtitle")
+        common_options = [
+            "--skip-download", "--sub-format", "vtt",
+            "-o", output_template,
+            # 多執行緒加速設定 (字幕檔案較小，使用適中參數)
+            "--concurrent-fragments", "8",
+            "--fragment-retries", "5",
+            "--retries", "3",
+            "--socket-timeout", "20",
+            "--no-warnings"
+        ]
+        cookie_options = ["--cookies", cookie_file] if cookie_file else []
+        
         # 嘗試下載字幕
         for lang in SUBTITLE_LANGUAGES:
-            download_command = [
-                YT_DLP_PATH, "--write-sub", "--sub-lang", lang, 
-                "--skip-download", "--sub-format", "vtt",
-                "-o", "_temp_subtitle", 
-                # 多執行緒加速設定 (字幕檔案較小，使用適中參數)
-                "--concurrent-fragments", "8",
-                "--fragment-retries", "5",
-                "--retries", "3",
-                "--socket-timeout", "20",
-                "--no-warnings",
-                youtube_url
-            ]
-            if cookie_file:
-                download_command.extend(["--cookies", cookie_file])
-            
+            download_command = [YT_DLP_PATH, "--write-sub", "--sub-lang", lang] + common_options + [youtube_url] + cookie_options
             try:
-                subprocess.run(download_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
+                run_process(download_command, "captions")
                 
                 # 檢查下載的檔案
-                for subtitle_file in [f"_temp_subtitle.{lang}.vtt", "_temp_subtitle.vtt"]:
+                for subtitle_file in [f"{output_template}.{lang}.vtt", f"{output_template}.vtt"]:
                     if os.path.exists(subtitle_file) and os.path.getsize(subtitle_file) > 0:
-                        os.rename(subtitle_file, SUBTITLE_FILENAME)
-                        st.write(f"✅ 成功下載 {lang} 字幕")
-                        return True
+                        os.replace(subtitle_file, subtitle_path)
+                        return f"{lang} 字幕"
                         
             except Exception:
                 continue
         
         # 嘗試下載自動字幕
-        return VideoProcessor._download_auto_subtitles(youtube_url, cookie_file)
-    
-    @staticmethod
-    def _download_auto_subtitles(youtube_url, cookie_file):
-        """下載自動字幕 (多執行緒最佳化)"""
-        download_command = [
-            YT_DLP_PATH, "--write-auto-sub", "--skip-download", 
-            "--sub-format", "vtt", "-o", "_temp_subtitle",
-            # 多執行緒加速設定
-            "--concurrent-fragments", "8",
-            "--fragment-retries", "5", 
-            "--retries", "3",
-            "--socket-timeout", "20",
-            "--no-warnings",
-            youtube_url
-        ]
-        if cookie_file:
-            download_command.extend(["--cookies", cookie_file])
-        
+        download_command = [YT_DLP_PATH, "--write-auto-sub"] + common_options + [youtube_url] + cookie_options
         try:
-            subprocess.run(download_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
+            run_process(download_command, "captions")
             
             # 尋找並處理下載的檔案
-            for file in os.listdir('.'):
-                if file.startswith('_temp_subtitle') and file.endswith('.vtt') and os.path.getsize(file) > 0:
-                    os.rename(file, SUBTITLE_FILENAME)
-                    st.write("✅ 成功下載自動字幕")
-                    return True
+            for file in os.listdir(work_dir):
+                file_path = os.path.join(work_dir, file)
+                if file.startswith('_temp_subtitle') and file.endswith('.vtt') and os.path.getsize(file_path) > 0:
+                    os.replace(file_path, subtitle_path)
+                    return "自動字幕"
                     
         except Exception:
             pass
-        
-        st.write("ℹ️ 無可用字幕，將使用語音轉文字")
-        return False
+        return None
     
     @staticmethod
     def download_audio(youtube_url, cookie_file=None):
         """使用 yt-dlp 下載音訊"""
         st.write("🎵 步驟 2/6: 下載音訊...")
         
-        # 建立優化的下載命令
-        command = [
-            YT_DLP_PATH, 
-            "-x", "--audio-format", "mp3", 
-            "-o", AUDIO_FILENAME, 
-            # 多執行緒加速設定
-            "--concurrent-fragments", "16",    # 同時下載16個片段 (最大化)
-            "--fragment-retries", "10",        # 片段重試次數
-            "--retries", "5",                  # 整體重試次數
-            "--http-chunk-size", "10M",        # 10MB 區塊大小
-            "--buffer-size", "32K",            # 32KB 緩衝區 (加大)
-            # 網路優化
-            "--socket-timeout", "30",          # 30秒超時
-            "--throttled-rate", "100K",        # 最低速度限制 (避免掛起)
-            # 品質最佳化 (音訊用，速度優先)
-            "--format", "bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio",
-            # 跳過不必要的檢查以提升速度
-            "--no-check-certificate",
-            "--no-warnings",
-            youtube_url
-        ]
-        
-        # 檢查並添加 FFmpeg 路徑
         try:
-            subprocess.run([FFMPEG_PATH, "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW, check=True)
-            command.extend(["--ffmpeg-location", FFMPEG_PATH])
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass  # 使用 yt-dlp 內建功能
-        
-        if cookie_file:
-            command.extend(["--cookies", cookie_file])
-
-        try:
-            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
-            if result.returncode != 0:
-                # 如果高速模式失敗，嘗試降級到標準模式
-                st.write("⚠️ 高速模式失敗，切換到標準模式...")
-                fallback_command = [YT_DLP_PATH, "-x", "--audio-format", "mp3", "-o", AUDIO_FILENAME, youtube_url]
-                if cookie_file:
-                    fallback_command.extend(["--cookies", cookie_file])
-                result = subprocess.run(fallback_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=subprocess.CREATE_NO_WINDOW)
-                if result.returncode != 0:
-                    st.error(f"❌ 下載失敗: {result.stderr.decode('utf-8', errors='ignore')}")
-                    return False
+            error = VideoProcessor.fetch_audio(
+                youtube_url, cookie_file, on_fallback=lambda: st.write("⚠️ 高速模式失敗，切換到標準模式...")
+            )
+            if error:
+                st.error(f"❌ 下載失敗: {error}")
+                return False
             st.success(f"✅ 音訊下載完成")
             return True
         except Exception as e:
             st.error(f"❌ 下載錯誤: {e}")
             return False
     
+    @staticmethod
+    def fetch_audio(youtube_url, cookie_file=None, audio_path=AUDIO_FILENAME, on_fallback=None):
+        """
+        下載音訊並存為 audio_path (不輸出介面訊息，可在背景執行緒中呼叫)
+        
+        高速模式失敗時改用標準模式 (此時呼叫 on_fallback)；成功回傳 None，失敗回傳 yt-dlp 的錯誤訊息。
+        以 --newline 逐行輸出下載進度，看門狗據此判斷下載是否停滯。
+        高速模式的分段連線數與區塊大小依該網站最近的實測速度選擇 (見 DownloadTuner)，並記錄此次的速度。
+        """
+        # 檢查 FFmpeg 路徑
+        ffmpeg_options = []
+        try:
+            if run_process([FFMPEG_PATH, "-version"], "probe").returncode == 0:
+                ffmpeg_options = ["--ffmpeg-location", FFMPEG_PATH]
+        except (OSError, ProcessWatchdogError):
+            pass  # 使用 yt-dlp 內建功能
+        cookie_options = ["--cookies", cookie_file] if cookie_file else []
+        
+        with get_download_tuner().lease(youtube_url) as lease:
+            # 建立優化的下載命令
+            command = [
+                YT_DLP_PATH, 
+                "-x", "--audio-format", "mp3", 
+                "-o", audio_path, 
+                # 多執行緒加速設定 (依實測速度調整)
+                "--concurrent-fragments", str(lease.fragments),
+                "--fragment-retries", "10",        # 片段重試次數
+                "--retries", "5",                  # 整體重試次數
+                "--http-chunk-size", lease.chunk_size,
+                "--buffer-size", "32K",            # 32KB 緩衝區 (加大)
+                # 網路優化
+                "--socket-timeout", "30",          # 30秒超時
+                "--throttled-rate", "100K",        # 最低速度限制 (避免掛起)
+                # 品質最佳化 (音訊用，速度優先)
+                "--format", "bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio",
+                # 跳過不必要的檢查以提升速度
+                "--no-check-certificate",
+                "--no-warnings",
+                "--newline",
+                youtube_url
+            ] + ffmpeg_options + cookie_options
+            if lease.limit_rate:
+                command.extend(["--limit-rate", lease.limit_rate])  # 共用的頻寬上限
+            
+            start_time = time.perf_counter()
+            try:
+                result = run_process(command, "audio")
+                if result.returncode == 0:
+                    lease.record(result.stdout.decode('utf-8', errors='ignore'), time.perf_counter() - start_time)
+                    return None
+            except ProcessWatchdogError:
+                pass
+        
+        # 如果高速模式失敗，嘗試降級到標準模式
+        if on_fallback:
+            on_fallback()
+        fallback_command = [YT_DLP_PATH, "-x", "--audio-format", "mp3", "--newline", "-o", audio_path, youtube_url] + cookie_options
+        try:
+            result = run_process(fallback_command, "audio")
+        except ProcessWatchdogError as e:
+            return str(e)
+        if result.returncode != 0:
+            return result.stderr.decode('utf-8', errors='ignore') or f"yt-dlp 結束代碼 {result.returncode}"
+        return None
+    
+    @staticmethod
+    def compute_audio_fingerprint():
+        """解碼下載的音訊並計算音訊指紋，回傳 (指紋, 音訊秒數)；無法計算時回傳 (None, None)"""
+        if not AudioFingerprinter.is_available():
+            return None, None
+        try:
+            start_time = time.time()
+            with track_peak("fingerprint"):
+                samples = decode_audio(AUDIO_FILENAME, sampling_rate=FINGERPRINT_SAMPLE_RATE)
+                hashes = AudioFingerprinter.fingerprint(samples)
+            st.write(f"🎧 音訊指紋計算完成（{len(hashes):,} 個特徵，用時 {time.time() - start_time:.1f} 秒）")
+            return hashes, len(samples) / FINGERPRINT_SAMPLE_RATE
+        except Exception as e:
+            st.warning(f"⚠️ 無法計算音訊指紋: {e}")
+            return None, None
+    
     @staticmethod
     def get_model_device(model):
         """獲取模型實際使用的設備"""
@@ -284,46 +436,37 @@ class VideoProcessor:
             return "無法確定設備"
     
     @staticmethod
-    def transcribe_audio(model_name="base", language="zh"):
-        """使用 faster-whisper 進行語音轉文字"""
-        st.write("🔥 步驟 3/6: 開始語音轉文字...")
-        if not os.path.exists(AUDIO_FILENAME):
-            st.error(f"❌ 找不到音訊檔案 {AUDIO_FILENAME}")
-            return False
-
+    def whisper_device():
+        """轉錄使用的設備與運算精度 (device, compute_type)"""
         try:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            import torch
+            cuda_available = torch.cuda.is_available()
+        except ImportError:
+            cuda_available = False
+        return ("cuda", "float16") if cuda_available else ("cpu", "int8")
+    
+    @staticmethod
+    def load_whisper_model(model_name="base"):
+        """
+        載入 faster-whisper 模型，同一模型只載入一次
+        
+        批次處理時每部影片都要轉錄，重複使用已載入的模型可省下每次數秒到數十秒的載入時間。
+        """
+        with VideoProcessor._model_lock:
+            model = VideoProcessor._whisper_models.get(model_name)
+            if model is not None:
+                return model
             
             # 檢查設備並設定模型參數
-            try:
+            device, compute_type = VideoProcessor.whisper_device()
+            if device == "cuda":
                 import torch
-                cuda_available = torch.cuda.is_available()
-                if cuda_available:
-                    torch.cuda.empty_cache()
-            except ImportError:
-                cuda_available = False
-            
-            device = "cuda" if cuda_available else "cpu"
-            compute_type = "float16" if cuda_available else "int8"
-            
-            # 顯示語言資訊
-            if language:
-                language_name = [k for k, v in LANGUAGE_OPTIONS.items() if v == language]
-                language_display = language_name[0] if language_name else language
-                st.info(f"🌍 語言設定: {language_display}")
-            else:
-                st.info("🌍 語言設定: 自動檢測 (支援中文/英文智慧識別)")
-            
-            progress_bar.progress(30)
+                torch.cuda.empty_cache()
             
             # 設定模型
             cache_dir = os.path.join(tempfile.gettempdir(), "faster_whisper_models")
             os.makedirs(cache_dir, exist_ok=True)
             
-            status_text.text(f"載入 {model_name} 模型...")
-            progress_bar.progress(40)
-            
             # 設定多執行緒參數 (最大化性能)
             import multiprocessing
             cpu_count = multiprocessing.cpu_count()
@@ -347,55 +490,160 @@ class VideoProcessor:
                 download_root=cache_dir,
                 local_files_only=False
             )
+            VideoProcessor._whisper_models[model_name] = model
+            return model
+    
+    @staticmethod
+    def loaded_whisper_models():
+        """目前已載入的模型名稱 (不等待載入中的模型)"""
+        return list(VideoProcessor._whisper_models)
+    
+    @staticmethod
+    def unload_whisper_model(model_name):
+        """
+        卸載模型以釋放記憶體，由記憶體控管在需要空間時卸載閒置的模型
+        
+        仍在轉錄的呼叫端持有模型參照，轉錄結束後才實際釋放。
+        """
+        with VideoProcessor._model_lock:
+            model = VideoProcessor._whisper_models.pop(model_name, None)
+        if model is not None:
+            del model
+            gc.collect()
+    
+    @staticmethod
+    def run_transcription(audio_path, model_name="base", language="zh", head_check=None, audio_seconds=None,
+                          allow_downgrade=True, on_memory_wait=None, on_memory_over_budget=None):
+        """
+        轉錄音訊檔 (不輸出介面訊息，可在背景執行緒中呼叫)
+        
+        回傳 {"text", "segments", "language", "language_probability", "stopped", "model"}；
+        head_check 的用法同 transcribe_audio，回傳 True 時停止轉錄並將 stopped 設為 True。
+        每個片段之間檢查目前的取消權杖，被取消時拋出 OperationCancelled。
+        轉錄前向記憶體控管 (MemoryAdmission) 取得預估的記憶體：不足時先卸載閒置的模型，仍不足時延後 (呼叫 on_memory_wait)，
+        或在 allow_downgrade 時改用較小的模型，model 為實際使用的模型；任何模型都放不下而仍執行時呼叫 on_memory_over_budget。
+        audio_seconds 未提供時依檔案估計。
+        """
+        token = current_token()
+        token.check()
+        compute_type = VideoProcessor.whisper_device()[1]
+        with get_memory_admission().admit(
+            model_name, audio_seconds or audio_seconds_of(audio_path), compute_type,
+            loaded_models=VideoProcessor.loaded_whisper_models, unload=VideoProcessor.unload_whisper_model,
+            allow_downgrade=allow_downgrade, on_wait=on_memory_wait, on_over_budget=on_memory_over_budget
+        ) as model_name:
+            return VideoProcessor._transcribe_segments(audio_path, model_name, language, head_check, token)
+    
+    @staticmethod
+    def _transcribe_segments(audio_path, model_name, language, head_check, token):
+        """run_transcription 取得記憶體後的實際轉錄"""
+        model = VideoProcessor.load_whisper_model(model_name)
+        
+        # 設定 FFmpeg 路徑
+        internal_dir = os.path.dirname(FFMPEG_PATH)
+        if internal_dir not in os.environ.get('PATH', ''):
+            os.environ['PATH'] = f"{internal_dir};{os.environ.get('PATH', '')}"
+        
+        # 進行轉錄 (最佳化參數)
+        segments, info = model.transcribe(
+            audio_path, 
+            language=language,  # 使用傳入的語言參數
+            beam_size=1,           # 最快的 beam search
+            temperature=0.0,       # 確定性輸出，避免重複計算
+            vad_filter=True,       # 啟用 VAD 過濾靜音
+            word_timestamps=False, # 不需要詞級時間戳，節省計算
+            condition_on_previous_text=False,  # 不依賴前文，並行處理
+            # 新增效能優化參數
+            no_speech_threshold=0.6,  # 提高靜音檢測靈敏度
+            log_prob_threshold=-1.0,  # 降低機率門檻，提升速度
+            compression_ratio_threshold=2.4,  # 適中的壓縮比門檻
+            initial_prompt=VideoProcessor._get_language_prompt(language)  # 根據語言調整提示
+        )
+        result = {
+            "text": "",
+            "segments": [],
+            "language": getattr(info, 'language', 'unknown'),
+            "language_probability": getattr(info, 'language_probability', 0.0),
+            "stopped": False,
+            "model": model_name
+        }
+        
+        # 收集文字與時間軸 (供章節分段使用)；segments 為惰性產生器，提前停止即可省下後續轉錄
+        segment_log = result["segments"]
+        for segment in segments:
+            token.check()
+            segment_log.append({"start": round(segment.start, 2), "end": round(segment.end, 2), "text": segment.text.strip()})
+            if head_check and segment.end >= NEAR_DUPLICATE_HEAD_SECONDS:
+                if head_check(" ".join(item["text"] for item in segment_log)):
+                    result["stopped"] = True
+                    return result
+                head_check = None
+        result["text"] = " ".join(segment["text"] for segment in segment_log).strip()
+        return result
+    
+    @staticmethod
+    def transcribe_audio(model_name="base", language="zh", head_check=None, audio_seconds=None):
+        """
+        使用 faster-whisper 進行語音轉文字
+        
+        head_check 為選用的回呼函式：轉錄到開頭指定秒數時以目前的文字呼叫，
+        回傳 True 代表已改用既有逐字稿，此時停止轉錄。
+        成功時回傳實際使用的模型名稱 (記憶體不足時可能改用較小的模型)，失敗時回傳 False。
+        """
+        st.write("🔥 步驟 3/6: 開始語音轉文字...")
+        if not os.path.exists(AUDIO_FILENAME):
+            st.error(f"❌ 找不到音訊檔案 {AUDIO_FILENAME}")
+            return False
+
+        try:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
             
-            progress_bar.progress(50)
-            status_text.text("開始轉錄...")
-            
-            # 設定 FFmpeg 路徑
-            internal_dir = os.path.dirname(FFMPEG_PATH)
-            if internal_dir not in os.environ.get('PATH', ''):
-                os.environ['PATH'] = f"{internal_dir};{os.environ.get('PATH', '')}"
-            
-            # 進行轉錄 (最佳化參數)
-            segments, info = model.transcribe(
-                AUDIO_FILENAME, 
-                language=language,  # 使用傳入的語言參數
-                beam_size=1,           # 最快的 beam search
-                temperature=0.0,       # 確定性輸出，避免重複計算
-                vad_filter=True,       # 啟用 VAD 過濾靜音
-                word_timestamps=False, # 不需要詞級時間戳，節省計算
-                condition_on_previous_text=False,  # 不依賴前文，並行處理
-                # 新增效能優化參數
-                no_speech_threshold=0.6,  # 提高靜音檢測靈敏度
-                log_prob_threshold=-1.0,  # 降低機率門檻，提升速度
-                compression_ratio_threshold=2.4,  # 適中的壓縮比門檻
-                initial_prompt=VideoProcessor._get_language_prompt(language)  # 根據語言調整提示
+            # 顯示語言資訊
+            if language:
+                language_name = [k for k, v in LANGUAGE_OPTIONS.items() if v == language]
+                language_display = language_name[0] if language_name else language
+                st.info(f"🌍 語言設定: {language_display}")
+            else:
+                st.info("🌍 語言設定: 自動檢測 (支援中文/英文智慧識別)")
+            
+            progress_bar.progress(30)
+            status_text.text(f"載入 {model_name} 模型並開始轉錄...")
+            result = VideoProcessor.run_transcription(
+                AUDIO_FILENAME, model_name, language, head_check=head_check, audio_seconds=audio_seconds,
+                on_memory_wait=lambda: st.info("⏳ 記憶體不足，等待其他轉錄完成..."),
+                on_memory_over_budget=lambda: st.warning("⚠️ 預估記憶體超出預算，仍以最小的模型轉錄，可能因記憶體不足而失敗")
             )
+            if result["model"] != model_name:
+                st.warning(f"⚠️ 記憶體不足，改用 {result['model']} 模型轉錄")
             
             progress_bar.progress(80)
             status_text.text("整理結果...")
             
             # 顯示檢測到的語言資訊
-            detected_language = getattr(info, 'language', 'unknown')
-            detected_probability = getattr(info, 'language_probability', 0.0)
+            detected_language = result["language"]
+            detected_probability = result["language_probability"]
             
             if detected_language in ['zh', 'en']:
                 lang_name = "中文" if detected_language == 'zh' else "英文"
                 confidence = f"{detected_probability:.1%}" if detected_probability > 0 else "N/A"
                 st.info(f"🔍 檢測到語言: {lang_name} (信心度: {confidence})")
             
-            # 收集文字
-            transcript_text = " ".join(segment.text for segment in segments)
+            if result["stopped"]:
+                progress_bar.progress(100)
+                status_text.text("已改用既有逐字稿，停止轉錄")
+                return result["model"]
             
             # 儲存結果
             with open(TRANSCRIPT_FILENAME, "w", encoding="utf-8") as f:
-                f.write(transcript_text.strip())
+                f.write(result["text"])
+            FileManager.write_segments(result["segments"])
                 
             progress_bar.progress(100)
             status_text.text("轉錄完成！")
             
             st.success(f"✅ 逐字稿已儲存為 {TRANSCRIPT_FILENAME}")
-            return True
+            return result["model"]
             
         except Exception as e:
             st.error(f"❌ 轉錄失敗: {e}")
@@ -4,6 +4,7 @@ YouTube 財經報告生成器
 """
 import os
 import sys
+import math
 import streamlit as st
 from dotenv import load_dotenv
 
@@ -25,10 +26,17 @@ except ImportError:
     APP_DESCRIPTION = "使用 AI 技術將 YouTube 財經影片轉換為結構化報告"
 
 # 導入自定義模組
-from src.core.config import AI_PROVIDERS, WHISPER_MODELS, LANGUAGE_OPTIONS
+from src.core.config import (
+    AI_PROVIDERS, WHISPER_MODELS, LANGUAGE_OPTIONS, GEMINI_API_KEYS_ENV,
+    AUTO_MODEL, AUTO_ROUTE_LATENCY_TARGET_SECONDS, COMPACTION_STEPS,
+    TRANSCRIPT_PAGE_SIZE, TRANSCRIPT_SORT_OPTIONS
+)
 from src.services.video_processor import VideoProcessor
+from src.services.gemini_scheduler import get_scheduler
 from src.core.business_logic import BusinessLogic
 from src.utils.prompt_manager import PromptManager
+from src.utils.transcript_store import TranscriptStore
+from src.utils.chapter_splitter import ChapterSplitter
 
 # 設定編碼環境
 import locale
@@ -64,12 +72,14 @@ def main():
         st.subheader("📝 Prompt選擇")
         available_prompts = prompt_manager.get_available_prompts()
         
-        selected_prompt = st.selectbox(
+        selected_prompts = st.multiselect(
             "選擇專家",
             available_prompts,
-            index=0,
-            help="選擇適合影片內容的專業分析師"
+            default=available_prompts[:1],
+            help="選擇適合影片內容的專業分析師，可複選以平行產生多份專家報告"
         )
+        if len(selected_prompts) > 1:
+            st.caption(f"👥 將同時由 {len(selected_prompts)} 位專家分析同一份逐字稿")
         
         # 系統資訊
         st.subheader("🖥️ 系統資訊")
@@ -87,13 +97,36 @@ def main():
         
         # 顯示選擇的模型資訊
         selected_model_value = AI_PROVIDERS[ai_provider]
-        if "pro" in selected_model_value:
+        latency_target = None
+        if selected_model_value == AUTO_MODEL:
+            latency_target = st.slider(
+                "延遲目標 (秒)",
+                min_value=10,
+                max_value=300,
+                value=AUTO_ROUTE_LATENCY_TARGET_SECONDS,
+                step=10,
+                help="依 Prompt 預估長度，選擇能在此時間內完成且品質最高的模型"
+            )
+            st.info("🧭 已選擇: 自動選擇模型 (依 Prompt 長度與延遲目標)")
+        elif "pro" in selected_model_value:
             st.success(f"🚀 已選擇: {selected_model_value} (最高品質)")
         elif "flash-lite" in selected_model_value:
             st.info(f"⚡ 已選擇: {selected_model_value} (最快速度)")
         else:
             st.info(f"⚖️ 已選擇: {selected_model_value} (平衡模式)")
         
+        stream_output = st.checkbox(
+            "即時串流顯示報告",
+            value=True,
+            help="邊生成邊顯示報告內容，不必等待完整回應"
+        )
+        
+        force_regenerate = st.checkbox(
+            "強制重新生成報告",
+            value=False,
+            help="略過報告快取，重新呼叫 Gemini 產生報告（相同逐字稿、Prompt 與模型預設會直接使用快取）"
+        )
+        
         # API Key 設定
         default_api_key = os.getenv("GOOGLE_API_KEY", "")
         api_key = st.text_input(
@@ -103,6 +136,34 @@ def main():
             help="輸入您的 AI API Key"
         )
         
+        # 章節分析設定
+        chapter_mode = st.checkbox(
+            "依章節平行分析",
+            value=False,
+            help="依影片章節（無章節時依語音停頓）切分逐字稿，各段平行分析後組合為附時間軸的報告；僅適用於單一專家"
+        )
+        
+        # 逐字稿精簡設定
+        compact_transcript = st.checkbox(
+            "精簡逐字稿後再分析",
+            value=True,
+            help="移除贅詞（嗯、那個、um、you know）、重複迴圈與多餘空白以節省 Token，保存的原始逐字稿不受影響"
+        )
+        convert_traditional = st.checkbox(
+            "簡體轉繁體",
+            value=False,
+            disabled=not compact_transcript,
+            help="需安裝 opencc 套件"
+        )
+        compaction_steps = None
+        if compact_transcript:
+            compaction_steps = COMPACTION_STEPS + (["traditional"] if convert_traditional else [])
+        
+        # Gemini 排程佇列與重試統計
+        with st.expander("📊 Gemini 排程狀態"):
+            st.caption(f"可於環境變數 {GEMINI_API_KEYS_ENV} 設定多組 API Key（以逗號分隔）輪流使用")
+            st.json(get_scheduler().snapshot())
+        
         # 顯示逐字稿保存資訊
         st.info("💾 逐字稿將自動保存到 saved_transcripts 資料夾")
         
@@ -149,13 +210,14 @@ def main():
         # 輸入模式選擇
         input_mode = st.radio(
             "選擇輸入方式",
-            ["YouTube 影片", "逐字稿檔案"],
+            ["YouTube 影片", "批次影片", "逐字稿檔案"],
             index=0,
             horizontal=True,
-            help="選擇要處理YouTube影片還是直接上傳逐字稿檔案"
+            help="選擇要處理單一 YouTube 影片、批次處理多部影片（播放清單 / 頻道），還是直接上傳逐字稿檔案"
         )
         
         youtube_url = None
+        batch_urls = None
         transcript_file = None
         
         if input_mode == "YouTube 影片":
@@ -165,19 +227,27 @@ def main():
                 placeholder="https://www.youtube.com/watch?v=...",
                 help="貼上要處理的 YouTube 影片連結"
             )
+        elif input_mode == "批次影片":
+            st.subheader("🎞️ 批次影片處理")
+            batch_urls = st.text_area(
+                "輸入影片、播放清單或頻道網址（每行一個）",
+                placeholder="https://www.youtube.com/playlist?list=...\nhttps://www.youtube.com/@channel\nhttps://www.youtube.com/watch?v=...",
+                height=150,
+                help="播放清單與頻道會自動展開為影片列表；下載、轉錄與分析分階段平行進行，以第一位專家分析"
+            )
         else:
             st.subheader("📄 逐字稿檔案處理")
             
-            # 檢查已保存的逐字稿
-            transcripts_folder = "saved_transcripts"
-            saved_transcripts = []
-            if os.path.exists(transcripts_folder):
-                saved_transcripts = [f for f in os.listdir(transcripts_folder) if f.endswith('.txt')]
+            # 從逐字稿目錄查詢已保存的逐字稿（首次使用時匯入既有檔案）
+            transcript_store = TranscriptStore()
+            if transcript_store.count() == 0:
+                transcript_store.import_folder()
+            saved_count = transcript_store.count()
             
             # 逐字稿來源選擇
             transcript_source = st.radio(
                 "逐字稿來源",
-                ["上傳新檔案", "選擇已保存的逐字稿"] if saved_transcripts else ["上傳新檔案"],
+                ["上傳新檔案", "選擇已保存的逐字稿"] if saved_count else ["上傳新檔案"],
                 index=0,
                 horizontal=True,
                 help="選擇使用新上傳的檔案或之前保存的逐字稿"
@@ -187,33 +257,76 @@ def main():
             selected_saved_transcript = None
             
             if transcript_source == "上傳新檔案":
-                transcript_file = st.file_uploader(
+                transcript_files = st.file_uploader(
                     "上傳逐字稿檔案",
                     type=['txt', 'md'],
-                    help="上傳包含影片內容逐字稿的文字檔案"
+                    accept_multiple_files=True,
+                    help="上傳包含影片內容逐字稿的文字檔案，可一次選擇多份；多份短逐字稿會打包成批次請求分析"
                 )
+                if len(transcript_files) > 1:
+                    st.caption(f"📦 已選擇 {len(transcript_files)} 份逐字稿，將以第一位專家批次分析")
+                transcript_file = transcript_files[0] if transcript_files else None
             else:
-                if saved_transcripts:
-                    # 按修改時間排序，最新的在前面
-                    saved_transcripts_with_time = []
-                    for filename in saved_transcripts:
-                        filepath = os.path.join(transcripts_folder, filename)
-                        mtime = os.path.getmtime(filepath)
-                        saved_transcripts_with_time.append((filename, mtime))
+                if saved_count:
+                    with st.expander("🔎 全文搜尋逐字稿", expanded=False):
+                        search_query = st.text_input(
+                            "搜尋內容",
+                            placeholder="例如：升息 通膨（以空白分隔多個關鍵字）",
+                            help="搜尋所有已保存逐字稿的內容，依相關程度排序並顯示命中段落的時間點"
+                        )
+                        if search_query.strip():
+                            hits, elapsed_ms = transcript_store.search(search_query.strip())
+                            st.caption(f"找到 {len(hits)} 部影片（{elapsed_ms:.0f} 毫秒）")
+                            for hit in hits:
+                                timestamp = f"[{ChapterSplitter.format_timestamp(hit['start'])}] " if hit["start"] is not None else ""
+                                st.markdown(f"**{hit['record']['title']}** · {hit['hits']} 處命中")
+                                st.markdown(f"> {timestamp}{hit['snippet']}")
                     
-                    saved_transcripts_sorted = [item[0] for item in sorted(saved_transcripts_with_time, key=lambda x: x[1], reverse=True)]
+                    filter_col, sort_col, page_col = st.columns([2, 1, 1])
+                    with filter_col:
+                        title_filter = st.text_input("篩選標題", placeholder="輸入標題關鍵字")
+                    with sort_col:
+                        sort_label = st.selectbox("排序方式", list(TRANSCRIPT_SORT_OPTIONS))
+                    order_by, descending = TRANSCRIPT_SORT_OPTIONS[sort_label]
                     
-                    selected_saved_transcript = st.selectbox(
-                        "選擇已保存的逐字稿",
-                        saved_transcripts_sorted,
-                        help="選擇要重新處理的逐字稿檔案（按修改時間排序，最新的在前面）"
+                    filtered_count = transcript_store.count(title_filter.strip())
+                    page_count = max(1, math.ceil(filtered_count / TRANSCRIPT_PAGE_SIZE))
+                    with page_col:
+                        page = st.number_input("頁次", min_value=1, max_value=page_count, value=1, step=1)
+                    
+                    records, _ = transcript_store.list_page(
+                        page - 1, TRANSCRIPT_PAGE_SIZE, order_by, descending, title_filter.strip()
                     )
+                    storage = transcript_store.storage_stats()
+                    storage_note = ""
+                    if storage["stored_bytes"] and storage["stored_bytes"] < storage["original_bytes"]:
+                        storage_note = f"，壓縮後佔用 {storage['stored_bytes'] / 1024:,.0f} KB（原始 {storage['original_bytes'] / 1024:,.0f} KB）"
+                    st.caption(f"共 {filtered_count} 份逐字稿，第 {page}/{page_count} 頁{storage_note}")
+                    
+                    if records:
+                        record_labels = {record["filename"]: record for record in records}
+                        selected_saved_transcript = st.selectbox(
+                            "選擇已保存的逐字稿",
+                            list(record_labels),
+                            format_func=lambda filename: BusinessLogic.format_transcript_label(record_labels[filename]),
+                            help="選擇要重新處理的逐字稿檔案"
+                        )
+                        # 先前產生的報告可直接開啟，不需重新分析
+                        BusinessLogic.display_report_history(record_labels[selected_saved_transcript])
+                    else:
+                        st.info("沒有符合條件的逐字稿")
                 else:
                     st.info("尚無已保存的逐字稿檔案")
         
+        # 上一次的處理被取消時提示
+        if st.session_state.pop("processing_cancelled", False):
+            st.warning("⏹️ 已取消處理，進行中的下載與轉錄已停止")
+        
         # 開始處理按鈕
         if st.button("🚀 開始生成報告", type="primary", use_container_width=True):
-            if input_mode == "YouTube 影片":
+            if not selected_prompts:
+                st.error("❌ 請至少選擇一位專家")
+            elif input_mode == "YouTube 影片":
                 if not youtube_url or not youtube_url.strip():
                     st.error("❌ 請輸入 YouTube 影片網址")
                 elif not api_key.strip():
@@ -224,7 +337,8 @@ def main():
                     cookie_path = BusinessLogic.prepare_cookie_file(cookie_file)
                     
                     # 獲取選中的 prompt
-                    selected_prompt_content = prompt_manager.get_prompt_content(selected_prompt)
+                    expert_prompts = {name: prompt_manager.get_prompt_content(name) for name in selected_prompts}
+                    selected_prompt_content = next(iter(expert_prompts.values()))
                     
                     # 獲取選擇的 AI 模型
                     selected_ai_model = AI_PROVIDERS[ai_provider]
@@ -238,7 +352,32 @@ def main():
                         whisper_model,
                         selected_prompt_content,
                         language,
-                        selected_ai_model
+                        selected_ai_model,
+                        stream_output,
+                        force_regenerate,
+                        expert_prompts,
+                        latency_target,
+                        compaction_steps,
+                        chapter_mode
+                    )
+            elif input_mode == "批次影片":
+                if not batch_urls or not batch_urls.strip():
+                    st.error("❌ 請輸入至少一個影片、播放清單或頻道網址")
+                else:
+                    cookie_path = BusinessLogic.prepare_cookie_file(cookie_file)
+                    BusinessLogic.process_video_batch(
+                        batch_urls,
+                        api_key.strip(),
+                        save_path,
+                        cookie_path,
+                        whisper_model,
+                        prompt_manager.get_prompt_content(selected_prompts[0]),
+                        language,
+                        AI_PROVIDERS[ai_provider],
+                        force_regenerate,
+                        latency_target,
+                        compaction_steps,
+                        selected_prompts[0]
                     )
             else:
                 # 檢查是否有逐字稿輸入
@@ -255,20 +394,40 @@ def main():
                 else:
                     # 逐字稿檔案處理邏輯
                     # 獲取選中的 prompt
-                    selected_prompt_content = prompt_manager.get_prompt_content(selected_prompt)
+                    expert_prompts = {name: prompt_manager.get_prompt_content(name) for name in selected_prompts}
+                    selected_prompt_content = next(iter(expert_prompts.values()))
                     
                     # 獲取選擇的 AI 模型
                     selected_ai_model = AI_PROVIDERS[ai_provider]
                     
                     # 根據來源處理逐字稿
-                    if transcript_source == "上傳新檔案":
+                    if transcript_source == "上傳新檔案" and len(transcript_files) > 1:
+                        # 批次處理多份上傳的檔案
+                        BusinessLogic.process_transcript_batch(
+                            transcript_files,
+                            api_key.strip(),
+                            save_path,
+                            selected_prompt_content,
+                            selected_ai_model,
+                            force_regenerate,
+                            latency_target,
+                            compaction_steps,
+                            selected_prompts[0]
+                        )
+                    elif transcript_source == "上傳新檔案":
                         # 處理上傳的檔案
                         BusinessLogic.process_transcript_file(
                             transcript_file,
                             api_key.strip(),
                             save_path,
                             selected_prompt_content,
-                            selected_ai_model
+                            selected_ai_model,
+                            stream_output,
+                            force_regenerate,
+                            expert_prompts,
+                            latency_target,
+                            compaction_steps,
+                            chapter_mode
                         )
                     else:
                         # 處理已保存的逐字稿
@@ -277,7 +436,13 @@ def main():
                             api_key.strip(),
                             save_path,
                             selected_prompt_content,
-                            selected_ai_model
+                            selected_ai_model,
+                            stream_output,
+                            force_regenerate,
+                            expert_prompts,
+                            latency_target,
+                            compaction_steps,
+                            chapter_mode
                         )
 
 
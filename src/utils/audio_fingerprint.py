@@ -0,0 +1,133 @@
+"""
+音訊指紋模組
+以頻譜峰值配對 (constellation hashing) 產生音訊指紋，
+即使片頭長度不同也能找出相同的音訊並估算兩者的時間差
+"""
+from collections import Counter
+from src.core.config import (
+    FINGERPRINT_SAMPLE_RATE, FINGERPRINT_FFT_SIZE, FINGERPRINT_HOP_SIZE, FINGERPRINT_PEAK_BLOCK_FRAMES,
+    FINGERPRINT_FAN_OUT, FINGERPRINT_MAX_DELTA_FRAMES, FINGERPRINT_MIN_MATCHES, FINGERPRINT_MIN_MATCH_RATIO
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 語音主要能量所在的頻帶 (Hz)，每個頻帶各自挑選峰值
+_BAND_EDGES_HZ = (100, 300, 600, 1000, 1800, 3200)
+# 分塊計算頻譜，避免長影片一次佔用大量記憶體
+_FRAMES_PER_CHUNK = 4096
+
+
+class AudioFingerprinter:
+    """音訊指紋計算與比對"""
+
+    @staticmethod
+    def is_available():
+        """檢查是否已安裝 NumPy"""
+        return np is not None
+
+    @staticmethod
+    def frames_to_seconds(frames):
+        return frames * FINGERPRINT_HOP_SIZE / FINGERPRINT_SAMPLE_RATE
+
+    @staticmethod
+    def spectrogram(samples):
+        """計算對數振幅頻譜，回傳 (幀數, 頻率點數) 陣列"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) < FINGERPRINT_FFT_SIZE:
+            return np.zeros((0, FINGERPRINT_FFT_SIZE // 2 + 1), dtype=np.float32)
+
+        window = np.hanning(FINGERPRINT_FFT_SIZE).astype(np.float32)
+        frame_count = 1 + (len(samples) - FINGERPRINT_FFT_SIZE) // FINGERPRINT_HOP_SIZE
+        chunks = []
+        for first in range(0, frame_count, _FRAMES_PER_CHUNK):
+            last = min(frame_count, first + _FRAMES_PER_CHUNK)
+            starts = np.arange(first, last) * FINGERPRINT_HOP_SIZE
+            frames = samples[starts[:, None] + np.arange(FINGERPRINT_FFT_SIZE)] * window
+            chunks.append(np.log1p(np.abs(np.fft.rfft(frames, axis=1))).astype(np.float32))
+        return np.concatenate(chunks)
+
+    @staticmethod
+    def find_peaks(spectrum):
+        """每個頻帶在每個時間區塊內取振幅最大的點，且需高於該頻帶的平均振幅"""
+        bin_hz = FINGERPRINT_SAMPLE_RATE / FINGERPRINT_FFT_SIZE
+        edges = [int(hz / bin_hz) for hz in _BAND_EDGES_HZ if hz < FINGERPRINT_SAMPLE_RATE / 2]
+        block = FINGERPRINT_PEAK_BLOCK_FRAMES
+        usable_frames = len(spectrum) // block * block
+        if usable_frames == 0:
+            return []
+
+        peaks = []
+        for low, high in zip(edges, edges[1:]):
+            band = spectrum[:usable_frames, low:high]
+            threshold = band.mean() + band.std()
+            blocks = band.reshape(-1, block, high - low)
+            flat = blocks.reshape(len(blocks), -1)
+            best = flat.argmax(axis=1)
+            values = flat[np.arange(len(blocks)), best]
+            for index in np.nonzero(values > threshold)[0]:
+                frame_offset, bin_offset = divmod(int(best[index]), high - low)
+                peaks.append((int(index) * block + frame_offset, low + bin_offset))
+        peaks.sort()
+        return peaks
+
+    @staticmethod
+    def hash_peaks(peaks):
+        """每個錨點與其後的數個峰值配對，雜湊 (錨點頻率, 目標頻率, 時間差)，回傳 [(雜湊值, 錨點幀)]"""
+        hashes = []
+        for index, (anchor_frame, anchor_bin) in enumerate(peaks):
+            paired = 0
+            for target_frame, target_bin in peaks[index + 1:]:
+                delta = target_frame - anchor_frame
+                if delta <= 0:
+                    continue
+                if delta > FINGERPRINT_MAX_DELTA_FRAMES or paired >= FINGERPRINT_FAN_OUT:
+                    break
+                hashes.append(((anchor_bin & 0x3FF) << 20 | (target_bin & 0x3FF) << 10 | (delta & 0x3FF), anchor_frame))
+                paired += 1
+        return hashes
+
+    @staticmethod
+    def fingerprint(samples):
+        """由取樣率為 FINGERPRINT_SAMPLE_RATE 的單聲道 PCM 計算指紋"""
+        return AudioFingerprinter.hash_peaks(AudioFingerprinter.find_peaks(AudioFingerprinter.spectrogram(samples)))
+
+    @staticmethod
+    def best_alignment(query_hashes, candidate_rows):
+        """
+        依時間差直方圖找出最佳對齊
+
+        candidate_rows 為 [(指紋來源, 雜湊值, 幀)]；回傳 [(指紋來源, 相符數, 時間差幀數)]，依相符數排序。
+        時間差為「既有音訊的位置 - 新音訊的位置」，片頭較長的新影片時間差為負值。
+        """
+        query_frames = {}
+        for hash_value, frame in query_hashes:
+            query_frames.setdefault(hash_value, []).append(frame)
+
+        histograms = {}
+        for source, hash_value, frame in candidate_rows:
+            histogram = histograms.setdefault(source, Counter())
+            for query_frame in query_frames.get(hash_value, ()):
+                histogram[frame - query_frame] += 1
+
+        alignments = []
+        for source, histogram in histograms.items():
+            # 允許 ±1 幀的量化誤差
+            offset, count = max(
+                ((offset, histogram[offset - 1] + histogram[offset] + histogram[offset + 1]) for offset in histogram),
+                key=lambda item: item[1]
+            )
+            alignments.append((source, count, offset))
+        alignments.sort(key=lambda item: item[1], reverse=True)
+        return alignments
+
+    @staticmethod
+    def is_match(match_count, query_hash_count):
+        """相符數需同時達到絕對門檻與比例門檻"""
+        return (
+            match_count >= FINGERPRINT_MIN_MATCHES
+            and query_hash_count
+            and match_count / query_hash_count >= FINGERPRINT_MIN_MATCH_RATIO
+        )
@@ -0,0 +1,128 @@
+"""
+長音訊分段模組
+以 FFmpeg 的 silencedetect 找出靜音位置，將數小時的音訊在靜音處切成多段 (相鄰分段略為重疊)，
+各段分別轉錄後再依時間順序合併時間軸，重疊範圍內的片段只保留一份
+"""
+import re
+from src.core.config import (
+    FFMPEG_PATH, SHARD_TARGET_SECONDS, SHARD_SEARCH_SECONDS, SHARD_OVERLAP_SECONDS, SHARD_SILENCE_DB,
+    SHARD_MIN_SILENCE_SECONDS
+)
+from src.utils.process_runner import run_process
+
+_DURATION_PATTERN = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START_PATTERN = re.compile(r"silence_start:\s*(-?\d+(?:\.\d+)?)")
+_SILENCE_END_PATTERN = re.compile(r"silence_end:\s*(-?\d+(?:\.\d+)?)")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class AudioSharder:
+    """長音訊的切段與分段結果合併"""
+
+    @staticmethod
+    def parse_silencedetect(output):
+        """解析 FFmpeg silencedetect 的輸出，回傳 (音訊秒數, [(靜音開始, 靜音結束)])"""
+        duration = None
+        match = _DURATION_PATTERN.search(output)
+        if match:
+            hours, minutes, seconds = match.groups()
+            duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        silences = []
+        start = None
+        for line in output.splitlines():
+            match = _SILENCE_START_PATTERN.search(line)
+            if match:
+                start = max(0.0, float(match.group(1)))
+                continue
+            match = _SILENCE_END_PATTERN.search(line)
+            if match and start is not None:
+                silences.append((start, float(match.group(1))))
+                start = None
+        if start is not None and duration is not None:
+            silences.append((start, duration))  # 結尾的靜音沒有 silence_end
+        return duration, silences
+
+    @staticmethod
+    def detect_silences(audio_path, noise_db=SHARD_SILENCE_DB, min_silence=SHARD_MIN_SILENCE_SECONDS):
+        """以串流方式掃描整個音訊檔 (不需整段載入記憶體)，回傳 (音訊秒數, 靜音區間列表)；保留進度輸出供看門狗判斷是否停滯"""
+        command = [
+            FFMPEG_PATH, "-hide_banner", "-i", audio_path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"
+        ]
+        result = run_process(command, "ffmpeg")
+        output = result.stderr.decode("utf-8", errors="ignore")
+        duration, silences = AudioSharder.parse_silencedetect(output)
+        if result.returncode != 0 or duration is None:
+            raise RuntimeError(f"無法分析音訊: {output.strip().splitlines()[-1][:300] if output.strip() else result.returncode}")
+        return duration, silences
+
+    @staticmethod
+    def plan_shards(duration, silences, target_seconds=SHARD_TARGET_SECONDS, search_seconds=SHARD_SEARCH_SECONDS,
+                    overlap_seconds=SHARD_OVERLAP_SECONDS):
+        """
+        規劃分段，回傳 [{"index", "start", "end", "cut_start", "cut_end"}]
+
+        cut_start / cut_end 為該段負責的範圍 (相鄰分段在同一切點交接)，切點取目標位置前後 search_seconds 內
+        最接近目標的靜音中點，找不到靜音時直接在目標位置切開；start / end 為實際轉錄的範圍，
+        向兩側各延伸 overlap_seconds，避免切點上的語句被截斷。
+        """
+        if duration <= 0:
+            return []
+        midpoints = sorted((start + end) / 2 for start, end in silences)
+        cuts = [0.0]
+        while duration - cuts[-1] > target_seconds * 1.5:
+            target = cuts[-1] + target_seconds
+            nearby = [point for point in midpoints if abs(point - target) <= search_seconds and point > cuts[-1]]
+            cuts.append(min(nearby, key=lambda point: abs(point - target)) if nearby else target)
+        cuts.append(duration)
+
+        return [
+            {
+                "index": index,
+                "start": round(max(0.0, cut_start - overlap_seconds), 3),
+                "end": round(min(duration, cut_end + overlap_seconds), 3),
+                "cut_start": round(cut_start, 3),
+                "cut_end": round(cut_end, 3)
+            }
+            for index, (cut_start, cut_end) in enumerate(zip(cuts, cuts[1:]))
+        ]
+
+    @staticmethod
+    def extract_shard(audio_path, start, end, output_path):
+        """將指定時間範圍轉為 16 kHz 單聲道 WAV (轉錄模型使用的格式，節點不需再解碼原始檔)"""
+        command = [
+            FFMPEG_PATH, "-hide_banner", "-loglevel", "error", "-progress", "pipe:1", "-y", "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+            "-i", audio_path, "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", output_path
+        ]
+        result = run_process(command, "ffmpeg")
+        if result.returncode != 0:
+            raise RuntimeError(f"無法切出分段: {result.stderr.decode('utf-8', errors='ignore').strip()[:300]}")
+        return output_path
+
+    @staticmethod
+    def _same_text(first, second):
+        return _NON_WORD.sub("", first).lower() == _NON_WORD.sub("", second).lower()
+
+    @staticmethod
+    def merge_segments(shards):
+        """
+        合併各段的時間軸 (時間已換算為整段音訊的時間)，回傳依時間排序的片段列表
+
+        shards 為 [{"cut_start", "cut_end", "segments"}]。每個片段只由中點所在的分段保留；
+        重疊範圍內兩段各自辨識出的同一句話若中點剛好落在切點兩側，再以時間重疊且文字相同去除重複。
+        """
+        merged = []
+        shards = sorted(shards, key=lambda shard: shard["cut_start"])
+        for position, shard in enumerate(shards):
+            # 最後一段也負責結尾之後的片段 (模型給出的時間可能略超過音訊長度)
+            cut_end = shard["cut_end"] if position < len(shards) - 1 else float("inf")
+            for segment in shard["segments"]:
+                midpoint = (segment["start"] + segment["end"]) / 2
+                if not shard["cut_start"] <= midpoint < cut_end:
+                    continue
+                if merged and segment["start"] < merged[-1]["end"] and AudioSharder._same_text(segment["text"], merged[-1]["text"]):
+                    continue
+                merged.append(segment)
+        merged.sort(key=lambda segment: segment["start"])
+        return merged
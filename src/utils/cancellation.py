@@ -0,0 +1,81 @@
+"""
+取消機制模組
+以取消權杖 (CancelToken) 協同停止長時間的處理：外部程式的看門狗與語音轉文字在每次輪詢 / 每個片段之間檢查權杖，
+權杖被取消時拋出 OperationCancelled，沿途的 finally / with 區塊會終止子程序並立即釋放佔用的資源
+"""
+import time
+import threading
+
+_local = threading.local()
+
+
+class OperationCancelled(BaseException):
+    """
+    處理已被取消
+
+    與 KeyboardInterrupt 相同繼承自 BaseException，既有的 except Exception 不會把取消當成一般錯誤吞掉。
+    """
+
+
+class CancelToken:
+    """
+    取消權杖
+
+    on_check 為選用的回呼，check() 時最多每 check_interval 秒呼叫一次 (例如網頁介面藉此更新已用時間，
+    Streamlit 也在這些介面更新時中止被使用者取消或關閉分頁的執行)。
+    """
+
+    def __init__(self, on_check=None, check_interval=1.0):
+        self.on_check = on_check
+        self.check_interval = check_interval
+        self.reason = None
+        self._event = threading.Event()
+        self._last_check = 0.0
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="已取消"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def wait(self, timeout=None):
+        """等待取消，回傳是否已取消"""
+        return self._event.wait(timeout)
+
+    def check(self):
+        """已取消時拋出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+        if self.on_check and time.monotonic() - self._last_check >= self.check_interval:
+            self._last_check = time.monotonic()
+            self.on_check()
+
+    def bind(self):
+        """在 with 區塊內設為目前執行緒的權杖 (current_token)"""
+        return _Binding(self)
+
+
+class _Binding:
+    def __init__(self, token):
+        self.token = token
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(_local, "token", None)
+        _local.token = self.token
+        return self.token
+
+    def __exit__(self, *exc_info):
+        _local.token = self.previous
+        return False
+
+
+_NEVER = CancelToken()
+
+
+def current_token():
+    """目前執行緒的取消權杖；沒有綁定時回傳永遠不會被取消的權杖"""
+    return getattr(_local, "token", None) or _NEVER
@@ -0,0 +1,90 @@
+"""
+章節切分模組
+依影片章節資訊或語音停頓，將帶時間軸的逐字稿切分為段落
+"""
+from src.core.config import SILENCE_GAP_SECONDS, MIN_SECTION_SECONDS, MAX_SECTION_SECONDS
+
+
+class ChapterSplitter:
+    """逐字稿章節切分器"""
+
+    @staticmethod
+    def format_timestamp(seconds):
+        """將秒數格式化為 HH:MM:SS 或 MM:SS"""
+        seconds = int(seconds or 0)
+        hours, remainder = divmod(seconds, 3600)
+        minutes, secs = divmod(remainder, 60)
+        if hours:
+            return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+        return f"{minutes:02d}:{secs:02d}"
+
+    @staticmethod
+    def _make_section(title, segments):
+        return {
+            "title": title,
+            "start": segments[0]["start"],
+            "end": segments[-1]["end"],
+            "text": " ".join(segment["text"] for segment in segments)
+        }
+
+    @staticmethod
+    def split_by_chapters(segments, chapters):
+        """依影片章節時間切分，每個時間軸片段依開始時間歸入對應章節"""
+        if not segments or not chapters:
+            return []
+
+        chapters = sorted(chapters, key=lambda chapter: chapter["start"])
+        grouped = [[] for _ in chapters]
+        chapter_index = 0
+        for segment in sorted(segments, key=lambda item: item["start"]):
+            while chapter_index + 1 < len(chapters) and segment["start"] >= chapters[chapter_index + 1]["start"]:
+                chapter_index += 1
+            grouped[chapter_index].append(segment)
+
+        sections = []
+        for chapter, chapter_segments in zip(chapters, grouped):
+            if chapter_segments:
+                section = ChapterSplitter._make_section(chapter["title"], chapter_segments)
+                section["start"] = chapter["start"]
+                section["end"] = chapter.get("end") or section["end"]
+                sections.append(section)
+        return sections
+
+    @staticmethod
+    def split_by_silence(segments, min_gap=SILENCE_GAP_SECONDS,
+                         min_section_seconds=MIN_SECTION_SECONDS, max_section_seconds=MAX_SECTION_SECONDS):
+        """
+        無章節資訊時依語音停頓切分：段落達最短長度後，遇到足夠長的停頓即切開；
+        超過最長長度時強制切開，避免單一段落過大
+        """
+        if not segments:
+            return []
+
+        sections = []
+        current = []
+        for segment in sorted(segments, key=lambda item: item["start"]):
+            if current:
+                duration = current[-1]["end"] - current[0]["start"]
+                gap = segment["start"] - current[-1]["end"]
+                if (duration >= min_section_seconds and gap >= min_gap) or duration >= max_section_seconds:
+                    sections.append(ChapterSplitter._make_section(f"段落 {len(sections) + 1}", current))
+                    current = []
+            current.append(segment)
+
+        if current:
+            # 最後一段過短時併入前一段
+            if sections and current[-1]["end"] - current[0]["start"] < min_section_seconds / 2:
+                merged_text = sections[-1]["text"] + " " + " ".join(segment["text"] for segment in current)
+                sections[-1].update({"end": current[-1]["end"], "text": merged_text})
+            else:
+                sections.append(ChapterSplitter._make_section(f"段落 {len(sections) + 1}", current))
+        return sections
+
+    @staticmethod
+    def build_sections(segments, chapters=None):
+        """優先使用影片章節，否則改用語音停頓切分；回傳 (段落列表, 切分方式)"""
+        if chapters:
+            sections = ChapterSplitter.split_by_chapters(segments, chapters)
+            if len(sections) > 1:
+                return sections, "chapters"
+        return ChapterSplitter.split_by_silence(segments), "silence"
@@ -0,0 +1,35 @@
+"""
+中日韓文字斷詞模組
+中日韓文字以相鄰兩字 (bigram) 為單位、拉丁字母與數字以整個單字為單位，
+供全文檢索與相似度比對共用
+"""
+import re
+import unicodedata
+
+_CJK_RANGES = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_TOKEN_PATTERN = re.compile(rf"[{_CJK_RANGES}]+|[^\W{_CJK_RANGES}]+")
+_CJK_RUN_PATTERN = re.compile(rf"[{_CJK_RANGES}]+")
+
+
+def normalize(text):
+    """統一全形半形與大小寫"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def tokenize(text):
+    """將文字切分為 token 列表：中日韓文字切成 bigram，單獨一字時保留單字"""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(normalize(text)):
+        if _CJK_RUN_PATTERN.fullmatch(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def query_terms(query):
+    """將搜尋字串依空白切分為多個詞，每個詞各自轉為 token 序列"""
+    return [tokens for tokens in (tokenize(term) for term in query.split()) if tokens]
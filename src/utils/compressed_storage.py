@@ -0,0 +1,171 @@
+"""
+壓縮儲存模組
+逐字稿、時間軸與報告以 zstd 壓縮保存 (未安裝 zstandard 時改用 gzip)，
+檔案以原本的路徑加上 .zst / .gz 副檔名存放；讀取時依檔案開頭自動解壓縮，未壓縮的舊檔案也能直接讀取
+"""
+import os
+import gzip
+from src.core.config import STORAGE_COMPRESSION, STORAGE_ZSTD_LEVEL, STORAGE_GZIP_LEVEL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# 壓縮格式對應的副檔名 (依讀取時的優先順序排列)
+SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+
+class CompressedStorage:
+    """壓縮檔案讀寫"""
+
+    @staticmethod
+    def algorithm(preferred=STORAGE_COMPRESSION):
+        """決定實際使用的壓縮格式：未安裝 zstandard 時改用 gzip，None 或 "none" 代表不壓縮"""
+        if preferred == "zstd" and zstandard is None:
+            return "gzip"
+        return preferred if preferred in SUFFIXES else None
+
+    @staticmethod
+    def compress(data, algorithm=STORAGE_COMPRESSION):
+        """壓縮位元組資料"""
+        algorithm = CompressedStorage.algorithm(algorithm)
+        if algorithm == "zstd":
+            return zstandard.ZstdCompressor(level=STORAGE_ZSTD_LEVEL).compress(data)
+        if algorithm == "gzip":
+            # 固定 mtime，相同內容壓縮結果一致
+            return gzip.compress(data, compresslevel=STORAGE_GZIP_LEVEL, mtime=0)
+        return data
+
+    @staticmethod
+    def detect(data):
+        """依開頭的魔術位元組判斷壓縮格式，未壓縮時回傳 None"""
+        if data[:4] == _ZSTD_MAGIC:
+            return "zstd"
+        if data[:2] == _GZIP_MAGIC:
+            return "gzip"
+        return None
+
+    @staticmethod
+    def decompress(data):
+        """解壓縮位元組資料，未壓縮的資料原樣回傳"""
+        algorithm = CompressedStorage.detect(data)
+        if algorithm == "zstd":
+            if zstandard is None:
+                raise RuntimeError("此檔案以 zstd 壓縮，請先安裝 zstandard: pip install zstandard")
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        if algorithm == "gzip":
+            return gzip.decompress(data)
+        return data
+
+    @staticmethod
+    def decode(value):
+        """將資料庫中的文字或壓縮後的位元組還原為文字"""
+        if value is None or isinstance(value, str):
+            return value
+        return CompressedStorage.decompress(bytes(value)).decode("utf-8")
+
+    @staticmethod
+    def candidates(path):
+        """原始路徑可能對應的實際檔案 (壓縮檔優先)"""
+        return [path + suffix for suffix in SUFFIXES.values()] + [path]
+
+    @staticmethod
+    def resolve(path):
+        """取得實際存在的檔案路徑，都不存在時回傳 None"""
+        for candidate in CompressedStorage.candidates(path):
+            if os.path.exists(candidate):
+                return candidate
+        return None
+
+    @staticmethod
+    def exists(path):
+        return CompressedStorage.resolve(path) is not None
+
+    @staticmethod
+    def logical_name(name):
+        """去除壓縮副檔名，取得原本的檔名"""
+        for suffix in SUFFIXES.values():
+            if name.endswith(suffix):
+                return name[:-len(suffix)]
+        return name
+
+    @staticmethod
+    def stored_size(path):
+        """實際佔用的檔案大小，檔案不存在時回傳 0"""
+        physical_path = CompressedStorage.resolve(path)
+        return os.path.getsize(physical_path) if physical_path else 0
+
+    @staticmethod
+    def read_bytes(path):
+        """讀取並解壓縮檔案"""
+        physical_path = CompressedStorage.resolve(path)
+        if physical_path is None:
+            raise FileNotFoundError(f"找不到檔案: {path}")
+        with open(physical_path, "rb") as f:
+            return CompressedStorage.decompress(f.read())
+
+    @staticmethod
+    def read_text(path):
+        return CompressedStorage.read_bytes(path).decode("utf-8")
+
+    @staticmethod
+    def write_bytes(path, data, algorithm=STORAGE_COMPRESSION):
+        """壓縮並寫入檔案 (先寫入暫存檔再取代)，移除其他格式的舊檔案，回傳 (實際路徑, 檔案大小)"""
+        algorithm = CompressedStorage.algorithm(algorithm)
+        physical_path = path + SUFFIXES[algorithm] if algorithm else path
+        payload = CompressedStorage.compress(data, algorithm)
+
+        temp_path = physical_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(payload)
+        os.replace(temp_path, physical_path)
+
+        for candidate in CompressedStorage.candidates(path):
+            if candidate != physical_path and os.path.exists(candidate):
+                os.remove(candidate)
+        return physical_path, len(payload)
+
+    @staticmethod
+    def write_text(path, text, algorithm=STORAGE_COMPRESSION):
+        return CompressedStorage.write_bytes(path, text.encode("utf-8"), algorithm)
+
+    @staticmethod
+    def extract(path, target_path):
+        """將 (可能已壓縮的) 檔案解壓縮為一般檔案，來源不存在時回傳 False"""
+        if not CompressedStorage.exists(path):
+            return False
+        with open(target_path, "wb") as f:
+            f.write(CompressedStorage.read_bytes(path))
+        return True
+
+    @staticmethod
+    def remove(path):
+        """刪除所有格式的檔案，回傳刪除的檔案數"""
+        removed = 0
+        for candidate in CompressedStorage.candidates(path):
+            if os.path.exists(candidate):
+                os.remove(candidate)
+                removed += 1
+        return removed
+
+    @staticmethod
+    def convert(path, algorithm=STORAGE_COMPRESSION):
+        """
+        將既有檔案轉換為指定的壓縮格式 (已是該格式時不重寫)
+
+        回傳 (原始大小, 轉換後大小)；檔案不存在時回傳 None。
+        """
+        physical_path = CompressedStorage.resolve(path)
+        if physical_path is None:
+            return None
+        data = CompressedStorage.read_bytes(path)
+        algorithm = CompressedStorage.algorithm(algorithm)
+        target_path = path + SUFFIXES[algorithm] if algorithm else path
+        if physical_path == target_path:
+            return len(data), os.path.getsize(physical_path)
+        _, stored_size = CompressedStorage.write_bytes(path, data, algorithm)
+        return len(data), stored_size
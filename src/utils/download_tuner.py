@@ -0,0 +1,192 @@
+"""
+音訊下載調校模組
+依各網站最近實測的下載速度選擇 yt-dlp 的分段連線數與區塊大小 (在 DOWNLOAD_PROFILES 中爬坡：先試最快設定的相鄰設定，
+之後使用平均速度最快者並定期重新測量)，同時進行的下載共用連線數與頻寬上限；
+每次下載的實際速度記錄為效能指標 (audio_download)，重新啟動後從記錄載入，不需重新摸索
+"""
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from src.core.config import (
+    DOWNLOAD_PROFILES, DOWNLOAD_DEFAULT_PROFILE, DOWNLOAD_MAX_CONNECTIONS, DOWNLOAD_MAX_BANDWIDTH_MBPS,
+    DOWNLOAD_HISTORY, DOWNLOAD_EXPLORE_EVERY
+)
+from src.utils.metrics import MetricsRecorder
+
+# yt-dlp --newline 的完成行，例如 "[download] 100% of   45.67MiB in 00:00:12 at 3.71MiB/s"
+_COMPLETED_PATTERN = re.compile(r"\[download\]\s+100(?:\.0+)?% of\s+~?\s*([\d.]+)\s*([KMGT]?i?B)\s+in\s+([\d:]+)")
+_UNITS = {
+    "B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4,
+    "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4
+}
+_MB = 1024 ** 2
+
+
+class DownloadLease:
+    """一次下載使用的設定，下載完成後以 record() 回報 yt-dlp 的輸出"""
+
+    def __init__(self, tuner, host, profile, fragments, limit_mbps, concurrent):
+        self.tuner = tuner
+        self.host = host
+        self.profile = profile
+        self.fragments = fragments
+        self.chunk_size = tuner.profiles[profile]["chunk_size"]
+        self.limit_mbps = limit_mbps
+        self.concurrent = concurrent
+
+    @property
+    def capped(self):
+        """連線數因共用上限而少於設定值 (此時的速度不代表該設定)"""
+        return self.fragments < self.tuner.profiles[self.profile]["fragments"]
+
+    @property
+    def limit_rate(self):
+        """yt-dlp --limit-rate 參數，不限制時為 None"""
+        return f"{self.limit_mbps * 1024:.0f}K" if self.limit_mbps else None
+
+    def record(self, output, seconds):
+        """記錄此次下載的速度 (seconds 為整個 yt-dlp 的執行秒數，含轉檔)，回傳 MB/s (無法判斷時為 None)"""
+        return self.tuner.record(self, output, seconds)
+
+
+class DownloadTuner:
+    """
+    依網站選擇下載設定
+
+    速度以 yt-dlp 回報的下載量與下載秒數計算 (不含轉為 mp3 的時間)。連線數上限由所有進行中的下載共用，
+    不足時減少新下載的連線數；頻寬上限在下載開始時依進行中的下載數平分。
+    """
+
+    def __init__(self, profiles=DOWNLOAD_PROFILES, default_profile=DOWNLOAD_DEFAULT_PROFILE,
+                 max_connections=DOWNLOAD_MAX_CONNECTIONS, max_bandwidth_mbps=DOWNLOAD_MAX_BANDWIDTH_MBPS,
+                 history=DOWNLOAD_HISTORY, explore_every=DOWNLOAD_EXPLORE_EVERY, load_history=True):
+        self.profiles = list(profiles)
+        self.default_profile = min(max(0, default_profile), len(self.profiles) - 1)
+        self.max_connections = max_connections
+        self.max_bandwidth_mbps = max_bandwidth_mbps
+        self.history = history
+        self.explore_every = explore_every
+        self._lock = threading.Lock()
+        self._samples = {}      # 網站 -> deque[(設定索引, MB/s)]
+        self._downloads = {}    # 網站 -> 下載次數
+        self._connections = 0
+        self._active = 0
+        if load_history:
+            for entry in MetricsRecorder.read_recent("audio_download"):
+                profile, mbps = entry.get("profile"), entry.get("mbps")
+                if isinstance(profile, int) and 0 <= profile < len(self.profiles) and mbps and not entry.get("capped"):
+                    self._remember(entry.get("host"), profile, mbps)
+
+    @staticmethod
+    def host_of(url):
+        """網址的網站名稱 (同一網站的不同子網域視為相同)"""
+        host = (urlsplit(url).hostname or "").lower()
+        for prefix in ("www.", "m.", "music."):
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                break
+        return {"youtu.be": "youtube.com"}.get(host, host)
+
+    @staticmethod
+    def parse_download(output):
+        """解析 yt-dlp --newline 的輸出，回傳 (下載位元組數, 下載秒數)；沒有完成的下載時回傳 None"""
+        total_bytes, total_seconds = 0.0, 0
+        for size, unit, elapsed in _COMPLETED_PATTERN.findall(output):
+            if unit not in _UNITS:
+                continue
+            seconds = 0
+            for part in elapsed.split(":"):
+                seconds = seconds * 60 + int(part)
+            total_bytes += float(size) * _UNITS[unit]
+            total_seconds += seconds
+        return (int(total_bytes), total_seconds) if total_bytes else None
+
+    def _remember(self, host, profile, mbps):
+        if host:
+            self._samples.setdefault(host, deque(maxlen=self.history)).append((profile, float(mbps)))
+
+    def _means(self, host):
+        speeds = {}
+        for profile, mbps in self._samples.get(host, ()):
+            speeds.setdefault(profile, []).append(mbps)
+        return {profile: sum(values) / len(values) for profile, values in speeds.items()}
+
+    def throughput(self, host):
+        """各設定在此網站最近的平均速度 {設定索引: MB/s}"""
+        with self._lock:
+            return {profile: round(mbps, 3) for profile, mbps in self._means(host).items()}
+
+    def _choose(self, host):
+        means = self._means(host)
+        if not means:
+            return self.default_profile
+        best = max(means, key=means.get)
+        neighbors = [profile for profile in (best + 1, best - 1) if 0 <= profile < len(self.profiles)]
+        untried = [profile for profile in neighbors if profile not in means]
+        if untried:
+            return untried[0]
+        count = self._downloads.get(host, 0)
+        if neighbors and self.explore_every and count % self.explore_every == self.explore_every - 1:
+            return neighbors[(count // self.explore_every) % len(neighbors)]
+        return best
+
+    @contextmanager
+    def lease(self, url):
+        """取得此網址的下載設定 (DownloadLease)，離開時歸還佔用的連線數"""
+        host = self.host_of(url)
+        with self._lock:
+            profile = self._choose(host)
+            self._downloads[host] = self._downloads.get(host, 0) + 1
+            fragments = min(self.profiles[profile]["fragments"], max(1, self.max_connections - self._connections))
+            self._connections += fragments
+            self._active += 1
+            limit_mbps = round(self.max_bandwidth_mbps / self._active, 3) if self.max_bandwidth_mbps else None
+            lease = DownloadLease(self, host, profile, fragments, limit_mbps, self._active)
+        try:
+            yield lease
+        finally:
+            with self._lock:
+                self._connections -= fragments
+                self._active -= 1
+
+    def record(self, lease, output, seconds):
+        parsed = self.parse_download(output)
+        size, download_seconds = parsed if parsed else (None, None)
+        mbps = round(size / _MB / download_seconds, 3) if size and download_seconds else None
+        if mbps and not lease.capped:
+            with self._lock:
+                self._remember(lease.host, lease.profile, mbps)
+        MetricsRecorder.record(
+            "audio_download", host=lease.host, profile=lease.profile, fragments=lease.fragments,
+            chunk_size=lease.chunk_size, capped=lease.capped, limit_mbps=lease.limit_mbps,
+            concurrent=lease.concurrent, mb=round(size / _MB, 3) if size else None,
+            download_seconds=download_seconds, seconds=round(seconds, 3), mbps=mbps
+        )
+        return mbps
+
+    def stats(self):
+        """進行中的下載數、佔用的連線數與各網站各設定的平均速度"""
+        with self._lock:
+            return {
+                "active": self._active,
+                "connections": self._connections,
+                "hosts": {
+                    host: {profile: round(mbps, 3) for profile, mbps in self._means(host).items()}
+                    for host in self._samples
+                }
+            }
+
+
+_download_tuner = None
+_download_tuner_lock = threading.Lock()
+
+
+def get_download_tuner():
+    """取得共用的下載調校器 (同一程序中的所有下載共用連線數與頻寬上限)"""
+    global _download_tuner
+    with _download_tuner_lock:
+        if _download_tuner is None:
+            _download_tuner = DownloadTuner()
+        return _download_tuner
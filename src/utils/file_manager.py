@@ -4,9 +4,15 @@
 """
 import os
 import re
-import glob
+import json
+import time
+import uuid
 import streamlit as st
-from src.core.config import AUDIO_FILENAME, SUBTITLE_FILENAME, TRANSCRIPT_FILENAME, TRANSCRIPTS_FOLDER
+from src.core.config import (
+    AUDIO_FILENAME, SUBTITLE_FILENAME, TRANSCRIPT_FILENAME, TRANSCRIPTS_FOLDER,
+    SEGMENTS_FILENAME, SEGMENTS_SUFFIX, DEFAULT_REPORT_NAME
+)
+from src.utils.transcript_store import TranscriptStore
 
 
 class FileManager:
@@ -22,24 +28,11 @@ class FileManager:
             return False
         
         try:
-            with open(SUBTITLE_FILENAME, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            text_lines = []
-            for line in lines:
-                line = line.strip()
-                if (line.startswith('WEBVTT') or 
-                    '-->' in line or 
-                    line == '' or 
-                    line.isdigit()):
-                    continue
-                
-                clean_line = re.sub(r'<[^>]+>', '', line)
-                if clean_line:
-                    text_lines.append(clean_line)
+            transcript_text, segments = FileManager.parse_vtt(SUBTITLE_FILENAME)
             
             with open(TRANSCRIPT_FILENAME, 'w', encoding='utf-8') as f:
-                f.write(' '.join(text_lines))
+                f.write(transcript_text)
+            FileManager.write_segments(segments)
             
             st.success(f"✅ 字幕已成功轉換為文字並儲存為 {TRANSCRIPT_FILENAME}")
             return True
@@ -49,36 +42,100 @@ class FileManager:
             return False
     
     @staticmethod
-    def save_transcript(video_title):
-        """將逐字稿保存到指定資料夾，以影片標題命名"""
-        try:
-            # 建立逐字稿資料夾
-            if not os.path.exists(TRANSCRIPTS_FOLDER):
-                os.makedirs(TRANSCRIPTS_FOLDER)
-                st.info(f"📁 已建立逐字稿資料夾: {TRANSCRIPTS_FOLDER}")
+    def parse_vtt(subtitle_path):
+        """解析 VTT 字幕檔，回傳 (純文字, 時間軸片段)"""
+        with open(subtitle_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        
+        text_lines = []
+        segments = []
+        cue_start, cue_end = None, None
+        for line in lines:
+            line = line.strip()
+            if '-->' in line:
+                cue_start, cue_end = FileManager._parse_vtt_timing(line)
+                continue
+            if (line.startswith('WEBVTT') or 
+                line == '' or 
+                line.isdigit()):
+                continue
             
+            clean_line = re.sub(r'<[^>]+>', '', line)
+            if clean_line:
+                text_lines.append(clean_line)
+                # 自動字幕會在相鄰字幕塊重複上一行，時間軸只保留一次
+                if cue_start is not None and not (segments and segments[-1]["text"] == clean_line):
+                    segments.append({"start": cue_start, "end": cue_end, "text": clean_line})
+        return ' '.join(text_lines), segments
+    
+    @staticmethod
+    def _parse_vtt_timing(line):
+        """解析 VTT 時間軸行，回傳 (開始秒數, 結束秒數)"""
+        def to_seconds(timestamp):
+            parts = timestamp.strip().split()[0].replace(',', '.').split(':')
+            seconds = 0.0
+            for part in parts:
+                seconds = seconds * 60 + float(part)
+            return round(seconds, 2)
+        
+        try:
+            start, end = line.split('-->', 1)
+            return to_seconds(start), to_seconds(end)
+        except (ValueError, IndexError):
+            return None, None
+    
+    @staticmethod
+    def write_segments(segments, segments_path=SEGMENTS_FILENAME):
+        """以 JSON Lines 格式寫入逐字稿時間軸"""
+        with open(segments_path, 'w', encoding='utf-8') as f:
+            for segment in segments:
+                f.write(json.dumps(segment, ensure_ascii=False) + '\n')
+    
+    @staticmethod
+    def load_segments(segments_path=SEGMENTS_FILENAME):
+        """讀取逐字稿時間軸，檔案不存在時回傳空列表"""
+        if not os.path.exists(segments_path):
+            return []
+        segments = []
+        with open(segments_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    segments.append(json.loads(line))
+        return segments
+    
+    @staticmethod
+    def segments_path_for(transcript_path):
+        """取得已保存逐字稿對應的時間軸檔案路徑"""
+        return os.path.splitext(transcript_path)[0] + SEGMENTS_SUFFIX
+    
+    @staticmethod
+    def report_path(save_path, title):
+        """建立報告檔案路徑：以標題與時間命名並加上隨機後綴，同時處理的工作不會互相覆寫"""
+        safe_title = re.sub(r'[\\/:*?"<>|\s]+', "_", title).strip("_")[:80] or DEFAULT_REPORT_NAME
+        return os.path.join(
+            save_path, f"{DEFAULT_REPORT_NAME}_{safe_title}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.txt"
+        )
+    
+    @staticmethod
+    def save_transcript(video_title, video_id=None, duration=None, language=None, model=None, source=None):
+        """將逐字稿保存到指定資料夾並登錄至逐字稿目錄，以影片標題命名，回傳目錄記錄 (失敗時回傳 False)"""
+        try:
             # 檢查逐字稿檔案是否存在
             if not os.path.exists(TRANSCRIPT_FILENAME):
                 st.error(f"❌ 找不到逐字稿檔案 {TRANSCRIPT_FILENAME}")
                 return False
             
-            # 建立目標檔案路徑
-            transcript_filename = f"{video_title}.txt"
-            target_path = os.path.join(TRANSCRIPTS_FOLDER, transcript_filename)
-            
-            # 如果檔案已存在，加上編號
-            counter = 1
-            original_target_path = target_path
-            while os.path.exists(target_path):
-                name, ext = os.path.splitext(original_target_path)
-                target_path = f"{name}_{counter}{ext}"
-                counter += 1
+            with open(TRANSCRIPT_FILENAME, "r", encoding="utf-8") as f:
+                transcript_text = f.read()
             
-            # 複製逐字稿檔案
-            import shutil
-            shutil.copy2(TRANSCRIPT_FILENAME, target_path)
-            st.success(f"💾 逐字稿已保存: {target_path}")
-            return True
+            # 同名逐字稿由目錄以內容雜湊區分，不必逐一嘗試編號
+            record = TranscriptStore().save(
+                transcript_text, video_title, video_id=video_id, duration=duration,
+                language=language, model=model, source=source, segments_path=SEGMENTS_FILENAME
+            )
+            st.success(f"💾 逐字稿已保存: {os.path.join(TRANSCRIPTS_FOLDER, record['filename'])}")
+            return record
             
         except Exception as e:
             st.error(f"❌ 保存逐字稿失敗: {e}")
@@ -101,7 +158,7 @@ class FileManager:
         """移除暫存檔案（逐字稿將被保存而不是刪除）"""
         st.write("🧹 步驟 5/6: 清理暫存檔案...")
         
-        files_to_remove = [AUDIO_FILENAME, SUBTITLE_FILENAME]
+        files_to_remove = [AUDIO_FILENAME, SUBTITLE_FILENAME, SEGMENTS_FILENAME]
         
         for filename in files_to_remove:
             try:
@@ -119,13 +176,4 @@ class FileManager:
             except OSError as e:
                 st.warning(f"⚠️ 無法刪除 Cookie 檔案 {cookie_file}: {e}")
         
-        # 清理所有臨時 cookie 檔案
-        temp_cookies = glob.glob("temp_cookie_*.txt")
-        for temp_cookie in temp_cookies:
-            try:
-                os.remove(temp_cookie)
-                st.write(f"🗑️ 已清理臨時 Cookie 檔案: {temp_cookie}")
-            except OSError as e:
-                st.warning(f"⚠️ 無法清理臨時 Cookie 檔案 {temp_cookie}: {e}")
-        
         st.write("✅ 步驟 6/6: 清理完畢。")
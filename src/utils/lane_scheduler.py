@@ -0,0 +1,180 @@
+"""
+優先佇列排程模組
+同一程序中的多個工作 (網頁介面、批次處理、工作 API) 共用有限的轉錄資源：
+互動與批次兩條佇列依權重分享，佇列內依預估用時由短到長分配，並隨等待時間提高優先順序避免長影片餓死；
+記錄各佇列的等待時間以檢查互動工作的 p95 延遲；等待中的請求在目前的取消權杖被取消時放棄等待
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from src.utils.cancellation import current_token
+from src.core.config import (
+    SCHEDULER_TRANSCRIBE_SLOTS, SCHEDULER_LANE_WEIGHTS, SCHEDULER_LANE_LIMITS, SCHEDULER_AGING_RATE,
+    SCHEDULER_ASR_SECONDS_PER_AUDIO_SECOND, SCHEDULER_CAPTION_COST_SECONDS, SCHEDULER_UNKNOWN_DURATION_SECONDS,
+    SCHEDULER_WAIT_HISTORY
+)
+
+# 等待資源時檢查取消權杖的間隔 (秒)
+CANCEL_POLL_SECONDS = 0.5
+
+INTERACTIVE, BATCH = "interactive", "batch"
+
+
+class Ticket:
+    """一個等待 (或已取得) 資源的請求"""
+
+    def __init__(self, lane, cost):
+        self.lane = lane
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+
+    @property
+    def wait_seconds(self):
+        return (self.granted_at or time.monotonic()) - self.enqueued_at
+
+
+class LaneScheduler:
+    """
+    多佇列加權排程
+
+    佇列之間以 stride 排程分享資源：每次分配後該佇列累加「預估用時 / 權重」，下次分配給累計值最小的佇列，
+    互動佇列權重較高，但批次佇列仍會輪到。佇列內挑選「預估用時 - 已等待秒數 × aging_rate」最小的請求。
+    """
+
+    def __init__(self, slots=SCHEDULER_TRANSCRIBE_SLOTS, lane_weights=SCHEDULER_LANE_WEIGHTS,
+                 lane_limits=SCHEDULER_LANE_LIMITS, aging_rate=SCHEDULER_AGING_RATE, history=SCHEDULER_WAIT_HISTORY):
+        self.slots = max(1, slots)
+        self.lane_weights = dict(lane_weights)
+        self.lane_limits = dict(lane_limits)
+        self.aging_rate = aging_rate
+        self._condition = threading.Condition()
+        self._waiting = {lane: [] for lane in self.lane_weights}
+        self._running = {lane: 0 for lane in self.lane_weights}
+        self._passes = {lane: 0.0 for lane in self.lane_weights}
+        self._granted = {lane: 0 for lane in self.lane_weights}
+        self._waits = {lane: deque(maxlen=history) for lane in self.lane_weights}
+
+    @staticmethod
+    def estimate_cost(duration, has_captions=False):
+        """依影片長度與是否有字幕估計處理秒數"""
+        if has_captions:
+            return SCHEDULER_CAPTION_COST_SECONDS
+        return (duration or SCHEDULER_UNKNOWN_DURATION_SECONDS) * SCHEDULER_ASR_SECONDS_PER_AUDIO_SECOND
+
+    def acquire(self, lane, cost, on_wait=None):
+        """
+        等待並取得一個資源，回傳 Ticket (用畢需 release)；需要等待時先呼叫一次 on_wait()
+
+        等待期間目前的取消權杖被取消時放棄等待並拋出 OperationCancelled。
+        """
+        if lane not in self.lane_weights:
+            raise ValueError(f"不支援的佇列: {lane}")
+        ticket = Ticket(lane, cost)
+        token = current_token()
+        with self._condition:
+            if not self._waiting[lane] and not self._running[lane]:
+                # 閒置的佇列不累積額度：重新開始時從其他進行中佇列的最小累計值起算
+                active = [
+                    self._passes[name] for name in self.lane_weights
+                    if name != lane and (self._waiting[name] or self._running[name])
+                ]
+                if active:
+                    self._passes[lane] = max(self._passes[lane], min(active))
+            self._waiting[lane].append(ticket)
+            self._dispatch()
+            if ticket.granted_at is None and on_wait:
+                self._condition.release()
+                try:
+                    on_wait()
+                finally:
+                    self._condition.acquire()
+            try:
+                while ticket.granted_at is None:
+                    self._condition.wait(CANCEL_POLL_SECONDS)
+                    if ticket.granted_at is None:
+                        token.check()
+            except BaseException:
+                # 放棄等待：尚未分配時移出佇列，剛好已分配時立即歸還
+                if ticket.granted_at is None:
+                    self._waiting[lane].remove(ticket)
+                else:
+                    self._running[lane] -= 1
+                    self._dispatch()
+                raise
+        return ticket
+
+    def release(self, ticket):
+        with self._condition:
+            self._running[ticket.lane] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, lane, cost, on_wait=None):
+        ticket = self.acquire(lane, cost, on_wait)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _eligible(self, lane):
+        limit = self.lane_limits.get(lane)
+        return self._waiting[lane] and (limit is None or self._running[lane] < limit)
+
+    def _dispatch(self):
+        """有空的資源時依排程規則分配 (呼叫時需持有鎖)"""
+        granted = False
+        while sum(self._running.values()) < self.slots:
+            lanes = [lane for lane in self.lane_weights if self._eligible(lane)]
+            if not lanes:
+                break
+            lane = min(lanes, key=lambda name: self._passes[name])
+            now = time.monotonic()
+            ticket = min(self._waiting[lane], key=lambda waiting: waiting.cost - (now - waiting.enqueued_at) * self.aging_rate)
+            self._waiting[lane].remove(ticket)
+            ticket.granted_at = now
+            self._running[lane] += 1
+            self._granted[lane] += 1
+            self._passes[lane] += max(ticket.cost, 1.0) / self.lane_weights[lane]
+            self._waits[lane].append(ticket.wait_seconds)
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    @staticmethod
+    def _percentile(values, percent):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))], 3)
+
+    def stats(self):
+        """各佇列的等待數、執行數、已分配數與最近等待時間 (p50 / p95 / 最大值，秒)"""
+        with self._condition:
+            now = time.monotonic()
+            return {
+                lane: {
+                    "waiting": len(self._waiting[lane]),
+                    "running": self._running[lane],
+                    "granted": self._granted[lane],
+                    "oldest_wait": round(max((now - ticket.enqueued_at for ticket in self._waiting[lane]), default=0.0), 3),
+                    "wait_p50": self._percentile(self._waits[lane], 50),
+                    "wait_p95": self._percentile(self._waits[lane], 95),
+                    "wait_max": round(max(self._waits[lane]), 3) if self._waits[lane] else None
+                }
+                for lane in self.lane_weights
+            }
+
+
+_transcribe_scheduler = None
+_transcribe_scheduler_lock = threading.Lock()
+
+
+def get_transcribe_scheduler():
+    """取得共用的轉錄資源排程器"""
+    global _transcribe_scheduler
+    with _transcribe_scheduler_lock:
+        if _transcribe_scheduler is None:
+            _transcribe_scheduler = LaneScheduler()
+        return _transcribe_scheduler
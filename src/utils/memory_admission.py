@@ -0,0 +1,345 @@
+"""
+記憶體控管模組
+同一程序中同時進行的轉錄 (網頁介面、批次處理、工作節點) 共用記憶體預算：依模型大小、運算精度與音訊長度估計
+每次轉錄的峰值記憶體，合計會超過預算時延後執行，等待過久或無論如何都放不下時改用較小的模型，避免程序被系統終止。
+各階段實測的峰值 RSS 記錄為效能指標 (memory_stage)，並用來修正之後的估計。
+psutil 為選用套件，未安裝時在 Linux 讀取 /proc，其他系統只依估計值控管
+"""
+import os
+import time
+import wave
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from src.core.config import (
+    MEMORY_BUDGET_MB, MEMORY_BUDGET_FRACTION, MEMORY_FALLBACK_BUDGET_MB, MEMORY_MODEL_MB, MEMORY_COMPUTE_TYPE_FACTORS,
+    MEMORY_TRANSCRIBE_OVERHEAD_MB, MEMORY_AUDIO_MB_PER_SECOND, MEMORY_DOWNGRADE, MEMORY_DEFER_SECONDS,
+    MEMORY_SAMPLE_SECONDS, MEMORY_ESTIMATE_HISTORY
+)
+from src.utils.cancellation import current_token
+from src.utils.metrics import MetricsRecorder
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+_MB = 1024 ** 2
+# 無法從檔頭得知長度的音訊 (yt-dlp 轉出的 mp3) 以約 128 kbps 估計秒數
+_COMPRESSED_BYTES_PER_SECOND = 16000
+
+
+def process_rss_mb():
+    """目前程序的常駐記憶體 (MB)，無法取得時回傳 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / _MB
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def available_mb():
+    """系統目前可用的記憶體 (MB)，無法取得時回傳 None"""
+    if psutil is not None:
+        return psutil.virtual_memory().available / _MB
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def audio_seconds_of(audio_path):
+    """音訊長度 (秒)：WAV 讀取檔頭，其他格式依檔案大小估計；無法讀取時回傳 None"""
+    try:
+        if audio_path.lower().endswith(".wav"):
+            with wave.open(audio_path, "rb") as f:
+                return f.getnframes() / f.getframerate()
+        return os.path.getsize(audio_path) / _COMPRESSED_BYTES_PER_SECOND
+    except (OSError, EOFError, wave.Error, ZeroDivisionError):
+        return None
+
+
+class PeakTracker:
+    """一段處理期間的 RSS 起始值與峰值 (MB)"""
+
+    def __init__(self, start_mb):
+        self.start_mb = start_mb
+        self.peak_mb = start_mb
+
+    @property
+    def delta_mb(self):
+        return self.peak_mb - self.start_mb
+
+
+class RssSampler:
+    """以單一背景執行緒定期取樣 RSS，更新所有進行中的 PeakTracker；沒有追蹤對象時執行緒結束"""
+
+    def __init__(self, rss_reader=process_rss_mb, interval=MEMORY_SAMPLE_SECONDS):
+        self.rss_reader = rss_reader
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._trackers = set()
+        self._thread = None
+
+    @contextmanager
+    def track(self):
+        """在 with 區塊內追蹤 RSS 峰值，yield PeakTracker (無法取得 RSS 時為 None)"""
+        start_mb = self.rss_reader()
+        if start_mb is None:
+            yield None
+            return
+        tracker = PeakTracker(start_mb)
+        with self._lock:
+            self._trackers.add(tracker)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        try:
+            yield tracker
+        finally:
+            end_mb = self.rss_reader()
+            with self._lock:
+                self._trackers.discard(tracker)
+                if end_mb is not None:
+                    tracker.peak_mb = max(tracker.peak_mb, end_mb)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            rss_mb = self.rss_reader()
+            with self._lock:
+                if not self._trackers:
+                    self._thread = None
+                    return
+                if rss_mb is not None:
+                    for tracker in self._trackers:
+                        tracker.peak_mb = max(tracker.peak_mb, rss_mb)
+
+
+class MemoryAdmission:
+    """
+    轉錄的記憶體預算
+
+    目前用量取「啟動時的 RSS + 已載入的模型 + 進行中轉錄的預留」與實測 RSS 的較大者；預留為工作記憶體，
+    模型尚未載入時另加模型大小。已載入的模型依模型快取 (見 VideoProcessor.load_whisper_model) 實際載入後才計入，
+    並依最近使用的順序記錄。放不下時先卸載閒置的模型 (最久未使用者優先)，仍放不下時：等待其他轉錄結束可放下者
+    延後執行 (最多 defer_seconds 秒)，否則改用 MEMORY_DOWNGRADE 中放得下的較小模型；沒有其他轉錄可等而任何模型
+    都放不下時以最小的模型執行，並在效能指標中標記 over_budget。
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, rss_reader=process_rss_mb, defer_seconds=MEMORY_DEFER_SECONDS,
+                 history=MEMORY_ESTIMATE_HISTORY, load_history=True):
+        self.rss_reader = rss_reader
+        self.baseline_mb = rss_reader() or 0.0
+        if budget_mb is None:
+            available = available_mb()
+            budget_mb = self.baseline_mb + available * MEMORY_BUDGET_FRACTION if available else MEMORY_FALLBACK_BUDGET_MB
+        self.budget_mb = round(budget_mb, 1)
+        self.defer_seconds = defer_seconds
+        self.history = history
+        self.sampler = RssSampler(rss_reader)
+        self._condition = threading.Condition()
+        self._resident = OrderedDict()  # 已載入的模型 -> 估計 MB (最久未使用者在前)
+        self._active = {}               # 進行中的轉錄 -> (模型, 模型 MB, 工作記憶體 MB)
+        self._in_use = {}               # 模型 -> 進行中的轉錄數
+        self._ratios = {}               # 模型 -> deque[實測 / 估計]
+        self._over_budget = 0
+        if load_history:
+            for entry in MetricsRecorder.read_recent("memory_stage"):
+                if entry.get("stage") == "transcribe" and entry.get("estimate_mb") and entry.get("delta_mb") is not None:
+                    self._remember(entry.get("model"), entry["delta_mb"] / entry["estimate_mb"])
+
+    def _remember(self, model, ratio):
+        if model:
+            self._ratios.setdefault(model, deque(maxlen=self.history)).append(min(max(ratio, 0.5), 3.0))
+
+    def correction(self, model):
+        """依最近實測修正估計的倍數 (取最近的最大值，寧可高估)"""
+        ratios = self._ratios.get(model)
+        return max(ratios) if ratios else 1.0
+
+    def estimate(self, model, audio_seconds, compute_type="int8", loaded=False):
+        """估計轉錄增加的記憶體 (MB)，回傳 (模型, 工作記憶體)；模型已載入時模型部分為 0"""
+        correction = self.correction(model)
+        model_mb = 0.0
+        if not loaded:
+            model_mb = MEMORY_MODEL_MB.get(model, max(MEMORY_MODEL_MB.values())) * MEMORY_COMPUTE_TYPE_FACTORS.get(compute_type, 1.0)
+        working_mb = MEMORY_TRANSCRIBE_OVERHEAD_MB + (audio_seconds or 0) * MEMORY_AUDIO_MB_PER_SECOND
+        return round(model_mb * correction, 1), round(working_mb * correction, 1)
+
+    def _sync_resident(self, loaded, compute_type):
+        """依模型快取中實際載入的模型更新記錄 (載入失敗、已卸載或預先載入的模型)"""
+        for name in list(self._resident):
+            if name not in loaded:
+                del self._resident[name]
+        for name in loaded:
+            if name not in self._resident:
+                self._resident[name] = self.estimate(name, 0, compute_type)[0]
+
+    def _usage(self):
+        static_mb = self.baseline_mb + sum(self._resident.values())
+        reserved_mb, loading = 0.0, {}
+        for name, model_mb, working_mb in self._active.values():
+            reserved_mb += working_mb
+            if name not in self._resident:
+                loading[name] = max(loading.get(name, 0.0), model_mb)
+        return static_mb, max(static_mb + reserved_mb + sum(loading.values()), self.rss_reader() or 0.0)
+
+    def _evictions(self, option, usage_mb):
+        """放下 option 需要卸載的閒置模型 (最久未使用者優先)；卸載所有閒置模型仍放不下時回傳 None"""
+        excess_mb = usage_mb + option[1] + option[2] - self.budget_mb
+        evict = []
+        for name, model_mb in self._resident.items():
+            if excess_mb <= 0:
+                break
+            if name != option[0] and not self._in_use.get(name):
+                evict.append(name)
+                excess_mb -= model_mb
+        return evict if excess_mb <= 0 else None
+
+    def _select(self, model, audio_seconds, compute_type, allow_downgrade, waited_seconds, can_unload):
+        """
+        選擇可以執行的模型，回傳 ((模型, 模型 MB, 工作記憶體 MB), 需卸載的模型, 是否超出預算)；
+        需要等待時回傳 None (呼叫時需持有鎖)
+        """
+        candidates = [model]
+        while allow_downgrade and candidates[-1] in MEMORY_DOWNGRADE:
+            candidates.append(MEMORY_DOWNGRADE[candidates[-1]])
+        options = [
+            (name,) + self.estimate(name, audio_seconds, compute_type, name in self._resident) for name in candidates
+        ]
+        static_mb, usage_mb = self._usage()
+        plans = []
+        for option in options:
+            evict = self._evictions(option, usage_mb)
+            if evict is not None and (can_unload or not evict):
+                plans.append((option, evict, False))
+        if plans and plans[0][0] is options[0]:
+            return plans[0]
+        if not self._active:
+            if plans:
+                return plans[0]
+            idle = [name for name in self._resident if name != options[-1][0]] if can_unload else []
+            return options[-1], idle, True
+        # 其他轉錄結束後 (閒置的模型都可卸載) 是否放得下要求的模型
+        floor_mb = self.baseline_mb + self._resident.get(model, 0.0) if can_unload else static_mb
+        fits_later = floor_mb + options[0][1] + options[0][2] <= self.budget_mb
+        if plans and (not fits_later or waited_seconds >= self.defer_seconds):
+            return plans[0]
+        return None
+
+    @contextmanager
+    def admit(self, model, audio_seconds=None, compute_type="int8", loaded_models=None, unload=None,
+              allow_downgrade=True, on_wait=None, on_over_budget=None):
+        """
+        取得轉錄所需的記憶體，在 with 區塊內轉錄；yield 實際使用的模型名稱
+
+        loaded_models 為回傳模型快取中已載入模型名稱的函式，unload(模型名稱) 卸載閒置的模型 (未提供時不卸載)。
+        需要等待時先呼叫一次 on_wait()，超出預算仍執行時呼叫 on_over_budget()；
+        等待期間目前的取消權杖被取消時拋出 OperationCancelled。離開時記錄實測的峰值 RSS 並修正估計。
+        """
+        loaded_models = loaded_models or tuple
+        token = current_token()
+        requested_at = time.monotonic()
+        waited = False
+        with self._condition:
+            while True:
+                self._sync_resident(loaded_models(), compute_type)
+                choice = self._select(
+                    model, audio_seconds, compute_type, allow_downgrade, time.monotonic() - requested_at,
+                    unload is not None
+                )
+                if choice is not None:
+                    break
+                if not waited and on_wait:
+                    self._condition.release()
+                    try:
+                        on_wait()
+                    finally:
+                        self._condition.acquire()
+                waited = True
+                self._condition.wait(MEMORY_SAMPLE_SECONDS)
+                token.check()
+            (granted, model_mb, working_mb), evict, over_budget = choice
+            for name in evict:
+                del self._resident[name]
+            ticket = object()
+            self._active[ticket] = (granted, model_mb, working_mb)
+            self._in_use[granted] = self._in_use.get(granted, 0) + 1
+            if granted in self._resident:
+                self._resident.move_to_end(granted)
+            self._over_budget += over_budget
+        # 卸載需等待模型快取的鎖 (可能正在載入其他模型)，不在持有控管的鎖時進行
+        for name in evict:
+            unload(name)
+        if over_budget and on_over_budget:
+            on_over_budget()
+        wait_seconds = round(time.monotonic() - requested_at, 3)
+
+        tracker = None
+        try:
+            with self.sampler.track() as tracker:
+                yield granted
+        finally:
+            with self._condition:
+                del self._active[ticket]
+                self._in_use[granted] -= 1
+                if not self._in_use[granted]:
+                    del self._in_use[granted]
+                self._sync_resident(loaded_models(), compute_type)
+                if granted in self._resident:
+                    self._resident.move_to_end(granted)
+                self._condition.notify_all()
+            estimate_mb = model_mb + working_mb
+            if tracker is not None:
+                with self._condition:
+                    self._remember(granted, tracker.delta_mb / estimate_mb)
+            MetricsRecorder.record(
+                "memory_stage", stage="transcribe", model=granted, requested_model=model, compute_type=compute_type,
+                audio_seconds=round(audio_seconds, 1) if audio_seconds else None, estimate_mb=estimate_mb,
+                start_mb=round(tracker.start_mb, 1) if tracker else None,
+                peak_mb=round(tracker.peak_mb, 1) if tracker else None,
+                delta_mb=round(tracker.delta_mb, 1) if tracker else None,
+                wait_seconds=wait_seconds, budget_mb=self.budget_mb, evicted=evict or None, over_budget=over_budget
+            )
+
+    def stats(self):
+        """預算、目前用量、已載入的模型 (最久未使用者在前)、進行中的轉錄數與超出預算執行的次數"""
+        with self._condition:
+            static_mb, usage_mb = self._usage()
+            return {
+                "budget_mb": self.budget_mb, "usage_mb": round(usage_mb, 1), "resident_models": dict(self._resident),
+                "active": len(self._active), "in_use": dict(self._in_use), "over_budget": self._over_budget,
+                "reserved_mb": round(sum(model_mb + working_mb for _, model_mb, working_mb in self._active.values()), 1)
+            }
+
+
+@contextmanager
+def track_peak(stage, **fields):
+    """記錄一段處理的 RSS 峰值為效能指標 (memory_stage)；無法取得 RSS 時不記錄"""
+    with get_memory_admission().sampler.track() as tracker:
+        yield tracker
+    if tracker is not None:
+        MetricsRecorder.record(
+            "memory_stage", stage=stage, start_mb=round(tracker.start_mb, 1), peak_mb=round(tracker.peak_mb, 1),
+            delta_mb=round(tracker.delta_mb, 1), **fields
+        )
+
+
+_memory_admission = None
+_memory_admission_lock = threading.Lock()
+
+
+def get_memory_admission():
+    """取得共用的轉錄記憶體控管"""
+    global _memory_admission
+    with _memory_admission_lock:
+        if _memory_admission is None:
+            _memory_admission = MemoryAdmission()
+        return _memory_admission
@@ -0,0 +1,54 @@
+"""
+效能指標記錄模組
+以 JSON Lines 格式記錄各項處理指標，供後續分析與調校使用
+"""
+import os
+import json
+import time
+import threading
+from src.core.config import METRICS_FILENAME
+
+
+class MetricsRecorder:
+    """效能指標記錄器"""
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(event, **fields):
+        """記錄一筆指標資料，回傳寫入的內容"""
+        entry = {"event": event, "timestamp": round(time.time(), 3)}
+        entry.update(fields)
+
+        try:
+            with MetricsRecorder._lock:
+                metrics_dir = os.path.dirname(METRICS_FILENAME)
+                if metrics_dir:
+                    os.makedirs(metrics_dir, exist_ok=True)
+                with open(METRICS_FILENAME, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"寫入效能指標時發生錯誤: {e}")
+
+        return entry
+
+    @staticmethod
+    def read_recent(event, max_bytes=1024 * 1024):
+        """讀取記錄檔最後 max_bytes 內指定類型的指標 (由舊到新)，記錄檔不存在時回傳空列表"""
+        try:
+            with MetricsRecorder._lock, open(METRICS_FILENAME, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - max_bytes))
+                lines = f.read().decode("utf-8", errors="ignore").splitlines()
+        except OSError:
+            return []
+
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 截斷的第一行或損壞的資料
+            if isinstance(entry, dict) and entry.get("event") == event:
+                entries.append(entry)
+        return entries
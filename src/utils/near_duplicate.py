@@ -0,0 +1,98 @@
+"""
+近似重複偵測模組
+以 MinHash 簽章與 LSH 分帶找出內容近似的逐字稿（重新上傳、精華剪輯、轉載），
+逐字稿依固定長度的視窗各自產生簽章，片段內容也能對應到完整逐字稿中的位置
+"""
+import random
+import struct
+import hashlib
+from src.core.config import (
+    NEAR_DUPLICATE_NUM_PERM, NEAR_DUPLICATE_BANDS, NEAR_DUPLICATE_SHINGLE_TOKENS, NEAR_DUPLICATE_WINDOW_TOKENS
+)
+from src.utils.cjk_tokenizer import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 固定種子產生排列參數，確保簽章可跨程序比對；
+# shingle 雜湊為 32 位元、參數小於 2^31，a * x + b 不會超出 64 位元整數範圍
+_random = random.Random(20240601)
+_PERMUTATIONS = [
+    (_random.randrange(1, 1 << 31), _random.randrange(0, 1 << 31))
+    for _ in range(NEAR_DUPLICATE_NUM_PERM)
+]
+
+
+class MinHasher:
+    """MinHash 簽章與 LSH 分帶計算"""
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+    @staticmethod
+    def shingle_sequence(tokens, size=NEAR_DUPLICATE_SHINGLE_TOKENS):
+        """將連續 size 個 token 組成 shingle 並雜湊，依出現順序回傳"""
+        if len(tokens) < size:
+            return [MinHasher._hash(" ".join(tokens))] if tokens else []
+        return [MinHasher._hash(" ".join(tokens[i:i + size])) for i in range(len(tokens) - size + 1)]
+
+    @staticmethod
+    def shingles(text):
+        """取得整份文字的 shingle 雜湊集合"""
+        return set(MinHasher.shingle_sequence(tokenize(text)))
+
+    @staticmethod
+    def signature(hashes):
+        """計算 MinHash 簽章"""
+        if not hashes:
+            return None
+        if np is not None:
+            values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+            a = np.array([a for a, _ in _PERMUTATIONS], dtype=np.uint64)
+            b = np.array([b for _, b in _PERMUTATIONS], dtype=np.uint64)
+            permuted = ((values[:, None] * a + b) % np.uint64(_MERSENNE_PRIME)) & np.uint64(_MAX_HASH)
+            return permuted.min(axis=0).tolist()
+        return [
+            min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashes)
+            for a, b in _PERMUTATIONS
+        ]
+
+    @staticmethod
+    def window_signatures(text, window_tokens=NEAR_DUPLICATE_WINDOW_TOKENS):
+        """
+        將文字依視窗 (重疊一半) 切分並分別計算簽章
+
+        先計算每半個視窗的區塊簽章，相鄰兩個區塊逐項取最小值即為視窗簽章，重疊部分不必重算。
+        """
+        sequence = MinHasher.shingle_sequence(tokenize(text))
+        step = max(1, window_tokens // 2)
+        blocks = [
+            MinHasher.signature(set(sequence[begin:begin + step]))
+            for begin in range(0, len(sequence), step)
+        ]
+        if len(blocks) <= 1:
+            return blocks
+        return [list(map(min, left, right)) for left, right in zip(blocks, blocks[1:])]
+
+    @staticmethod
+    def band_buckets(signature, bands=NEAR_DUPLICATE_BANDS):
+        """將簽章分帶並雜湊為 LSH 桶編號 (分帶序號一併雜湊，各分帶的桶不會互相碰撞)"""
+        rows = len(signature) // bands
+        buckets = []
+        for band in range(bands):
+            packed = struct.pack(f"<I{rows}I", band, *signature[band * rows:(band + 1) * rows])
+            buckets.append(int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), "little", signed=True))
+        return buckets
+
+    @staticmethod
+    def containment(query_hashes, candidate_hashes):
+        """query 的 shingle 有多少比例出現在候選中"""
+        if not query_hashes:
+            return 0.0
+        return len(query_hashes & candidate_hashes) / len(query_hashes)
@@ -0,0 +1,110 @@
+"""
+外部程式執行模組
+以看門狗執行 yt-dlp / FFmpeg：超過該階段的總時間、持續沒有任何輸出，或目前的取消權杖被取消時，
+終止整個程序樹 (yt-dlp 會再啟動 FFmpeg)，不會留下卡住的子程序
+"""
+import os
+import time
+import signal
+import threading
+import subprocess
+from src.core.config import PROCESS_WATCHDOG, PROCESS_POLL_SECONDS
+from src.utils.cancellation import current_token
+
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+class ProcessWatchdogError(RuntimeError):
+    """外部程式逾時或停止輸出，已被終止"""
+
+
+class _OutputReader(threading.Thread):
+    """持續讀取輸出 (避免管線塞滿而卡住) 並記錄最後一次有輸出的時間"""
+
+    def __init__(self, stream, on_output):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.on_output = on_output
+        self.chunks = []
+
+    def run(self):
+        read = getattr(self.stream, "read1", self.stream.read)
+        while True:
+            chunk = read(65536)
+            if not chunk:
+                break
+            self.chunks.append(chunk)
+            self.on_output()
+
+    @property
+    def data(self):
+        return b"".join(self.chunks)
+
+
+def _kill_tree(process):
+    """終止程序與其子程序"""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, creationflags=_NO_WINDOW, timeout=10
+            )
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, subprocess.SubprocessError):
+        pass
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+
+
+def run_process(command, stage, env=None, timeout=None, idle_timeout=None):
+    """
+    執行外部程式並等待結束，回傳 subprocess.CompletedProcess (stdout / stderr 為 bytes)
+
+    stage 對應 PROCESS_WATCHDOG 的限制 (timeout / idle_timeout 可覆寫)。
+    逾時拋出 ProcessWatchdogError，目前的取消權杖被取消時拋出 OperationCancelled，兩者都會先終止程序樹。
+    """
+    limits = PROCESS_WATCHDOG.get(stage, {})
+    timeout = timeout or limits.get("timeout")
+    idle_timeout = idle_timeout or limits.get("idle")
+    token = current_token()
+    token.check()
+
+    last_output = [time.monotonic()]
+
+    def on_output():
+        last_output[0] = time.monotonic()
+
+    process = subprocess.Popen(
+        command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        creationflags=_NO_WINDOW, start_new_session=os.name != "nt"
+    )
+    readers = [_OutputReader(process.stdout, on_output), _OutputReader(process.stderr, on_output)]
+    for reader in readers:
+        reader.start()
+
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                process.wait(PROCESS_POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            token.check()
+            now = time.monotonic()
+            if timeout and now - started > timeout:
+                raise ProcessWatchdogError(f"{os.path.basename(command[0])} 超過 {timeout} 秒未完成，已終止")
+            if idle_timeout and now - last_output[0] > idle_timeout:
+                raise ProcessWatchdogError(f"{os.path.basename(command[0])} 超過 {idle_timeout} 秒沒有輸出，已終止")
+    finally:
+        _kill_tree(process)
+        for reader in readers:
+            reader.join(5)
+        process.stdout.close()
+        process.stderr.close()
+
+    return subprocess.CompletedProcess(command, process.returncode, readers[0].data, readers[1].data)
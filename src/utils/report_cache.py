@@ -0,0 +1,166 @@
+"""
+報告快取模組
+以逐字稿、Prompt 與模型組合為鍵，持久化保存 Gemini 產生的報告 (報告內容壓縮後存放)
+"""
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from contextlib import closing
+from src.core.config import REPORT_CACHE_DB, REPORT_CACHE_TTL_SECONDS, REPORT_CACHE_MAX_BYTES, STORAGE_COMPRESSION
+from src.utils.compressed_storage import CompressedStorage
+
+
+class ReportCache:
+    """報告快取 (SQLite)"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, db_path=REPORT_CACHE_DB, ttl_seconds=REPORT_CACHE_TTL_SECONDS, max_bytes=REPORT_CACHE_MAX_BYTES):
+        """初始化快取資料庫"""
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS report_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    transcript_hash TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_report_cache_access ON report_cache(last_access)")
+            # 舊版快取的報告為未壓縮文字，沒有壓縮後大小欄位
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(report_cache)")}
+            if "stored_size" not in columns:
+                conn.execute("ALTER TABLE report_cache ADD COLUMN stored_size INTEGER")
+
+    def _connect(self):
+        """建立資料庫連線"""
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    @staticmethod
+    def normalize_transcript(transcript_text):
+        """正規化逐字稿，避免空白差異造成快取失效"""
+        text = unicodedata.normalize("NFC", transcript_text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    @staticmethod
+    def _sha256(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def build_key(transcript_text, prompt_template, model_name):
+        """建立快取鍵：逐字稿雜湊 + Prompt 雜湊 + 模型"""
+        transcript_hash = ReportCache._sha256(ReportCache.normalize_transcript(transcript_text))
+        prompt_hash = ReportCache._sha256(prompt_template)
+        cache_key = ReportCache._sha256(f"{transcript_hash}:{prompt_hash}:{model_name}")
+        return cache_key, transcript_hash, prompt_hash
+
+    def get(self, transcript_text, prompt_template, model_name):
+        """查詢快取，未命中或已過期時回傳 None"""
+        cache_key, _, _ = self.build_key(transcript_text, prompt_template, model_name)
+        now = time.time()
+
+        with ReportCache._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT report, created_at FROM report_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            report, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM report_cache WHERE cache_key = ?", (cache_key,))
+                return None
+
+            conn.execute("UPDATE report_cache SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+            return CompressedStorage.decode(report)
+
+    def put(self, transcript_text, prompt_template, model_name, report):
+        """寫入快取並執行淘汰"""
+        cache_key, transcript_hash, prompt_hash = self.build_key(transcript_text, prompt_template, model_name)
+        now = time.time()
+        data = report.encode("utf-8")
+        payload = CompressedStorage.compress(data)
+
+        with ReportCache._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO report_cache
+                    (cache_key, transcript_hash, prompt_hash, model, report, size, stored_size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cache_key, transcript_hash, prompt_hash, model_name, sqlite3.Binary(payload), len(data),
+                 len(payload), now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        """淘汰過期項目，並依最近存取時間淘汰超出容量的項目"""
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM report_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+
+        if not self.max_bytes:
+            return
+
+        # 容量以實際佔用 (壓縮後) 的大小計算
+        total_size = conn.execute("SELECT COALESCE(SUM(COALESCE(stored_size, size)), 0) FROM report_cache").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        expired_keys = []
+        for cache_key, size in conn.execute(
+            "SELECT cache_key, COALESCE(stored_size, size) FROM report_cache ORDER BY last_access ASC"
+        ):
+            if total_size <= self.max_bytes:
+                break
+            expired_keys.append((cache_key,))
+            total_size -= size
+        conn.executemany("DELETE FROM report_cache WHERE cache_key = ?", expired_keys)
+
+    def invalidate(self, transcript_text, prompt_template, model_name):
+        """移除指定組合的快取"""
+        cache_key, _, _ = self.build_key(transcript_text, prompt_template, model_name)
+        with ReportCache._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM report_cache WHERE cache_key = ?", (cache_key,))
+
+    def stats(self):
+        """取得快取統計資訊"""
+        with closing(self._connect()) as conn:
+            count, total_size, stored_size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(stored_size, size)), 0) FROM report_cache"
+            ).fetchone()
+        return {"entries": count, "total_bytes": total_size, "stored_bytes": stored_size}
+
+    def compress_entries(self, algorithm=STORAGE_COMPRESSION):
+        """將既有快取項目轉換為指定的壓縮格式，回傳 (項目數, 原始位元組, 壓縮後位元組)"""
+        with ReportCache._lock, closing(self._connect()) as conn, conn:
+            rows = conn.execute("SELECT cache_key, report FROM report_cache").fetchall()
+            updates = []
+            original_bytes = stored_bytes = 0
+            for cache_key, report in rows:
+                data = CompressedStorage.decode(report).encode("utf-8")
+                payload = CompressedStorage.compress(data, algorithm)
+                # 不壓縮時以文字存回，與舊版快取相容
+                value = sqlite3.Binary(payload) if CompressedStorage.algorithm(algorithm) else data.decode("utf-8")
+                updates.append((value, len(data), len(payload), cache_key))
+                original_bytes += len(data)
+                stored_bytes += len(payload)
+            conn.executemany(
+                "UPDATE report_cache SET report = ?, size = ?, stored_size = ? WHERE cache_key = ?", updates
+            )
+        return len(rows), original_bytes, stored_bytes
@@ -0,0 +1,108 @@
+"""
+重複工作合併模組 (single-flight)
+同一程序中多個工作階段 / 批次工作同時處理同一部影片時，只由第一個 (leader) 下載與轉錄，
+其餘的 (follower) 附加到進行中的處理：可看到其進度，完成後取得同一份逐字稿記錄
+"""
+import threading
+
+
+class Flight:
+    """一項進行中的處理"""
+
+    def __init__(self, key):
+        self.key = key
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self._callbacks = []
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待處理完成，回傳是否已完成"""
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    """
+    依 key 合併同時進行的相同處理
+
+    join() 的第一個呼叫者成為 leader，需以 publish() 回報進度並在結束時呼叫 finish()；
+    之後的呼叫者取得同一個 Flight，可 wait() 等待，或提供 on_update(flight) 在加入、進度更新與完成時被呼叫
+    (加入時於 join() 中、之後於 leader 的執行緒中呼叫，不可長時間阻塞)。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key, on_update=None):
+        """加入 key 的處理，回傳 (Flight, 是否為 leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight(key)
+                return flight, True
+            flight.followers += 1
+            if on_update:
+                flight._callbacks.append(on_update)
+                # 先取得目前進度；在鎖內呼叫，確保早於之後的完成通知
+                self._notify(flight, [on_update])
+            return flight, False
+
+    def publish(self, key, stage):
+        """leader 回報目前階段"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                return
+            flight.stage = stage
+            callbacks = list(flight._callbacks)
+        self._notify(flight, callbacks)
+
+    def finish(self, key, result=None, error=None):
+        """leader 處理結束：通知所有 follower，之後相同 key 的處理會重新開始"""
+        with self._lock:
+            flight = self._flights.pop(key, None)
+            if flight is None:
+                return
+            flight.result = result
+            flight.error = error
+            flight._done.set()
+            callbacks = list(flight._callbacks)
+        self._notify(flight, callbacks)
+
+    def in_flight(self):
+        """進行中的 key 與附加的 follower 數"""
+        with self._lock:
+            return {key: flight.followers for key, flight in self._flights.items()}
+
+    @staticmethod
+    def _notify(flight, callbacks):
+        for callback in callbacks:
+            try:
+                callback(flight)
+            except Exception:
+                pass  # follower 的錯誤不影響 leader
+
+
+_transcript_flights = None
+_transcript_flights_lock = threading.Lock()
+
+
+def get_transcript_flights():
+    """取得共用的逐字稿處理合併表 (key 為影片 ID 與轉錄參數)"""
+    global _transcript_flights
+    with _transcript_flights_lock:
+        if _transcript_flights is None:
+            _transcript_flights = SingleFlight()
+        return _transcript_flights
+
+
+def transcript_key(video_id, whisper_model, language):
+    """逐字稿處理的 key；沒有影片 ID 時無法合併，回傳 None"""
+    return (video_id, whisper_model, language) if video_id else None
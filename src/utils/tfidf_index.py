@@ -0,0 +1,143 @@
+"""
+相關影片索引模組
+以 bigram TF-IDF 向量表示每份逐字稿，並以倒排索引 (依詞分欄的稀疏矩陣) 計算餘弦相似度，
+查詢時只走訪查詢向量中各詞的倒排列表，不需與整個語料逐一比較
+"""
+import math
+import heapq
+from array import array
+from src.core.config import RELATED_TERMS_PER_DOC
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 已移除的列超過此比例時重新整理索引，釋放空間
+_COMPACT_RATIO = 0.2
+
+
+class TfidfIndex:
+    """
+    可增量更新的稀疏 TF-IDF 索引 (記憶體內)
+
+    倒排列表與各列向量皆以 array 連續存放 (每個非零項 8 位元組)，NumPy 可直接以 frombuffer 取用而不需複製；
+    移除文件時只標記該列，查詢時略過，累積過多後再一次重建。
+    """
+
+    def __init__(self):
+        self.vocabulary = {}        # 詞 -> 欄位
+        self.posting_rows = []      # 欄位 -> array("i") 列號
+        self.posting_weights = []   # 欄位 -> array("f") 權重
+        self.row_ids = []           # 列 -> 文件 ID (已移除的列為 None)
+        self.rows = {}              # 文件 ID -> 列
+        self.row_columns = []       # 列 -> array("i") 欄位
+        self.row_weights = []       # 列 -> array("f") 權重
+        self.removed = set()        # 已移除的列
+
+    @staticmethod
+    def weigh(term_counts, document_frequency, document_count, max_terms=RELATED_TERMS_PER_DOC):
+        """
+        計算正規化後的 TF-IDF 向量，只保留權重最高的 max_terms 個詞
+
+        term_counts 為 {詞: 出現次數}；document_frequency 為 {詞: 含有此詞的文件數}，未列出的詞視為 0。
+        IDF 加 1 平滑，語料很少時 (例如第一份逐字稿) 仍有非零向量。
+        """
+        weights = {
+            term: (1 + math.log(count)) * (math.log((document_count + 1) / (document_frequency.get(term, 0) + 1)) + 1)
+            for term, count in term_counts.items()
+        }
+        top_terms = heapq.nlargest(max_terms, ((weight, term) for term, weight in weights.items() if weight > 0))
+        norm = math.sqrt(sum(weight * weight for weight, _ in top_terms))
+        return {term: weight / norm for weight, term in top_terms} if norm else {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.rows
+
+    def add(self, doc_id, vector):
+        """加入或取代一份文件的向量 ({詞: 權重}，需已正規化)"""
+        if doc_id in self.rows:
+            self.remove(doc_id)
+
+        row = len(self.row_ids)
+        self.row_ids.append(doc_id)
+        self.rows[doc_id] = row
+        columns, weights = array("i"), array("f")
+        for term, weight in vector.items():
+            column = self.vocabulary.get(term)
+            if column is None:
+                column = self.vocabulary[term] = len(self.posting_rows)
+                self.posting_rows.append(array("i"))
+                self.posting_weights.append(array("f"))
+            self.posting_rows[column].append(row)
+            self.posting_weights[column].append(weight)
+            columns.append(column)
+            weights.append(weight)
+        self.row_columns.append(columns)
+        self.row_weights.append(weights)
+
+    def remove(self, doc_id):
+        """移除文件，回傳是否存在"""
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return False
+        self.removed.add(row)
+        self.row_ids[row] = None
+        self.row_columns[row] = array("i")
+        self.row_weights[row] = array("f")
+        if len(self.removed) > len(self.row_ids) * _COMPACT_RATIO:
+            self.compact()
+        return True
+
+    def compact(self):
+        """以仍存在的文件重建索引，清除已移除的列"""
+        terms = {column: term for term, column in self.vocabulary.items()}
+        live = [
+            (doc_id, {terms[column]: weight for column, weight in zip(self.row_columns[row], self.row_weights[row])})
+            for doc_id, row in sorted(self.rows.items(), key=lambda item: item[1])
+        ]
+        self.__init__()
+        for doc_id, vector in live:
+            self.add(doc_id, vector)
+
+    def most_similar(self, doc_id=None, vector=None, k=5, min_score=0.0):
+        """
+        查詢與指定文件 (或向量) 最相似的 k 份文件，回傳 [(文件 ID, 餘弦相似度)]，不含查詢文件本身
+
+        向量皆已正規化，內積即為餘弦相似度：分數 = 倒排索引矩陣的欄位子集 × 查詢權重。
+        """
+        if doc_id is not None:
+            row = self.rows.get(doc_id)
+            if row is None:
+                return []
+            query = list(zip(self.row_columns[row], self.row_weights[row]))
+        else:
+            query = [(self.vocabulary[term], weight) for term, weight in (vector or {}).items() if term in self.vocabulary]
+        excluded = set(self.removed)
+        if doc_id is not None:
+            excluded.add(self.rows[doc_id])
+
+        if np is not None:
+            scores = np.zeros(len(self.row_ids), dtype=np.float32)
+            for column, weight in query:
+                rows = np.frombuffer(self.posting_rows[column], dtype=np.int32)
+                scores[rows] += np.frombuffer(self.posting_weights[column], dtype=np.float32) * weight
+            if excluded:
+                scores[np.fromiter(excluded, dtype=np.int64, count=len(excluded))] = 0.0
+            count = min(k, int(np.count_nonzero(scores > min_score)))
+            if count == 0:
+                return []
+            top_rows = np.argpartition(-scores, count - 1)[:count]
+            ranked = sorted(((float(scores[row]), int(row)) for row in top_rows), reverse=True)
+        else:
+            accumulated = {}
+            for column, weight in query:
+                for row, doc_weight in zip(self.posting_rows[column], self.posting_weights[column]):
+                    accumulated[row] = accumulated.get(row, 0.0) + doc_weight * weight
+            ranked = heapq.nlargest(
+                k, ((score, row) for row, score in accumulated.items() if score > min_score and row not in excluded)
+            )
+        return [(self.row_ids[row], score) for score, row in ranked]
@@ -0,0 +1,193 @@
+"""
+Token 估算模組
+以字元類別特徵離線估算 Gemini Token 數（適用中英混合文字），
+並可依 Gemini 回傳的實際用量重新校正係數
+"""
+import os
+import re
+import json
+import threading
+from src.core.config import TOKEN_USAGE_LOG, TOKEN_CALIBRATION_FILE
+from src.utils.metrics import MetricsRecorder
+
+# 預先編譯的字元類別規則
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+_LATIN_WORD_PATTERN = re.compile(r"[A-Za-z]+")
+_DIGIT_PATTERN = re.compile(r"\d")
+_SYMBOL_PATTERN = re.compile(r"[^\w\s]")
+
+FEATURE_NAMES = ("cjk_chars", "latin_words", "latin_chars", "digits", "symbols")
+
+# 預設係數：中文約每字 0.8 token，英文約每字 1.3 token，數字與符號多半各自成為一個 token
+DEFAULT_COEFFICIENTS = {
+    "cjk_chars": 0.8,
+    "latin_words": 0.75,
+    "latin_chars": 0.12,
+    "digits": 1.0,
+    "symbols": 1.0
+}
+
+
+class TokenEstimator:
+    """離線 Token 估算器"""
+
+    _coefficients = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def extract_features(text):
+        """計算文字的字元類別特徵"""
+        latin_words = _LATIN_WORD_PATTERN.findall(text)
+        return {
+            "cjk_chars": len(_CJK_PATTERN.findall(text)),
+            "latin_words": len(latin_words),
+            "latin_chars": sum(map(len, latin_words)),
+            "digits": len(_DIGIT_PATTERN.findall(text)),
+            "symbols": len(_SYMBOL_PATTERN.findall(text))
+        }
+
+    @staticmethod
+    def coefficients():
+        """取得目前使用的係數（優先使用校正結果）"""
+        with TokenEstimator._lock:
+            if TokenEstimator._coefficients is None:
+                coefficients = dict(DEFAULT_COEFFICIENTS)
+                try:
+                    with open(TOKEN_CALIBRATION_FILE, "r", encoding="utf-8") as f:
+                        calibrated = json.load(f).get("coefficients", {})
+                    coefficients.update({name: float(calibrated[name]) for name in FEATURE_NAMES if name in calibrated})
+                except (OSError, ValueError):
+                    pass
+                TokenEstimator._coefficients = coefficients
+            return TokenEstimator._coefficients
+
+    @staticmethod
+    def estimate_from_features(features, coefficients=None):
+        coefficients = coefficients or TokenEstimator.coefficients()
+        return max(1, round(sum(coefficients[name] * features[name] for name in FEATURE_NAMES)))
+
+    @staticmethod
+    def estimate(text):
+        """估算文字的 Token 數"""
+        if not text:
+            return 0
+        return TokenEstimator.estimate_from_features(TokenEstimator.extract_features(text))
+
+    @staticmethod
+    def record_usage(text, model_name, actual_tokens, output_tokens=None, estimated_tokens=None):
+        """記錄估算值與 Gemini 實際用量，供日後校正"""
+        if not actual_tokens:
+            return None
+
+        features = TokenEstimator.extract_features(text)
+        if estimated_tokens is None:
+            estimated_tokens = TokenEstimator.estimate_from_features(features)
+
+        entry = {
+            "model": model_name,
+            "features": features,
+            "estimated_tokens": estimated_tokens,
+            "actual_tokens": actual_tokens,
+            "output_tokens": output_tokens
+        }
+        try:
+            with TokenEstimator._lock:
+                log_dir = os.path.dirname(TOKEN_USAGE_LOG)
+                if log_dir:
+                    os.makedirs(log_dir, exist_ok=True)
+                with open(TOKEN_USAGE_LOG, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"寫入 Token 用量記錄時發生錯誤: {e}")
+
+        MetricsRecorder.record(
+            "token_usage", model=model_name, estimated_tokens=estimated_tokens,
+            actual_tokens=actual_tokens, output_tokens=output_tokens
+        )
+        return entry
+
+    @staticmethod
+    def recalibrate(min_samples=20, ridge=1e-3):
+        """以最小平方法依實際用量重新擬合係數，回傳校正摘要；樣本不足時回傳 None"""
+        samples = []
+        try:
+            with open(TOKEN_USAGE_LOG, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        samples.append(([entry["features"][name] for name in FEATURE_NAMES], entry["actual_tokens"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            return None
+
+        if len(samples) < min_samples:
+            return None
+
+        # 正規方程 (X^T X + λI) w = X^T y，維度很小，直接以高斯消去法求解
+        size = len(FEATURE_NAMES)
+        xtx = [[0.0] * size for _ in range(size)]
+        xty = [0.0] * size
+        for row, actual in samples:
+            for i in range(size):
+                xty[i] += row[i] * actual
+                for j in range(size):
+                    xtx[i][j] += row[i] * row[j]
+        for i in range(size):
+            xtx[i][i] += ridge * max(1.0, xtx[i][i])
+
+        weights = _solve_linear_system(xtx, xty)
+        if weights is None:
+            return None
+
+        # 特徵未出現時保留預設係數，並避免負係數
+        previous = TokenEstimator.coefficients()
+        coefficients = {}
+        for i, name in enumerate(FEATURE_NAMES):
+            observed = any(row[i] for row, _ in samples)
+            coefficients[name] = max(0.0, weights[i]) if observed else previous[name]
+
+        def mean_error(coeffs):
+            errors = [
+                abs(sum(coeffs[name] * row[i] for i, name in enumerate(FEATURE_NAMES)) - actual) / actual
+                for row, actual in samples if actual
+            ]
+            return sum(errors) / len(errors) if errors else 0.0
+
+        summary = {
+            "coefficients": coefficients,
+            "samples": len(samples),
+            "error_before": round(mean_error(previous), 4),
+            "error_after": round(mean_error(coefficients), 4)
+        }
+
+        calibration_dir = os.path.dirname(TOKEN_CALIBRATION_FILE)
+        if calibration_dir:
+            os.makedirs(calibration_dir, exist_ok=True)
+        with open(TOKEN_CALIBRATION_FILE, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        with TokenEstimator._lock:
+            TokenEstimator._coefficients = coefficients
+        return summary
+
+
+def _solve_linear_system(matrix, vector):
+    """以部分主元高斯消去法求解線性方程組"""
+    size = len(vector)
+    augmented = [list(matrix[i]) + [vector[i]] for i in range(size)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(augmented[r][col]))
+        if abs(augmented[pivot][col]) < 1e-12:
+            return None
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        for row in range(col + 1, size):
+            factor = augmented[row][col] / augmented[col][col]
+            for k in range(col, size + 1):
+                augmented[row][k] -= factor * augmented[col][k]
+
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        remainder = augmented[row][size] - sum(augmented[row][k] * solution[k] for k in range(row + 1, size))
+        solution[row] = remainder / augmented[row][row]
+    return solution
@@ -0,0 +1,136 @@
+"""
+逐字稿精簡模組
+在送交 AI 分析前移除贅詞、重複迴圈與多餘空白，降低 Token 用量
+每個步驟都是對整份文字的一次預先編譯規則替換，可依需求組合或擴充
+"""
+import re
+from src.core.config import COMPACTION_STEPS
+from src.utils.token_estimator import TokenEstimator
+
+_CJK_PUNCTUATION = r"，。！？、；：「」『』（）《》…"
+
+# 贅詞規則：單字贅詞前後需為標點、空白或文字開頭結尾，避免刪除詞語中的同一個字 (例如「唔該」)
+_CJK_FILLER_PATTERN = re.compile(
+    rf"(?<![^\s{_CJK_PUNCTUATION},.!?;:])[嗯呃欸唔]+(?=[\s{_CJK_PUNCTUATION},.!?;:]|$)[，,、\s]*"
+)
+_CJK_PHRASE_FILLER_PATTERN = re.compile(r"(?:那個|那个|就是說|就是说|然後呢|然后呢)[，,、\s]+")
+_EN_FILLER_PATTERN = re.compile(r"\b(?:u+m+|u+h+|e+r+m*|h+m+)\b[,\s]*", re.IGNORECASE)
+_EN_PHRASE_FILLER_PATTERN = re.compile(r"\b(?:you know|i mean)\b\s*,\s*", re.IGNORECASE)
+
+# 重複迴圈規則：兩個字以上的片語連續出現四次以上 (常見於語音辨識的幻覺迴圈)；
+# 單字的重複多半是正常用語 (例如「看看」、「哈哈哈」)，不收斂
+_REPETITION_PATTERN = re.compile(r"(.{2,30}?)(?:[\s，,、]*\1){3,}", re.DOTALL)
+
+# 空白與標點規則
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_SPACE_AROUND_CJK_PUNCTUATION_PATTERN = re.compile(rf"\s*([{_CJK_PUNCTUATION}])\s*")
+_SPACE_BEFORE_PUNCTUATION_PATTERN = re.compile(r"\s+([,.!?;:])")
+_REPEATED_PUNCTUATION_PATTERN = re.compile(rf"([{_CJK_PUNCTUATION},.!?;:])(?:\s*\1)+")
+_MIXED_COMMA_PATTERN = re.compile(r"[，,、](?:\s*[，,、])+")
+_LEADING_PUNCTUATION_PATTERN = re.compile(rf"^[\s{_CJK_PUNCTUATION},.!?;:]+")
+
+
+def remove_fillers(text):
+    """移除中英文口語贅詞"""
+    text = _CJK_FILLER_PATTERN.sub("", text)
+    text = _CJK_PHRASE_FILLER_PATTERN.sub("", text)
+    text = _EN_FILLER_PATTERN.sub("", text)
+    return _EN_PHRASE_FILLER_PATTERN.sub("", text)
+
+
+def _collapse_repetition(match):
+    phrase = match.group(1)
+    # 數字、純標點與單字的重複屬於正常內容 (例如 10000)，保持原樣
+    if phrase.strip().isdigit() or len(re.findall(r"\w", phrase)) < 2:
+        return match.group(0)
+    return phrase
+
+
+def collapse_repetitions(text):
+    """將連續重複的片語收斂為一次"""
+    return _REPETITION_PATTERN.sub(_collapse_repetition, text)
+
+
+def normalize_whitespace(text):
+    """合併多餘空白"""
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def normalize_punctuation(text):
+    """移除標點周圍的空白並合併重複標點"""
+    text = _SPACE_AROUND_CJK_PUNCTUATION_PATTERN.sub(r"\1", text)
+    text = _SPACE_BEFORE_PUNCTUATION_PATTERN.sub(r"\1", text)
+    text = _MIXED_COMMA_PATTERN.sub(lambda m: m.group(0)[0], text)
+    text = _REPEATED_PUNCTUATION_PATTERN.sub(r"\1", text)
+    return _LEADING_PUNCTUATION_PATTERN.sub("", text)
+
+
+_opencc_converter = None
+
+
+def to_traditional(text):
+    """簡體轉繁體 (需安裝 opencc，未安裝時保持原文)"""
+    global _opencc_converter
+    if _opencc_converter is None:
+        try:
+            import opencc
+            _opencc_converter = opencc.OpenCC("s2twp")
+        except ImportError:
+            _opencc_converter = False
+        except Exception as e:
+            print(f"初始化簡繁轉換時發生錯誤: {e}")
+            _opencc_converter = False
+    if not _opencc_converter:
+        return text
+    return _opencc_converter.convert(text)
+
+
+class TranscriptCompactor:
+    """逐字稿精簡管線"""
+
+    STEPS = {
+        "whitespace": normalize_whitespace,
+        "fillers": remove_fillers,
+        "repetitions": collapse_repetitions,
+        "punctuation": normalize_punctuation,
+        "traditional": to_traditional
+    }
+
+    def __init__(self, steps=None):
+        """初始化精簡管線，steps 為步驟名稱列表，依序執行"""
+        self.steps = list(steps) if steps is not None else list(COMPACTION_STEPS)
+        unknown = [name for name in self.steps if name not in self.STEPS]
+        if unknown:
+            raise ValueError(f"未知的精簡步驟: {', '.join(unknown)}")
+
+    @classmethod
+    def register_step(cls, name, func):
+        """註冊自訂精簡步驟，func 接受並回傳文字"""
+        cls.STEPS[name] = func
+
+    @staticmethod
+    def is_traditional_available():
+        """檢查是否可進行簡繁轉換"""
+        to_traditional("")
+        return bool(_opencc_converter)
+
+    def compact(self, text):
+        """執行精簡，回傳 (精簡後文字, 統計資訊)"""
+        tokens_before = TokenEstimator.estimate(text)
+        chars_before = len(text)
+
+        for name in self.steps:
+            text = self.STEPS[name](text)
+        # 各步驟可能留下新的多餘空白，最後統一整理
+        text = normalize_whitespace(text)
+
+        tokens_after = TokenEstimator.estimate(text)
+        stats = {
+            "steps": self.steps,
+            "chars_before": chars_before,
+            "chars_after": len(text),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "token_reduction": 1 - tokens_after / tokens_before if tokens_before else 0.0
+        }
+        return text, stats
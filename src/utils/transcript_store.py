@@ -0,0 +1,718 @@
+"""
+逐字稿目錄模組
+以 SQLite (WAL) 記錄已保存逐字稿的中繼資料，逐字稿內容與時間軸以壓縮檔存放於 saved_transcripts 資料夾；
+並以 FTS5 建立 bigram 全文索引、以 MinHash/LSH 建立近似重複索引、記錄詞頻供 TF-IDF 相關影片索引使用，保存逐字稿時同步更新；
+另記錄音訊指紋，供轉錄前比對已處理過的音訊，以及每份逐字稿依專家與模型區分版本的報告歷史
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import closing
+from src.core.config import (
+    TRANSCRIPTS_FOLDER, TRANSCRIPT_CATALOG_DB, TRANSCRIPT_PAGE_SIZE, SEGMENTS_SUFFIX, STORAGE_COMPRESSION,
+    TRANSCRIPT_SEARCH_CHUNK_CHARS, TRANSCRIPT_SEARCH_LIMIT, TRANSCRIPT_SNIPPET_CHARS, NEAR_DUPLICATE_THRESHOLD,
+    RELATED_VIDEO_LIMIT, RELATED_MIN_SCORE
+)
+from src.utils.cjk_tokenizer import tokenize, query_terms
+from src.utils.near_duplicate import MinHasher
+from src.utils.audio_fingerprint import AudioFingerprinter
+from src.utils.compressed_storage import CompressedStorage
+from src.utils.tfidf_index import TfidfIndex
+
+# 介面可排序的欄位 (避免將任意字串組進 SQL)
+SORTABLE_COLUMNS = ("created_at", "title", "duration", "size")
+# 報告列表只取中繼資料，不讀取內容
+_REPORT_COLUMNS = "id, transcript_id, expert, model, version, content_hash, size, stored_size, created_at"
+
+
+class TranscriptStore:
+    """逐字稿目錄 (SQLite)"""
+
+    _lock = threading.Lock()
+    # 記憶體內的相關影片索引：資料庫路徑 -> (TfidfIndex, 載入時詞頻表的 (筆數, 最新時間))
+    _related_indexes = {}
+    _related_lock = threading.Lock()
+
+    def __init__(self, db_path=TRANSCRIPT_CATALOG_DB, folder=TRANSCRIPTS_FOLDER):
+        """初始化目錄資料庫"""
+        self.db_path = db_path
+        self.folder = folder
+
+        os.makedirs(self.folder, exist_ok=True)
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    video_id TEXT,
+                    duration REAL,
+                    language TEXT,
+                    model TEXT,
+                    source TEXT,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            # 舊版目錄沒有壓縮後大小欄位
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(transcripts)")}
+            if "stored_size" not in columns:
+                conn.execute("ALTER TABLE transcripts ADD COLUMN stored_size INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_created ON transcripts(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_title ON transcripts(title)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_video ON transcripts(video_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcripts_hash ON transcripts(content_hash)")
+            # 全文索引：tokens 欄位為預先切好的 bigram；原文與各片段的 [字元位置, 開始秒數] 不建索引，僅供顯示
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS transcript_fts USING fts5(
+                    tokens, transcript_id UNINDEXED, offsets UNINDEXED, text UNINDEXED,
+                    tokenize = 'unicode61'
+                )
+            """)
+            # 近似重複索引：每份逐字稿各視窗簽章的 LSH 桶
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_lsh (
+                    bucket INTEGER NOT NULL,
+                    transcript_id INTEGER NOT NULL,
+                    PRIMARY KEY (bucket, transcript_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcript_lsh_id ON transcript_lsh(transcript_id)")
+            # 相關影片索引：每份逐字稿的詞頻 (壓縮的 JSON)；IDF 在載入記憶體內的索引時依全文索引的詞彙表套用，
+            # 語料增加後既有逐字稿的權重隨之更新。舊版保存的是寫入當時加權的向量，改為重新計算詞頻
+            legacy_vectors = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transcript_vectors'"
+            ).fetchone() is not None
+            conn.execute("DROP TABLE IF EXISTS transcript_vectors")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcript_terms (
+                    transcript_id INTEGER PRIMARY KEY,
+                    counts BLOB NOT NULL,
+                    indexed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transcript_terms_time ON transcript_terms(indexed_at)")
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS transcript_vocab USING fts5vocab(transcript_fts, 'row')")
+            # 音訊指紋：峰值配對雜湊與其在音訊中的位置 (幀)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS audio_fingerprints (
+                    hash INTEGER NOT NULL,
+                    transcript_id INTEGER NOT NULL,
+                    frame INTEGER NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audio_fingerprints_hash ON audio_fingerprints(hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_audio_fingerprints_id ON audio_fingerprints(transcript_id)")
+            # 報告歷史：同一份逐字稿、專家與模型的報告依版本保存 (內容壓縮)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    transcript_id INTEGER NOT NULL,
+                    expert TEXT NOT NULL DEFAULT '',
+                    model TEXT NOT NULL DEFAULT '',
+                    version INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    report BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (transcript_id, expert, model, version)
+                )
+            """)
+        if legacy_vectors:
+            self._backfill_terms()
+
+    def _connect(self):
+        """建立資料庫連線"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def content_hash(text):
+        """計算逐字稿內容雜湊"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def path_for(self, filename):
+        """取得逐字稿檔案的完整路徑 (壓縮前的檔名，實際檔案可能加上 .zst / .gz)"""
+        return os.path.join(self.folder, filename)
+
+    def segments_path_for(self, filename):
+        """取得逐字稿對應的時間軸檔案路徑"""
+        return os.path.splitext(self.path_for(filename))[0] + SEGMENTS_SUFFIX
+
+    def _read_segments(self, filename):
+        try:
+            lines = CompressedStorage.read_text(self.segments_path_for(filename)).splitlines()
+            return [json.loads(line) for line in lines if line.strip()]
+        except (OSError, ValueError):
+            return []
+
+    @staticmethod
+    def _build_chunks(transcript_text, segments):
+        """
+        將逐字稿切成索引單位，回傳 [(片段位置列表, 文字)]
+
+        有時間軸時依片段組合，並記錄每個片段在文字中的字元位置與開始秒數；否則依長度切分。
+        """
+        chunks = []
+        if segments:
+            offsets, text = [], ""
+            for segment in segments:
+                if text:
+                    text += " "
+                offsets.append([len(text), segment.get("start")])
+                text += segment.get("text", "")
+                if len(text) >= TRANSCRIPT_SEARCH_CHUNK_CHARS:
+                    chunks.append((offsets, text))
+                    offsets, text = [], ""
+            if text:
+                chunks.append((offsets, text))
+            return chunks
+
+        for offset in range(0, len(transcript_text), TRANSCRIPT_SEARCH_CHUNK_CHARS):
+            chunks.append(([], transcript_text[offset:offset + TRANSCRIPT_SEARCH_CHUNK_CHARS]))
+        return chunks
+
+    @staticmethod
+    def _lsh_buckets(text):
+        buckets = set()
+        for signature in MinHasher.window_signatures(text):
+            buckets.update(MinHasher.band_buckets(signature))
+        return buckets
+
+    @staticmethod
+    def _delete_indexes(conn, transcript_id, remove_record=False):
+        """刪除索引；remove_record 代表逐字稿本身被移除，一併刪除音訊指紋與報告歷史"""
+        conn.execute("DELETE FROM transcript_fts WHERE transcript_id = ?", (transcript_id,))
+        conn.execute("DELETE FROM transcript_lsh WHERE transcript_id = ?", (transcript_id,))
+        conn.execute("DELETE FROM transcript_terms WHERE transcript_id = ?", (transcript_id,))
+        if remove_record:
+            conn.execute("DELETE FROM audio_fingerprints WHERE transcript_id = ?", (transcript_id,))
+            conn.execute("DELETE FROM reports WHERE transcript_id = ?", (transcript_id,))
+
+    def _index_transcript(self, conn, transcript_id, transcript_text, segments):
+        """重建單一逐字稿的全文索引、近似重複索引與相關影片使用的詞頻"""
+        self._delete_indexes(conn, transcript_id)
+        conn.executemany(
+            "INSERT OR IGNORE INTO transcript_lsh (bucket, transcript_id) VALUES (?, ?)",
+            [(bucket, transcript_id) for bucket in self._lsh_buckets(transcript_text)]
+        )
+        conn.executemany(
+            "INSERT INTO transcript_fts (tokens, transcript_id, offsets, text) VALUES (?, ?, ?, ?)",
+            [
+                (" ".join(tokenize(text)), transcript_id, json.dumps(offsets), text)
+                for offsets, text in self._build_chunks(transcript_text, segments) if text.strip()
+            ]
+        )
+        self._index_terms(conn, transcript_id, transcript_text)
+
+    @staticmethod
+    def _index_terms(conn, transcript_id, transcript_text):
+        """保存逐字稿的詞頻；TF-IDF 權重在載入相關影片索引時依當時的文件頻率計算"""
+        counts = json.dumps(Counter(tokenize(transcript_text)), ensure_ascii=False, separators=(",", ":"))
+        conn.execute(
+            "INSERT OR REPLACE INTO transcript_terms (transcript_id, counts, indexed_at) VALUES (?, ?, ?)",
+            (transcript_id, sqlite3.Binary(CompressedStorage.compress(counts.encode("utf-8"))), time.time())
+        )
+
+    def _backfill_terms(self):
+        """為尚未記錄詞頻的逐字稿計算詞頻 (由舊版的加權向量升級時)"""
+        with closing(self._connect()) as conn:
+            records = [
+                (row["id"], row["filename"]) for row in conn.execute(
+                    "SELECT id, filename FROM transcripts WHERE id NOT IN (SELECT transcript_id FROM transcript_terms)"
+                )
+            ]
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            for transcript_id, filename in records:
+                try:
+                    self._index_terms(conn, transcript_id, self.read_text(filename))
+                except (OSError, UnicodeDecodeError, RuntimeError) as e:
+                    print(f"略過無法讀取的逐字稿 {filename}: {e}")
+
+    def _resolve_filename(self, conn, title, content_hash):
+        """以標題命名；同名但內容不同時加上內容雜湊後綴，不需逐一嘗試編號"""
+        filename = f"{title}.txt"
+        row = conn.execute("SELECT content_hash FROM transcripts WHERE filename = ?", (filename,)).fetchone()
+        if row is None and not CompressedStorage.exists(self.path_for(filename)):
+            return filename
+        if row is not None and row["content_hash"] == content_hash:
+            return filename
+        return f"{title}_{content_hash[:8]}.txt"
+
+    def save(self, transcript_text, title, video_id=None, duration=None, language=None, model=None,
+             source=None, segments_path=None):
+        """保存逐字稿內容並登錄中繼資料，回傳目錄記錄"""
+        content_hash = self.content_hash(transcript_text)
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            filename = self._resolve_filename(conn, title, content_hash)
+            _, stored_size = CompressedStorage.write_text(self.path_for(filename), transcript_text)
+            if segments_path and os.path.exists(segments_path):
+                with open(segments_path, "rb") as f:
+                    CompressedStorage.write_bytes(self.segments_path_for(filename), f.read())
+
+            conn.execute(
+                """
+                INSERT INTO transcripts
+                    (filename, title, video_id, duration, language, model, source, content_hash, size,
+                     stored_size, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    title = excluded.title,
+                    video_id = COALESCE(excluded.video_id, video_id),
+                    duration = COALESCE(excluded.duration, duration),
+                    language = COALESCE(excluded.language, language),
+                    model = COALESCE(excluded.model, model),
+                    source = COALESCE(excluded.source, source),
+                    content_hash = excluded.content_hash,
+                    size = excluded.size,
+                    stored_size = excluded.stored_size,
+                    created_at = excluded.created_at
+                """,
+                (filename, title, video_id, duration, language, model, source, content_hash,
+                 len(transcript_text.encode("utf-8")), stored_size, time.time())
+            )
+            row = conn.execute("SELECT * FROM transcripts WHERE filename = ?", (filename,)).fetchone()
+            self._index_transcript(conn, row["id"], transcript_text, self._read_segments(filename))
+        return dict(row)
+
+    def get(self, filename):
+        """依檔名查詢目錄記錄"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM transcripts WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def find_by_video_id(self, video_id):
+        """依影片 ID 查詢最新的目錄記錄"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT * FROM transcripts WHERE video_id = ? ORDER BY created_at DESC LIMIT 1", (video_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _title_condition(title_filter):
+        if not title_filter:
+            return "", []
+        return "WHERE title LIKE ?", [f"%{title_filter}%"]
+
+    def list_page(self, page=0, page_size=TRANSCRIPT_PAGE_SIZE, order_by="created_at", descending=True, title_filter=None):
+        """分頁查詢逐字稿，回傳 (目錄記錄列表, 總筆數)"""
+        if order_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"不支援的排序欄位: {order_by}")
+        direction = "DESC" if descending else "ASC"
+
+        where, params = self._title_condition(title_filter)
+        with closing(self._connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM transcripts {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM transcripts {where} ORDER BY {order_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+                params + [page_size, page * page_size]
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def count(self, title_filter=None):
+        """取得逐字稿總數，可依標題篩選"""
+        where, params = self._title_condition(title_filter)
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM transcripts {where}", params).fetchone()[0]
+
+    def remove(self, filename, delete_file=False):
+        """自目錄移除逐字稿，可選擇一併刪除檔案"""
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT id FROM transcripts WHERE filename = ?", (filename,)).fetchone()
+            if row:
+                self._delete_indexes(conn, row["id"], remove_record=True)
+            conn.execute("DELETE FROM transcripts WHERE filename = ?", (filename,))
+        if delete_file:
+            CompressedStorage.remove(self.path_for(filename))
+            CompressedStorage.remove(self.segments_path_for(filename))
+
+    def import_folder(self):
+        """將資料夾中尚未登錄的逐字稿檔案加入目錄，回傳 (新增筆數, 移除的失效記錄數)"""
+        with closing(self._connect()) as conn:
+            known = {row["filename"] for row in conn.execute("SELECT filename FROM transcripts")}
+
+        on_disk = {
+            logical_name for logical_name in map(CompressedStorage.logical_name, os.listdir(self.folder))
+            if logical_name.endswith(".txt")
+        }
+        entries = []
+        for filename in sorted(on_disk - known):
+            path = self.path_for(filename)
+            try:
+                text = CompressedStorage.read_text(path)
+                physical_path = CompressedStorage.resolve(path)
+                created_at = os.path.getmtime(physical_path)
+            except (OSError, UnicodeDecodeError, RuntimeError) as e:
+                print(f"略過無法讀取的逐字稿 {filename}: {e}")
+                continue
+            entries.append((filename, text, os.path.getsize(physical_path), created_at))
+
+        # 檔案已不存在的記錄一併清除
+        missing = sorted(known - on_disk)
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            for filename, text, stored_size, created_at in entries:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO transcripts (filename, title, content_hash, size, stored_size, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (filename, os.path.splitext(filename)[0], self.content_hash(text),
+                     len(text.encode("utf-8")), stored_size, created_at)
+                )
+                self._index_transcript(conn, cursor.lastrowid, text, self._read_segments(filename))
+            for filename in missing:
+                row = conn.execute("SELECT id FROM transcripts WHERE filename = ?", (filename,)).fetchone()
+                self._delete_indexes(conn, row["id"], remove_record=True)
+                conn.execute("DELETE FROM transcripts WHERE filename = ?", (filename,))
+        return len(entries), len(missing)
+
+    def rebuild_index(self):
+        """重建所有逐字稿的全文索引、近似重複索引與相關影片使用的詞頻，回傳已索引的逐字稿數"""
+        with closing(self._connect()) as conn:
+            records = [(row["id"], row["filename"]) for row in conn.execute("SELECT id, filename FROM transcripts")]
+
+        indexed = 0
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM transcript_fts")
+            conn.execute("DELETE FROM transcript_lsh")
+            conn.execute("DELETE FROM transcript_terms")
+            for transcript_id, filename in records:
+                try:
+                    text = self.read_text(filename)
+                except (OSError, UnicodeDecodeError, RuntimeError) as e:
+                    print(f"略過無法讀取的逐字稿 {filename}: {e}")
+                    continue
+                self._index_transcript(conn, transcript_id, text, self._read_segments(filename))
+                indexed += 1
+        return indexed
+
+    @staticmethod
+    def _snippet(text, offsets, terms):
+        """擷取第一個命中詞前後的文字作為摘要並以粗體標示，回傳 (摘要, 命中處的開始秒數)"""
+        pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+        match = pattern.search(text)
+        position = match.start() if match else 0
+        start = None
+        for offset, segment_start in offsets:
+            if offset > position:
+                break
+            start = segment_start
+
+        if match is None:
+            return text[:TRANSCRIPT_SNIPPET_CHARS * 2], start
+        begin = max(0, match.start() - TRANSCRIPT_SNIPPET_CHARS)
+        end = min(len(text), match.end() + TRANSCRIPT_SNIPPET_CHARS)
+        snippet = pattern.sub(lambda m: f"**{m.group(0)}**", text[begin:end])
+        return ("…" if begin else "") + snippet + ("…" if end < len(text) else ""), start
+
+    def search(self, query, limit=TRANSCRIPT_SEARCH_LIMIT):
+        """
+        全文搜尋逐字稿，空白分隔的多個詞需同時出現；依 BM25 排序，每部影片取最相關的片段
+
+        回傳 (命中列表, 查詢耗時毫秒)，命中項目包含目錄記錄、片段開始秒數、摘要與命中片段數。
+        """
+        start_time = time.perf_counter()
+        terms = query_terms(query)
+        if not terms:
+            return [], 0.0
+
+        # 每個詞的 bigram 組成片語，確保字元連續出現；單一中文字以前綴比對 bigram
+        match_expression = " AND ".join(
+            f'"{tokens[0]}"*' if len(tokens) == 1 and len(tokens[0]) == 1 else '"' + " ".join(tokens) + '"'
+            for tokens in terms
+        )
+        with closing(self._connect()) as conn:
+            ranked = conn.execute(
+                """
+                SELECT transcript_id, MIN(score) AS best_rank, COUNT(*) AS hits
+                FROM (
+                    SELECT transcript_id, rank AS score
+                    FROM transcript_fts WHERE transcript_fts MATCH ?
+                )
+                GROUP BY transcript_id ORDER BY best_rank LIMIT ?
+                """,
+                (match_expression, limit)
+            ).fetchall()
+            if not ranked:
+                return [], (time.perf_counter() - start_time) * 1000
+
+            transcript_ids = [row["transcript_id"] for row in ranked]
+            placeholders = ", ".join("?" * len(transcript_ids))
+            best_chunks = {}
+            for row in conn.execute(
+                f"""
+                SELECT transcript_id, offsets, text FROM transcript_fts
+                WHERE transcript_fts MATCH ? AND transcript_id IN ({placeholders})
+                ORDER BY rank
+                """,
+                [match_expression] + transcript_ids
+            ):
+                best_chunks.setdefault(row["transcript_id"], row)
+            records = {
+                row["id"]: dict(row)
+                for row in conn.execute(f"SELECT * FROM transcripts WHERE id IN ({placeholders})", transcript_ids)
+            }
+
+        raw_terms = [term for term in query.split() if term]
+        hits = []
+        for row in ranked:
+            transcript_id = row["transcript_id"]
+            if transcript_id not in records:
+                continue
+            chunk = best_chunks[transcript_id]
+            snippet, start = self._snippet(chunk["text"], json.loads(chunk["offsets"]), raw_terms)
+            hits.append({
+                "record": records[transcript_id],
+                "start": start,
+                "snippet": snippet,
+                "hits": row["hits"],
+                "score": -row["best_rank"]
+            })
+        return hits, (time.perf_counter() - start_time) * 1000
+
+    def read_text(self, filename):
+        """讀取已保存逐字稿的內容 (自動解壓縮)"""
+        return CompressedStorage.read_text(self.path_for(filename))
+
+    def compress_files(self, algorithm=STORAGE_COMPRESSION):
+        """
+        將目錄中的逐字稿與時間軸轉換為指定的壓縮格式，並更新目錄記錄的檔案大小
+
+        回傳 {"transcripts": (檔案數, 原始位元組, 壓縮後位元組), "segments": (...)}。
+        """
+        with closing(self._connect()) as conn:
+            filenames = [row["filename"] for row in conn.execute("SELECT filename FROM transcripts")]
+
+        totals = {"transcripts": [0, 0, 0], "segments": [0, 0, 0]}
+        stored_sizes = []
+        for filename in filenames:
+            for kind, path in (("transcripts", self.path_for(filename)), ("segments", self.segments_path_for(filename))):
+                try:
+                    sizes = CompressedStorage.convert(path, algorithm)
+                except (OSError, RuntimeError) as e:
+                    print(f"略過無法轉換的檔案 {path}: {e}")
+                    continue
+                if sizes is None:
+                    continue
+                totals[kind][0] += 1
+                totals[kind][1] += sizes[0]
+                totals[kind][2] += sizes[1]
+                if kind == "transcripts":
+                    stored_sizes.append((sizes[1], filename))
+
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            conn.executemany("UPDATE transcripts SET stored_size = ? WHERE filename = ?", stored_sizes)
+        return {kind: tuple(values) for kind, values in totals.items()}
+
+    def storage_stats(self):
+        """取得逐字稿原始與實際佔用的總大小"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(COALESCE(stored_size, size)), 0) FROM transcripts"
+            ).fetchone()
+        return {"files": row[0], "original_bytes": row[1], "stored_bytes": row[2]}
+
+    def find_near_duplicates(self, text, min_containment=NEAR_DUPLICATE_THRESHOLD, max_candidates=10):
+        """
+        找出內容近似的既有逐字稿，依相似度由高到低回傳
+
+        以 LSH 桶取得候選後，再以完整 shingle 集合驗證：containment 為新內容出現在既有逐字稿中的比例，
+        coverage 為既有逐字稿被新內容涵蓋的比例（兩者皆高代表整份重複，僅前者高代表片段或剪輯）。
+        """
+        buckets = list(self._lsh_buckets(text))
+        if not buckets:
+            return []
+
+        candidate_hits = {}
+        with closing(self._connect()) as conn:
+            for offset in range(0, len(buckets), 500):
+                batch = buckets[offset:offset + 500]
+                placeholders = ", ".join("?" * len(batch))
+                for row in conn.execute(
+                    f"""
+                    SELECT transcript_id, COUNT(*) AS hits FROM transcript_lsh
+                    WHERE bucket IN ({placeholders}) GROUP BY transcript_id
+                    """,
+                    batch
+                ):
+                    candidate_hits[row["transcript_id"]] = candidate_hits.get(row["transcript_id"], 0) + row["hits"]
+            candidate_ids = sorted(candidate_hits, key=candidate_hits.get, reverse=True)[:max_candidates]
+            if not candidate_ids:
+                return []
+            placeholders = ", ".join("?" * len(candidate_ids))
+            records = [
+                dict(row) for row in conn.execute(f"SELECT * FROM transcripts WHERE id IN ({placeholders})", candidate_ids)
+            ]
+
+        query_shingles = MinHasher.shingles(text)
+        matches = []
+        for record in records:
+            try:
+                candidate_shingles = MinHasher.shingles(self.read_text(record["filename"]))
+            except (OSError, UnicodeDecodeError, RuntimeError):
+                continue
+            containment = MinHasher.containment(query_shingles, candidate_shingles)
+            if containment >= min_containment:
+                matches.append({
+                    "record": record,
+                    "containment": containment,
+                    "coverage": MinHasher.containment(candidate_shingles, query_shingles)
+                })
+        matches.sort(key=lambda match: (match["containment"], match["coverage"]), reverse=True)
+        return matches
+
+    def read_segments(self, filename):
+        """讀取已保存逐字稿的時間軸，沒有時間軸時回傳空列表"""
+        return self._read_segments(filename)
+
+    def add_fingerprint(self, transcript_id, hashes):
+        """記錄逐字稿對應音訊的指紋 (取代先前的指紋)"""
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM audio_fingerprints WHERE transcript_id = ?", (transcript_id,))
+            conn.executemany(
+                "INSERT INTO audio_fingerprints (hash, transcript_id, frame) VALUES (?, ?, ?)",
+                [(hash_value, transcript_id, frame) for hash_value, frame in set(hashes)]
+            )
+
+    def has_fingerprint(self, transcript_id):
+        """檢查逐字稿是否已有音訊指紋"""
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "SELECT 1 FROM audio_fingerprints WHERE transcript_id = ? LIMIT 1", (transcript_id,)
+            ).fetchone() is not None
+
+    def match_fingerprint(self, hashes):
+        """
+        以音訊指紋查詢已處理過的音訊，回傳 (目錄記錄, 相符數, 時間差秒數)，沒有符合時回傳 None
+
+        時間差為「既有音訊的位置 - 新音訊的位置」。
+        """
+        unique_hashes = list({hash_value for hash_value, _ in hashes})
+        if not unique_hashes:
+            return None
+
+        candidate_rows = []
+        with closing(self._connect()) as conn:
+            for offset in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[offset:offset + 500]
+                placeholders = ", ".join("?" * len(batch))
+                candidate_rows.extend(
+                    (row["transcript_id"], row["hash"], row["frame"])
+                    for row in conn.execute(
+                        f"SELECT transcript_id, hash, frame FROM audio_fingerprints WHERE hash IN ({placeholders})",
+                        batch
+                    )
+                )
+
+        for transcript_id, match_count, offset_frames in AudioFingerprinter.best_alignment(hashes, candidate_rows):
+            if not AudioFingerprinter.is_match(match_count, len(hashes)):
+                break
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT * FROM transcripts WHERE id = ?", (transcript_id,)).fetchone()
+            if row is not None:
+                return dict(row), match_count, AudioFingerprinter.frames_to_seconds(offset_frames)
+        return None
+
+    def add_report(self, transcript_id, report_text, expert=None, model=None):
+        """
+        保存報告為新版本並回傳報告記錄 (不含內容)
+
+        內容與同一專家、模型的最新版本相同時 (例如由快取取得) 不另建版本，直接回傳最新版本。
+        """
+        content_hash = self.content_hash(report_text)
+        expert, model = expert or "", model or ""
+        data = report_text.encode("utf-8")
+        payload = CompressedStorage.compress(data)
+        with TranscriptStore._lock, closing(self._connect()) as conn, conn:
+            latest = conn.execute(
+                f"""
+                SELECT {_REPORT_COLUMNS} FROM reports
+                WHERE transcript_id = ? AND expert = ? AND model = ? ORDER BY version DESC LIMIT 1
+                """,
+                (transcript_id, expert, model)
+            ).fetchone()
+            if latest is not None and latest["content_hash"] == content_hash:
+                return dict(latest)
+            cursor = conn.execute(
+                """
+                INSERT INTO reports
+                    (transcript_id, expert, model, version, content_hash, report, size, stored_size, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (transcript_id, expert, model, (latest["version"] if latest else 0) + 1, content_hash,
+                 sqlite3.Binary(payload), len(data), len(payload), time.time())
+            )
+            row = conn.execute(f"SELECT {_REPORT_COLUMNS} FROM reports WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return dict(row)
+
+    def list_reports(self, transcript_id):
+        """列出逐字稿的所有報告版本 (不含內容)，依建立時間由新到舊排序"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {_REPORT_COLUMNS} FROM reports WHERE transcript_id = ? ORDER BY created_at DESC, id DESC",
+                (transcript_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def read_report(self, report_id):
+        """讀取指定版本的報告內容，不存在時回傳 None"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT report FROM reports WHERE id = ?", (report_id,)).fetchone()
+        return CompressedStorage.decode(row["report"]) if row else None
+
+    def _related_index(self):
+        """
+        取得記憶體內的相關影片索引 (呼叫時需持有 _related_lock)
+
+        詞頻有新增、更新或刪除時，以全文索引詞彙表目前的文件頻率重新為所有逐字稿加權，
+        早期保存的逐字稿與新逐字稿使用相同的 IDF；沒有變動時沿用已載入的索引。
+        """
+        index, loaded_state = TranscriptStore._related_indexes.get(self.db_path, (None, None))
+        with closing(self._connect()) as conn:
+            state = tuple(conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(indexed_at), 0) FROM transcript_terms"
+            ).fetchone())
+            if index is not None and state == loaded_state:
+                return index
+            document_count = conn.execute("SELECT COUNT(*) FROM transcript_fts").fetchone()[0]
+            document_frequency = {row["term"]: row["doc"] for row in conn.execute("SELECT term, doc FROM transcript_vocab")}
+            index = TfidfIndex()
+            for row in conn.execute("SELECT transcript_id, counts FROM transcript_terms"):
+                term_counts = json.loads(CompressedStorage.decode(row["counts"]))
+                index.add(row["transcript_id"], TfidfIndex.weigh(term_counts, document_frequency, document_count))
+        TranscriptStore._related_indexes[self.db_path] = (index, state)
+        return index
+
+    def related(self, transcript_id, limit=RELATED_VIDEO_LIMIT, min_score=RELATED_MIN_SCORE):
+        """找出主題相近的其他逐字稿，依相似度由高到低回傳 [{"record": 目錄記錄, "score": 餘弦相似度}]"""
+        with TranscriptStore._related_lock:
+            matches = self._related_index().most_similar(transcript_id, k=limit, min_score=min_score)
+        if not matches:
+            return []
+
+        placeholders = ", ".join("?" * len(matches))
+        with closing(self._connect()) as conn:
+            records = {
+                row["id"]: dict(row)
+                for row in conn.execute(
+                    f"SELECT * FROM transcripts WHERE id IN ({placeholders})", [match_id for match_id, _ in matches]
+                )
+            }
+        return [
+            {"record": records[match_id], "score": score} for match_id, score in matches if match_id in records
+        ]
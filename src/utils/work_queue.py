@@ -0,0 +1,265 @@
+"""
+共用工作佇列模組
+多台 VidScript 節點以放在共用儲存空間上的 SQLite 資料庫協調工作：節點領取工作時取得租約 (lease)，
+處理期間定期送出心跳延長租約；節點當機或斷線時租約到期，工作自動退回佇列由其他節點重試。
+工作可標註需求 (是否需要 GPU、使用的 Whisper 模型)，優先分派給已載入相同模型的節點
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import closing
+from src.core.config import (
+    WORK_QUEUE_DB, WORK_QUEUE_LEASE_SECONDS, WORK_QUEUE_MAX_ATTEMPTS, WORK_QUEUE_WORKER_TIMEOUT_SECONDS,
+    WORK_QUEUE_AFFINITY_WAIT_SECONDS
+)
+
+# 工作狀態
+QUEUED, LEASED, DONE, FAILED = "queued", "leased", "done", "failed"
+# 每次領取時最多檢查的候選工作數
+_CLAIM_CANDIDATES = 50
+
+
+class SharedWorkQueue:
+    """
+    以 SQLite 實作的多節點工作佇列
+
+    網路磁碟無法使用 WAL 的共用記憶體，因此使用預設的 rollback journal；領取工作以條件式 UPDATE
+    (狀態仍為 queued 才更新) 避免兩個節點領到同一份工作。各節點以自己的時鐘計算租約，需同步系統時間。
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, db_path=WORK_QUEUE_DB, lease_seconds=WORK_QUEUE_LEASE_SECONDS,
+                 worker_timeout=WORK_QUEUE_WORKER_TIMEOUT_SECONDS, affinity_wait=WORK_QUEUE_AFFINITY_WAIT_SECONDS):
+        """初始化佇列資料庫"""
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.worker_timeout = worker_timeout
+        self.affinity_wait = affinity_wait
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    requires TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    worker_id TEXT,
+                    lease_expires_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    host TEXT NOT NULL,
+                    capabilities TEXT NOT NULL,
+                    current_task INTEGER,
+                    started_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        """建立資料庫連線"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _task(row):
+        if row is None:
+            return None
+        task = dict(row)
+        for key in ("payload", "requires", "result"):
+            task[key] = json.loads(task[key]) if task[key] is not None else None
+        return task
+
+    def enqueue(self, kind, payload, requires=None, max_attempts=WORK_QUEUE_MAX_ATTEMPTS):
+        """
+        加入工作，回傳工作 ID
+
+        requires 為節點需具備的能力：{"gpu": True} 只分派給有 GPU 的節點 (必要條件)，
+        {"model": "small"} 優先分派給已載入該模型的節點 (等待超過 affinity_wait 秒後任何節點都可領取)。
+        """
+        now = time.time()
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO tasks (kind, payload, requires, status, max_attempts, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (kind, json.dumps(payload, ensure_ascii=False), json.dumps(requires or {}), QUEUED, max_attempts, now, now)
+            )
+            return cursor.lastrowid
+
+    def heartbeat(self, worker_id, capabilities, task_id=None):
+        """登錄節點與其能力並更新心跳時間；處理中的工作同時延長租約，回傳租約是否仍有效"""
+        now = time.time()
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO workers (worker_id, host, capabilities, current_task, started_at, heartbeat_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET
+                    capabilities = excluded.capabilities,
+                    current_task = excluded.current_task,
+                    heartbeat_at = excluded.heartbeat_at
+                """,
+                (worker_id, socket.gethostname(), json.dumps(capabilities), task_id, now, now)
+            )
+            if task_id is None:
+                return True
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+                (now + self.lease_seconds, now, task_id, worker_id, LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def unregister(self, worker_id):
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def requeue_expired(self, conn, now):
+        """租約到期的工作 (節點當機或斷線) 退回佇列；已達重試上限時標為失敗"""
+        conn.execute(
+            """
+            UPDATE tasks SET status = ?, error = '節點失去聯繫，已達重試上限', worker_id = NULL, updated_at = ?
+            WHERE status = ? AND lease_expires_at < ? AND attempts >= max_attempts
+            """,
+            (FAILED, now, LEASED, now)
+        )
+        conn.execute(
+            """
+            UPDATE tasks SET status = ?, error = '節點失去聯繫，重新排入佇列', worker_id = NULL, updated_at = ?
+            WHERE status = ? AND lease_expires_at < ?
+            """,
+            (QUEUED, now, LEASED, now)
+        )
+
+    def _warm_elsewhere(self, conn, worker_id, now):
+        """其他仍在線的節點已載入的模型"""
+        models = set()
+        for row in conn.execute(
+            "SELECT capabilities FROM workers WHERE worker_id != ? AND heartbeat_at >= ?",
+            (worker_id, now - self.worker_timeout)
+        ):
+            models.update(json.loads(row["capabilities"]).get("models") or [])
+        return models
+
+    def claim(self, worker_id, capabilities, kinds=None):
+        """
+        領取一份符合能力的工作並取得租約，沒有可領取的工作時回傳 None
+
+        capabilities 為 {"gpu": bool, "models": [已載入的模型]}。依建立順序挑選，
+        但需要某模型的工作若有其他在線節點已載入該模型，且等待未超過 affinity_wait 秒，則留給該節點。
+        """
+        now = time.time()
+        warm = set(capabilities.get("models") or [])
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            self.requeue_expired(conn, now)
+            warm_elsewhere = self._warm_elsewhere(conn, worker_id, now)
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE status = ? ORDER BY created_at, id LIMIT ?", (QUEUED, _CLAIM_CANDIDATES)
+            ).fetchall()
+
+            candidates = []
+            for row in rows:
+                task = self._task(row)
+                requires = task["requires"]
+                if kinds is not None and task["kind"] not in kinds:
+                    continue
+                if requires.get("gpu") and not capabilities.get("gpu"):
+                    continue
+                model = requires.get("model")
+                if model and model not in warm and model in warm_elsewhere and now - task["created_at"] < self.affinity_wait:
+                    continue
+                # 已載入所需模型的工作排在前面
+                candidates.append((0 if model and model in warm else 1, task))
+            candidates.sort(key=lambda candidate: candidate[0])
+
+            for _, task in candidates:
+                cursor = conn.execute(
+                    """
+                    UPDATE tasks SET status = ?, worker_id = ?, attempts = attempts + 1, lease_expires_at = ?,
+                        updated_at = ?
+                    WHERE id = ? AND status = ?
+                    """,
+                    (LEASED, worker_id, now + self.lease_seconds, now, task["id"], QUEUED)
+                )
+                if cursor.rowcount == 1:
+                    task.update(status=LEASED, worker_id=worker_id, attempts=task["attempts"] + 1)
+                    return task
+        return None
+
+    def complete(self, task_id, worker_id, result=None):
+        """回報工作完成；租約已被收回 (逾時後由其他節點接手) 時回傳 False"""
+        return self._finish(task_id, worker_id, DONE, result=result)
+
+    def fail(self, task_id, worker_id, error, retry=True):
+        """回報工作失敗；retry 為 True 且未達重試上限時退回佇列"""
+        with SharedWorkQueue._lock, closing(self._connect()) as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        status = QUEUED if retry and row and row["attempts"] < row["max_attempts"] else FAILED
+        return self._finish(task_id, worker_id, status, error=error)
+
+    def _finish(self, task_id, worker_id, status, result=None, error=None):
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                """
+                UPDATE tasks SET status = ?, result = ?, error = ?, updated_at = ?,
+                    worker_id = CASE WHEN ? = ? THEN NULL ELSE worker_id END, lease_expires_at = NULL
+                WHERE id = ? AND worker_id = ? AND status = ?
+                """,
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(),
+                 status, QUEUED, task_id, worker_id, LEASED)
+            )
+            return cursor.rowcount == 1
+
+    def cancel(self, task_ids, reason="已取消"):
+        """取消仍在等待的工作 (處理中的工作不受影響)，回傳取消的數量"""
+        now = time.time()
+        with SharedWorkQueue._lock, closing(self._connect()) as conn, conn:
+            return sum(
+                conn.execute(
+                    "UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (FAILED, reason, now, task_id, QUEUED)
+                ).rowcount
+                for task_id in task_ids
+            )
+
+    def get(self, task_id):
+        with closing(self._connect()) as conn:
+            return self._task(conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def stats(self):
+        """各狀態的工作數與在線節點"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            counts = {row["status"]: row["count"] for row in conn.execute(
+                "SELECT status, COUNT(*) AS count FROM tasks GROUP BY status"
+            )}
+            workers = [
+                {
+                    "worker_id": row["worker_id"], "host": row["host"],
+                    "capabilities": json.loads(row["capabilities"]), "current_task": row["current_task"],
+                    "alive": row["heartbeat_at"] >= now - self.worker_timeout,
+                    "heartbeat_age": round(now - row["heartbeat_at"], 1)
+                }
+                for row in conn.execute("SELECT * FROM workers ORDER BY worker_id")
+            ]
+        return {"tasks": {status: counts.get(status, 0) for status in (QUEUED, LEASED, DONE, FAILED)}, "workers": workers}
@@ -0,0 +1,88 @@
+"""
+批次分析測試 - 依 Token 預算打包逐字稿、解析批次回應，以及批次回應缺漏時改為逐份呼叫 (不呼叫 Gemini)
+"""
+import os
+import sys
+import json
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+pytest.importorskip("streamlit")
+pytest.importorskip("google.generativeai")
+
+import src.utils.metrics as metrics
+from src.services.ai_service import AIService
+from src.utils.metrics import MetricsRecorder
+
+
+@pytest.fixture(autouse=True)
+def isolated_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+
+
+def test_pack_batches_first_fit_decreasing():
+    item_tokens = {"a": 50, "b": 70, "c": 30, "d": 20, "e": 40, "f": 150}
+    batches, singles = AIService.pack_batches(item_tokens, token_budget=100, max_items=10)
+
+    # 由大到小放入第一個放得下的批次：b+c、a+e；d 放不進任何批次而自成一批，只有一份時改為單獨處理
+    assert batches == [["b", "c"], ["a", "e"]]
+    assert singles == ["f", "d"]
+
+
+def test_pack_batches_respects_max_items_and_demotes_single_item_batches():
+    item_tokens = {name: 10 for name in "abcde"}
+    batches, singles = AIService.pack_batches(item_tokens, token_budget=100, max_items=2)
+    assert batches == [["a", "b"], ["c", "d"]]
+    assert singles == ["e"]
+
+    batches, singles = AIService.pack_batches({"a": 80, "b": 70}, token_budget=100)
+    assert batches == [] and singles == ["a", "b"]
+
+
+def test_parse_batch_response_validates_payload():
+    with pytest.raises(ValueError):
+        AIService.parse_batch_response("不是 JSON", ["1"])
+    with pytest.raises(ValueError):
+        AIService.parse_batch_response(json.dumps({"id": "1", "report": "報告"}), ["1"])
+
+    response = json.dumps([
+        {"id": 1, "report": "第一份"},
+        {"id": " 2 ", "report": "第二份"},
+        {"id": "3", "report": "   "},
+        {"id": "9", "report": "不在請求中"},
+        {"report": "沒有編號"},
+        "不是物件"
+    ], ensure_ascii=False)
+    assert AIService.parse_batch_response(response, ["1", "2", "3", "4"]) == {"1": "第一份", "2": "第二份"}
+
+
+def test_missing_batch_reports_fall_back_to_single_calls(tmp_path, monkeypatch):
+    batch_calls = []
+    single_calls = []
+
+    def fake_batch(prompt, item_ids, api_key, model_name="gemini-2.5-flash", estimated_tokens=None):
+        batch_calls.append(list(item_ids))
+        return {item_ids[0]: "批次報告"}  # 只回傳第一份
+
+    def fake_single(prompt, api_key, model_name="gemini-2.5-flash", estimated_tokens=None):
+        single_calls.append(prompt)
+        return "單獨報告"
+
+    monkeypatch.setattr(AIService, "generate_batch_reports", staticmethod(fake_batch))
+    monkeypatch.setattr(AIService, "generate_report_text", staticmethod(fake_single))
+    transcripts = {"a": "第一份逐字稿", "b": "第二份逐字稿", "c": "第三份逐字稿"}
+    output_paths = {name: str(tmp_path / f"{name}.md") for name in transcripts}
+
+    results = AIService.refine_batch(transcripts, output_paths, "key", "分析：{transcript_text}")
+
+    assert results == {name: "gemini-2.5-flash" for name in transcripts}
+    assert batch_calls == [["1", "2", "3"]]
+    assert len(single_calls) == 2
+    reports = sorted(open(path, encoding="utf-8").read() for path in output_paths.values())
+    assert reports == ["單獨報告", "單獨報告", "批次報告"]
+    entry = MetricsRecorder.read_recent("batch_pack")[-1]
+    assert (entry["batches"], entry["singles"], entry["fallbacks"], entry["requests"]) == (1, 0, 2, 3)
@@ -0,0 +1,86 @@
+"""
+長音訊分段測試
+驗證 silencedetect 輸出解析、在靜音處規劃分段、重疊範圍的合併，以及透過共用佇列分段轉錄後依時間合併
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.core.worker_node import WorkerNode, SHARD_TASK, transcribe_sharded
+from src.utils.audio_sharding import AudioSharder
+from src.utils.work_queue import SharedWorkQueue
+
+FFMPEG_OUTPUT = """
+Input #0, mov,mp4,m4a, from 'live.m4a':
+  Duration: 01:00:00.50, start: 0.000000, bitrate: 129 kb/s
+[silencedetect @ 0x1] silence_start: 1180.2
+[silencedetect @ 0x1] silence_end: 1181.0 | silence_duration: 0.8
+[silencedetect @ 0x1] silence_start: 2450
+[silencedetect @ 0x1] silence_end: 2451.5 | silence_duration: 1.5
+[silencedetect @ 0x1] silence_start: 3599.9
+"""
+
+
+def test_parse_and_plan_cut_at_silences():
+    duration, silences = AudioSharder.parse_silencedetect(FFMPEG_OUTPUT)
+    assert duration == 3600.5
+    assert silences == [(1180.2, 1181.0), (2450.0, 2451.5), (3599.9, 3600.5)]
+
+    plan = AudioSharder.plan_shards(duration, silences, target_seconds=1200, search_seconds=90, overlap_seconds=2)
+    assert [shard["cut_start"] for shard in plan] == [0.0, 1180.6, 2450.75]
+    assert plan[-1]["cut_end"] == 3600.5
+    assert plan[1]["start"] == 1178.6 and plan[1]["end"] == 2452.75
+    # 太短的音訊不切段
+    assert len(AudioSharder.plan_shards(1500, [], target_seconds=1200)) == 1
+
+
+def test_merge_drops_overlap_duplicates():
+    shards = [
+        {"cut_start": 0, "cut_end": 100, "segments": [
+            {"start": 90.0, "end": 97.0, "text": "第一句"},
+            {"start": 98.0, "end": 101.6, "text": "跨切點的一句"}
+        ]},
+        {"cut_start": 100, "cut_end": 200, "segments": [
+            {"start": 98.1, "end": 101.5, "text": "跨切點的一句。"},
+            {"start": 102.0, "end": 203.0, "text": "最後一句"}
+        ]}
+    ]
+    merged = AudioSharder.merge_segments(shards)
+    assert [segment["text"] for segment in merged] == ["第一句", "跨切點的一句", "最後一句"]
+
+
+def test_transcribe_sharded_merges_results_from_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.setattr(AudioSharder, "detect_silences", staticmethod(lambda path: (3000.0, [(1199.0, 1201.0)])))
+
+    def fake_extract(audio_path, start, end, output_path):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(f"{start},{end}")
+        return output_path
+
+    monkeypatch.setattr(AudioSharder, "extract_shard", staticmethod(fake_extract))
+
+    def fake_shard(payload, node):
+        with open(payload["path"], "r", encoding="utf-8") as f:
+            start, end = map(float, f.read().split(","))
+        segments = [{"start": second, "end": second + 10, "text": f"{second:.0f}"}
+                    for second in range(int(start), int(end) - 10, 300)]
+        return {"index": payload["index"], "worker": node.worker_id, "language": "zh", "seconds": 0.01,
+                "segments": segments}
+
+    class SilentReporter:
+        def emit(self, event, **fields):
+            pass
+
+    work_queue = SharedWorkQueue(str(tmp_path / "queue.sqlite3"))
+    node = WorkerNode(work_queue, {SHARD_TASK: fake_shard}, worker_id="coordinator", gpu=False,
+                      poll_seconds=0.01, reporter=SilentReporter())
+    result = transcribe_sharded(node, "live.m4a", "small", "zh", shard_root=str(tmp_path / "shards"), min_seconds=0)
+
+    starts = [segment["start"] for segment in result["segments"]]
+    assert starts == sorted(starts) and len(starts) == len(set(starts))
+    assert len(result["shards"]) == 2 and all(shard["worker"] == "coordinator" for shard in result["shards"])
+    assert result["language"] == "zh"
+    assert os.listdir(tmp_path / "shards") == []
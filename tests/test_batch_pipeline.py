@@ -0,0 +1,206 @@
+"""
+影片批次處理管線測試 - 以模擬的執行方式驗證階段路由、失敗隔離與工作資料夾清理
+"""
+import io
+import os
+import sys
+import json
+import threading
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.core.batch_pipeline import BatchPipeline
+from src.core.batch_cli import run_batch
+from src.utils.single_flight import SingleFlight
+
+
+class StubBackend:
+    """模擬各階段：網址中的關鍵字決定影片有無字幕、是否失敗或轉錄較慢"""
+
+    can_analyze = True
+
+    def __init__(self):
+        self.release_slow = threading.Event()
+        self.transcribed = []
+        self.lock = threading.Lock()
+
+    def probe(self, url):
+        if "broken" in url:
+            raise RuntimeError("無法取得影片資訊")
+        return {"id": url.rsplit("/", 1)[-1], "title": url, "duration": 60, "has_subtitles": "captions" in url}
+
+    def find_existing(self, item):
+        return {"id": 0, "filename": "old.txt"} if "existing" in item["url"] else None
+
+    def fetch_captions(self, item, work_dir):
+        with open(os.path.join(work_dir, "subtitle.vtt"), "w", encoding="utf-8") as f:
+            f.write("WEBVTT")
+        return "字幕內容", []
+
+    def fetch_audio(self, item, work_dir):
+        audio_path = os.path.join(work_dir, "audio.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(b"audio")
+        return audio_path
+
+    def transcribe(self, item, audio_path):
+        if "slow" in item["url"]:
+            assert self.release_slow.wait(5)
+        with self.lock:
+            self.transcribed.append(item["url"])
+        return "轉錄內容", [], "zh"
+
+    def save(self, item, transcript_text, segments, source, work_dir, language=None):
+        return {"id": item["index"], "filename": f"{item['index']}.txt"}
+
+    def read_transcript(self, item):
+        return f"逐字稿 {item['index']}"
+
+    def analyze(self, item):
+        return {"path": f"report_{item['index']}.txt", "model": "stub", "cache_hit": False}
+
+
+def test_pipeline_routes_items_and_isolates_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    backend = StubBackend()
+    urls = ["v/captions1", "v/audio1", "v/broken", "v/existing"]
+    items = BatchPipeline(backend, work_root=str(tmp_path / "work")).run(urls)
+
+    by_url = {item["url"]: item for item in items}
+    assert [item["url"] for item in items] == urls
+    assert by_url["v/captions1"]["source"] == "captions"
+    assert by_url["v/audio1"]["source"] == "asr"
+    assert by_url["v/existing"]["source"] == "existing"
+    assert by_url["v/broken"]["status"] == "failed" and by_url["v/broken"]["stage"] == "metadata"
+    assert backend.transcribed == ["v/audio1"]
+    for url in ("v/captions1", "v/audio1", "v/existing"):
+        assert by_url[url]["status"] == "done"
+        assert by_url[url]["report"]["path"].startswith("report_")
+    assert set(by_url["v/audio1"]["timings"]) == {"metadata", "audio", "transcribe", "analyze"}
+    # 每部影片的暫存資料夾與整個工作資料夾都已刪除
+    assert os.listdir(tmp_path / "work") == []
+
+
+def test_concurrent_jobs_share_transcription(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+
+    class KeyedBackend(StubBackend):
+        def transcript_key(self, item):
+            return (item["video_id"], "base", "zh")
+
+        def analyze(self, item):
+            return {"path": f"report_{id(self)}.txt", "model": "stub", "cache_hit": False}
+
+    flights = SingleFlight()
+    first_backend, second_backend = KeyedBackend(), KeyedBackend()
+    first = BatchPipeline(first_backend, work_root=str(tmp_path / "work"), flights=flights)
+    second = BatchPipeline(second_backend, work_root=str(tmp_path / "work"), flights=flights)
+    first.start(["v/slow"])
+    for _ in range(100):
+        if flights.in_flight():
+            break
+        first.wait(timeout=0.05)
+    second.start(["https://youtu.be/slow"])
+
+    # 第二個工作附加到進行中的處理，看得到其進度
+    for _ in range(100):
+        if second.snapshot()[0]["source"] == "shared":
+            break
+        second.wait(timeout=0.05)
+    assert flights.in_flight() == {("slow", "base", "zh"): 1}
+    assert second.snapshot()[0]["stage"] == "transcribe"
+
+    first_backend.release_slow.set()
+    assert first.wait(timeout=5) and second.wait(timeout=5)
+    shared = second.snapshot()[0]
+    assert first_backend.transcribed == ["v/slow"] and second_backend.transcribed == []
+    assert shared["status"] == "done" and shared["record"] == first.snapshot()[0]["record"]
+    # 只有 AI 分析由各自的設定重新執行
+    assert shared["report"]["path"] == f"report_{id(second_backend)}.txt"
+    assert flights.in_flight() == {}
+
+
+def test_full_follower_queue_does_not_stall_leader(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+
+    class KeyedBackend(StubBackend):
+        def __init__(self):
+            super().__init__()
+            self.release_analyze = threading.Event()
+
+        def transcript_key(self, item):
+            return (item["video_id"], "base", "zh")
+
+        def analyze(self, item):
+            assert self.release_analyze.wait(5)
+            return super().analyze(item)
+
+    flights = SingleFlight()
+    first_backend, second_backend = KeyedBackend(), KeyedBackend()
+    first_backend.release_analyze.set()
+    urls = ["v/slow1", "v/slow2", "v/slow3"]
+    first = BatchPipeline(first_backend, work_root=str(tmp_path / "work"), flights=flights)
+    # 第二個工作的 AI 分析佇列只容納一部影片，且分析會卡住
+    second = BatchPipeline(
+        second_backend, workers={"analyze": 1}, queue_size=1, work_root=str(tmp_path / "work"), flights=flights
+    )
+    first.start(urls)
+    for _ in range(100):
+        if len(flights.in_flight()) == len(urls):
+            break
+        first.wait(timeout=0.05)
+    second.start(urls)
+    for _ in range(100):
+        if all(item["source"] == "shared" for item in second.snapshot()):
+            break
+        second.wait(timeout=0.05)
+
+    first_backend.release_slow.set()
+    assert first.wait(timeout=5)
+    assert not second.done
+    second_backend.release_analyze.set()
+    assert second.wait(timeout=5)
+    assert [item["status"] for item in second.snapshot()] == ["done"] * len(urls)
+
+
+def test_slow_item_does_not_stall_others(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    backend = StubBackend()
+    urls = ["v/slow"] + [f"v/captions{index}" for index in range(6)]
+    pipeline = BatchPipeline(backend, workers={"transcribe": 1}, queue_size=2, work_root=str(tmp_path / "work"))
+    pipeline.start(urls)
+
+    # 較慢的影片佔住轉錄階段時，有字幕的影片仍可完成
+    def captions_done():
+        return sum(item["status"] == "done" for item in pipeline.snapshot()) == 6
+
+    for _ in range(100):
+        if captions_done():
+            break
+        pipeline.wait(timeout=0.05)
+    assert captions_done()
+    assert not pipeline.done
+
+    backend.release_slow.set()
+    assert pipeline.wait(timeout=5)
+    assert all(item["status"] == "done" for item in pipeline.snapshot())
+    assert pipeline.stage_summary()["transcribe"]["items"] == 1
+
+
+def test_cli_streams_json_progress_and_writes_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.chdir(tmp_path)
+    stream = io.StringIO()
+    items, stage_summary, _ = run_batch(["v/captions1", "v/broken"], StubBackend(), str(tmp_path), stream=stream)
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert events[0]["event"] == "job_started" and events[-1]["event"] == "job_finished"
+    assert events[-1]["done"] == 1 and events[-1]["failed"] == 1
+    assert any(event["event"] == "item" and event["stage"] == "captions" for event in events)
+    assert (tmp_path / "transcripts" / "0.txt").read_text(encoding="utf-8") == "逐字稿 0"
+
+    summary = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+    assert summary["stages"]["captions"]["items"] == 1
+    assert [item["status"] for item in summary["items"]] == ["done", "failed"]
@@ -0,0 +1,85 @@
+"""
+取消機制測試 - 驗證外部程式的看門狗、取消時終止子程序，以及批次處理取消後立即釋放轉錄資源
+"""
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.core.batch_pipeline import BatchPipeline
+from src.utils.cancellation import CancelToken, OperationCancelled, current_token
+from src.utils.lane_scheduler import LaneScheduler
+from src.utils.process_runner import run_process, ProcessWatchdogError
+from src.utils.single_flight import SingleFlight
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+def test_watchdog_kills_silent_process():
+    start_time = time.monotonic()
+    with pytest.raises(ProcessWatchdogError):
+        run_process(SLEEPER, "probe", idle_timeout=1)
+    assert time.monotonic() - start_time < 10
+
+    result = run_process([sys.executable, "-c", "print('ok')"], "probe")
+    assert result.returncode == 0 and result.stdout.strip() == b"ok"
+
+
+def test_cancel_token_stops_running_process():
+    token = CancelToken()
+    threading.Timer(0.5, token.cancel, args=("測試取消",)).start()
+    start_time = time.monotonic()
+    with token.bind(), pytest.raises(OperationCancelled, match="測試取消"):
+        run_process(SLEEPER, "audio")
+    assert time.monotonic() - start_time < 10
+    assert current_token() is not token
+
+
+class HangingBackend:
+    """轉錄會一直等到被取消"""
+
+    can_analyze = False
+
+    def probe(self, url):
+        return {"id": url, "title": url, "duration": 60}
+
+    def find_existing(self, item):
+        return None
+
+    def fetch_audio(self, item, work_dir):
+        return None
+
+    def transcribe(self, item, audio_path):
+        token = current_token()
+        token.wait(10)
+        token.check()
+        return "不應完成", [], "zh"
+
+    def save(self, item, transcript_text, segments, source, work_dir, language=None):
+        return {"id": item["index"], "filename": f"{item['index']}.txt"}
+
+
+def test_cancel_pipeline_releases_transcribe_slot(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    scheduler = LaneScheduler(slots=1)
+    pipeline = BatchPipeline(
+        HangingBackend(), workers={"transcribe": 1}, work_root=str(tmp_path / "work"), flights=SingleFlight(),
+        scheduler=scheduler
+    )
+    pipeline.start(["v/1", "v/2", "v/3"])
+    deadline = time.monotonic() + 5
+    while not any(item["stage"] == "transcribe" and item["status"] == "running" for item in pipeline.snapshot()):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    pipeline.cancel("測試取消")
+    assert pipeline.wait(5)
+    assert [item["status"] for item in pipeline.snapshot()] == ["cancelled"] * 3
+    assert scheduler.stats()["batch"]["running"] == 0
+    assert not os.listdir(tmp_path / "work")
@@ -0,0 +1,61 @@
+"""
+章節切分測試 - 片段歸入影片章節、依停頓切分的最短與最長段落長度，以及過短的最後一段併入前一段
+"""
+import os
+import sys
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.chapter_splitter import ChapterSplitter
+
+
+def make_segments(spans):
+    return [{"start": start, "end": end, "text": f"{start}-{end}"} for start, end in spans]
+
+
+def test_segments_are_assigned_to_chapters_by_start_time():
+    segments = make_segments([(70, 80), (0, 10), (55, 65), (10, 20), (120, 130)])
+    chapters = [
+        {"title": "結論", "start": 100, "end": 140},
+        {"title": "開場", "start": 0},
+        {"title": "市場", "start": 50},
+        {"title": "沒有內容", "start": 90}
+    ]
+
+    sections = ChapterSplitter.split_by_chapters(segments, chapters)
+
+    assert [(section["title"], section["start"], section["end"]) for section in sections] == [
+        ("開場", 0, 20), ("市場", 50, 80), ("結論", 100, 140)
+    ]
+    # 跨越章節邊界的片段依開始時間歸入前一章
+    assert sections[1]["text"] == "55-65 70-80"
+    assert ChapterSplitter.split_by_chapters(segments, []) == []
+
+
+def test_silence_split_respects_minimum_and_maximum_length():
+    # 0-40 秒之間的停頓都在最短長度前，不切開；40 秒後的 5 秒停頓切開
+    segments = make_segments([(0, 10), (15, 25), (30, 40), (45, 55), (56, 66)])
+    sections = ChapterSplitter.split_by_silence(segments, min_gap=3, min_section_seconds=30, max_section_seconds=100)
+    assert [(section["start"], section["end"]) for section in sections] == [(0, 40), (45, 66)]
+    assert [section["title"] for section in sections] == ["段落 1", "段落 2"]
+
+    # 沒有停頓時超過最長長度強制切開
+    continuous = make_segments([(start, start + 10) for start in range(0, 100, 10)])
+    sections = ChapterSplitter.split_by_silence(continuous, min_gap=3, min_section_seconds=10, max_section_seconds=30)
+    assert [(section["start"], section["end"]) for section in sections] == [(0, 30), (30, 60), (60, 90), (90, 100)]
+
+
+def test_short_last_section_merges_into_previous():
+    segments = make_segments([(0, 20), (21, 40), (50, 55)])
+    sections = ChapterSplitter.split_by_silence(segments, min_gap=5, min_section_seconds=30, max_section_seconds=100)
+
+    assert len(sections) == 1
+    assert (sections[0]["start"], sections[0]["end"]) == (0, 55)
+    assert sections[0]["text"] == "0-20 21-40 50-55"
+
+
+def test_build_sections_falls_back_to_silence_with_single_chapter():
+    segments = make_segments([(0, 10), (20, 30)])
+    sections, method = ChapterSplitter.build_sections(segments, [{"title": "全部", "start": 0}])
+    assert method == "silence" and sections[0]["title"] == "段落 1"
@@ -0,0 +1,46 @@
+"""
+壓縮儲存測試 - 壓縮格式偵測、舊版未壓縮資料相容與報告快取轉換
+"""
+import os
+import sys
+import sqlite3
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.compressed_storage import CompressedStorage
+from src.utils.report_cache import ReportCache
+
+
+def test_formats_round_trip_and_replace_each_other(tmp_path):
+    path = str(tmp_path / "transcript.txt")
+    text = "逐字稿內容 transcript " * 100
+
+    for algorithm in ("gzip", "zstd", None):
+        physical_path, stored_size = CompressedStorage.write_text(path, text, algorithm)
+        # 切換格式時不留下其他格式的舊檔案
+        assert [candidate for candidate in CompressedStorage.candidates(path) if os.path.exists(candidate)] == [physical_path]
+        assert CompressedStorage.read_text(path) == text
+        assert os.path.getsize(physical_path) == stored_size
+
+    assert CompressedStorage.logical_name("a.txt.gz") == "a.txt"
+    assert CompressedStorage.remove(path) == 1
+    assert not CompressedStorage.exists(path)
+
+
+def test_report_cache_reads_legacy_rows_and_compresses_them(tmp_path):
+    db_path = str(tmp_path / "cache.sqlite3")
+    cache = ReportCache(db_path=db_path)
+    report = "## 投資重點\n" + "重點內容。" * 200
+    cache.put("逐字稿", "prompt", "model", report)
+    assert cache.get("逐字稿", "prompt", "model") == report
+    assert cache.stats()["stored_bytes"] < cache.stats()["total_bytes"]
+
+    # 模擬舊版以文字保存、沒有壓縮後大小的項目
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE report_cache SET report = ?, stored_size = NULL", (report,))
+    assert cache.get("逐字稿", "prompt", "model") == report
+
+    count, original_bytes, stored_bytes = cache.compress_entries()
+    assert count == 1 and stored_bytes < original_bytes
+    assert cache.get("逐字稿", "prompt", "model") == report
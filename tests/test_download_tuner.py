@@ -0,0 +1,60 @@
+"""
+音訊下載調校測試 - 驗證 yt-dlp 進度解析、依實測速度選擇設定，以及共用的連線數與頻寬上限
+"""
+import os
+import sys
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.utils.download_tuner import DownloadTuner
+from src.utils.metrics import MetricsRecorder
+
+PROFILES = [{"fragments": 4, "chunk_size": "5M"}, {"fragments": 8, "chunk_size": "10M"}, {"fragments": 16, "chunk_size": "10M"}]
+
+
+def progress(mib, seconds):
+    return f"[download]  50.0% of   {mib:.2f}MiB at 1.00MiB/s ETA 00:05\n[download] 100% of   {mib:.2f}MiB in 00:00:{seconds:02d} at 1.00MiB/s\n"
+
+
+def test_parse_download_output():
+    output = "[youtube] abc: Downloading webpage\n" + progress(40, 8) + "[download] 100% of 512.00KiB in 00:02\n"
+    assert DownloadTuner.parse_download(output) == (40 * 1024 ** 2 + 512 * 1024, 10)
+    assert DownloadTuner.parse_download("[download] abc has already been downloaded") is None
+    assert DownloadTuner.host_of("https://youtu.be/abc") == DownloadTuner.host_of("https://m.youtube.com/watch?v=abc")
+
+
+def test_choose_fastest_profile_per_host(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    tuner = DownloadTuner(profiles=PROFILES, default_profile=1, max_connections=100, explore_every=0)
+    speed = {0: 2, 1: 5, 2: 9}  # 此網站連線數越多越快
+
+    chosen = []
+    for _ in range(4):
+        with tuner.lease("https://www.youtube.com/watch?v=abc") as lease:
+            chosen.append(lease.fragments)
+            lease.record(progress(speed[lease.profile] * 10, 10), 12.0)
+    assert chosen == [8, 16, 16, 16]
+    assert tuner.throughput("youtube.com") == {1: 5.0, 2: 9.0}
+
+    # 其他網站各自摸索；重新啟動後從效能指標記錄載入
+    with tuner.lease("https://vimeo.com/1") as lease:
+        assert lease.fragments == 8
+    assert DownloadTuner(profiles=PROFILES, explore_every=0).throughput("youtube.com") == {1: 5.0, 2: 9.0}
+    entries = MetricsRecorder.read_recent("audio_download")
+    assert [entry["mbps"] for entry in entries] == [5.0, 9.0, 9.0, 9.0]
+
+
+def test_shared_connection_and_bandwidth_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    tuner = DownloadTuner(profiles=PROFILES, default_profile=2, max_connections=20, max_bandwidth_mbps=8)
+    with tuner.lease("https://youtube.com/watch?v=1") as first, tuner.lease("https://youtube.com/watch?v=2") as second:
+        assert (first.fragments, second.fragments) == (16, 4)
+        assert (first.limit_rate, second.limit_rate) == ("8192K", "4096K")
+        assert tuner.stats()["connections"] == 20
+        second.record(progress(10, 10), 10.0)
+    assert tuner.stats()["connections"] == 0
+    # 連線數被限制時的速度不代表該設定，只記錄為指標
+    assert tuner.throughput("youtube.com") == {}
+    assert MetricsRecorder.read_recent("audio_download")[0]["capped"] is True
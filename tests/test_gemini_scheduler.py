@@ -0,0 +1,151 @@
+"""
+Gemini 排程器測試 - 以本機模擬伺服器注入節流與伺服器錯誤
+"""
+import os
+import sys
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.services.gemini_scheduler import GeminiScheduler, CircuitBreaker, CircuitOpenError
+
+
+class StubGeminiServer:
+    """模擬 Gemini 端點：依序回傳預先排定的狀態碼，之後一律成功"""
+
+    def __init__(self, failures):
+        self.failures = list(failures)
+        self.received_keys = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with stub.lock:
+                    stub.received_keys.append(self.headers.get("x-goog-api-key"))
+                    status = stub.failures.pop(0) if stub.failures else 200
+                body = json.dumps({"text": "ok"} if status == 200 else {"error": status}).encode("utf-8")
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/generate"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def request_fn(self, api_key):
+        request = urllib.request.Request(
+            self.url, data=b"{}", method="POST",
+            headers={"x-goog-api-key": api_key, "Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read().decode("utf-8"))["text"]
+
+
+def make_scheduler(**overrides):
+    options = dict(max_retries=4, backoff_base=0.01, backoff_max=0.05, failure_threshold=5, reset_seconds=60)
+    options.update(overrides)
+    return GeminiScheduler(**options)
+
+
+@pytest.fixture(autouse=True)
+def isolated_environment(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("GOOGLE_API_KEYS", raising=False)
+
+
+def test_retries_through_throttling_and_server_errors():
+    scheduler = make_scheduler()
+    with StubGeminiServer([429, 503, 429]) as stub:
+        assert scheduler.submit("gemini-2.5-flash", stub.request_fn, api_key="key-a") == "ok"
+
+    metrics = scheduler.snapshot()
+    assert metrics["retries"] == 3
+    assert metrics["throttled"] == 2
+    assert metrics["successes"] == 1
+    assert metrics["queue_depth"] == 0
+
+
+def test_non_retryable_error_is_raised_immediately():
+    scheduler = make_scheduler()
+    with StubGeminiServer([400]) as stub:
+        with pytest.raises(urllib.error.HTTPError):
+            scheduler.submit("gemini-2.5-flash", stub.request_fn, api_key="key-a")
+        assert len(stub.received_keys) == 1
+
+
+def test_throttled_key_rotates_to_pooled_key(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEYS", "key-b,key-c")
+    scheduler = make_scheduler(backoff_base=5, backoff_max=5)
+    with StubGeminiServer([429]) as stub:
+        assert scheduler.submit("gemini-2.5-flash", stub.request_fn, api_key="key-a") == "ok"
+    assert stub.received_keys == ["key-a", "key-b"]
+
+
+def test_circuit_opens_after_consecutive_failures():
+    scheduler = make_scheduler(max_retries=10, failure_threshold=3)
+    with StubGeminiServer([503] * 10) as stub:
+        with pytest.raises(CircuitOpenError):
+            scheduler.submit("gemini-2.5-pro", stub.request_fn, api_key="key-a")
+        assert len(stub.received_keys) == 3
+        with pytest.raises(CircuitOpenError):
+            scheduler.submit("gemini-2.5-pro", stub.request_fn, api_key="key-a")
+    assert scheduler.snapshot()["circuit_states"]["gemini-2.5-pro"] == "open"
+
+
+def test_throttling_does_not_open_circuit_and_half_open_allows_single_probe():
+    scheduler = make_scheduler(failure_threshold=2)
+    with StubGeminiServer([429, 429, 429]) as stub:
+        assert scheduler.submit("gemini-2.5-pro", stub.request_fn, api_key="key-a") == "ok"
+    assert scheduler.snapshot()["circuit_states"]["gemini-2.5-pro"] == "closed"
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_requests_per_minute_budget_queues_excess_calls():
+    scheduler = make_scheduler(rate_limits={"gemini-2.5-flash": {"rpm": 2, "tpm": None}}, window_seconds=0.3)
+    with StubGeminiServer([]) as stub:
+        threads = [
+            threading.Thread(target=scheduler.submit, args=("gemini-2.5-flash", stub.request_fn), kwargs={"api_key": "key-a"})
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    metrics = scheduler.snapshot()
+    assert metrics["successes"] == 4
+    assert metrics["max_queue_depth"] >= 2
+    assert metrics["max_wait_seconds"] >= 0.2
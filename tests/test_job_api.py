@@ -0,0 +1,162 @@
+"""
+工作 API 測試 - 以模擬的 yt-dlp / Gemini 執行方式驗證送出工作、查詢狀態、SSE 進度與結果下載
+"""
+import os
+import sys
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.core.job_api import JobApiServer
+from src.core.job_manager import JobManager
+from src.utils.cancellation import current_token
+
+
+class StubBackend:
+    """模擬下載、轉錄與分析：網址含 captions 時有字幕，含 broken 時取得資訊失敗，含 hang 時轉錄到被取消為止"""
+
+    def __init__(self, report_dir, options):
+        self.report_dir = report_dir
+        self.can_analyze = bool(options.get("expert"))
+
+    def expand_urls(self, source_text):
+        return [line.strip() for line in source_text.splitlines() if line.strip()]
+
+    def probe(self, url):
+        if "broken" in url:
+            raise RuntimeError("無法取得影片資訊")
+        return {"id": url, "title": f"標題 {url}", "has_subtitles": "captions" in url}
+
+    def find_existing(self, item):
+        return None
+
+    def fetch_captions(self, item, work_dir):
+        return f"字幕 {item['url']}", []
+
+    def fetch_audio(self, item, work_dir):
+        return None
+
+    def transcribe(self, item, audio_path):
+        if "hang" in item["url"]:
+            current_token().wait(10)
+            current_token().check()
+        return f"轉錄 {item['url']}", [], "zh"
+
+    def save(self, item, transcript_text, segments, source, work_dir, language=None):
+        return {"id": item["index"], "filename": f"{item['index']}.txt", "text": transcript_text}
+
+    def read_transcript(self, item):
+        return item["record"]["text"]
+
+    def analyze(self, item):
+        report_path = os.path.join(self.report_dir, f"report_{item['index']}.md")
+        with open(report_path, "w", encoding="utf-8") as f:
+            f.write(f"# 報告 {item['title']}")
+        return {"path": report_path, "model": "stub", "cache_hit": False}
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    monkeypatch.chdir(tmp_path)
+    manager = JobManager(lambda options: StubBackend(str(tmp_path), options))
+    server = JobApiServer(manager, "127.0.0.1", 0, token="secret", keepalive_seconds=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    manager.shutdown()
+    server.shutdown()
+    server.server_close()
+
+
+def request(base_url, path, payload=None, token="secret"):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method="POST" if data else "GET")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(req, timeout=10) as response:
+        body = response.read().decode("utf-8")
+        if response.headers.get_content_type() == "application/json":
+            return json.loads(body)
+        return body
+
+
+def test_submit_stream_and_fetch_results(api):
+    job = request(api, "/jobs", {"urls": ["v/captions1", "v/audio1", "v/broken"], "options": {"expert": "通用分析師"}})
+    # 有空的執行名額時工作會立即開始
+    assert job["status"] in ("queued", "running") and job["priority"] == "batch"
+
+    # SSE 串流在工作結束後關閉，事件依序編號
+    events = []
+    with urllib.request.urlopen(
+        urllib.request.Request(f"{api}/jobs/{job['id']}/events", headers={"Authorization": "Bearer secret"}), timeout=10
+    ) as response:
+        assert response.headers.get_content_type() == "text/event-stream"
+        for line in response.read().decode("utf-8").splitlines():
+            if line.startswith("data: "):
+                events.append(json.loads(line[len("data: "):]))
+    assert [event["id"] for event in events] == list(range(len(events)))
+    assert events[-1]["event"] == "job_status" and events[-1]["status"] == "done"
+    finished = next(event for event in events if event["event"] == "job_finished")
+    assert finished["done"] == 2 and finished["failed"] == 1
+
+    status = request(api, f"/jobs/{job['id']}")
+    assert status["counts"]["done"] == 2 and status["items"][2]["error"] == "無法取得影片資訊"
+    assert status["stages"]["transcribe"]["items"] == 1
+    assert request(api, f"/jobs/{job['id']}/items/0/transcript") == "字幕 v/captions1"
+    assert request(api, f"/jobs/{job['id']}/items/1/report") == "# 報告 標題 v/audio1"
+    queue = request(api, "/queue")
+    assert {key: queue[key] for key in ("queued_jobs", "running_jobs", "pending_items", "stages")} == {
+        "queued_jobs": 0, "running_jobs": 0, "pending_items": 0, "stages": {}
+    }
+    assert queue["job_lanes"]["batch"]["granted"] == 1 and queue["job_lanes"]["interactive"]["waiting"] == 0
+
+    # 從指定事件之後續傳
+    with urllib.request.urlopen(urllib.request.Request(
+        f"{api}/jobs/{job['id']}/events", headers={"Authorization": "Bearer secret", "Last-Event-ID": str(len(events) - 2)}
+    ), timeout=10) as response:
+        assert response.read().decode("utf-8").count("data: ") == 1
+
+
+def test_errors_and_authentication(api):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, "/queue", token=None)
+    assert error.value.code == 401
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, "/jobs", {"urls": []})
+    assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, "/jobs", {"urls": ["v/a"], "options": {"unknown": 1}})
+    assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, "/jobs", {"urls": ["v/a"], "options": {"priority": "urgent"}})
+    assert error.value.code == 400
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, "/jobs/missing")
+    assert error.value.code == 404
+
+
+def test_cancel_running_job(api):
+    job = request(api, "/jobs", {"urls": ["v/hang", "v/captions"]})
+    deadline = time.monotonic() + 5
+    while request(api, f"/jobs/{job['id']}")["counts"]["running"] == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+    assert request(api, f"/jobs/{job['id']}/cancel", {})["id"] == job["id"]
+    while not request(api, f"/jobs/{job['id']}")["finished_at"]:
+        assert time.monotonic() < deadline + 5
+        time.sleep(0.05)
+    status = request(api, f"/jobs/{job['id']}")
+    assert status["status"] == "cancelled"
+    assert status["items"][0]["status"] == "cancelled"
+    with pytest.raises(urllib.error.HTTPError) as error:
+        request(api, f"/jobs/{job['id']}/cancel", {})
+    assert error.value.code == 409
@@ -0,0 +1,76 @@
+"""
+優先佇列排程測試
+驗證互動佇列優先、佇列內短工作優先、長時間等待的工作不會餓死，以及各佇列的等待時間統計
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.lane_scheduler import LaneScheduler, INTERACTIVE, BATCH
+
+
+def run_waiters(scheduler, requests):
+    """在資源被佔用時送出請求，釋放後依序記錄取得資源的名稱"""
+    order = []
+    lock = threading.Lock()
+    blocker = scheduler.acquire(BATCH, 0)
+
+    def wait(name, lane, cost):
+        with scheduler.slot(lane, cost):
+            with lock:
+                order.append(name)
+
+    threads = []
+    for name, lane, cost in requests:
+        thread = threading.Thread(target=wait, args=(name, lane, cost))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)  # 固定送出順序
+    scheduler.release(blocker)
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_weighted_lanes_and_shortest_job_first():
+    scheduler = LaneScheduler(slots=1, lane_weights={INTERACTIVE: 3, BATCH: 1}, lane_limits={}, aging_rate=0)
+    order = run_waiters(scheduler, [
+        ("batch-3h", BATCH, 1620), ("batch-10m", BATCH, 90),
+        ("clip-20m", INTERACTIVE, 180), ("clip-5m", INTERACTIVE, 45)
+    ])
+    # 互動佇列先處理，各佇列內短的優先；批次佇列仍會輪到
+    assert order.index("clip-5m") < order.index("clip-20m")
+    assert order.index("batch-10m") < order.index("batch-3h")
+    assert order[0] == "clip-5m"
+
+    stats = scheduler.stats()
+    assert stats[INTERACTIVE]["granted"] == 2 and stats[BATCH]["granted"] == 3
+    assert stats[INTERACTIVE]["wait_p95"] is not None and stats[BATCH]["waiting"] == 0
+
+
+def test_aging_prevents_starvation():
+    scheduler = LaneScheduler(slots=1, lane_weights={INTERACTIVE: 3, BATCH: 1}, lane_limits={}, aging_rate=100000)
+    order = run_waiters(scheduler, [("long", BATCH, 100), ("short", BATCH, 1)])
+    # 先送出的長工作已等待較久，視為較短
+    assert order == ["long", "short"]
+
+
+def test_lane_limit_reserves_capacity():
+    scheduler = LaneScheduler(slots=2, lane_weights={INTERACTIVE: 3, BATCH: 1}, lane_limits={BATCH: 1})
+    first = scheduler.acquire(BATCH, 10)
+    granted = threading.Event()
+
+    def second_batch():
+        with scheduler.slot(BATCH, 10):
+            granted.set()
+
+    threading.Thread(target=second_batch, daemon=True).start()
+    assert not granted.wait(0.1)
+    with scheduler.slot(INTERACTIVE, 10):  # 保留的名額可立即使用
+        pass
+    scheduler.release(first)
+    assert granted.wait(2)
+    assert LaneScheduler.estimate_cost(600, has_captions=True) < LaneScheduler.estimate_cost(600)
@@ -0,0 +1,127 @@
+"""
+記憶體控管測試 - 以模擬的 RSS 與模型快取驗證峰值估計、放不下時改用較小的模型、延後執行、卸載閒置的模型、
+超出預算的標記與依實測修正估計
+"""
+import os
+import sys
+import time
+import threading
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.metrics as metrics
+from src.utils.memory_admission import MemoryAdmission
+from src.utils.metrics import MetricsRecorder
+
+
+class FakeRss:
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+
+class FakeModelCache:
+    """模擬 VideoProcessor 的模型快取：載入時 RSS 增加估計的模型大小，卸載時減少"""
+
+    def __init__(self, admission, rss, loaded=()):
+        self.admission = admission
+        self.rss = rss
+        self.models = {name: admission.estimate(name, 0)[0] for name in loaded}
+        self.unloaded = []
+
+    def loaded(self):
+        return list(self.models)
+
+    def load(self, name):
+        if name not in self.models:
+            self.models[name] = self.admission.estimate(name, 0)[0]
+            if self.rss.value is not None:
+                self.rss.value += self.models[name]
+
+    def unload(self, name):
+        self.unloaded.append(name)
+        model_mb = self.models.pop(name)
+        if self.rss.value is not None:
+            self.rss.value -= model_mb
+
+
+def test_estimate_scales_with_model_precision_and_audio():
+    admission = MemoryAdmission(budget_mb=8000, rss_reader=FakeRss(None), load_history=False)
+    medium_model, medium_working = admission.estimate("medium", 600, "int8")
+    assert admission.estimate("medium", 600, "int8", loaded=True) == (0.0, medium_working)
+    assert admission.estimate("small", 600, "int8")[0] < medium_model
+    assert admission.estimate("medium", 600, "float16")[0] < medium_model
+    assert admission.estimate("medium", 7200, "int8")[1] > medium_working
+
+
+def test_downgrade_when_model_cannot_fit_and_refine_estimate(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    rss = FakeRss(1000.0)
+    admission = MemoryAdmission(budget_mb=2000, rss_reader=rss, load_history=False)
+    estimate_before = sum(admission.estimate("small", 60))
+
+    with admission.admit("medium", 60) as model:
+        assert model == "small"
+        rss.value += 1500  # 實際用量高於估計
+    with admission.admit("medium", 60, allow_downgrade=False, loaded_models=lambda: ["medium"]) as model:
+        assert model == "medium"  # 沒有其他轉錄可等時仍執行，但標記超出預算
+
+    first, second = MetricsRecorder.read_recent("memory_stage")
+    assert (first["model"], first["requested_model"], first["delta_mb"]) == ("small", "medium", 1500.0)
+    assert not first["over_budget"] and second["over_budget"]
+    assert admission.stats()["over_budget"] == 1
+    assert sum(admission.estimate("small", 60)) > estimate_before
+    assert MemoryAdmission(budget_mb=2000, rss_reader=FakeRss(None)).correction("small") == admission.correction("small")
+
+
+def test_defer_until_running_transcription_finishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    admission = MemoryAdmission(budget_mb=2200, rss_reader=FakeRss(None), load_history=False)
+    waiting = threading.Event()
+    granted = []
+
+    def second():
+        with admission.admit("medium", 60, loaded_models=cache.loaded, on_wait=waiting.set) as model:
+            granted.append(model)
+            cache.load(model)
+
+    cache = FakeModelCache(admission, FakeRss(None))
+    with admission.admit("base", 60, loaded_models=cache.loaded) as model:
+        assert model == "base"
+        cache.load(model)
+        thread = threading.Thread(target=second)
+        thread.start()
+        assert waiting.wait(5)
+        time.sleep(0.1)
+        assert granted == [] and admission.stats()["active"] == 1
+    thread.join(5)
+    assert granted == ["medium"]
+    assert admission.stats()["resident_models"].keys() == {"base", "medium"}
+    assert MetricsRecorder.read_recent("memory_stage")[-1]["wait_seconds"] > 0
+
+
+def test_idle_models_are_evicted_and_failed_loads_not_resident(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_FILENAME", str(tmp_path / "metrics.jsonl"))
+    rss = FakeRss(1000.0)
+    admission = MemoryAdmission(budget_mb=2600, rss_reader=rss, load_history=False)
+    cache = FakeModelCache(admission, rss, loaded=["large-v3"])
+    rss.value += cache.models["large-v3"]
+
+    # 降級到較小的模型時卸載閒置的大模型，而不是讓兩者同時常駐
+    with admission.admit("medium", 60, loaded_models=cache.loaded, unload=cache.unload) as model:
+        cache.load(model)
+    assert cache.unloaded == ["large-v3"]
+    assert list(admission.stats()["resident_models"]) == [model]
+
+    # 轉錄在載入模型前失敗時不記為常駐
+    try:
+        with admission.admit("tiny", 60, loaded_models=cache.loaded, unload=cache.unload):
+            raise RuntimeError("load failed")
+    except RuntimeError:
+        pass
+    assert "tiny" not in admission.stats()["resident_models"]
+    entry = MetricsRecorder.read_recent("memory_stage")[0]
+    assert entry["evicted"] == ["large-v3"] and not entry["over_budget"]
@@ -0,0 +1,65 @@
+"""
+報告快取測試 - TTL 過期、超出容量時依最近存取淘汰與逐字稿空白正規化
+"""
+import os
+import sys
+import secrets
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.report_cache as report_cache
+from src.utils.report_cache import ReportCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_expired_rows_are_not_returned(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(report_cache.time, "time", clock)
+    cache = ReportCache(db_path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_bytes=None)
+    cache.put("逐字稿", "prompt", "model", "報告")
+
+    clock.now += 59
+    assert cache.get("逐字稿", "prompt", "model") == "報告"
+    clock.now += 2
+    assert cache.get("逐字稿", "prompt", "model") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_rows_are_evicted_first(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(report_cache.time, "time", clock)
+    cache = ReportCache(db_path=str(tmp_path / "cache.sqlite3"), ttl_seconds=None, max_bytes=None)
+    # 隨機內容幾乎無法壓縮，每個項目佔用的大小相近
+    reports = {name: secrets.token_hex(2000) for name in ("a", "b", "c")}
+    cache.put("a", "prompt", "model", reports["a"])
+    entry_bytes = cache.stats()["stored_bytes"]
+    cache.max_bytes = int(entry_bytes * 2.5)
+
+    clock.now += 1
+    cache.put("b", "prompt", "model", reports["b"])
+    clock.now += 1
+    assert cache.get("a", "prompt", "model") == reports["a"]  # a 變成最近存取
+    clock.now += 1
+    cache.put("c", "prompt", "model", reports["c"])
+
+    assert cache.get("b", "prompt", "model") is None
+    assert cache.get("a", "prompt", "model") == reports["a"]
+    assert cache.get("c", "prompt", "model") == reports["c"]
+    assert cache.stats()["stored_bytes"] <= cache.max_bytes
+
+
+def test_whitespace_differences_share_the_same_key(tmp_path):
+    cache = ReportCache(db_path=str(tmp_path / "cache.sqlite3"))
+    cache.put("第一段  內容\n\n第二段\t內容 ", "prompt", "model", "報告")
+
+    assert cache.get(" 第一段 內容 第二段 內容", "prompt", "model") == "報告"
+    assert cache.get("第一段內容 第二段內容", "prompt", "model") is None
+    assert cache.get("第一段 內容 第二段 內容", "prompt", "other-model") is None
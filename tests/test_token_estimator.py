@@ -0,0 +1,85 @@
+"""
+Token 估算測試 - 依實際用量重新擬合係數與自動選擇模型的門檻
+"""
+import os
+import sys
+import json
+import random
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import src.utils.token_estimator as token_estimator
+from src.utils.token_estimator import TokenEstimator, FEATURE_NAMES, DEFAULT_COEFFICIENTS
+
+
+@pytest.fixture
+def isolated_usage_log(tmp_path, monkeypatch):
+    usage_log = tmp_path / "token_usage.jsonl"
+    calibration_file = tmp_path / "token_calibration.json"
+    monkeypatch.setattr(token_estimator, "TOKEN_USAGE_LOG", str(usage_log))
+    monkeypatch.setattr(token_estimator, "TOKEN_CALIBRATION_FILE", str(calibration_file))
+    monkeypatch.setattr(TokenEstimator, "_coefficients", None)
+    return usage_log, calibration_file
+
+
+def write_samples(path, coefficients, count, seed=7):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(count):
+            features = {name: rng.randint(0, 2000) for name in FEATURE_NAMES}
+            actual = sum(coefficients[name] * features[name] for name in FEATURE_NAMES)
+            f.write(json.dumps({"model": "gemini-2.5-flash", "features": features, "actual_tokens": actual}) + "\n")
+        f.write("不是 JSON 的行\n")
+
+
+def test_recalibrate_recovers_known_coefficients(isolated_usage_log):
+    usage_log, calibration_file = isolated_usage_log
+    expected = {"cjk_chars": 1.1, "latin_words": 0.6, "latin_chars": 0.2, "digits": 0.5, "symbols": 0.9}
+    write_samples(usage_log, expected, 50)
+
+    summary = TokenEstimator.recalibrate()
+
+    assert summary["samples"] == 50
+    for name in FEATURE_NAMES:
+        assert summary["coefficients"][name] == pytest.approx(expected[name], rel=0.01)
+    assert summary["error_after"] < 0.01 < summary["error_before"]
+    assert json.loads(calibration_file.read_text(encoding="utf-8"))["coefficients"] == summary["coefficients"]
+    assert TokenEstimator.coefficients() == summary["coefficients"]
+
+
+def test_recalibrate_needs_enough_samples(isolated_usage_log):
+    usage_log, calibration_file = isolated_usage_log
+    write_samples(usage_log, DEFAULT_COEFFICIENTS, 5)
+
+    assert TokenEstimator.recalibrate(min_samples=20) is None
+    assert not calibration_file.exists()
+
+
+def test_select_model_uses_thresholds(monkeypatch):
+    pytest.importorskip("streamlit")
+    pytest.importorskip("google.generativeai")
+    import src.services.ai_service as ai_service
+    from src.services.ai_service import AIService
+
+    profiles = {
+        "pro": {"context_tokens": 100000, "overhead_seconds": 20.0, "input_tokens_per_second": 1000, "output_tokens_per_second": 100},
+        "flash": {"context_tokens": 500000, "overhead_seconds": 5.0, "input_tokens_per_second": 5000, "output_tokens_per_second": 200},
+        "lite": {"context_tokens": 500000, "overhead_seconds": 1.0, "input_tokens_per_second": 10000, "output_tokens_per_second": 400}
+    }
+    monkeypatch.setattr(ai_service, "GEMINI_MODEL_PROFILES", profiles)
+    monkeypatch.setattr(ai_service, "AUTO_ROUTE_EXPECTED_OUTPUT_TOKENS", 1000)
+    monkeypatch.setattr(ai_service, "AUTO_ROUTE_LATENCY_TARGET_SECONDS", 60)
+
+    # 短 Prompt 在延遲目標內，選品質最高的模型：20 + 10 + 10 = 40 秒
+    assert AIService.select_model(10000) == ("pro", 40.0)
+    # 超過延遲目標時改用較快的模型：pro 需 20 + 50 + 10 = 80 秒
+    assert AIService.select_model(50000) == ("flash", 20.0)
+    # 超過 pro 的 context 上限時跳過
+    assert AIService.select_model(200000)[0] == "flash"
+    # 沒有模型能達成延遲目標時選預估最快的模型
+    assert AIService.select_model(50000, latency_target=5) == ("lite", 8.5)
+    # 任何模型都放不下時退回最後一個模型，不提供預估
+    assert AIService.select_model(600000) == ("lite", None)
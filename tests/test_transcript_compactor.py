@@ -0,0 +1,45 @@
+"""
+逐字稿精簡測試 - 贅詞只在獨立出現時移除、重複迴圈收斂但保留正常用語、數字與標點，以及精簡前後的 Token 統計
+"""
+import os
+import sys
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.token_estimator import TokenEstimator, DEFAULT_COEFFICIENTS
+from src.utils.transcript_compactor import TranscriptCompactor, remove_fillers, collapse_repetitions
+
+
+def test_standalone_fillers_are_removed():
+    assert remove_fillers("嗯，我們今天，呃，來談 um, the market") == "我們今天，來談 the market"
+    assert remove_fillers("嗯嗯 那個，大家好") == "大家好"
+    assert remove_fillers("I mean, uh the rate") == "the rate"
+
+
+def test_filler_characters_inside_words_are_kept():
+    assert remove_fillers("唔該晒") == "唔該晒"
+    assert remove_fillers("欸你看這個") == "欸你看這個"
+    assert remove_fillers("那個人說 umbrella") == "那個人說 umbrella"
+
+
+def test_repetition_loops_collapse_but_normal_repeats_are_kept():
+    assert collapse_repetitions("好的好的好的好的，我們開始") == "好的，我們開始"
+    assert collapse_repetitions("謝謝收看 謝謝收看 謝謝收看 謝謝收看") == "謝謝收看"
+    assert collapse_repetitions("看看看看這個") == "看看看看這個"
+    assert collapse_repetitions("哈哈哈哈好好笑") == "哈哈哈哈好好笑"
+    assert collapse_repetitions("營收 1000000000 元") == "營收 1000000000 元"
+    assert collapse_repetitions("太扯了！！！！......") == "太扯了！！！！......"
+
+
+def test_compact_reports_tokens_before_and_after(monkeypatch):
+    monkeypatch.setattr(TokenEstimator, "_coefficients", dict(DEFAULT_COEFFICIENTS))
+    text = "嗯，  今天   我們來談市場。 好的好的好的好的，那個，重點是 um, inflation 。。"
+
+    compacted, stats = TranscriptCompactor(["whitespace", "fillers", "repetitions", "punctuation"]).compact(text)
+
+    assert compacted == "今天 我們來談市場。好的，重點是 inflation。"
+    assert stats["chars_before"] == len(text) and stats["chars_after"] == len(compacted)
+    assert stats["tokens_before"] == TokenEstimator.estimate(text)
+    assert stats["tokens_after"] == TokenEstimator.estimate(compacted)
+    assert stats["token_reduction"] == 1 - stats["tokens_after"] / stats["tokens_before"] > 0
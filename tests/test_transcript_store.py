@@ -0,0 +1,206 @@
+"""
+逐字稿目錄測試 - 命名衝突、分頁排序、既有檔案匯入、全文搜尋與重複偵測
+"""
+import os
+import sys
+
+import pytest
+
+# 添加專案根目錄到 Python 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.utils.transcript_store import TranscriptStore
+
+
+def make_store(tmp_path):
+    folder = tmp_path / "saved_transcripts"
+    return TranscriptStore(db_path=str(folder / "catalog.sqlite3"), folder=str(folder))
+
+
+def test_same_title_different_content_gets_hash_suffix(tmp_path):
+    store = make_store(tmp_path)
+    first = store.save("第一份內容", "影片標題", video_id="abc", source="captions")
+    second = store.save("第二份內容", "影片標題")
+    again = store.save("第一份內容", "影片標題")
+
+    assert first["filename"] == "影片標題.txt"
+    assert second["filename"] == f"影片標題_{second['content_hash'][:8]}.txt"
+    # 相同內容重新保存時沿用原檔名並保留既有中繼資料
+    assert again["filename"] == first["filename"]
+    assert again["video_id"] == "abc"
+    assert store.count() == 2
+
+
+def test_list_page_sorts_and_filters(tmp_path):
+    store = make_store(tmp_path)
+    for index in range(5):
+        store.save(f"內容 {index}", f"標題 {index}", duration=index * 60)
+
+    records, total = store.list_page(page=1, page_size=2, order_by="duration", descending=True)
+    assert total == 5
+    assert [record["title"] for record in records] == ["標題 2", "標題 1"]
+
+    records, total = store.list_page(title_filter="標題 3")
+    assert total == 1 and records[0]["duration"] == 180
+
+
+def test_import_folder_registers_existing_files(tmp_path):
+    store = make_store(tmp_path)
+    with open(store.path_for("舊逐字稿.txt"), "w", encoding="utf-8") as f:
+        f.write("早期保存的逐字稿")
+
+    assert store.import_folder() == (1, 0)
+    assert store.get("舊逐字稿.txt")["title"] == "舊逐字稿"
+
+    os.remove(store.path_for("舊逐字稿.txt"))
+    assert store.import_folder() == (0, 1)
+    assert store.count() == 0
+
+
+def test_search_ranks_hits_with_snippet_and_timestamp(tmp_path):
+    store = make_store(tmp_path)
+    segments_path = tmp_path / "segments.jsonl"
+    segments_path.write_text(
+        '{"start": 0.0, "end": 5.0, "text": "開場介紹"}\n{"start": 65.0, "end": 70.0, "text": "聯準會宣布升息一碼"}\n',
+        encoding="utf-8"
+    )
+    store.save("開場介紹 聯準會宣布升息一碼", "利率決策", segments_path=str(segments_path))
+    store.save("今天討論天氣與旅遊", "旅遊節目")
+
+    hits, elapsed_ms = store.search("升息")
+    assert [hit["record"]["title"] for hit in hits] == ["利率決策"]
+    assert hits[0]["start"] == 65.0
+    assert "**升息**" in hits[0]["snippet"]
+    assert elapsed_ms >= 0
+
+    # 多個關鍵字需同時出現，字元需連續
+    assert store.search("升息 旅遊")[0] == []
+    assert store.search("息升")[0] == []
+
+
+def test_find_near_duplicates_distinguishes_copies_from_clips(tmp_path):
+    store = make_store(tmp_path)
+    sentences = [f"第{index}段討論通膨數據與央行政策走向，投資人關注殖利率變化與美元強弱第{index}次" for index in range(60)]
+    full_text = "".join(sentences)
+    store.save(full_text, "完整直播")
+    store.save("今天介紹日本旅遊的行程規劃與美食推薦" * 20, "旅遊節目")
+
+    mirror = store.find_near_duplicates("".join(sentences) + "感謝收看")
+    assert mirror[0]["record"]["title"] == "完整直播"
+    assert mirror[0]["coverage"] > 0.9
+
+    clip = store.find_near_duplicates("".join(sentences[20:30]))
+    assert [match["record"]["title"] for match in clip] == ["完整直播"]
+    assert clip[0]["containment"] > 0.9 and clip[0]["coverage"] < 0.3
+
+    assert store.find_near_duplicates("完全無關的內容，講的是籃球比賽的戰術分析" * 5) == []
+
+
+def test_match_fingerprint_finds_trimmed_audio_offset(tmp_path):
+    np = pytest.importorskip("numpy")
+    from src.core.config import FINGERPRINT_SAMPLE_RATE
+    from src.utils.audio_fingerprint import AudioFingerprinter
+
+    rng = np.random.default_rng(0)
+    sample_rate = FINGERPRINT_SAMPLE_RATE
+    tones = []
+    for _ in range(1200):
+        low, high = rng.uniform(150, 3000, 2)
+        t = np.arange(sample_rate // 10) / sample_rate
+        tones.append(np.sin(2 * np.pi * low * t) + 0.5 * np.sin(2 * np.pi * high * t))
+    audio = np.concatenate(tones).astype(np.float32)
+
+    store = make_store(tmp_path)
+    record = store.save("原始影片逐字稿", "原始影片")
+    store.add_fingerprint(record["id"], AudioFingerprinter.fingerprint(audio))
+
+    # 去掉 5 秒片頭並加入雜訊
+    trimmed = audio[5 * sample_rate:] + rng.normal(0, 0.1, len(audio) - 5 * sample_rate).astype(np.float32)
+    matched, match_count, offset_seconds = store.match_fingerprint(AudioFingerprinter.fingerprint(trimmed))
+    assert matched["title"] == "原始影片"
+    assert abs(offset_seconds - 5.0) < 0.1
+
+    noise = rng.normal(0, 1, 30 * sample_rate).astype(np.float32)
+    assert store.match_fingerprint(AudioFingerprinter.fingerprint(noise)) is None
+
+
+def test_transcripts_are_stored_compressed_and_legacy_files_migrate(tmp_path):
+    store = make_store(tmp_path)
+    text = "央行宣布升息半碼，市場預期通膨將逐步降溫。" * 50
+    record = store.save(text, "壓縮測試")
+
+    # 實際檔案帶有壓縮副檔名，讀取時自動解壓縮
+    assert not os.path.exists(store.path_for(record["filename"]))
+    assert record["stored_size"] < record["size"]
+    assert store.read_text(record["filename"]) == text
+
+    # 舊版未壓縮的檔案仍可匯入與搜尋，轉換後內容不變
+    legacy_path = tmp_path / "saved_transcripts" / "舊逐字稿.txt"
+    legacy_path.write_text(text, encoding="utf-8")
+    (tmp_path / "saved_transcripts" / "舊逐字稿.segments.jsonl").write_text(
+        '{"start": 0.0, "end": 5.0, "text": "央行宣布升息"}\n', encoding="utf-8"
+    )
+    assert store.import_folder() == (1, 0)
+    totals = store.compress_files()
+    assert totals["transcripts"][0] == 2 and totals["segments"][0] == 1
+    assert not legacy_path.exists()
+    assert store.read_text("舊逐字稿.txt") == text
+    assert store.read_segments("舊逐字稿.txt")[0]["text"] == "央行宣布升息"
+    assert store.storage_stats()["stored_bytes"] < store.storage_stats()["original_bytes"]
+
+
+def test_reports_are_versioned_per_expert_and_model(tmp_path):
+    store = make_store(tmp_path)
+    record = store.save("逐字稿內容", "報告歷史")
+
+    first = store.add_report(record["id"], "第一版報告", expert="財經專家", model="gemini-2.5-flash")
+    # 內容相同 (例如快取命中) 不另建版本
+    assert store.add_report(record["id"], "第一版報告", expert="財經專家", model="gemini-2.5-flash")["id"] == first["id"]
+    second = store.add_report(record["id"], "第二版報告", expert="財經專家", model="gemini-2.5-flash")
+    other = store.add_report(record["id"], "其他模型報告", expert="財經專家", model="gemini-2.5-pro")
+
+    assert (first["version"], second["version"], other["version"]) == (1, 2, 1)
+    assert [report["id"] for report in store.list_reports(record["id"])] == [other["id"], second["id"], first["id"]]
+    assert store.read_report(first["id"]) == "第一版報告"
+
+    store.remove(record["filename"])
+    assert store.list_reports(record["id"]) == []
+
+
+def test_related_transcripts_rank_same_topic_first(tmp_path):
+    store = make_store(tmp_path)
+    rate = store.save("聯準會宣布升息一碼，通膨數據仍高，市場預期利率將維持高檔。" * 5, "升息")
+    rate_again = store.save("通膨降溫前聯準會可能再次升息，利率高檔壓抑股市估值。" * 5, "利率展望")
+    store.save("新款手機相機升級，電池續航表現亮眼，螢幕亮度也提高。" * 5, "手機評測")
+
+    related = store.related(rate["id"])
+    assert related[0]["record"]["id"] == rate_again["id"]
+    assert all(match["record"]["id"] != rate["id"] for match in related)
+
+    # 新增與刪除逐字稿後，記憶體內的索引依新的文件頻率重新加權
+    newer = store.save("升息循環接近尾聲，聯準會關注通膨與利率路徑。" * 5, "利率循環")
+    assert newer["id"] in [match["record"]["id"] for match in store.related(rate["id"])]
+    store.remove(rate_again["filename"])
+    assert rate_again["id"] not in [match["record"]["id"] for match in store.related(rate["id"])]
+
+
+def test_early_transcript_related_scores_match_rebuilt_index(tmp_path):
+    store = make_store(tmp_path)
+    early = store.save("聯準會宣布升息一碼，通膨數據仍高，市場預期利率將維持高檔。" * 5, "升息")
+    assert store.related(early["id"]) == []
+    topics = [
+        "通膨降溫前聯準會可能再次升息，利率高檔壓抑股市估值。",
+        "升息循環接近尾聲，聯準會關注通膨與利率路徑。",
+        "新款手機相機升級，電池續航表現亮眼，螢幕亮度也提高。",
+        "市場預期降息，債券殖利率回落，股市估值回升。",
+        "電動車銷量成長，電池成本下降，車廠調降售價。"
+    ]
+    for number, text in enumerate(topics):
+        store.save(text * 5, f"主題 {number}")
+
+    incremental = [(match["record"]["id"], match["score"]) for match in store.related(early["id"], min_score=0)]
+    store.rebuild_index()
+    rebuilt = [(match["record"]["id"], match["score"]) for match in store.related(early["id"], min_score=0)]
+
+    assert [match_id for match_id, _ in incremental] == [match_id for match_id, _ in rebuilt]
+    assert [score for _, score in incremental] == pytest.approx([score for _, score in rebuilt])
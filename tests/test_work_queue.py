@@ -0,0 +1,70 @@
+"""
+共用工作佇列測試
+驗證租約到期後重新排入佇列、重試上限、GPU 需求與模型親和性的分派，以及租約被收回後的結果不會寫回
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from src.core.worker_node import WorkerNode
+from src.utils.work_queue import SharedWorkQueue, QUEUED, DONE, FAILED
+
+
+def test_expired_lease_is_retried_until_max_attempts(tmp_path):
+    work_queue = SharedWorkQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.2)
+    task_id = work_queue.enqueue("video", {"url": "a"}, max_attempts=2)
+
+    assert work_queue.claim("node-a", {})["id"] == task_id
+    assert work_queue.claim("node-b", {}) is None  # 租約仍有效
+    time.sleep(0.3)
+    retried = work_queue.claim("node-b", {})
+    assert retried["id"] == task_id and retried["attempts"] == 2
+    # 原節點的租約已被收回，遲到的結果不會覆蓋
+    assert not work_queue.complete(task_id, "node-a", {"late": True})
+
+    time.sleep(0.3)
+    assert work_queue.claim("node-c", {}) is None
+    assert work_queue.get(task_id)["status"] == FAILED
+
+
+def test_routing_by_gpu_and_warm_model(tmp_path):
+    work_queue = SharedWorkQueue(str(tmp_path / "queue.sqlite3"), affinity_wait=60)
+    gpu_task = work_queue.enqueue("video", {"url": "gpu"}, requires={"gpu": True})
+    model_task = work_queue.enqueue("video", {"url": "large"}, requires={"model": "large-v3"})
+    work_queue.heartbeat("gpu-node", {"gpu": True, "models": ["large-v3"]})
+
+    # CPU 節點不能領取需要 GPU 的工作，需要 large-v3 的工作也保留給已載入模型的節點
+    assert work_queue.claim("cpu-node", {"gpu": False, "models": []}) is None
+    # 已載入模型的工作優先
+    assert work_queue.claim("gpu-node", {"gpu": True, "models": ["large-v3"]})["id"] == model_task
+    assert work_queue.claim("gpu-node", {"gpu": True, "models": ["large-v3"]})["id"] == gpu_task
+
+
+def test_worker_node_completes_and_retries_failures(tmp_path):
+    work_queue = SharedWorkQueue(str(tmp_path / "queue.sqlite3"))
+    ok_task = work_queue.enqueue("echo", {"value": 1})
+    bad_task = work_queue.enqueue("echo", {"value": None}, max_attempts=2)
+
+    def echo(payload, node):
+        if payload["value"] is None:
+            raise ValueError("沒有值")
+        return {"value": payload["value"], "worker": node.worker_id}
+
+    class SilentReporter:
+        def emit(self, event, **fields):
+            pass
+
+    node = WorkerNode(work_queue, {"echo": echo}, worker_id="node-a", gpu=False, poll_seconds=0.01,
+                      heartbeat_seconds=0.05, reporter=SilentReporter())
+    assert node.run_once()
+    assert work_queue.get(ok_task)["status"] == DONE
+    assert work_queue.get(ok_task)["result"] == {"value": 1, "worker": "node-a"}
+
+    assert node.run_once()
+    assert work_queue.get(bad_task)["status"] == QUEUED
+    node.run(max_tasks=3)
+    assert work_queue.get(bad_task)["status"] == FAILED
+    assert work_queue.get(bad_task)["error"] == "沒有值"
+    assert work_queue.stats()["workers"] == []
@@ -0,0 +1,104 @@
+"""
+相關影片索引效能測試工具
+以合成語料 (預設 50,000 份) 建立 TF-IDF 索引，量測建立時間、索引記憶體用量與 top-k 查詢延遲
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from collections import Counter
+
+# 確保可以導入專案模組
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.config import RELATED_TERMS_PER_DOC, RELATED_VIDEO_LIMIT
+from src.utils.tfidf_index import TfidfIndex, np
+
+
+def generate_corpus(doc_count, tokens_per_doc, topic_count, vocabulary_size, seed):
+    """
+    產生合成語料，回傳 [(主題, {詞: 次數})]
+
+    每份文件約四成的詞取自所屬主題的詞彙，其餘取自依 Zipf 分佈的共用詞彙，模擬常見字詞與主題用語。
+    """
+    rng = random.Random(seed)
+    background = [f"w{index}" for index in range(vocabulary_size)]
+    background_weights = []
+    total = 0.0
+    for rank in range(1, vocabulary_size + 1):
+        total += 1.0 / rank
+        background_weights.append(total)
+    topics = [[f"t{topic}_{index}" for index in range(300)] for topic in range(topic_count)]
+
+    corpus = []
+    topic_tokens = int(tokens_per_doc * 0.4)
+    for _ in range(doc_count):
+        topic = rng.randrange(topic_count)
+        tokens = rng.choices(topics[topic], k=topic_tokens)
+        tokens += rng.choices(background, cum_weights=background_weights, k=tokens_per_doc - topic_tokens)
+        corpus.append((topic, Counter(tokens)))
+    return corpus
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測相關影片索引的記憶體用量與查詢延遲")
+    parser.add_argument("--docs", type=int, default=50000, help="合成文件數")
+    parser.add_argument("--tokens", type=int, default=400, help="每份文件的詞數")
+    parser.add_argument("--topics", type=int, default=500, help="主題數")
+    parser.add_argument("--vocabulary", type=int, default=100000, help="共用詞彙數")
+    parser.add_argument("--queries", type=int, default=200, help="查詢次數")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"🧪 產生 {args.docs:,} 份合成文件（每份 {args.tokens} 詞，{args.topics} 個主題）...")
+    corpus = generate_corpus(args.docs, args.tokens, args.topics, args.vocabulary, args.seed)
+    document_frequency = Counter()
+    for _, term_counts in corpus:
+        document_frequency.update(term_counts.keys())
+    vectors = [TfidfIndex.weigh(term_counts, document_frequency, len(corpus)) for _, term_counts in corpus]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    build_start = time.perf_counter()
+    index = TfidfIndex()
+    for doc_id, vector in enumerate(vectors):
+        index.add(doc_id, vector)
+    build_seconds = time.perf_counter() - build_start
+    index_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    rng = random.Random(args.seed)
+    query_ids = [rng.randrange(len(corpus)) for _ in range(args.queries)]
+    # 第一次查詢另外列出 (含 NumPy 初始化等一次性成本)
+    cold_start = time.perf_counter()
+    index.most_similar(query_ids[0], k=RELATED_VIDEO_LIMIT)
+    cold_ms = (time.perf_counter() - cold_start) * 1000
+
+    latencies = []
+    same_topic = 0
+    for doc_id in query_ids:
+        query_start = time.perf_counter()
+        matches = index.most_similar(doc_id, k=RELATED_VIDEO_LIMIT)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+        same_topic += sum(corpus[match_id][0] == corpus[doc_id][0] for match_id, _ in matches)
+    postings = sum(len(posting) for posting in index.posting_rows)
+
+    print(f"   計算方式: {'NumPy' if np is not None else '純 Python'}，每份文件保留 {RELATED_TERMS_PER_DOC} 個詞")
+    print(f"   索引建立: {build_seconds:.1f} 秒，詞彙 {len(index.vocabulary):,} 個，非零項 {postings:,} 個")
+    print(f"   索引記憶體: {index_bytes / 1024 / 1024:,.1f} MB（每份文件 {index_bytes / len(corpus) / 1024:.1f} KB）")
+    print(f"   查詢延遲 (top-{RELATED_VIDEO_LIMIT}): 首次 {cold_ms:.1f} ms，"
+          f"p50 {percentile(latencies, 0.5):.1f} ms，p95 {percentile(latencies, 0.95):.1f} ms，最大 {max(latencies):.1f} ms")
+    print(f"   同主題比例: {same_topic / (len(query_ids) * RELATED_VIDEO_LIMIT):.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
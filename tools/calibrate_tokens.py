@@ -0,0 +1,34 @@
+"""
+Token 估算器校正工具
+依 logs/token_usage.jsonl 中 Gemini 回傳的實際用量重新擬合估算係數
+"""
+import os
+import sys
+import argparse
+
+# 確保可以導入專案模組
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.utils.token_estimator import TokenEstimator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重新校正 Token 估算係數")
+    parser.add_argument("--min-samples", type=int, default=20, help="進行校正所需的最少樣本數")
+    args = parser.parse_args()
+
+    summary = TokenEstimator.recalibrate(min_samples=args.min_samples)
+    if summary is None:
+        print(f"❌ 樣本不足（至少需要 {args.min_samples} 筆實際用量記錄），暫不校正")
+        return 1
+
+    print(f"✅ 已使用 {summary['samples']} 筆樣本完成校正")
+    print(f"   平均相對誤差: {summary['error_before']:.1%} → {summary['error_after']:.1%}")
+    for name, value in summary["coefficients"].items():
+        print(f"   {name}: {value:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
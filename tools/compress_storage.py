@@ -0,0 +1,59 @@
+"""
+儲存壓縮轉換工具
+將 saved_transcripts 資料夾中的逐字稿、時間軸與報告快取轉換為壓縮格式 (或還原為未壓縮)，並列出壓縮率
+"""
+import os
+import sys
+import argparse
+
+# 確保可以導入專案模組
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.config import TRANSCRIPTS_FOLDER, TRANSCRIPT_CATALOG_DB, REPORT_CACHE_DB, STORAGE_COMPRESSION
+from src.utils.compressed_storage import CompressedStorage
+from src.utils.transcript_store import TranscriptStore
+from src.utils.report_cache import ReportCache
+
+
+def format_ratio(label, count, original_bytes, stored_bytes):
+    ratio = original_bytes / stored_bytes if stored_bytes else 1.0
+    saved = 1 - stored_bytes / original_bytes if original_bytes else 0.0
+    return (f"   {label}: {count} 個, {original_bytes / 1024:,.1f} KB → {stored_bytes / 1024:,.1f} KB "
+            f"(壓縮比 {ratio:.2f}x, 節省 {saved:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將逐字稿、時間軸與報告快取轉換為壓縮格式")
+    parser.add_argument("--folder", default=TRANSCRIPTS_FOLDER, help="逐字稿資料夾")
+    parser.add_argument("--db", default=TRANSCRIPT_CATALOG_DB, help="逐字稿目錄資料庫路徑")
+    parser.add_argument("--cache-db", default=REPORT_CACHE_DB, help="報告快取資料庫路徑")
+    parser.add_argument("--algorithm", choices=["zstd", "gzip", "none"], default=STORAGE_COMPRESSION or "none",
+                        help="壓縮格式 (none 代表還原為未壓縮)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ 找不到逐字稿資料夾: {args.folder}")
+        return 1
+
+    algorithm = CompressedStorage.algorithm(args.algorithm)
+    if args.algorithm == "zstd" and algorithm != "zstd":
+        print("⚠️ 未安裝 zstandard，改用 gzip 壓縮 (pip install zstandard 可取得較佳壓縮率)")
+    print(f"📦 壓縮格式: {algorithm or '不壓縮'}")
+
+    # 先登錄尚未在目錄中的檔案，確保所有逐字稿都會轉換
+    store = TranscriptStore(db_path=args.db, folder=args.folder)
+    added, _ = store.import_folder()
+    if added:
+        print(f"   已先匯入 {added} 份未登錄的逐字稿")
+    totals = store.compress_files(algorithm)
+    print(format_ratio("逐字稿", *totals["transcripts"]))
+    print(format_ratio("時間軸", *totals["segments"]))
+
+    if os.path.exists(args.cache_db):
+        print(format_ratio("報告快取", *ReportCache(db_path=args.cache_db).compress_entries(algorithm)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+共用工作佇列示範工具
+在本機啟動多個工作節點行程共用同一個佇列資料庫 (模擬多台主機共用網路磁碟)，以模擬工作代替實際轉錄：
+其中一個節點已載入指定模型 (展示模型親和性)，一個節點處理到一半時當機 (展示租約到期後由其他節點重試)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+
+# 確保可以導入專案模組
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.worker_node import WorkerNode
+from src.utils.work_queue import SharedWorkQueue, DONE, FAILED
+
+DEMO_TASK = "demo"
+
+
+def run_worker(args):
+    """子行程：以模擬工作執行節點，處理到佇列清空為止"""
+    work_queue = SharedWorkQueue(
+        args.queue, lease_seconds=args.lease, worker_timeout=args.lease * 3, affinity_wait=args.affinity_wait
+    )
+
+    def handle(payload, node):
+        if args.crash:
+            time.sleep(payload["seconds"] / 2)
+            os._exit(1)  # 模擬節點當機：不回報結果、不再送出心跳
+        time.sleep(payload["seconds"])
+        return {"worker": node.worker_id, "warm": payload["model"] in node.warm_models}
+
+    node = WorkerNode(
+        work_queue, {DEMO_TASK: handle}, worker_id=args.worker_id, gpu=False,
+        warm_models=[args.warm] if args.warm else [], poll_seconds=0.2, heartbeat_seconds=args.lease / 4
+    )
+    idle_since = None
+    while True:
+        if node.run_once():
+            idle_since = None
+            continue
+        stats = work_queue.stats()["tasks"]
+        if stats["queued"] == 0 and stats["leased"] == 0:
+            idle_since = idle_since or time.time()
+            if time.time() - idle_since > 1.0:
+                break
+        time.sleep(node.poll_seconds)
+    work_queue.unregister(node.worker_id)
+
+
+def run_demo(args):
+    queue_path = os.path.join(tempfile.mkdtemp(prefix="work_queue_demo_"), "queue.sqlite3")
+    work_queue = SharedWorkQueue(queue_path, lease_seconds=args.lease)
+    for index in range(args.tasks):
+        work_queue.enqueue(DEMO_TASK, {"seconds": args.task_seconds, "model": "small"}, requires={"model": "small"})
+
+    processes = []
+    for number in range(args.workers):
+        command = [
+            sys.executable, os.path.abspath(__file__), "--role", "worker", "--queue", queue_path,
+            "--worker-id", f"node-{number}", "--lease", str(args.lease), "--affinity-wait", str(args.affinity_wait)
+        ]
+        if number == 0:
+            command += ["--warm", "small"]
+        if number == args.workers - 1 and args.workers > 1:
+            command.append("--crash")
+        processes.append(subprocess.Popen(command, stderr=subprocess.DEVNULL))
+
+    start_time = time.perf_counter()
+    for process in processes:
+        process.wait()
+    wall_seconds = time.perf_counter() - start_time
+
+    tasks = [work_queue.get(task_id) for task_id in range(1, args.tasks + 1)]
+    done = [task for task in tasks if task["status"] == DONE]
+    per_worker = Counter(task["result"]["worker"] for task in done)
+    print(json.dumps({
+        "tasks": args.tasks,
+        "done": len(done),
+        "failed": sum(task["status"] == FAILED for task in tasks),
+        "retried": sum(task["attempts"] > 1 for task in tasks),
+        "warm_model_hits": sum(task["result"]["warm"] for task in done),
+        "per_worker": dict(sorted(per_worker.items())),
+        "exit_codes": [process.returncode for process in processes],
+        "wall_seconds": round(wall_seconds, 2),
+        "serial_seconds": round(args.tasks * args.task_seconds, 2)
+    }, ensure_ascii=False, indent=2))
+    return 0 if len(done) == args.tasks else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="共用工作佇列示範 (多個本機節點行程)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--task-seconds", type=float, default=0.5)
+    parser.add_argument("--lease", type=float, default=2.0, help="租約秒數 (示範用，實際預設為 120 秒)")
+    parser.add_argument("--affinity-wait", type=float, default=1.0, help="保留給已載入模型節點的秒數 (實際預設為 60 秒)")
+    # 以下為子行程使用
+    parser.add_argument("--role", default="demo", choices=["demo", "worker"], help=argparse.SUPPRESS)
+    parser.add_argument("--queue", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-id", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", help=argparse.SUPPRESS)
+    parser.add_argument("--crash", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        run_worker(args)
+        return 0
+    return run_demo(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+逐字稿目錄匯入工具
+將 saved_transcripts 資料夾中既有的逐字稿檔案登錄到逐字稿目錄 (SQLite)，並可重建全文索引
+"""
+import os
+import sys
+import argparse
+
+# 確保可以導入專案模組
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.core.config import TRANSCRIPTS_FOLDER, TRANSCRIPT_CATALOG_DB
+from src.utils.transcript_store import TranscriptStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將既有逐字稿檔案匯入逐字稿目錄")
+    parser.add_argument("--folder", default=TRANSCRIPTS_FOLDER, help="逐字稿資料夾")
+    parser.add_argument("--db", default=TRANSCRIPT_CATALOG_DB, help="逐字稿目錄資料庫路徑")
+    parser.add_argument("--reindex", action="store_true", help="重建所有逐字稿的全文索引")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.folder):
+        print(f"❌ 找不到逐字稿資料夾: {args.folder}")
+        return 1
+
+    store = TranscriptStore(db_path=args.db, folder=args.folder)
+    added, removed = store.import_folder()
+    print(f"✅ 已匯入 {added} 份逐字稿，移除 {removed} 筆失效記錄")
+    if args.reindex:
+        print(f"🔎 已重建 {store.rebuild_index()} 份逐字稿的全文索引")
+    print(f"   目錄共 {store.count()} 份逐字稿: {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())